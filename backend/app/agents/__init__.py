@@ -14,15 +14,22 @@ def get_global_agent_factory():
 # 保持向后兼容性
 agent_factory = get_global_agent_factory()
 
-# 导入Web平台智能体
-from .web import (
-    ImageAnalyzerAgent,
-    YAMLGeneratorAgent,
-    YAMLExecutorAgent,
-    PlaywrightGeneratorAgent,
-    PlaywrightExecutorAgent
+# Web平台智能体在首次访问时导入
+_WEB_AGENTS = (
+    'ImageAnalyzerAgent',
+    'YAMLGeneratorAgent',
+    'YAMLExecutorAgent',
+    'PlaywrightGeneratorAgent',
+    'PlaywrightExecutorAgent'
 )
 
+
+def __getattr__(name):
+    if name in _WEB_AGENTS:
+        from . import web
+        return getattr(web, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 __all__ = [
     # 工厂类
     'AgentFactory',
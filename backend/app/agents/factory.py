@@ -2,18 +2,34 @@
 UI自动化测试系统 - 智能体工厂
 统一创建和管理所有智能体实例，提供 AssistantAgent 和自定义智能体的创建接口
 """
-from typing import Dict, Any, Callable, Optional, List, Type
+import importlib
+from typing import TYPE_CHECKING, Dict, Any, Callable, Optional, List, Type
 from abc import ABC, abstractmethod
 
 from autogen_core import SingleThreadedAgentRuntime, ClosureAgent, TypeSubscription
-from autogen_agentchat.agents import AssistantAgent, UserProxyAgent
 from loguru import logger
 
 from app.core.config import settings
-from app.core.llms import get_deepseek_model_client, get_uitars_model_client, get_qwenvl_model_client
 from app.core.types import AgentTypes, TopicTypes, AGENT_NAMES, AgentPlatform, LLModel
 from app.core.agents.base import BaseAgent
 
+if TYPE_CHECKING:
+    from autogen_agentchat.agents import AssistantAgent, UserProxyAgent
+
+# 智能体类型对应的实现类（模块路径:类名）。智能体模块会加载 autogen-agentchat、openai 等重量级依赖，
+# 在首次创建或注册智能体时才导入，不拖慢服务启动
+AGENT_CLASS_PATHS: Dict[str, str] = {
+    AgentTypes.IMAGE_ANALYZER.value: "app.agents.web.image_analyzer:ImageAnalyzerAgent",
+    AgentTypes.PAGE_ANALYZER.value: "app.agents.web.page_analyzer:PageAnalyzerAgent",
+    AgentTypes.TEST_CASE_GENERATOR.value: "app.agents.web.test_case_generator:TestCaseGeneratorAgent",
+    AgentTypes.YAML_GENERATOR.value: "app.agents.web.yaml_generator:YAMLGeneratorAgent",
+    AgentTypes.YAML_EXECUTOR.value: "app.agents.web.yaml_executor:YAMLExecutorAgent",
+    AgentTypes.PLAYWRIGHT_GENERATOR.value: "app.agents.web.playwright_generator:PlaywrightGeneratorAgent",
+    AgentTypes.PLAYWRIGHT_EXECUTOR.value: "app.agents.web.playwright_executor:PlaywrightExecutorAgent",
+    AgentTypes.SCRIPT_DATABASE_SAVER.value: "app.agents.web.script_database_saver:ScriptDatabaseSaverAgent",
+    AgentTypes.PAGE_ANALYSIS_STORAGE.value: "app.agents.web.page_element_data_storage_agent:PageAnalysisStorageAgent",
+}
+
 
 class AgentFactory:
     """智能体工厂类，统一管理智能体的创建和注册"""
@@ -21,46 +37,30 @@ class AgentFactory:
     def __init__(self):
         """初始化智能体工厂"""
         self._registered_agents: Dict[str, Dict[str, Any]] = {}
-        self._agent_classes: Dict[str, Type[BaseAgent]] = {}
+        # 智能体类在首次使用时导入，见 _agent_classes
+        self._loaded_agent_classes: Optional[Dict[str, Type[BaseAgent]]] = None
         self._assistant_agent_configs: Dict[str, Dict[str, Any]] = {}
-        
-        # 注册所有可用的智能体类
-        self._register_agent_classes()
-        
+
         logger.info("智能体工厂初始化完成")
 
+    @property
+    def _agent_classes(self) -> Dict[str, Type[BaseAgent]]:
+        if self._loaded_agent_classes is None:
+            self._register_agent_classes()
+        return self._loaded_agent_classes
+
     def _register_agent_classes(self) -> None:
-        """注册所有智能体类"""
+        """导入并注册所有智能体类"""
         try:
-            # Web平台智能体
-            from app.agents.web.image_analyzer import ImageAnalyzerAgent
-            from app.agents.web.page_analyzer import PageAnalyzerAgent
-            from app.agents.web.test_case_generator import TestCaseGeneratorAgent
-            from app.agents.web.yaml_generator import YAMLGeneratorAgent
-            from app.agents.web.yaml_executor import YAMLExecutorAgent
-            from app.agents.web.playwright_generator import PlaywrightGeneratorAgent
-            from app.agents.web.playwright_executor import PlaywrightExecutorAgent
-            from app.agents.web.script_database_saver import ScriptDatabaseSaverAgent
-            from app.agents.web.page_element_data_storage_agent import PageAnalysisStorageAgent
-            
-            # 注册智能体类
-            self._agent_classes.update({
-                AgentTypes.IMAGE_ANALYZER.value: ImageAnalyzerAgent,
-                AgentTypes.PAGE_ANALYZER.value: PageAnalyzerAgent,
-                AgentTypes.TEST_CASE_GENERATOR.value: TestCaseGeneratorAgent,
-                AgentTypes.YAML_GENERATOR.value: YAMLGeneratorAgent,
-                AgentTypes.YAML_EXECUTOR.value: YAMLExecutorAgent,
-                AgentTypes.PLAYWRIGHT_GENERATOR.value: PlaywrightGeneratorAgent,
-                AgentTypes.PLAYWRIGHT_EXECUTOR.value: PlaywrightExecutorAgent,
-                AgentTypes.SCRIPT_DATABASE_SAVER.value: ScriptDatabaseSaverAgent,
-                AgentTypes.PAGE_ANALYSIS_STORAGE.value: PageAnalysisStorageAgent,
-            })
-            
+            agent_classes = {}
+            for agent_type, class_path in AGENT_CLASS_PATHS.items():
+                module_name, _, class_name = class_path.partition(":")
+                agent_classes[agent_type] = getattr(importlib.import_module(module_name), class_name)
+            self._loaded_agent_classes = agent_classes
+
             # 调试信息
-            logger.info(f"已注册 {len(self._agent_classes)} 个智能体类")
-            logger.debug(f"注册的智能体类型: {list(self._agent_classes.keys())}")
-            logger.debug(f"IMAGE_ANALYZER 值: {AgentTypes.IMAGE_ANALYZER.value}")
-            logger.debug(f"IMAGE_ANALYZER 是否在注册列表中: {AgentTypes.IMAGE_ANALYZER.value in self._agent_classes}")
+            logger.info(f"已注册 {len(agent_classes)} 个智能体类")
+            logger.debug(f"注册的智能体类型: {list(agent_classes.keys())}")
 
         except ImportError as e:
             logger.error(f"智能体类导入失败: {str(e)}")
@@ -74,7 +74,7 @@ class AgentFactory:
                                system_message: str,
                                model_client_type: str = LLModel.DEEPSEEK,
                                model_client_stream: bool = True,
-                               **kwargs) -> AssistantAgent:
+                               **kwargs) -> "AssistantAgent":
         """创建 AssistantAgent 实例
         
         Args:
@@ -88,6 +88,9 @@ class AgentFactory:
             AssistantAgent: 创建的智能体实例
         """
         try:
+            from autogen_agentchat.agents import AssistantAgent
+            from app.core.llms import get_deepseek_model_client, get_uitars_model_client, get_qwenvl_model_client
+
             # 选择模型客户端
             if model_client_type == LLModel.UITARS:
                 model_client = get_uitars_model_client()
@@ -130,8 +133,10 @@ class AgentFactory:
             
             agent_class = self._agent_classes[agent_type]
             
-            # 根据智能体类型选择合适的模型客户端
+            # 根据智能体类型选择合适的模型客户端（客户端在首次使用时创建）
             if not kwargs.get('model_client_instance'):
+                from app.core.llms import get_deepseek_model_client, get_uitars_model_client
+
                 if agent_type == AgentTypes.IMAGE_ANALYZER.value:
                     kwargs['model_client_instance'] = get_uitars_model_client()
                 else:
@@ -310,7 +315,7 @@ class AgentFactory:
     def create_user_proxy_agent(self,
                                name: str = "user_proxy",
                                input_func: Optional[Callable] = None,
-                               **kwargs) -> UserProxyAgent:
+                               **kwargs) -> "UserProxyAgent":
         """创建用户代理智能体
 
         Args:
@@ -386,10 +391,10 @@ class AgentFactory:
             {
                 "agent_type": agent_type,
                 "agent_name": AGENT_NAMES.get(agent_type, agent_type),
-                "agent_class": agent_class.__name__,
+                "agent_class": class_path.partition(":")[2],
                 "registered": agent_type in self._registered_agents
             }
-            for agent_type, agent_class in self._agent_classes.items()
+            for agent_type, class_path in AGENT_CLASS_PATHS.items()
         ]
 
     def list_registered_agents(self) -> List[Dict[str, Any]]:
@@ -1,20 +1,34 @@
 """
 Web平台相关智能体模块
 包含Web UI自动化测试的分析、生成和执行智能体
+智能体在首次访问时才导入（依赖 autogen-agentchat、openai 等重量级模块），导入本包不会加载它们
 """
+import importlib
+
+# Web专用智能体：名称 -> 所在模块
+_LAZY_EXPORTS = {
+    'ImageAnalyzerAgent': 'app.agents.web.image_analyzer',
+    'YAMLGeneratorAgent': 'app.agents.web.yaml_generator',
+    'YAMLExecutorAgent': 'app.agents.web.yaml_executor',
+    'PlaywrightGeneratorAgent': 'app.agents.web.playwright_generator',
+    'PlaywrightExecutorAgent': 'app.agents.web.playwright_executor',
+    'ScriptDatabaseSaverAgent': 'app.agents.web.script_database_saver',
+}
+
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
 
-# Web专用智能体
-from app.agents.web.image_analyzer import ImageAnalyzerAgent
-from app.agents.web.yaml_generator import YAMLGeneratorAgent
-from app.agents.web.yaml_executor import YAMLExecutorAgent
-from app.agents.web.playwright_generator import PlaywrightGeneratorAgent
-from app.agents.web.playwright_executor import PlaywrightExecutorAgent
-from app.agents.web.script_database_saver import ScriptDatabaseSaverAgent
 
 __all__ = [
     'ImageAnalyzerAgent',
     'YAMLGeneratorAgent',
-     'YAMLExecutorAgent',
+    'YAMLExecutorAgent',
     'PlaywrightGeneratorAgent',
     'PlaywrightExecutorAgent',
     'ScriptDatabaseSaverAgent'
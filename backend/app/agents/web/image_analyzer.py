@@ -26,7 +26,12 @@ from app.core.messages.web import (
     PageAnalysis, UIElement, AnalysisType
 )
 from app.core.agents.base import BaseAgent
+from app.core.config import settings
+from app.services.pipeline_checkpoints import (
+    pipeline_checkpoints, compute_content_hash, STAGE_TEAM_RESULTS, STAGE_ANALYSIS
+)
 from app.core.types import TopicTypes, AgentTypes, AGENT_NAMES, MessageRegion, LLModel
+from app.core.cancellation import current_cancellation_token
 
 
 @type_subscription(topic_type=TopicTypes.IMAGE_ANALYZER.value)
@@ -102,19 +107,41 @@ class ImageAnalyzerAgent(BaseAgent):
         """处理图片分析请求"""
         try:
             monitor_id = self.start_performance_monitoring()
-            analysis_id = str(uuid.uuid4())
-
-            # 创建分析团队
-            team = await self._create_image_analysis_team()
-
-            # 准备多模态消息
-            multimodal_message = await self._prepare_multimodal_message(message)
+            content_hash = compute_content_hash(
+                message.image_data, message.image_url, message.image_path,
+                message.test_description, message.additional_context
+            )
 
-            # 运行团队分析
-            team_results = await self._run_team_analysis(team, multimodal_message)
-            self.metrics = self.end_performance_monitoring(monitor_id)
-            # 整合分析结果
-            analysis_result = await self._integrate_analysis_results(team_results, analysis_id, message)
+            # 相同输入在有效期内已有分析检查点时直接复用，跳过团队分析和结果整合；请求要求重新分析时不复用
+            reuse = settings.CHECKPOINT_ENABLED and not message.force_reanalyze
+            analysis_result = await self._load_analysis_checkpoint(content_hash, message) if reuse else None
+            if analysis_result is None:
+                team_results = await self._load_team_results_checkpoint(content_hash) if reuse else None
+                if team_results is None:
+                    # 创建分析团队
+                    team = await self._create_image_analysis_team()
+
+                    # 准备多模态消息
+                    multimodal_message = await self._prepare_multimodal_message(message)
+
+                    # 运行团队分析
+                    team_results = await self._run_team_analysis(team, multimodal_message)
+                    if settings.CHECKPOINT_ENABLED and not team_results.get("failed"):
+                        await pipeline_checkpoints.save(
+                            content_hash, STAGE_TEAM_RESULTS, team_results, session_id=message.session_id
+                        )
+                self.metrics = self.end_performance_monitoring(monitor_id)
+                # 整合分析结果
+                analysis_result = await self._integrate_analysis_results(team_results, str(uuid.uuid4()), message)
+                # 失败或低置信度的结果不保存，下次请求重新分析
+                if settings.CHECKPOINT_ENABLED and not team_results.get("failed") \
+                        and analysis_result.confidence_score >= settings.CHECKPOINT_MIN_CONFIDENCE:
+                    await pipeline_checkpoints.save(
+                        content_hash, STAGE_ANALYSIS, analysis_result.model_dump(mode="json"),
+                        session_id=message.session_id, analysis_id=analysis_result.analysis_id
+                    )
+            else:
+                self.metrics = self.end_performance_monitoring(monitor_id)
 
             await self.send_response(
                 "✅ 图片分析完成",
@@ -177,6 +204,39 @@ class ImageAnalyzerAgent(BaseAgent):
         except Exception as e:
             await self.handle_exception("handle_test_case_generation_message", e)
 
+    async def _load_analysis_checkpoint(self, content_hash: str,
+                                        message: WebMultimodalAnalysisRequest) -> Optional[WebMultimodalAnalysisResponse]:
+        """读取有效期内整合后的分析结果检查点，会话ID和被测页面URL使用当前请求的值"""
+        record = await pipeline_checkpoints.load(
+            content_hash, STAGE_ANALYSIS, max_age_hours=settings.CHECKPOINT_REUSE_TTL_HOURS
+        )
+        if record is None:
+            return None
+        try:
+            analysis_result = WebMultimodalAnalysisResponse.model_validate(record["data"])
+        except Exception as e:
+            logger.warning(f"分析结果检查点无法解析，重新分析: {e}")
+            return None
+
+        await self.send_response(
+            f"♻️ 复用已有分析结果（{record.get('created_at')}），跳过图片分析\n\n"
+        )
+        logger.info(f"复用分析结果检查点: {analysis_result.analysis_id}")
+        return analysis_result.model_copy(update={
+            "session_id": message.session_id,
+            "target_url": message.target_url or message.web_url or analysis_result.target_url,
+        })
+
+    async def _load_team_results_checkpoint(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """读取有效期内团队分析原始结果检查点"""
+        record = await pipeline_checkpoints.load(
+            content_hash, STAGE_TEAM_RESULTS, max_age_hours=settings.CHECKPOINT_REUSE_TTL_HOURS
+        )
+        if record is None or not isinstance(record.get("data"), dict):
+            return None
+        await self.send_response("♻️ 复用已有团队分析结果，跳过图片分析\n\n")
+        return record["data"]
+
     async def _route_to_script_generators(self, analysis_result: WebMultimodalAnalysisResponse, generate_formats: List[str]) -> None:
         """根据用户选择的格式路由到相应的脚本生成智能体"""
         try:
@@ -283,7 +343,7 @@ class ImageAnalyzerAgent(BaseAgent):
         """运行团队协作分析"""
         try:
             # 运行团队分析
-            stream = team.run_stream(task=multimodal_message)
+            stream = team.run_stream(task=multimodal_message, cancellation_token=current_cancellation_token())
             messages = []
             async for event in stream:  # type: ignore
                 # 流式消息
@@ -336,8 +396,9 @@ class ImageAnalyzerAgent(BaseAgent):
 
         except Exception as e:
             logger.error(f"团队分析执行失败: {str(e)}")
-            # 返回默认结果
+            # 返回默认结果（标记失败，不保存检查点）
             return {
+                "failed": True,
                 "ui_analysis": ["团队分析失败"],
                 "interaction_analysis": ["团队分析失败"],
                 "test_scenarios": ["团队分析失败"],
@@ -908,7 +969,9 @@ REVISE
                 confidence_score=confidence_score,
                 status="completed",
                 message="图片分析完成",
-                processing_time=self.metrics.get("duration_seconds", 0.0)
+                processing_time=self.metrics.get("duration_seconds", 0.0),
+                test_description=request.test_description,
+                target_url=request.target_url or request.web_url
             )
 
         except Exception as e:
@@ -25,6 +25,7 @@ from app.core.types import AgentTypes, TopicTypes, MessageRegion, LLModel
 from app.core.types.constants import AGENT_NAMES
 from app.core.messages.web import WebMultimodalAnalysisRequest, WebMultimodalAnalysisResponse, PageAnalysisStorageRequest, PageAnalysisStorageResponse
 from app.core.llms import get_uitars_model_client
+from app.core.cancellation import current_cancellation_token
 
 
 @type_subscription(topic_type=TopicTypes.PAGE_ANALYZER.value)
@@ -109,7 +110,7 @@ class PageAnalyzerAgent(BaseAgent):
             await self.send_response("🔍 正在分析页面元素...", region=MessageRegion.ANALYSIS)
 
             # 运行分析
-            stream = agent.run_stream(task=multimodal_message)
+            stream = agent.run_stream(task=multimodal_message, cancellation_token=current_cancellation_token())
             full_content = ""
 
             async for event in stream:
@@ -19,6 +19,7 @@ from app.core.types import TopicTypes, AgentTypes, AGENT_NAMES
 from app.database.connection import db_manager
 from app.database.models.page_analysis import PageAnalysisResult, PageElement
 from app.database.repositories.page_analysis_repository import PageAnalysisRepository, PageElementRepository
+from app.services.knowledge.page_vector_store import page_vector_store
 
 
 @type_subscription(topic_type=TopicTypes.PAGE_ANALYSIS_STORAGE.value)
@@ -51,6 +52,9 @@ class PageAnalysisStorageAgent(BaseAgent):
             # 保存页面分析结果到数据库
             storage_result = await self._save_page_analysis_to_database(message)
 
+            # 增量更新本地向量索引
+            await self._update_vector_index(message, storage_result)
+
             # 结束性能监控
             metrics = self.end_performance_monitoring(monitor_id)
 
@@ -142,7 +146,8 @@ class PageAnalysisStorageAgent(BaseAgent):
 
                     return {
                         "storage_id": existing_record.id,
-                        "elements_count": len(elements_data)
+                        "elements_count": len(elements_data),
+                        "elements": elements_data
                     }
                 else:
                     # 如果没有找到现有记录，创建新记录（兼容旧流程）
@@ -179,13 +184,29 @@ class PageAnalysisStorageAgent(BaseAgent):
 
                     return {
                         "storage_id": page_analysis_result.id,
-                        "elements_count": len(elements_data)
+                        "elements_count": len(elements_data),
+                        "elements": elements_data
                     }
 
         except Exception as e:
             logger.error(f"保存页面分析结果到数据库失败: {str(e)}")
             raise
 
+    async def _update_vector_index(self, request: PageAnalysisStorageRequest, storage_result: Dict[str, Any]) -> None:
+        """将页面摘要和元素描述写入向量索引（失败不影响存储结果）"""
+        try:
+            page = {
+                "id": storage_result["storage_id"],
+                "page_name": request.page_name,
+                "page_type": request.page_type,
+                "page_description": request.page_description,
+                "analysis_summary": request.analysis_result.analysis_summary,
+            }
+            indexed = await page_vector_store.index_page(page, storage_result.get("elements", []))
+            logger.info(f"页面向量索引已更新: {page['id']}，元素 {indexed} 个")
+        except Exception as e:
+            logger.warning(f"更新页面向量索引失败: {str(e)}")
+
     async def _prepare_elements_data(self, analysis_result: PageAnalysis, analysis_metadata: Dict[str, Any]) -> List[
         Dict[str, Any]]:
         """准备页面元素数据"""
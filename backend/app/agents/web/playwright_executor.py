@@ -10,7 +10,8 @@ import asyncio
 import subprocess
 import re
 import webbrowser
-from typing import Dict, List, Any, Optional
+from collections import deque
+from typing import Dict, List, Any, Iterable, Optional
 from datetime import datetime
 from pathlib import Path
 
@@ -19,8 +20,15 @@ from loguru import logger
 
 from app.core.messages.web import PlaywrightExecutionRequest
 from app.core.agents.base import BaseAgent
+from app.core.metrics import observe_subprocess
+from app.core.tracing import tracer
+from app.core.workload import RESOURCE_EXECUTION, workload_manager
+from app.core.cancellation import process_group_kwargs, terminate_process
+from app.core.logging import log_hot_path
 from app.core.types import TopicTypes, AgentTypes, AGENT_NAMES
 from app.services.test_report_service import test_report_service
+from app.services.execution_log_store import LogBatcher, execution_log_store
+from app.services.database_script_service import database_script_service
 from datetime import datetime
 
 
@@ -37,10 +45,13 @@ class PlaywrightExecutorAgent(BaseAgent):
             **kwargs
         )
         self.execution_records: Dict[str, Dict[str, Any]] = {}
+        self._log_batchers: Dict[str, LogBatcher] = {}
         # 使用配置中的UI自动化测试目录路径
         from app.core.config import get_settings
         settings = get_settings()
         self.playwright_workspace = Path(settings.UI_UIAUTOMATION_DIR)
+        # 执行记录中只保留尾部日志，完整日志写入执行日志存储
+        self.log_tail_lines = settings.EXECUTION_LOG_TAIL_LINES
 
         logger.info(f"Playwright执行智能体初始化完成: {self.agent_name}")
         logger.info(f"执行环境路径: {self.playwright_workspace}")
@@ -165,6 +176,7 @@ class PlaywrightExecutorAgent(BaseAgent):
     async def handle_execution_request(self, message: PlaywrightExecutionRequest, ctx: MessageContext) -> None:
         """处理Playwright执行请求"""
         monitor_id = None
+        execution_id = None
         try:
             monitor_id = self.start_performance_monitoring("playwright_execution")
             execution_id = str(uuid.uuid4())
@@ -176,27 +188,53 @@ class PlaywrightExecutorAgent(BaseAgent):
                 await self.send_error("Playwright工作空间验证失败")
                 return
 
-            # 创建执行记录
+            # 创建执行记录（脚本已保存到数据库时同时写入 script_executions）
+            execution_pk = await database_script_service.start_execution(
+                message.script_id, execution_id,
+                execution_config=message.execution_config.model_dump() if message.execution_config else {},
+                environment_info={"executor": "playwright", "script_name": message.script_name}
+            )
             self.execution_records[execution_id] = {
                 "execution_id": execution_id,
+                "execution_pk": execution_pk,
                 "status": "running",
                 "start_time": datetime.now().isoformat(),
                 "script_name": message.script_name,
                 "test_content": message.test_content,
                 "config": message.execution_config or {},
-                "logs": [],
+                "logs": deque(maxlen=self.log_tail_lines),
                 "screenshots": [],
                 "results": None,
                 "error_message": None,
                 "playwright_output": None,
                 "report_path": None
             }
+            self._log_batchers[execution_id] = LogBatcher(
+                lambda lines: self._write_logs(execution_id, execution_pk, lines)
+            )
 
             # 执行Playwright测试
-            execution_result = await self._execute_playwright_test(execution_id, message)
-
-            # 更新执行记录
+            try:
+                execution_result = await self._execute_playwright_test(execution_id, message)
+            except asyncio.CancelledError:
+                await self._close_logs(execution_id)
+                await database_script_service.finish_execution(execution_pk, "cancelled")
+                raise
+
+            # 更新执行记录；完整日志落盘，报告中只保存尾部日志
             self.execution_records[execution_id].update(execution_result)
+            total_lines = await self._close_logs(execution_id)
+            logger.info(f"执行日志已保存: {execution_id}, 共 {total_lines} 行")
+            await database_script_service.finish_execution(
+                execution_pk,
+                "completed" if execution_result["status"] == "passed" else "failed",
+                error_message=execution_result.get("error_message"),
+                exit_code=execution_result.get("return_code"),
+                metrics={
+                    "duration": execution_result.get("duration", 0.0),
+                    "test_results": execution_result.get("test_results", {}),
+                }
+            )
 
             # 保存测试报告到数据库
             await self._save_test_report_to_database(execution_id, message, execution_result)
@@ -221,8 +259,28 @@ class PlaywrightExecutorAgent(BaseAgent):
         except Exception as e:
             if monitor_id:
                 self.end_performance_monitoring(monitor_id)
+            if execution_id:
+                await self._close_logs(execution_id)
             await self.handle_exception("handle_execution_request", e)
 
+    async def _append_logs(self, execution_id: str, lines: Iterable[str]) -> None:
+        """追加执行日志：执行记录的尾部日志立即更新，完整日志按批次写入执行日志存储"""
+        lines = list(lines)
+        self.execution_records[execution_id]["logs"].extend(lines)
+        await self._log_batchers[execution_id].add(lines)
+
+    async def _write_logs(self, execution_id: str, execution_pk: Optional[int], lines: List[str]) -> None:
+        """将一批日志写入执行日志存储和执行记录"""
+        await execution_log_store.append(execution_id, lines)
+        await database_script_service.log_execution(execution_pk, lines, component="playwright")
+
+    async def _close_logs(self, execution_id: str) -> int:
+        """提交剩余的日志并结束日志写入，返回总行数"""
+        batcher = self._log_batchers.pop(execution_id, None)
+        if batcher is not None:
+            await batcher.flush()
+        return await execution_log_store.close(execution_id)
+
     async def _execute_playwright_test(self, execution_id: str, message: PlaywrightExecutionRequest) -> Dict[str, Any]:
         """执行Playwright测试"""
         try:
@@ -238,8 +296,9 @@ class PlaywrightExecutorAgent(BaseAgent):
                 test_file_path = await self._create_test_file(execution_id, message.test_content, message.execution_config or {})
                 logger.info(f"创建新测试文件: {test_file_path}")
 
-            # 运行测试
-            execution_result = await self._run_playwright_test(test_file_path, execution_id)
+            # 运行测试（按工作负载类别占用执行名额，批量执行不会挤占交互式执行的浏览器）
+            async with workload_manager.slot(RESOURCE_EXECUTION):
+                execution_result = await self._run_playwright_test(test_file_path, execution_id)
 
             # 解析结果和报告
             parsed_result = await self._parse_playwright_result(execution_result)
@@ -280,6 +339,7 @@ class PlaywrightExecutorAgent(BaseAgent):
             test_file_path = e2e_dir / test_filename
 
             test_file_content = self._generate_test_file(test_content, config)
+            # 每次执行的临时文件，不进入内容寻址存储
             with open(test_file_path, "w", encoding="utf-8") as f:
                 f.write(test_file_content)
 
@@ -343,7 +403,7 @@ test("AI自动化测试", async ({{
             record = self.execution_records[execution_id]
             start_time = datetime.now()
 
-            record["logs"].append("开始执行Playwright测试...")
+            await self._append_logs(execution_id, ["开始执行Playwright测试..."])
             await self.send_response("🎭 开始执行Playwright测试...")
 
             # 确定工作目录和测试命令
@@ -423,18 +483,21 @@ test("AI自动化测试", async ({{
                     stdout_lines = result.stdout.splitlines() if result.stdout else []
                     stderr_lines = result.stderr.splitlines() if result.stderr else []
 
-                    # 记录和发送输出信息
+                    # 记录和发送输出信息（进程已结束，全部输出作为一批写入）
+                    await self._append_logs(
+                        execution_id,
+                        [f"[STDOUT] {line}" for line in stdout_lines if line.strip()]
+                        + [f"[STDERR] {line}" for line in stderr_lines if line.strip()]
+                    )
                     for line in stdout_lines:
                         if line.strip():
-                            record["logs"].append(f"[STDOUT] {line}")
                             await self.send_response(f"📝 {line}")
-                            logger.info(f"[Playwright] {line}")
+                            log_hot_path("playwright.stdout", "INFO", "[Playwright] {}", line)
 
                     for line in stderr_lines:
                         if line.strip():
-                            record["logs"].append(f"[STDERR] {line}")
                             await self.send_response(f"⚠️ {line}")
-                            logger.warning(f"[Playwright Error] {line}")
+                            log_hot_path("playwright.stderr", "WARNING", "[Playwright Error] {}", line)
 
                 except subprocess.TimeoutExpired:
                     logger.error("Playwright测试执行超时")
@@ -479,13 +542,14 @@ test("AI自动化测试", async ({{
                     raise
 
             else:
-                # 非Windows系统使用异步subprocess
+                # 非Windows系统使用异步subprocess，在独立进程组中启动以便取消时结束浏览器子进程
                 process = await asyncio.create_subprocess_exec(
                     *command,
                     cwd=work_dir,
                     stdout=asyncio.subprocess.PIPE,
                     stderr=asyncio.subprocess.PIPE,
-                    env=env
+                    env=env,
+                    **process_group_kwargs()
                 )
 
                 # 实时读取输出
@@ -497,26 +561,38 @@ test("AI自动化测试", async ({{
                         line_text = line.decode('utf-8').strip()
                         if line_text:
                             stdout_lines.append(line_text)
-                            record["logs"].append(f"[STDOUT] {line_text}")
+                            await self._append_logs(execution_id, [f"[STDOUT] {line_text}"])
                             await self.send_response(f"📝 {line_text}")
-                            logger.info(f"[Playwright] {line_text}")
+                            log_hot_path("playwright.stdout", "INFO", "[Playwright] {}", line_text)
 
                 async def read_stderr():
                     async for line in process.stderr:
                         line_text = line.decode('utf-8').strip()
                         if line_text:
                             stderr_lines.append(line_text)
-                            record["logs"].append(f"[STDERR] {line_text}")
+                            await self._append_logs(execution_id, [f"[STDERR] {line_text}"])
                             await self.send_response(f"⚠️ {line_text}")
-                            logger.warning(f"[Playwright Error] {line_text}")
-
-                # 并发读取输出
-                await asyncio.gather(read_stdout(), read_stderr())
+                            log_hot_path("playwright.stderr", "WARNING", "[Playwright Error] {}", line_text)
 
-                # 等待进程完成
-                return_code = await process.wait()
+                try:
+                    # 并发读取输出
+                    await asyncio.gather(read_stdout(), read_stderr())
+
+                    # 等待进程完成
+                    return_code = await process.wait()
+                except asyncio.CancelledError:
+                    return_code = await terminate_process(process)
+                    observe_subprocess("playwright", "cancelled", (datetime.now() - start_time).total_seconds())
+                    logger.info(f"Playwright测试已取消，进程组已结束: {execution_id}, 退出码 {return_code}")
+                    raise
             end_time = datetime.now()
             duration = (end_time - start_time).total_seconds()
+            observe_subprocess("playwright", "ok" if return_code == 0 else "failed", duration)
+            tracer.record_span(
+                "subprocess.playwright", "subprocess", start_time.timestamp(), end_time.timestamp(),
+                attributes={"command": " ".join(command), "return_code": return_code},
+                error=None if return_code == 0 else f"exit code {return_code}"
+            )
 
             return {
                 "return_code": return_code,
@@ -966,7 +1042,7 @@ def extract_report_path_from_output(stdout_lines):
                 start_time=start_time,
                 end_time=end_time,
                 duration=execution_result.get("duration", 0.0),
-                logs=record.get("logs", []),
+                logs=list(record.get("logs", [])),
                 execution_config=safe_execution_config,
                 environment_variables=safe_environment_variables,
                 # 传递报告路径和URL
@@ -18,7 +18,13 @@ from loguru import logger
 
 from app.core.messages.web import WebMultimodalAnalysisResponse
 from app.core.agents.base import BaseAgent
+from app.core.config import settings
+from app.services.knowledge.generation_context import generation_context_retriever
+from app.services.script_templates import script_template_engine
+from app.services.pipeline_checkpoints import pipeline_checkpoints
+from app.services.blob_store import blob_store
 from app.core.types import TopicTypes, AgentTypes, AGENT_NAMES, MessageRegion, LLModel
+from app.core.cancellation import current_cancellation_token
 
 
 @type_subscription(topic_type=TopicTypes.PLAYWRIGHT_GENERATOR.value)
@@ -35,6 +41,7 @@ class PlaywrightGeneratorAgent(BaseAgent):
         )
         self._prompt_template = self._build_prompt_template()
         self.metrics = None
+        self.prompt_stats = None
 
         logger.info(f"Playwright代码生成智能体初始化完成: {self.agent_name}")
 
@@ -245,35 +252,58 @@ const items = await aiQuery("获取商品列表");
         """处理多模态分析结果消息，生成Playwright测试代码"""
         try:
             monitor_id = self.start_performance_monitoring()
+            self.prompt_stats = None
 
             # 获取分析结果信息
             analysis_id = message.analysis_id
 
-            # 使用工厂创建agent并执行Playwright代码生成任务
-            agent = self.create_assistant_agent(
-                model_client_instance=self.model_client
+            # 常见流程优先使用模板生成，无法可靠匹配时交由大模型生成
+            template_plan = script_template_engine.match(
+                message.page_analysis, message.test_description, message.target_url
             )
+            if template_plan:
+                await self.send_response(
+                    f"⚡ 识别为{template_plan['label']}流程，使用模板生成\n\n",
+                    region=MessageRegion.GENERATION
+                )
+                self.metrics = self.end_performance_monitoring(monitor_id=monitor_id)
+                playwright_result = self._build_template_playwright_result(template_plan)
+            else:
+                # 使用工厂创建agent并执行Playwright代码生成任务
+                agent = self.create_assistant_agent(
+                    model_client_instance=self.model_client
+                )
 
-            # 准备生成任务
-            task = self._prepare_playwright_generation_task(message)
+                # 准备生成任务
+                task = await self._prepare_playwright_generation_task(message)
 
-            # 执行Playwright代码生成
-            playwright_content = ""
-            stream = agent.run_stream(task=task)
-            async for event in stream:  # type: ignore
-                if isinstance(event, ModelClientStreamingChunkEvent):
-                    await self.send_response(content=event.content, region=MessageRegion.GENERATION)
-                    continue
-                if isinstance(event, TextMessage):
-                    playwright_content = event.model_dump_json()
+                # 执行Playwright代码生成
+                playwright_content = ""
+                stream = agent.run_stream(task=task, cancellation_token=current_cancellation_token())
+                async for event in stream:  # type: ignore
+                    if isinstance(event, ModelClientStreamingChunkEvent):
+                        await self.send_response(content=event.content, region=MessageRegion.GENERATION)
+                        continue
+                    if isinstance(event, TextMessage):
+                        playwright_content = event.model_dump_json()
 
-            self.metrics = self.end_performance_monitoring(monitor_id=monitor_id)
+                self.metrics = self.end_performance_monitoring(monitor_id=monitor_id)
 
-            # 处理生成的Playwright代码内容
-            playwright_result = await self._process_generated_playwright(playwright_content, message)
+                # 处理生成的Playwright代码内容
+                playwright_result = await self._process_generated_playwright(playwright_content, message)
 
             # 保存Playwright文件
             file_paths = await self._save_playwright_files(playwright_result.get("test_code", {}), analysis_id)
+            if settings.CHECKPOINT_ENABLED:
+                await pipeline_checkpoints.save_script(
+                    analysis_id, "playwright",
+                    {
+                        "test_code": playwright_result.get("test_code"),
+                        "playwright_content": playwright_result.get("playwright_content", ""),
+                        "file_paths": file_paths
+                    },
+                    session_id=message.session_id
+                )
 
             # 构建完整结果
             result = {
@@ -281,7 +311,10 @@ const items = await aiQuery("获取商品列表");
                 "playwright_content": playwright_result.get("playwright_content", ""),
                 "file_paths": file_paths,
                 "generation_time": datetime.now().isoformat(),
-                "metrics": self.metrics
+                "metrics": self.metrics,
+                "prompt_stats": self.prompt_stats,
+                "generation_mode": "template" if template_plan else "llm",
+                "template_stats": script_template_engine.get_stats()
             }
 
             # 发送脚本到数据库保存智能体
@@ -332,11 +365,11 @@ const items = await aiQuery("获取商品列表");
             logger.error(f"发送脚本到数据库保存智能体失败: {e}")
             # 不抛出异常，避免影响主流程
 
-    def _prepare_playwright_generation_task(self, message: WebMultimodalAnalysisResponse) -> str:
+    async def _prepare_playwright_generation_task(self, message: WebMultimodalAnalysisResponse) -> str:
         """准备Playwright代码生成任务"""
         try:
-            # 构建分析摘要
-            analysis_summary = self._prepare_analysis_summary(message)
+            # 构建分析摘要（启用检索增强时只保留与测试需求相关的内容）
+            analysis_summary = await self._prepare_retrieved_analysis_summary(message)
 
             # 构建生成任务
             task = f"""
@@ -360,6 +393,34 @@ const items = await aiQuery("获取商品列表");
             logger.error(f"准备Playwright生成任务失败: {str(e)}")
             raise
 
+    async def _prepare_retrieved_analysis_summary(self, message: WebMultimodalAnalysisResponse) -> str:
+        """按测试需求检索相关元素和历史成功脚本构建分析摘要，失败时回退到完整摘要"""
+        baseline_summary = self._prepare_analysis_summary(message)
+        if not settings.RAG_GENERATION_ENABLED:
+            return baseline_summary
+
+        try:
+            context, self.prompt_stats = await generation_context_retriever.build_context(
+                message, "playwright", baseline_summary
+            )
+            return f"{context}\n{self._build_design_guidance()}"
+        except Exception as e:
+            logger.warning(f"检索增强分析摘要失败，使用完整摘要: {str(e)}")
+            return baseline_summary
+
+    @staticmethod
+    def _build_design_guidance() -> str:
+        """脚本设计指导"""
+        return """## MidScene.js + Playwright设计指导
+
+基于以上分析结果，请重点关注：
+1. **高置信度元素**: 优先使用置信度≥0.8的UI元素进行操作设计
+2. **详细视觉描述**: 利用颜色、位置、形状等特征进行精确元素定位
+3. **结构化流程**: 参考交互流程的步骤序列和验证点设计
+4. **MidScene.js最佳实践**: 使用详细的视觉描述，遵循单一职责原则
+5. **TypeScript类型安全**: 为数据查询提供准确的类型定义
+"""
+
     def _prepare_analysis_summary(self, message: WebMultimodalAnalysisResponse) -> str:
         """准备优化后的分析摘要，充分利用GraphFlow智能体的结构化输出"""
         try:
@@ -380,15 +441,7 @@ const items = await aiQuery("获取商品列表");
 ### 测试场景:
 {page_analysis.test_scenarios}
 
-## MidScene.js + Playwright设计指导
-
-基于以上分析结果，请重点关注：
-1. **高置信度元素**: 优先使用置信度≥0.8的UI元素进行操作设计
-2. **详细视觉描述**: 利用颜色、位置、形状等特征进行精确元素定位
-3. **结构化流程**: 参考交互流程的步骤序列和验证点设计
-4. **MidScene.js最佳实践**: 使用详细的视觉描述，遵循单一职责原则
-5. **TypeScript类型安全**: 为数据查询提供准确的类型定义
-"""
+{self._build_design_guidance()}"""
             return summary
 
         except Exception as e:
@@ -451,6 +504,20 @@ const items = await aiQuery("获取商品列表");
                 "generation_time": datetime.now().isoformat()
             }
 
+    def _build_template_playwright_result(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """按模板步骤计划生成Playwright代码结果"""
+        test_content = script_template_engine.render_playwright(plan)
+        return {
+            "test_code": {
+                "test_content": test_content,
+                "fixture_content": self._get_default_fixture(),
+                "config_content": self._get_default_config(),
+                "package_json": self._get_default_package_json()
+            },
+            "playwright_content": test_content,
+            "generation_time": datetime.now().isoformat()
+        }
+
     async def _save_playwright_files(self, test_code: Dict[str, str], analysis_id: str) -> Dict[str, str]:
         """保存生成的Playwright文件"""
         try:
@@ -473,8 +540,8 @@ const items = await aiQuery("获取商品列表");
             # 保存测试文件
             if test_code.get("test_content"):
                 test_file = e2e_dir / f"test_{timestamp}.spec.ts"
-                with open(test_file, "w", encoding="utf-8") as f:
-                    f.write(test_code["test_content"])
+                # 内容按哈希保存一份，工作空间中的文件为其链接；引用由保存的脚本记录持有
+                await blob_store.write_text(test_file, test_code["test_content"])
                 file_paths["test_file"] = str(test_file)
 
             # ------------- 以下内容已经生成，暂时不需要，所以注释掉 -----------
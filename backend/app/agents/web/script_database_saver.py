@@ -32,6 +32,7 @@ class ScriptSaveRequest(BaseModel):
     priority: int = Field(1, ge=1, le=5, description="优先级(1-5)")
     source_agent: Optional[str] = Field(None, description="来源智能体")
     file_path: Optional[str] = Field(None, description="文件路径")
+    trace_context: Optional[Dict[str, str]] = Field(None, description="链路追踪上下文")
 
     class Config:
         """Pydantic配置"""
@@ -16,6 +16,7 @@ from loguru import logger
 from app.core.messages.web import WebMultimodalAnalysisResponse, WebTestCaseGenerationRequest
 from app.core.agents.base import BaseAgent
 from app.core.types import TopicTypes, AgentTypes, AGENT_NAMES, MessageRegion, LLModel
+from app.core.cancellation import current_cancellation_token
 
 
 @type_subscription(topic_type=TopicTypes.TEST_CASE_GENERATOR.value)
@@ -271,7 +272,7 @@ class TestCaseGeneratorAgent(BaseAgent):
             await self.send_response("🔄 正在分析界面元素...\n\n")
             
             # 运行智能体生成测试用例
-            stream = agent.run_stream(task=content)
+            stream = agent.run_stream(task=content, cancellation_token=current_cancellation_token())
             
             generated_content = ""
             async for event in stream:
@@ -3,6 +3,7 @@
 负责执行各种类型的测试脚本（YAML、Playwright等）
 """
 import json
+import time
 import uuid
 import asyncio
 from typing import Dict, List, Any, Optional, Union
@@ -12,9 +13,16 @@ from pathlib import Path
 from autogen_core import message_handler, type_subscription, MessageContext
 from loguru import logger
 
+from app.core.config import settings
 from app.core.messages.web import YAMLExecutionRequest
 from app.core.agents.base import BaseAgent
+from app.core.metrics import observe_subprocess
+from app.core.tracing import tracer
+from app.core.workload import RESOURCE_EXECUTION, workload_manager
+from app.core.cancellation import process_group_kwargs, terminate_process
 from app.core.types import TopicTypes, AgentTypes, AGENT_NAMES
+from app.services.database_script_service import database_script_service
+from app.services.execution_log_store import execution_log_store
 
 
 @type_subscription(topic_type=TopicTypes.YAML_EXECUTOR.value)
@@ -31,40 +39,59 @@ class YAMLExecutorAgent(BaseAgent):
         )
         self.execution_records: Dict[str, Dict[str, Any]] = {}
         self.supported_formats = ["yaml", "playwright", "javascript", "typescript"]
+        # 执行记录中只保留尾部日志，完整日志写入执行日志存储
+        self.log_tail_lines = settings.EXECUTION_LOG_TAIL_LINES
 
         logger.info(f"YAML执行智能体初始化完成: {self.agent_name}")
 
     @message_handler
     async def handle_execution_request(self, message: YAMLExecutionRequest, ctx: MessageContext) -> None:
         """处理测试执行请求"""
+        execution_id = None
         try:
             self.start_performance_monitoring()
             execution_id = str(uuid.uuid4())
             
             await self.send_response(f"🚀 开始执行测试: {execution_id}")
             
-            # 创建执行记录
+            config = message.execution_config.model_dump() if message.execution_config else {}
+
+            # 创建执行记录（脚本已保存到数据库时同时写入 script_executions）
+            execution_pk = await database_script_service.start_execution(
+                message.script_id, execution_id, execution_config=config,
+                environment_info={"executor": "midscene_yaml"}
+            )
             self.execution_records[execution_id] = {
                 "execution_id": execution_id,
+                "execution_pk": execution_pk,
                 "status": "running",
                 "start_time": datetime.now().isoformat(),
                 "test_type": "yaml",
                 "test_content": message.yaml_content,
-                "config": message.execution_config.model_dump() if message.execution_config else {},
+                "config": config,
                 "logs": [],
                 "results": None,
                 "error_message": None
             }
             
             # 执行YAML测试
-            execution_result = await self._execute_yaml_test(
-                execution_id,
-                message.yaml_content,
-                message.execution_config.model_dump() if message.execution_config else {}
-            )
-            
-            # 更新执行记录
+            try:
+                execution_result = await self._execute_yaml_test(execution_id, message.yaml_content, config)
+            except asyncio.CancelledError:
+                await self._save_logs(execution_id)
+                await database_script_service.finish_execution(execution_pk, "cancelled")
+                raise
+            
+            # 更新执行记录；完整日志落盘，执行记录中只保留尾部日志
             self.execution_records[execution_id].update(execution_result)
+            total_lines = await self._save_logs(execution_id)
+            logger.info(f"执行日志已保存: {execution_id}, 共 {total_lines} 行")
+            await database_script_service.finish_execution(
+                execution_pk,
+                "completed" if execution_result["status"] == "passed" else "failed",
+                error_message=execution_result.get("error_message"),
+                metrics={"duration": execution_result.get("duration", 0.0)}
+            )
             
             await self.send_response(
                 f"✅ 测试执行完成: {execution_result['status']}",
@@ -79,9 +106,20 @@ class YAMLExecutorAgent(BaseAgent):
             self.end_performance_monitoring()
 
         except Exception as e:
+            record = self.execution_records.get(execution_id) if execution_id else None
+            if record is not None and "log_lines" not in record:
+                await self._save_logs(execution_id)
             await self.handle_exception("handle_execution_request", e)
 
-
+    async def _save_logs(self, execution_id: str) -> int:
+        """将执行过程和MidScene输出作为一批写入执行日志存储和执行记录，返回总行数"""
+        record = self.execution_records[execution_id]
+        lines = list(record["logs"])
+        await execution_log_store.append(execution_id, lines)
+        await database_script_service.log_execution(record.get("execution_pk"), lines, component="midscene")
+        record["logs"] = lines[-self.log_tail_lines:]
+        record["log_lines"] = await execution_log_store.close(execution_id)
+        return record["log_lines"]
 
     async def _execute_yaml_test(self, execution_id: str, test_content: Union[str, Dict[str, Any]], 
                                config: Dict[str, Any]) -> Dict[str, Any]:
@@ -108,7 +146,8 @@ class YAMLExecutorAgent(BaseAgent):
             
             # 这里需要调用MidScene.js执行器
             # 由于MidScene.js是Node.js工具，我们需要通过子进程调用
-            execution_result = await self._run_midscene_yaml(yaml_data, config, execution_id)
+            async with workload_manager.slot(RESOURCE_EXECUTION):
+                execution_result = await self._run_midscene_yaml(yaml_data, config, execution_id)
             
             end_time = datetime.now()
             duration = (end_time - start_time).total_seconds()
@@ -190,6 +229,7 @@ class YAMLExecutorAgent(BaseAgent):
             yaml_file = temp_dir / "test.yaml"
             
             import yaml
+            # 每次执行的临时文件直接写入执行目录，随目录由保留策略清理，不进入内容寻址存储
             with open(yaml_file, "w", encoding="utf-8") as f:
                 yaml.dump(yaml_data, f, default_flow_style=False, allow_unicode=True)
             
@@ -227,15 +267,35 @@ class YAMLExecutorAgent(BaseAgent):
                 env.update(config["environment_variables"])
             
             # 执行命令
+            started_at, started = time.time(), time.perf_counter()
             process = await asyncio.create_subprocess_exec(
                 *command,
                 cwd=temp_dir,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
-                env=env
+                env=env,
+                **process_group_kwargs()
             )
             
-            stdout, stderr = await process.communicate()
+            try:
+                stdout, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                # 会话取消时结束整个进程组（含浏览器）
+                await terminate_process(process)
+                observe_subprocess("midscene", "cancelled", time.perf_counter() - started)
+                raise
+            record["logs"].extend(
+                [f"[STDOUT] {line}" for line in stdout.decode('utf-8', errors='replace').splitlines() if line.strip()]
+                + [f"[STDERR] {line}" for line in stderr.decode('utf-8', errors='replace').splitlines() if line.strip()]
+            )
+            duration = time.perf_counter() - started
+            status = "ok" if process.returncode == 0 else "failed"
+            observe_subprocess("midscene", status, duration)
+            tracer.record_span(
+                "subprocess.midscene", "subprocess", started_at, started_at + duration,
+                attributes={"command": " ".join(command), "return_code": process.returncode},
+                error=None if status == "ok" else f"exit code {process.returncode}"
+            )
             
             # 解析执行结果
             if process.returncode == 0:
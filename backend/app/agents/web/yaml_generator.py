@@ -2,10 +2,13 @@
 YAML生成智能体
 负责根据多模态分析结果生成MidScene.js格式的YAML测试脚本
 """
+import re
+import copy
 import json
 import uuid
 import yaml
-from typing import Dict, List, Any, Optional
+import asyncio
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 
@@ -13,12 +16,19 @@ from autogen_agentchat.base import TaskResult
 from autogen_agentchat.messages import ModelClientStreamingChunkEvent, TextMessage
 from autogen_core import message_handler, type_subscription, MessageContext, TopicId
 from autogen_agentchat.agents import AssistantAgent
-from autogen_core.memory import ListMemory
+from autogen_core.memory import ListMemory, MemoryContent, MemoryMimeType
 from loguru import logger
 
 from app.core.messages.web import WebMultimodalAnalysisResponse
 from app.core.agents.base import BaseAgent
+from app.core.config import settings
+from app.services.knowledge.generation_context import generation_context_retriever
+from app.services.script_templates import script_template_engine
+from app.services.pipeline_checkpoints import pipeline_checkpoints
+from app.services.blob_store import blob_store
+from app.utils.yaml_stream import IncrementalYAMLParser, YAMLStreamError, repair_indentation
 from app.core.types import TopicTypes, AgentTypes, AGENT_NAMES, MessageRegion
+from app.core.cancellation import current_cancellation_token
 
 
 @type_subscription(topic_type=TopicTypes.YAML_GENERATOR.value)
@@ -35,6 +45,7 @@ class YAMLGeneratorAgent(BaseAgent):
         )
         self._prompt_template = self._build_prompt_template()
         self.metrics = None
+        self.prompt_stats = None
 
         logger.info(f"YAML生成智能体初始化完成: {self.agent_name}")
 
@@ -344,42 +355,29 @@ web:
         """处理多模态分析结果消息，生成YAML测试脚本"""
         try:
             monitor_id = self.start_performance_monitoring()
+            self.prompt_stats = None
 
             # 获取分析结果信息
             analysis_id = message.analysis_id
+            file_path = self._build_yaml_file_path(analysis_id)
 
-            # 使用工厂创建agent并执行YAML生成任务
-            agent = self.create_assistant_agent(
-                model_client_instance=self.model_client
-            )
-
-            from autogen_core.memory import ListMemory, MemoryContent, MemoryMimeType
             memory = ListMemory()
 
-            # 准备生成任务
-            task = self._prepare_yaml_generation_task(message)
-
-            # 执行YAML生成
-            yaml_content = ""
-            stream = agent.run_stream(task=task)
-            async for event in stream:  # type: ignore
-                if isinstance(event, ModelClientStreamingChunkEvent):
-                    await self.send_response(content=event.content, region=MessageRegion.GENERATION)
-                    continue
-                if isinstance(event, TextMessage):
-                    yaml_content = event.model_dump_json()
-                    await memory.add(MemoryContent(
-                        content=yaml_content,
-                        mime_type=MemoryMimeType.JSON.value
-                    ))
+            # 常见流程优先使用模板生成，无法可靠匹配时交由大模型生成
+            template_plan = script_template_engine.match(
+                message.page_analysis, message.test_description, message.target_url
+            )
+            if template_plan:
+                await self.send_response(
+                    f"⚡ 识别为{template_plan['label']}流程，使用模板生成\n\n",
+                    region=MessageRegion.GENERATION
+                )
+                yaml_result = self._build_yaml_result(script_template_engine.render_yaml(template_plan), message)
+                file_path = await self._save_and_publish_yaml(yaml_result, message, file_path)
+            else:
+                yaml_result, file_path = await self._generate_yaml_with_llm(message, memory, file_path)
             self.metrics = self.end_performance_monitoring(monitor_id=monitor_id)
 
-            # 处理生成的YAML内容
-            yaml_result = await self._process_generated_yaml(yaml_content, message)
-
-            # 保存YAML文件
-            file_path = await self._save_yaml_file(yaml_result.get("yaml_script", {}).get("content"), analysis_id)
-
             # 构建完整结果
             result = {
                 "yaml_script": yaml_result.get("yaml_script"),
@@ -387,14 +385,15 @@ web:
                 "file_path": file_path,
                 "generation_time": datetime.now().isoformat(),
                 "memory_content": self.serialize_memory_content(memory),
-                "metrics": self.metrics
+                "metrics": self.metrics,
+                "prompt_stats": self.prompt_stats,
+                "generation_mode": "template" if template_plan else "llm",
+                "template_stats": script_template_engine.get_stats(),
+                "partial": yaml_result.get("partial", False)
             }
 
-            # 发送脚本到数据库保存智能体
-            await self._send_to_database_saver(yaml_result.get("yaml_content", ""), message, file_path)
-
             await self.send_response(
-                "✅ YAML测试脚本生成完成",
+                "⚠️ YAML测试脚本不完整，未保存" if result["partial"] else "✅ YAML测试脚本生成完成",
                 is_final=True,
                 result=result
             )
@@ -402,6 +401,139 @@ web:
         except Exception as e:
             await self.handle_exception("handle_message", e)
 
+    async def _generate_yaml_with_llm(self, message: WebMultimodalAnalysisResponse, memory: ListMemory,
+                                      file_path: Path) -> Tuple[Dict[str, Any], str]:
+        """流式生成YAML脚本
+
+        输出过程中增量解析：每个task校验通过后立即写入文件并推送部分脚本；脚本结束（代码块闭合）后
+        立即保存并发送到数据库保存智能体，不等待大模型输出后续说明文字。
+        增量解析出现无法修复的结构错误时停止增量解析，等待完整输出后按全文修复；
+        全文仍无法修复时结果标记为 partial，只写入文件供查看，不作为最终脚本保存。
+
+        Returns:
+            (YAML处理结果, 文件路径)
+        """
+        agent = self.create_assistant_agent(
+            model_client_instance=self.model_client
+        )
+
+        # 准备生成任务
+        task = await self._prepare_yaml_generation_task(message)
+
+        parser = IncrementalYAMLParser()
+        streamed_chunks: List[str] = []
+        parse_error: Optional[YAMLStreamError] = None
+        yaml_result = None
+        saved_path = ""
+
+        stream = agent.run_stream(task=task, cancellation_token=current_cancellation_token())
+        try:
+            async for event in stream:  # type: ignore
+                if isinstance(event, ModelClientStreamingChunkEvent):
+                    await self.send_response(content=event.content, region=MessageRegion.GENERATION)
+                    if not parser.finished:
+                        streamed_chunks.append(event.content)
+                        if parse_error is None:
+                            parse_error = await self._feed_yaml_stream(parser, event.content, message, file_path)
+                    if parser.finished and yaml_result is None and parser.has_tasks:
+                        yaml_result = self._build_yaml_result(parser.document(), message)
+                        saved_path = await self._save_and_publish_yaml(yaml_result, message, file_path)
+                    continue
+                if isinstance(event, TextMessage):
+                    await memory.add(MemoryContent(
+                        content=event.model_dump_json(),
+                        mime_type=MemoryMimeType.JSON.value
+                    ))
+            if parse_error is None:
+                parse_error = await self._feed_yaml_stream(parser, None, message, file_path)
+        finally:
+            await stream.aclose()
+
+        if yaml_result is not None:
+            return yaml_result, saved_path
+
+        full_text = "".join(streamed_chunks)
+        if parse_error is None:
+            if parser.has_tasks:
+                yaml_result = self._build_yaml_result(parser.document(), message)
+            else:
+                yaml_result = await self._process_generated_yaml(full_text, message)
+        else:
+            yaml_result = self._repair_generated_yaml(full_text, message)
+            if yaml_result is None:
+                # 已校验的task只是脚本的一部分，不能作为最终脚本保存
+                yaml_result = self._build_yaml_result(parser.document(), message) if parser.has_tasks else {
+                    "yaml_script": None, "yaml_content": ""
+                }
+                yaml_result["partial"] = True
+                await self._write_yaml_file(file_path, yaml_result["yaml_content"])
+                await self.send_warning(f"生成的YAML存在无法修复的结构错误，脚本不完整，未保存为最终脚本: {parse_error}")
+                return yaml_result, str(file_path)
+            await self.send_warning("生成的YAML已按完整输出修复")
+
+        saved_path = await self._save_and_publish_yaml(yaml_result, message, file_path)
+        return yaml_result, saved_path
+
+    async def _feed_yaml_stream(self, parser: IncrementalYAMLParser, chunk: Optional[str],
+                                message: WebMultimodalAnalysisResponse, file_path: Path) -> Optional[YAMLStreamError]:
+        """输入流式片段（chunk 为None时结束输入）并处理事件，返回无法修复的结构错误"""
+        try:
+            events = parser.finish() if chunk is None else parser.feed(chunk)
+            await self._handle_yaml_stream_events(events, parser, message, file_path)
+            return None
+        except YAMLStreamError as e:
+            logger.warning(f"YAML增量解析失败，等待完整输出后修复: {str(e)}")
+            await self.send_warning(f"生成的YAML存在结构错误，将在输出完成后尝试修复: {str(e)}")
+            return e
+
+    def _repair_generated_yaml(self, yaml_content: str, message: WebMultimodalAnalysisResponse) -> Optional[Dict[str, Any]]:
+        """按完整输出修复脚本：提取代码块后依次尝试原文、修复缩进和通用格式修复，都无法得到task时返回None"""
+        match = re.search(r"```(?:ya?ml)?[^\n]*\n(.*?)(?:```|$)", yaml_content, re.DOTALL)
+        cleaned = self._clean_yaml_content(match.group(1) if match else yaml_content)
+        for candidate in (cleaned, repair_indentation(cleaned), self._fix_yaml_format(cleaned)):
+            try:
+                yaml_data = yaml.safe_load(candidate)
+            except yaml.YAMLError:
+                continue
+            if isinstance(yaml_data, dict) and isinstance(yaml_data.get("tasks"), list) and yaml_data["tasks"]:
+                try:
+                    return self._build_yaml_result(yaml_data, message)
+                except Exception as e:
+                    logger.warning(f"修复后的YAML结构校验失败: {str(e)}")
+        return None
+
+    async def _handle_yaml_stream_events(self, events: List[Dict[str, Any]], parser: IncrementalYAMLParser,
+                                         message: WebMultimodalAnalysisResponse, file_path: Path) -> None:
+        """处理增量解析事件：task完成时写入部分脚本并推送给用户"""
+        for event in events:
+            if event["type"] == "warning":
+                await self.send_warning(event["message"])
+            elif event["type"] == "task":
+                partial = self._build_yaml_result(parser.document(), message)
+                await self._write_yaml_file(file_path, partial["yaml_content"])
+                await self.send_response(
+                    f"🧩 第{event['index'] + 1}个任务校验通过: {event['data'].get('name')}\n\n",
+                    result={
+                        "partial": True,
+                        "completed_tasks": len(parser.tasks),
+                        "yaml_content": partial["yaml_content"],
+                        "file_path": str(file_path)
+                    }
+                )
+
+    async def _save_and_publish_yaml(self, yaml_result: Dict[str, Any], message: WebMultimodalAnalysisResponse,
+                                     file_path: Path) -> str:
+        """保存最终YAML文件并发送到数据库保存智能体"""
+        saved_path = await self._save_yaml_file(yaml_result.get("yaml_content", ""), message.analysis_id, file_path)
+        if settings.CHECKPOINT_ENABLED:
+            await pipeline_checkpoints.save_script(
+                message.analysis_id, "yaml",
+                {"yaml_content": yaml_result.get("yaml_content", ""), "file_path": saved_path},
+                session_id=message.session_id
+            )
+        await self._send_to_database_saver(yaml_result.get("yaml_content", ""), message, saved_path)
+        return saved_path
+
     async def _send_to_database_saver(self, yaml_content: str, analysis_result: WebMultimodalAnalysisResponse, file_path: str) -> None:
         """发送脚本到数据库保存智能体"""
         try:
@@ -432,11 +564,11 @@ web:
             # 不抛出异常，避免影响主流程
 
 
-    def _prepare_yaml_generation_task(self, message: WebMultimodalAnalysisResponse) -> str:
+    async def _prepare_yaml_generation_task(self, message: WebMultimodalAnalysisResponse) -> str:
         """准备YAML生成任务"""
         try:
-            # 构建分析摘要
-            analysis_summary = self._prepare_analysis_summary(message)
+            # 构建分析摘要（启用检索增强时只保留与测试需求相关的内容）
+            analysis_summary = await self._prepare_retrieved_analysis_summary(message)
 
             # 构建生成任务
             task = f"""
@@ -460,6 +592,43 @@ web:
             logger.error(f"准备YAML生成任务失败: {str(e)}")
             raise
 
+    async def _prepare_retrieved_analysis_summary(self, message: WebMultimodalAnalysisResponse) -> str:
+        """按测试需求检索相关元素和历史成功脚本构建分析摘要，失败时回退到完整摘要"""
+        baseline_summary = self._prepare_analysis_summary(message)
+        if not settings.RAG_GENERATION_ENABLED:
+            return baseline_summary
+
+        try:
+            context, self.prompt_stats = await generation_context_retriever.build_context(
+                message, "yaml", baseline_summary
+            )
+            return f"{context}\n{self._build_design_guidance()}"
+        except Exception as e:
+            logger.warning(f"检索增强分析摘要失败，使用完整摘要: {str(e)}")
+            return baseline_summary
+
+    @staticmethod
+    def _build_design_guidance() -> str:
+        """脚本设计指导"""
+        return """## MidScene.js设计指导
+
+基于以上分析结果，请重点关注：
+1. **高置信度元素**: 优先使用置信度≥0.8的UI元素进行操作设计
+2. **详细视觉描述**: 利用颜色、位置、形状等特征进行精确元素定位
+3. **结构化流程**: 参考交互流程的步骤序列和验证点设计
+4. **MidScene.js最佳实践**: 使用详细的视觉描述，遵循单一职责原则
+"""
+
+    def _build_yaml_result(self, yaml_data: Dict[str, Any], message: WebMultimodalAnalysisResponse) -> Dict[str, Any]:
+        """校验补全YAML脚本结构并生成处理结果"""
+        validated_data = self._validate_yaml_structure(copy.deepcopy(yaml_data), message)
+        return {
+            "yaml_script": validated_data,
+            "yaml_content": yaml.dump(validated_data, default_flow_style=False, allow_unicode=True, sort_keys=False),
+            "estimated_duration": self._estimate_execution_duration(validated_data),
+            "complexity_score": self._calculate_complexity_score(validated_data)
+        }
+
     def _prepare_analysis_summary(self, message: WebMultimodalAnalysisResponse) -> str:
         """准备优化后的分析摘要，充分利用GraphFlow智能体的结构化输出"""
         try:
@@ -492,14 +661,7 @@ web:
 ### 测试场景:
 {page_analysis.test_scenarios}
 
-## MidScene.js设计指导
-
-基于以上分析结果，请重点关注：
-1. **高置信度元素**: 优先使用置信度≥0.8的UI元素进行操作设计
-2. **详细视觉描述**: 利用颜色、位置、形状等特征进行精确元素定位
-3. **结构化流程**: 参考交互流程的步骤序列和验证点设计
-4. **MidScene.js最佳实践**: 使用详细的视觉描述，遵循单一职责原则
-"""
+{self._build_design_guidance()}"""
             return summary
 
         except Exception as e:
@@ -1162,21 +1324,30 @@ web:
                 "complexity_score": 1.0
             }
 
-    async def _save_yaml_file(self, yaml_content: str, analysis_id: str) -> str:
+    def _build_yaml_file_path(self, analysis_id: str) -> Path:
+        """生成YAML文件路径"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return Path("generated_scripts/yaml") / f"test_{analysis_id}_{timestamp}.yaml"
+
+    @staticmethod
+    def _write_file(file_path: Path, content: str) -> None:
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    async def _write_yaml_file(self, file_path: Path, yaml_content: str) -> None:
+        """写入YAML文件（在线程中执行，不阻塞流式输出）"""
+        try:
+            await asyncio.to_thread(self._write_file, file_path, yaml_content)
+        except Exception as e:
+            logger.warning(f"写入部分YAML文件失败: {str(e)}")
+
+    async def _save_yaml_file(self, yaml_content: str, analysis_id: str, file_path: Optional[Path] = None) -> str:
         """保存YAML文件"""
         try:
-            # 创建输出目录
-            output_dir = Path("generated_scripts/yaml")
-            output_dir.mkdir(parents=True, exist_ok=True)
-
-            # 生成文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"test_{analysis_id}_{timestamp}.yaml"
-
-            # 保存文件
-            file_path = output_dir / filename
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(yaml_content)
+            file_path = file_path or self._build_yaml_file_path(analysis_id)
+            # 最终内容按哈希保存到内容寻址存储，再物化到脚本路径（替换流式写入的部分文件）；引用由保存的脚本记录持有
+            await blob_store.write_text(file_path, yaml_content)
 
             logger.info(f"YAML文件已保存: {file_path}")
             return str(file_path)
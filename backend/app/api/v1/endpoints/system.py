@@ -1,8 +1,12 @@
 """
 系统管理API端点
 """
-from typing import Dict, Any
-from fastapi import APIRouter, HTTPException
+import sys
+import html
+import secrets
+from typing import Dict, Any, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from loguru import logger
 from datetime import datetime
 
@@ -65,13 +69,147 @@ async def system_stats():
         raise HTTPException(status_code=500, detail=f"获取系统统计失败: {str(e)}")
 
 
-@router.post("/cleanup")
-async def system_cleanup():
-    """系统清理"""
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """管理接口鉴权：请求头 X-Admin-Token 需与 ADMIN_TOKEN 一致"""
+    from app.core.config import settings
+
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="管理接口未启用，请配置 ADMIN_TOKEN")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="无权访问管理接口")
+
+
+@router.post("/profiling/start", dependencies=[Depends(require_admin)])
+async def start_profiling(
+    duration: float = Query(30, gt=0, description="采样时长（秒），超过 PROFILER_MAX_DURATION 时截断"),
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000, description="调用栈采样间隔（毫秒）")
+):
+    """启动采样剖析：duration 秒后自动停止"""
+    from app.core.profiling import profiler
+
     try:
-        # TODO: 实现系统清理
+        session = profiler.start(duration, interval_ms / 1000 if interval_ms else None)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"success": True, "data": session.summary()}
+
+
+@router.post("/profiling/stop", dependencies=[Depends(require_admin)])
+async def stop_profiling(top: int = Query(20, ge=1, le=200)):
+    """提前停止采样剖析，返回结果摘要"""
+    from app.core.profiling import profiler
+
+    session = profiler.stop()
+    if session is None:
+        raise HTTPException(status_code=404, detail="没有剖析会话")
+    return {"success": True, "data": session.summary(top)}
+
+
+@router.get("/profiling", dependencies=[Depends(require_admin)])
+async def get_profiling(top: int = Query(20, ge=1, le=200)):
+    """当前或最近一次剖析的结果：事件循环延迟分位数、运行最久的协程、阻塞调用"""
+    from app.core.profiling import profiler
+
+    session = profiler.session
+    if session is None:
+        raise HTTPException(status_code=404, detail="没有剖析会话")
+    return {"success": True, "data": session.summary(top)}
+
+
+@router.get("/profiling/flamegraph", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def get_profiling_flamegraph():
+    """折叠栈格式的采样结果，可直接用 flamegraph.pl 或 speedscope 生成火焰图"""
+    from app.core.profiling import profiler
+
+    session = profiler.session
+    if session is None:
+        raise HTTPException(status_code=404, detail="没有剖析会话")
+    return PlainTextResponse(session.collapsed_stacks())
+
+
+@router.get("/blobs", dependencies=[Depends(require_admin)])
+async def get_blob_store_stats():
+    """内容寻址存储统计：写入、去重命中、节省空间、物化方式和引用计数"""
+    from app.services.blob_store import blob_store
+
+    return {"success": True, "data": await blob_store.get_stats()}
+
+
+@router.post("/blobs/gc", dependencies=[Depends(require_admin)])
+async def collect_blob_garbage(
+    grace_hours: Optional[float] = Query(None, ge=0, description="引用计数归零后的保护期（小时）"),
+    include_orphans: bool = Query(False, description="同时删除没有数据库记录的内容块")
+):
+    """删除不再被引用的内容块"""
+    from app.services.blob_store import blob_store
+
+    try:
+        return {"success": True, "data": await blob_store.gc(grace_hours, include_orphans)}
+    except Exception as e:
+        logger.error(f"内容块垃圾回收失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"内容块垃圾回收失败: {str(e)}")
+
+
+@router.get("/jobs", dependencies=[Depends(require_admin)])
+async def get_job_queue_stats():
+    """任务队列统计：各队列各状态的任务数和最近一小时的排队时间"""
+    from app.services.job_queue import job_queue
+
+    try:
+        return {"success": True, "data": {"enabled": job_queue.enabled, "queues": await job_queue.stats()}}
+    except Exception as e:
+        logger.error(f"获取任务队列统计失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取任务队列统计失败: {str(e)}")
+
+
+@router.get("/workload", dependencies=[Depends(require_admin)])
+async def get_workload_stats():
+    """工作负载统计：各资源各类别的并发预算、占用、排队数和平均排队时间（排队时间分布见 workload_queue_seconds 指标）"""
+    from app.core.workload import workload_manager
+
+    return {"success": True, "data": workload_manager.stats()}
+
+
+@router.get("/llm-connections", dependencies=[Depends(require_admin)])
+async def get_llm_connection_stats():
+    """模型服务连接统计：各服务的连接池配置、请求数、空闲时间和最近一次预热耗时（首token时间分布见 llm_time_to_first_token_seconds 指标）"""
+    if "app.core.llm_connections" not in sys.modules:
+        # 模型客户端尚未加载，不为了统计而导入openai
+        return {"success": True, "data": {"loaded": False}}
+    from app.core.llm_connections import llm_connections
+
+    return {"success": True, "data": {"loaded": True, **llm_connections.stats()}}
+
+
+@router.get("/jobs/{job_id}", dependencies=[Depends(require_admin)])
+async def get_job(job_id: str):
+    """获取任务状态"""
+    from app.services.job_queue import job_queue
+
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在")
+    return {"success": True, "data": job.to_dict()}
+
+
+@router.post("/jobs/{job_id}/cancel", dependencies=[Depends(require_admin)])
+async def cancel_job(job_id: str):
+    """取消任务"""
+    from app.services.job_queue import job_queue
+
+    return {"success": True, "data": {"cancelled": await job_queue.cancel(job_id)}}
+
+
+@router.post("/cleanup", dependencies=[Depends(require_admin)])
+async def system_cleanup(dry_run: bool = Query(False, description="只统计将被删除的内容，不实际删除")):
+    """系统清理：按保留策略清理工作目录、过期报告和未引用的内容块，返回释放的空间"""
+    try:
+        from app.services.retention import retention_manager
+
+        result = await retention_manager.run(dry_run=dry_run)
         return {
-            "message": "系统清理功能待实现",
+            "success": True,
+            "data": result,
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -79,6 +217,32 @@ async def system_cleanup():
         raise HTTPException(status_code=500, detail=f"系统清理失败: {str(e)}")
 
 
+@router.get("/cleanup", dependencies=[Depends(require_admin)])
+async def get_cleanup_status():
+    """最近一次清理结果和当前保留策略"""
+    from app.core.config import settings
+    from app.services.retention import retention_manager
+
+    return {
+        "success": True,
+        "data": {
+            "enabled": settings.RETENTION_ENABLED,
+            "interval_hours": settings.RETENTION_INTERVAL_HOURS,
+            "last_result": retention_manager.last_result,
+            "policies": [
+                {
+                    "name": policy.name,
+                    "paths": [str(path) for path in policy.paths],
+                    "max_age_days": policy.max_age_days,
+                    "max_total_mb": policy.max_total_mb,
+                    "keep_last": policy.keep_last,
+                }
+                for policy in retention_manager.policies
+            ]
+        }
+    }
+
+
 @router.get("/config")
 async def system_config():
     """获取系统配置（安全信息已隐藏）"""
@@ -100,3 +264,102 @@ async def system_config():
     except Exception as e:
         logger.error(f"获取系统配置失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取系统配置失败: {str(e)}")
+
+
+@router.get("/traces")
+async def list_traces(session_id: Optional[str] = None, limit: int = 50):
+    """获取最近的链路列表，可按会话ID筛选"""
+    try:
+        from app.core.tracing import tracer
+
+        traces = tracer.exporter.list_traces(limit=max(1, min(limit, 500)))
+        if session_id:
+            traces = [trace for trace in traces if trace["session_id"] == session_id]
+        return {"success": True, "data": traces}
+    except Exception as e:
+        logger.error(f"获取链路列表失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取链路列表失败: {str(e)}")
+
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """获取单条链路的全部span"""
+    from app.core.tracing import tracer
+
+    trace = tracer.exporter.get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"链路 {trace_id} 不存在或已被淘汰")
+    return {"success": True, "data": trace}
+
+
+def _render_waterfall(trace: Dict[str, Any]) -> str:
+    """把链路渲染为瀑布图HTML"""
+    spans = trace["spans"]
+    if not spans:
+        return "<p>没有span</p>"
+
+    trace_start = spans[0]["start_time"]
+    total_ms = max(
+        (span["start_time"] - trace_start) * 1000 + span["duration_ms"] for span in spans
+    ) or 1.0
+
+    children: Dict[Optional[str], list] = {}
+    span_ids = {span["span_id"] for span in spans}
+    for span in spans:
+        parent_id = span["parent_id"] if span["parent_id"] in span_ids else None
+        children.setdefault(parent_id, []).append(span)
+
+    rows = []
+
+    def walk(parent_id: Optional[str], depth: int) -> None:
+        for span in children.get(parent_id, []):
+            offset = (span["start_time"] - trace_start) * 1000
+            left = offset / total_ms * 100
+            width = max(span["duration_ms"] / total_ms * 100, 0.2)
+            attributes = ", ".join(
+                f"{key}={value}" for key, value in span["attributes"].items() if value is not None
+            )
+            title = html.escape(f"{span['name']} {span['duration_ms']:.1f}ms {attributes} {span['error'] or ''}")
+            rows.append(
+                f'<tr><td style="padding-left:{depth * 16}px" title="{title}">{html.escape(span["name"])}</td>'
+                f'<td class="kind">{html.escape(span["kind"])}</td>'
+                f'<td class="bar"><div class="{span["kind"]} {span["status"]}" '
+                f'style="margin-left:{left:.3f}%;width:{width:.3f}%" title="{title}"></div></td>'
+                f'<td class="ms">{span["duration_ms"]:.1f}ms</td></tr>'
+            )
+            walk(span["span_id"], depth + 1)
+
+    walk(None, 0)
+    return (
+        f"<p>会话: {html.escape(str(trace['session_id']))} · span数: {len(spans)} · "
+        f"总耗时: {total_ms:.1f}ms · 丢弃: {trace['dropped_spans']}</p>"
+        "<table>" + "".join(rows) + "</table>"
+    )
+
+
+@router.get("/traces/{trace_id}/view", response_class=HTMLResponse)
+async def view_trace(trace_id: str):
+    """本地链路瀑布图查看页面"""
+    from app.core.tracing import tracer
+
+    trace = tracer.exporter.get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"链路 {trace_id} 不存在或已被淘汰")
+
+    return HTMLResponse(f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>链路 {html.escape(trace_id)}</title>
+<style>
+body {{ font-family: sans-serif; font-size: 13px; margin: 16px; }}
+table {{ border-collapse: collapse; width: 100%; }}
+td {{ padding: 2px 6px; white-space: nowrap; border-bottom: 1px solid #eee; }}
+td.bar {{ width: 60%; }}
+td.kind, td.ms {{ color: #666; }}
+td.bar div {{ height: 12px; border-radius: 2px; background: #8c8c8c; }}
+.orchestrator {{ background: #597ef7 !important; }}
+.agent {{ background: #36cfc9 !important; }}
+.llm {{ background: #9254de !important; }}
+.subprocess {{ background: #fa8c16 !important; }}
+.db {{ background: #73d13d !important; }}
+.error {{ outline: 2px solid #f5222d; }}
+</style></head>
+<body><h3>链路 {html.escape(trace_id)}</h3>{_render_waterfall(trace)}</body></html>""")
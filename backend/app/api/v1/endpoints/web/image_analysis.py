@@ -21,6 +21,16 @@ from app.core.messages import StreamMessage
 from app.core.messages.web import WebMultimodalAnalysisRequest
 from app.core.types import AgentPlatform
 from app.services.web.orchestrator_service import get_web_orchestrator
+from app.services.pipeline_checkpoints import pipeline_checkpoints, STAGE_ANALYSIS, is_valid_checkpoint_key
+from app.core.metrics import observe_queue_depth
+from app.core.workload import INTERACTIVE, RESOURCE_LLM, workload_manager, workload_scope
+from app.core.cancellation import cancellation_registry, cancellation_scope
+from app.core.tracing import traced
+from app.core.config import settings
+from app.utils.file_utils import read_image_base64
+from app.services.blob_store import blob_store
+from app.services.job_queue import JobContext, job_handler, job_queue
+from app.services.session_jobs import run_session_job, submit_session_job
 
 
 router = APIRouter()
@@ -41,14 +51,24 @@ feedback_queues: Dict[str, asyncio.Queue] = {}
 SESSION_TIMEOUT = 3600  # 1小时
 
 ssss = ""
+
+
+async def release_session_upload(session_info: Optional[Dict[str, Any]]) -> None:
+    """释放会话上传图片在内容寻址存储中的引用（上传图片由会话持有）"""
+    if session_info:
+        await blob_store.release_path(session_info.get("request", {}).get("image_path"))
+
+
 async def cleanup_session(session_id: str, delay: int = SESSION_TIMEOUT):
     """在指定延迟后清理会话资源"""
     await asyncio.sleep(delay)
     if session_id in active_sessions:
         logger.info(f"清理过期会话: {session_id}")
-        active_sessions.pop(session_id, None)
+        session_info = active_sessions.pop(session_id, None)
         message_queues.pop(session_id, None)
         feedback_queues.pop(session_id, None)
+        cancellation_registry.release(session_id)
+        await release_session_upload(session_info)
 
 
 @router.get("/health")
@@ -100,7 +120,9 @@ async def start_web_image_analysis(
     script_description: Optional[str] = Form(None),
     tags: Optional[str] = Form(None),  # JSON字符串格式的标签列表
     category: Optional[str] = Form(None),
-    priority: int = Form(1)
+    priority: int = Form(1),
+    force_reanalyze: bool = Form(False),
+    target_url: Optional[str] = Form(None)
 ):
     """
     启动Web图片分析任务，支持自动保存到数据库
@@ -116,25 +138,20 @@ async def start_web_image_analysis(
         tags: 标签列表（JSON字符串格式）
         category: 脚本分类
         priority: 优先级（1-5）
+        force_reanalyze: 忽略已有分析检查点，重新分析图片
+        target_url: 被测网页URL（常见流程按模板生成脚本时打开该页面）
 
     Returns:
         Dict: 包含session_id的响应
     """
     try:
+        # 大模型并发已满时在保存图片之前拒绝
+        workload_manager.check_admission(RESOURCE_LLM, INTERACTIVE)
+
         # 验证文件类型
         if not file.content_type or not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="请上传有效的图片文件")
         
-        # 验证文件大小（5MB限制）
-        file_size = 0
-        content = await file.read()
-        file_size = len(content)
-        if file_size > 5 * 1024 * 1024:  # 5MB
-            raise HTTPException(status_code=400, detail="图片文件大小不能超过5MB")
-        
-        # 转换为base64
-        image_base64 = base64.b64encode(content).decode('utf-8')
-        
         # 解析生成格式
         try:
             formats_list = [f.strip() for f in generate_formats.split(",")]
@@ -143,6 +160,16 @@ async def start_web_image_analysis(
         
         # 生成会话ID
         session_id = str(uuid.uuid4())
+
+        # 分块保存图片到磁盘（按内容去重，5MB限制，超过时提前拒绝），分析开始时再读取
+        file_extension = Path(file.filename).suffix if file.filename else '.png'
+        stored = await blob_store.save_upload(
+            file,
+            Path(settings.IMAGE_UPLOAD_DIR) / f"{session_id}{file_extension}",
+            5 * 1024 * 1024,
+            label="图片文件"
+        )
+        file_size = stored.size
         
         # 解析标签
         tag_list = []
@@ -155,22 +182,26 @@ async def start_web_image_analysis(
         # 创建分析请求
         analysis_request = WebMultimodalAnalysisRequest(
             session_id=session_id,
-            image_data=image_base64,
+            image_path=stored.path,
             test_description=test_description,
             additional_context=additional_context or "",
-            generate_formats=formats_list
+            generate_formats=formats_list,
+            force_reanalyze=force_reanalyze,
+            target_url=target_url or None
         )
 
         # 存储会话信息，包含数据库配置
         active_sessions[session_id] = {
             "request": analysis_request.model_dump(),
+            "workload": INTERACTIVE,
             "status": "initialized",
             "created_at": datetime.now().isoformat(),
             "last_activity": datetime.now().isoformat(),
             "file_info": {
                 "filename": file.filename,
                 "content_type": file.content_type,
-                "size": file_size
+                "size": file_size,
+                "sha256": stored.sha256
             },
             "database_config": {
                 "save_to_database": save_to_database,
@@ -202,6 +233,58 @@ async def start_web_image_analysis(
         raise HTTPException(status_code=500, detail=f"创建分析任务失败: {str(e)}")
 
 
+@router.post("/analyze/regenerate")
+async def start_script_regeneration(
+    analysis_id: str = Form(...),
+    generate_formats: str = Form("yaml")
+):
+    """
+    基于已有分析结果重新生成脚本，跳过耗时的图片分析
+
+    Args:
+        analysis_id: 分析ID（图片分析完成时返回）
+        generate_formats: 生成格式，逗号分隔（如: "playwright"）
+
+    Returns:
+        Dict: 包含session_id的响应
+    """
+    try:
+        if not is_valid_checkpoint_key(analysis_id):
+            raise HTTPException(status_code=400, detail="无效的分析ID")
+        workload_manager.check_admission(RESOURCE_LLM, INTERACTIVE)
+        content_hash = await pipeline_checkpoints.resolve_analysis(analysis_id)
+        if not content_hash or STAGE_ANALYSIS not in await pipeline_checkpoints.list_stages(content_hash):
+            raise HTTPException(status_code=404, detail=f"分析结果 {analysis_id} 不存在或已过期")
+
+        formats_list = [f.strip() for f in generate_formats.split(",") if f.strip()] or ["yaml"]
+        session_id = str(uuid.uuid4())
+
+        active_sessions[session_id] = {
+            "mode": "regenerate",
+            "workload": INTERACTIVE,
+            "request": {"analysis_id": analysis_id, "generate_formats": formats_list},
+            "status": "initialized",
+            "created_at": datetime.now().isoformat(),
+            "last_activity": datetime.now().isoformat()
+        }
+
+        logger.info(f"脚本重新生成任务已创建: {session_id}, 分析ID: {analysis_id}")
+
+        return JSONResponse({
+            "session_id": session_id,
+            "status": "initialized",
+            "message": "重新生成任务已创建，请使用SSE连接获取实时进度",
+            "sse_endpoint": f"/api/v1/web/create/stream/{session_id}",
+            "analysis_id": analysis_id
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"创建脚本重新生成任务失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"创建重新生成任务失败: {str(e)}")
+
+
 @router.get("/stream/{session_id}")
 async def stream_web_analysis(
     session_id: str,
@@ -248,9 +331,15 @@ async def stream_web_analysis(
     # 如果需要开始处理，启动分析任务
     if start_processing and active_sessions[session_id]["status"] == "initialized":
         logger.info(f"启动Web图片分析处理任务: {session_id}")
-        asyncio.create_task(
-            process_web_analysis_task(session_id)
-        )
+        if job_queue.enabled:
+            await submit_session_job("web.image_analysis", session_id, active_sessions, message_queues)
+        else:
+            token = cancellation_registry.token(session_id)
+            with workload_scope(active_sessions[session_id].get("workload")), cancellation_scope(token):
+                task = asyncio.create_task(
+                    process_web_analysis_task(session_id)
+                )
+            cancellation_registry.track(session_id, task)
     
     # 返回SSE响应
     response = EventSourceResponse(
@@ -305,6 +394,7 @@ async def web_event_generator(session_id: str, request: Request):
 
                 # 使用适中的超时时间，减少ping消息频率
                 message = await asyncio.wait_for(message_queue.get(), timeout=5.0)
+                observe_queue_depth("image_analysis", message_queue.qsize())
 
                 logger.debug(f"成功从队列获取消息: {message.type} - {message.content[:50]}...")
                 
@@ -357,6 +447,7 @@ async def web_event_generator(session_id: str, request: Request):
     yield f"event: close\nid: close-{message_id}\ndata: {close_data}\n\n"
 
 
+@traced("image_analysis.process_web_analysis_task", kind="http")
 async def process_web_analysis_task(session_id: str):
     """处理Web图片分析的后台任务"""
     logger.info(f"开始执行Web图片分析任务: {session_id}")
@@ -416,13 +507,25 @@ async def process_web_analysis_task(session_id: str):
         
         # 执行分析流程（支持多种格式）
         generate_formats = request_data.get("generate_formats", ["yaml"])
-        await orchestrator.analyze_image_to_scripts(
-            session_id=session_id,
-            image_data=request_data["image_data"],
-            test_description=request_data["test_description"],
-            additional_context=request_data.get("additional_context", ""),
-            generate_formats=generate_formats
-        )
+        if session_info.get("mode") == "regenerate":
+            # 基于已有分析结果重新生成脚本，跳过图片分析
+            await orchestrator.regenerate_scripts_from_analysis(
+                session_id=session_id,
+                analysis_id=request_data["analysis_id"],
+                generate_formats=generate_formats
+            )
+        else:
+            # 图片在上传时已保存到磁盘，此时才读取
+            image_data = request_data.get("image_data") or await read_image_base64(request_data["image_path"])
+            await orchestrator.analyze_image_to_scripts(
+                session_id=session_id,
+                image_data=image_data,
+                test_description=request_data["test_description"],
+                additional_context=request_data.get("additional_context", ""),
+                generate_formats=generate_formats,
+                force_reanalyze=request_data.get("force_reanalyze", False),
+                target_url=request_data.get("target_url")
+            )
         
         # # 数据库保存现在由智能体架构处理，这里只需要记录配置
         # # database_config = session_info.get("database_config", {})
@@ -480,6 +583,12 @@ async def process_web_analysis_task(session_id: str):
             active_sessions[session_id]["error_at"] = datetime.now().isoformat()
 
 
+@job_handler("web.image_analysis", queue="analysis", max_attempts=2)
+async def run_web_analysis_job(ctx: JobContext) -> Dict[str, Any]:
+    """worker进程中运行Web图片分析（分析失败时按退避重试）"""
+    return await run_session_job(ctx, active_sessions, message_queues, process_web_analysis_task, retry_on_error=True)
+
+
 @router.get("/sessions")
 async def list_sessions():
     """列出所有活动会话"""
@@ -504,10 +613,18 @@ async def delete_session(session_id: str):
     if session_id not in active_sessions:
         raise HTTPException(status_code=404, detail=f"会话 {session_id} 不存在或已过期")
 
-    # 删除会话资源
-    active_sessions.pop(session_id, None)
+    # 取消队列中的任务
+    job_id = active_sessions[session_id].get("job_id")
+    if job_id:
+        await job_queue.cancel(job_id)
+
+    # 中止进行中的分析（大模型流式请求随之关闭）并删除会话资源
+    cancellation_registry.cancel(session_id)
+    cancellation_registry.release(session_id)
+    session_info = active_sessions.pop(session_id, None)
     message_queues.pop(session_id, None)
     feedback_queues.pop(session_id, None)
+    await release_session_upload(session_info)
 
     return JSONResponse({
         "status": "success",
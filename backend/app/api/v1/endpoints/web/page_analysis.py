@@ -23,6 +23,9 @@ from app.core.messages import StreamMessage
 from app.core.messages.web import WebMultimodalAnalysisRequest
 from app.database.connection import db_manager
 from app.database.repositories.page_analysis_repository import PageAnalysisRepository, PageElementRepository
+from app.core.metrics import observe_queue_depth
+from app.utils.file_utils import StoredUpload, read_image_base64
+from app.services.blob_store import blob_store
 
 router = APIRouter()
 
@@ -41,10 +44,11 @@ SESSION_TIMEOUT = 3600  # 1小时
 # 图片存储配置
 UPLOAD_DIR = Path("uploads/images")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+MAX_PAGE_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
 
-async def save_uploaded_image(file: UploadFile, session_id: str, file_index: int) -> tuple[str, str]:
+async def save_uploaded_image(file: UploadFile, session_id: str, file_index: int) -> tuple[StoredUpload, str]:
     """
-    保存上传的图片文件
+    保存上传的图片文件（分块写入磁盘，同时计算SHA-256和感知哈希）
 
     Args:
         file: 上传的文件对象
@@ -52,7 +56,7 @@ async def save_uploaded_image(file: UploadFile, session_id: str, file_index: int
         file_index: 文件索引
 
     Returns:
-        tuple: (文件路径, 原始文件名)
+        tuple: (保存结果, 原始文件名)
     """
     try:
         # 生成唯一的文件名
@@ -60,19 +64,52 @@ async def save_uploaded_image(file: UploadFile, session_id: str, file_index: int
         unique_filename = f"{session_id}_{file_index}_{int(time.time())}{file_extension}"
         file_path = UPLOAD_DIR / unique_filename
 
-        # 保存文件
-        content = await file.read()
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(content)
+        # 保存文件（按内容去重），超过10MB时提前拒绝
+        stored = await blob_store.save_upload(
+            file, file_path, MAX_PAGE_IMAGE_SIZE, label=f"图片文件 {file.filename} ", perceptual_hash=True
+        )
 
-        logger.info(f"图片已保存: {file_path}")
-        return str(file_path), file.filename or f"image_{file_index}{file_extension}"
+        logger.info(f"图片已保存: {stored.path} ({stored.size} bytes, sha256={stored.sha256[:12]})")
+        return stored, file.filename or f"image_{file_index}{file_extension}"
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"保存图片失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"保存图片失败: {str(e)}")
 
 
+async def discard_uploaded_image(image_path: Optional[str]) -> None:
+    """丢弃上传的图片：存储中的内容释放引用（由垃圾回收删除），直接写入上传目录的文件立即删除"""
+    if not image_path or await blob_store.release_path(image_path):
+        return
+    try:
+        Path(image_path).unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"删除上传图片失败: {image_path}, {str(e)}")
+
+
+async def discard_uploaded_pages(session_id: str, image_paths: List[str]) -> None:
+    """撤销上传中途失败的会话：删除已提交的分析记录、向量索引和图片，避免记录一直停留在processing状态"""
+    page_ids: List[str] = []
+    try:
+        async with db_manager.get_session() as session:
+            page_ids = await PageAnalysisRepository().delete_by_session_id(session, session_id)
+    except Exception as e:
+        logger.error(f"删除上传失败会话的分析记录失败: {session_id}, {str(e)}")
+
+    if page_ids:
+        from app.services.knowledge.page_vector_store import page_vector_store
+        for page_id in page_ids:
+            try:
+                await page_vector_store.remove_page(page_id)
+            except Exception as e:
+                logger.warning(f"删除页面向量失败: {page_id}, {str(e)}")
+    for image_path in image_paths:
+        await discard_uploaded_image(image_path)
+    logger.info(f"上传失败，已撤销会话 {session_id} 的 {len(page_ids)} 条分析记录和 {len(image_paths)} 个图片")
+
+
 async def get_db_session():
     """获取数据库会话"""
     try:
@@ -129,36 +166,13 @@ async def upload_and_analyze_pages(
         # 生成会话ID（提前生成，用于文件命名）
         session_id = str(uuid.uuid4())
 
-        # 验证每个文件
-        validated_files = []
-        for file_index, file in enumerate(files):
-            # 验证文件类型
+        # 先校验所有文件的类型和已知大小，避免部分文件已开始分析后才拒绝请求
+        for file in files:
             if not file.content_type or not file.content_type.startswith('image/'):
                 raise HTTPException(status_code=400, detail=f"文件 {file.filename} 不是有效的图片文件")
-
-            # 验证文件大小（10MB限制）
-            content = await file.read()
-            file_size = len(content)
-            if file_size > 10 * 1024 * 1024:  # 10MB
+            if file.size is not None and file.size > MAX_PAGE_IMAGE_SIZE:
                 raise HTTPException(status_code=400, detail=f"图片文件 {file.filename} 大小不能超过10MB")
 
-            # 重置文件指针以便保存文件
-            await file.seek(0)
-
-            # 保存图片文件
-            image_path, original_filename = await save_uploaded_image(file, session_id, file_index)
-
-            # 转换为base64（用于分析）
-            image_base64 = base64.b64encode(content).decode('utf-8')
-
-            validated_files.append({
-                "filename": original_filename,
-                "content_type": file.content_type,
-                "size": file_size,
-                "image_data": image_base64,
-                "image_path": image_path  # 添加图片路径
-            })
-
         # 记录当前时间
         current_time = datetime.now()
 
@@ -166,7 +180,8 @@ async def upload_and_analyze_pages(
         final_page_name = page_name.strip() if page_name else None
         final_description = description.strip() if description else None
 
-        # 存储会话信息
+        # 存储会话信息（只保存文件路径和哈希，图片内容在分析时再从磁盘读取）
+        validated_files = []
         active_sessions[session_id] = {
             "status": "processing",  # 直接设置为处理中
             "created_at": current_time.isoformat(),
@@ -179,7 +194,7 @@ async def upload_and_analyze_pages(
             },
             "analysis_results": [],
             "progress": 0,
-            "total_files": len(validated_files),
+            "total_files": len(files),
             "processed_files": 0
         }
 
@@ -187,41 +202,62 @@ async def upload_and_analyze_pages(
         message_queue = asyncio.Queue()
         message_queues[session_id] = message_queue
 
-        # 为每个文件创建初始数据库记录（状态为processing）
+        # 立即启动后台分析任务，每个文件保存完成后即送入待分析队列
+        file_queue: asyncio.Queue = asyncio.Queue()
+        analysis_task = asyncio.create_task(process_page_analysis_task(session_id, file_queue))
+
+        # 逐个保存文件并创建初始数据库记录（状态为processing）
         from app.database.connection import db_manager
         from app.database.models.page_analysis import PageAnalysisResult
 
-        async with db_manager.get_session() as session:
-            try:
-                for i, file_info in enumerate(validated_files):
-                    # 生成分析ID
-                    analysis_id = str(uuid.uuid4())
-
-                    # 创建初始记录
-                    page_analysis = PageAnalysisResult(
-                        session_id=session_id,
-                        analysis_id=analysis_id,
-                        page_name=final_page_name or f"页面分析_{i+1}",
-                        page_url=page_url.strip() if page_url else None,
-                        page_description=final_description,
-                        image_path=file_info.get('image_path'),  # 添加图片路径
-                        image_filename=file_info.get('filename'),  # 添加原始文件名
-                        analysis_status='processing',  # 设置为处理中状态
-                        confidence_score=0.0,
-                        elements_count=0
-                    )
-
-                    session.add(page_analysis)
-
-                await session.commit()
-                logger.info(f"已创建 {len(validated_files)} 条初始分析记录，状态为processing")
-            except Exception as e:
-                await session.rollback()
-                logger.error(f"创建初始分析记录失败: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"创建分析记录失败: {str(e)}")
-
-        # 立即启动后台分析任务
-        asyncio.create_task(process_page_analysis_task(session_id))
+        try:
+            async with db_manager.get_session() as session:
+                for file_index, file in enumerate(files):
+                    stored, original_filename = await save_uploaded_image(file, session_id, file_index)
+                    file_info = {
+                        "filename": original_filename,
+                        "content_type": file.content_type,
+                        "size": stored.size,
+                        "sha256": stored.sha256,
+                        "phash": stored.phash,
+                        "image_path": stored.path
+                    }
+
+                    try:
+                        page_analysis = PageAnalysisResult(
+                            session_id=session_id,
+                            analysis_id=str(uuid.uuid4()),
+                            page_name=final_page_name or f"页面分析_{file_index+1}",
+                            page_url=page_url.strip() if page_url else None,
+                            page_description=final_description,
+                            image_path=stored.path,  # 添加图片路径
+                            image_filename=original_filename,  # 添加原始文件名
+                            analysis_status='processing',  # 设置为处理中状态
+                            confidence_score=0.0,
+                            elements_count=0
+                        )
+                        session.add(page_analysis)
+                        await session.commit()
+                    except Exception as e:
+                        await session.rollback()
+                        # 上传图片由分析记录持有，记录没有创建时丢弃
+                        await discard_uploaded_image(stored.path)
+                        logger.error(f"创建初始分析记录失败: {str(e)}")
+                        raise HTTPException(status_code=500, detail=f"创建分析记录失败: {str(e)}")
+
+                    validated_files.append(file_info)
+                    await file_queue.put(file_info)
+
+            await file_queue.put(None)
+            logger.info(f"已创建 {len(validated_files)} 条初始分析记录，状态为processing")
+        except BaseException:
+            # 上传中途失败（如超过大小上限），取消已启动的分析任务并撤销已保存的记录和图片
+            analysis_task.cancel()
+            active_sessions.pop(session_id, None)
+            message_queues.pop(session_id, None)
+            await asyncio.gather(analysis_task, return_exceptions=True)
+            await discard_uploaded_pages(session_id, [f["image_path"] for f in validated_files])
+            raise
 
         logger.info(f"页面分析任务已创建并启动: {session_id}, 文件数量: {len(validated_files)}")
 
@@ -336,6 +372,7 @@ async def page_analysis_event_generator(session_id: str, request: Request):
             try:
                 # 使用较短的超时时间，确保更频繁地检查连接状态
                 message = await asyncio.wait_for(message_queue.get(), timeout=0.5)
+                observe_queue_depth("page_analysis", message_queue.qsize())
 
                 # 更新会话最后活动时间
                 if session_id in active_sessions:
@@ -398,8 +435,14 @@ async def page_analysis_event_generator(session_id: str, request: Request):
     yield f"event: close\nid: close-{message_id}\ndata: {close_data}\n\n"
 
 
-async def process_page_analysis_task(session_id: str):
-    """处理页面分析的后台任务"""
+async def process_page_analysis_task(session_id: str, file_queue: Optional[asyncio.Queue] = None):
+    """处理页面分析的后台任务
+
+    Args:
+        session_id: 会话ID
+        file_queue: 待分析文件队列，上传接口每保存完一个文件即放入，None表示全部送达；
+            为空时分析会话中已保存的全部文件
+    """
     logger.info(f"开始执行页面分析任务: {session_id}")
 
     try:
@@ -455,13 +498,23 @@ async def process_page_analysis_task(session_id: str):
 
         # 获取页面信息
         page_info = session_info["page_info"]
-        files = session_info["files"]
+        total_files = session_info["total_files"]
 
-        # 处理每个上传的文件
-        for i, file_info in enumerate(files):
+        if file_queue is None:
+            file_queue = asyncio.Queue()
+            for file_info in session_info["files"]:
+                file_queue.put_nowait(file_info)
+            file_queue.put_nowait(None)
+
+        # 逐个处理上传的文件，文件保存完成即开始分析
+        i = 0
+        while True:
+            file_info = await file_queue.get()
+            if file_info is None:
+                break
             try:
                 # 更新进度
-                progress = int((i / len(files)) * 100)
+                progress = int((i / total_files) * 100)
                 active_sessions[session_id]["progress"] = progress
                 active_sessions[session_id]["processed_files"] = i
                 active_sessions[session_id]["last_activity"] = datetime.now().isoformat()
@@ -471,7 +524,7 @@ async def process_page_analysis_task(session_id: str):
                     message_id=f"progress-{uuid.uuid4()}",
                     type="message",
                     source="系统",
-                    content=f"📸 正在分析第 {i+1}/{len(files)} 个页面截图: {file_info['filename']} ({progress}%)",
+                    content=f"📸 正在分析第 {i+1}/{total_files} 个页面截图: {file_info['filename']} ({progress}%)",
                     region="process",
                     platform="web",
                     is_final=False,
@@ -481,10 +534,11 @@ async def process_page_analysis_task(session_id: str):
                 # 为每个文件生成独立的分析ID，但保持原始session_id
                 file_analysis_id = f"{session_id}_file_{i}"
 
-                # 使用编排器执行页面分析
+                # 使用编排器执行页面分析（图片内容在此时才从磁盘读取）
+                image_data = await read_image_base64(file_info["image_path"])
                 await orchestrator.analyze_page_elements(
                     session_id=file_analysis_id,  # 使用独立的分析ID
-                    image_data=file_info["image_data"],
+                    image_data=image_data,
                     page_name=page_info.get("page_name", "") if page_info.get("page_name", "") else "",
                     page_description=page_info.get("description", "") if page_info.get("description", "") else "",
                     page_url=page_info.get("page_url", "")
@@ -506,6 +560,8 @@ async def process_page_analysis_task(session_id: str):
                     is_final=False,
                 )
                 await message_queue.put(error_message)
+            finally:
+                i += 1
 
         # 发送最终结果
         final_message = StreamMessage(
@@ -522,7 +578,7 @@ async def process_page_analysis_task(session_id: str):
         # 更新会话状态
         active_sessions[session_id]["status"] = "completed"
         active_sessions[session_id]["progress"] = 100
-        active_sessions[session_id]["processed_files"] = len(files)
+        active_sessions[session_id]["processed_files"] = i
         active_sessions[session_id]["completed_at"] = datetime.now().isoformat()
         active_sessions[session_id]["last_activity"] = datetime.now().isoformat()
 
@@ -634,16 +690,11 @@ async def get_page_list(
 
         if search:
             logger.info(f"搜索页面，关键词: {search}")
-            pages = await repo.search_by_page_name(session, search, limit=page_size)
+            pages = await repo.search_by_page_name(session, search, limit=page_size, summary_only=True)
         else:
-            # 获取所有页面
+            # 获取所有页面（列表只加载摘要列）
             logger.info("获取所有页面")
-            from sqlalchemy import select, desc
-            from app.database.models.page_analysis import PageAnalysisResult
-
-            query = select(PageAnalysisResult).order_by(desc(PageAnalysisResult.created_at))
-            result = await session.execute(query.limit(page_size).offset((page - 1) * page_size))
-            pages = result.scalars().all()
+            pages = await repo.list_summaries(session, limit=page_size, offset=(page - 1) * page_size)
 
         logger.info(f"查询到 {len(pages)} 条页面记录")
 
@@ -653,8 +704,8 @@ async def get_page_list(
             try:
                 logger.debug(f"处理页面: {page_obj.id}")
 
-                # 使用改进后的to_dict方法
-                page_dict = page_obj.to_dict()
+                # 列表视图使用摘要字典，不返回完整分析数据
+                page_dict = page_obj.to_summary_dict()
 
                 # 添加分析状态（基于置信度和元素数量推断）
                 elements_count = page_dict.get('elements_count', 0) or 0
@@ -818,9 +869,17 @@ async def delete_page(
             raise HTTPException(status_code=404, detail="页面不存在")
 
         # 删除页面记录（级联删除元素）
+        image_path = page.image_path
         await session.delete(page)
         await session.commit()
 
+        # 释放分析记录持有的上传图片引用
+        await blob_store.release_path(image_path)
+
+        # 同步删除向量索引
+        from app.services.knowledge.page_vector_store import page_vector_store
+        await page_vector_store.remove_page(page_id)
+
         return JSONResponse({
             "success": True,
             "message": "页面删除成功"
@@ -885,13 +944,27 @@ async def search_knowledge_base(
     limit: int = 20,
     session: AsyncSession = Depends(get_db_session)
 ):
-    """搜索知识库"""
+    """搜索知识库（启用混合检索时融合关键词与向量检索结果）"""
     try:
+        from app.core.config import settings
+        if settings.HYBRID_RETRIEVAL_ENABLED and query:
+            from app.services.knowledge.page_analysis_kb import page_analysis_kb
+            results = await page_analysis_kb.search_similar_pages(query, page_type=page_type, limit=limit)
+            return JSONResponse({
+                "success": True,
+                "data": {
+                    "results": results,
+                    "total": len(results),
+                    "query": query,
+                    "page_type": page_type
+                }
+            })
+
         from sqlalchemy import select, or_
         from app.database.models.page_analysis import PageAnalysisResult
 
-        # 构建查询
-        stmt = select(PageAnalysisResult)
+        # 构建查询（搜索结果只加载摘要列）
+        stmt = select(PageAnalysisResult).options(*PageAnalysisResult.summary_options())
 
         search_conditions = []
         if query:
@@ -924,7 +997,7 @@ async def search_knowledge_base(
         return JSONResponse({
             "success": True,
             "data": {
-                "results": [result.to_dict() for result in results],
+                "results": [result.to_summary_dict() for result in results],
                 "total": len(results),
                 "query": query,
                 "page_type": page_type
@@ -959,7 +1032,9 @@ async def search_by_keywords(
                 )
             )
 
-        stmt = select(PageAnalysisResult).where(
+        stmt = select(PageAnalysisResult).options(
+            *PageAnalysisResult.summary_options()
+        ).where(
             or_(*search_conditions)
         ).order_by(
             PageAnalysisResult.confidence_score.desc(),
@@ -972,7 +1047,7 @@ async def search_by_keywords(
         return JSONResponse({
             "success": True,
             "data": {
-                "results": [result.to_dict() for result in results],
+                "results": [result.to_summary_dict() for result in results],
                 "total": len(results),
                 "keywords": keywords
             }
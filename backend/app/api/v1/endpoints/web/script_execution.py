@@ -22,7 +22,13 @@ from app.core.messages.web import PlaywrightExecutionRequest, ScriptExecutionReq
 from app.core.types import AgentPlatform
 from app.services.web.orchestrator_service import get_web_orchestrator
 from app.services.database_script_service import database_script_service
+from app.services.script_resolution_cache import script_resolution_cache
 from app.models.test_scripts import ScriptFormat
+from app.core.metrics import observe_queue_depth
+from app.core.workload import BATCH, INTERACTIVE, RESOURCE_EXECUTION, workload_manager, workload_scope
+from app.core.cancellation import cancellation_registry, cancellation_scope
+from app.services.job_queue import JobContext, job_handler, job_queue
+from app.services.session_jobs import run_session_job, submit_session_job
 from pydantic import BaseModel, Field
 
 router = APIRouter()
@@ -89,6 +95,7 @@ async def cleanup_session(session_id: str, delay: int = SESSION_TIMEOUT):
         active_sessions.pop(session_id, None)
         message_queues.pop(session_id, None)
         script_statuses.pop(session_id, None)
+        cancellation_registry.release(session_id)
 
 
 async def resolve_script_by_id(script_id: str) -> Dict[str, Any]:
@@ -102,6 +109,11 @@ async def resolve_script_by_id(script_id: str) -> Dict[str, Any]:
     Returns:
         Dict: 包含脚本信息的字典
     """
+    # 优先使用缓存（脚本更新/删除或文件变更时失效）
+    cached = script_resolution_cache.get(script_id)
+    if cached:
+        return cached
+
     # 首先尝试从数据库获取脚本
     try:
         db_script = await database_script_service.get_script(script_id)
@@ -136,13 +148,15 @@ async def resolve_script_by_id(script_id: str) -> Dict[str, Any]:
                 else:
                     raise FileNotFoundError(f"脚本文件不存在且数据库中无内容: {script_path}")
 
-            return {
+            script_info = {
                 "script_id": script_id,
                 "name": db_script.name,
                 "file_name": script_path.name,
                 "path": str(script_path),
                 "description": db_script.description or f"脚本: {db_script.name}"
             }
+            script_resolution_cache.put(script_id, script_info)
+            return script_info
     except Exception as e:
         logger.warning(f"从数据库获取脚本失败: {script_id} - {e}")
 
@@ -156,13 +170,15 @@ async def resolve_script_by_id(script_id: str) -> Dict[str, Any]:
             script_path = e2e_dir / f"{script_id}.spec.ts"
 
         if script_path.exists():
-            return {
+            script_info = {
                 "script_id": script_id,
                 "name": script_path.stem,  # 不包含扩展名的文件名
                 "file_name": script_path.name,
                 "path": str(script_path),
                 "description": f"脚本: {script_path.name}"
             }
+            script_resolution_cache.put(script_id, script_info)
+            return script_info
     except Exception as e:
         logger.warning(f"从文件系统获取脚本失败: {script_id} - {e}")
 
@@ -171,23 +187,17 @@ async def resolve_script_by_id(script_id: str) -> Dict[str, Any]:
 
 
 def get_available_scripts() -> List[Dict[str, Any]]:
-    """获取e2e目录下可用的脚本列表"""
+    """获取e2e目录下可用的脚本列表（目录扫描结果由脚本解析缓存维护）"""
     try:
-        e2e_dir = PLAYWRIGHT_WORKSPACE / "e2e"
-        if not e2e_dir.exists():
-            return []
-        
-        scripts = []
-        for script_file in e2e_dir.glob("*.spec.ts"):
-            if script_file.name != "fixture.ts":  # 排除fixture文件
-                scripts.append({
-                    "name": script_file.name,
-                    "path": str(script_file),
-                    "size": script_file.stat().st_size,
-                    "modified": datetime.fromtimestamp(script_file.stat().st_mtime).isoformat()
-                })
-        
-        return sorted(scripts, key=lambda x: x["modified"], reverse=True)
+        return [
+            {
+                "name": script["name"],
+                "path": script["path"],
+                "size": script["size"],
+                "modified": datetime.fromtimestamp(script["mtime"]).isoformat()
+            }
+            for script in script_resolution_cache.list_scripts()
+        ]
     
     except Exception as e:
         logger.error(f"获取可用脚本列表失败: {str(e)}")
@@ -235,6 +245,8 @@ async def execute_script_by_id(request: UnifiedScriptExecutionRequest):
         UnifiedScriptExecutionResponse: 执行响应
     """
     try:
+        workload_manager.check_admission(RESOURCE_EXECUTION, INTERACTIVE)
+
         # 解析脚本信息
         script_info = await resolve_script_by_id(request.script_id)
 
@@ -245,6 +257,7 @@ async def execute_script_by_id(request: UnifiedScriptExecutionRequest):
         session_data = {
             "session_id": session_id,
             "type": "single_script",
+            "workload": INTERACTIVE,
             "script_id": request.script_id,
             "script_info": script_info,
             "execution_config": request.execution_config or {},
@@ -297,6 +310,8 @@ async def batch_execute_scripts_by_ids(request: UnifiedBatchExecutionRequest):
         UnifiedBatchExecutionResponse: 批量执行响应
     """
     try:
+        workload_manager.check_admission(RESOURCE_EXECUTION, BATCH)
+
         # 解析所有脚本信息
         script_infos = []
         for script_id in request.script_ids:
@@ -317,6 +332,7 @@ async def batch_execute_scripts_by_ids(request: UnifiedBatchExecutionRequest):
         session_data = {
             "session_id": session_id,
             "type": "batch_scripts",
+            "workload": BATCH,
             "script_ids": request.script_ids,
             "script_infos": script_infos,
             "execution_config": request.execution_config or {},
@@ -381,6 +397,8 @@ async def execute_single_script(
         Dict: 包含session_id的响应
     """
     try:
+        workload_manager.check_admission(RESOURCE_EXECUTION, INTERACTIVE)
+
         # 验证脚本是否存在
         e2e_dir = PLAYWRIGHT_WORKSPACE / "e2e"
         script_path = e2e_dir / script_name
@@ -408,6 +426,7 @@ async def execute_single_script(
         # 存储会话信息
         active_sessions[session_id] = {
             "type": "single_script",
+            "workload": INTERACTIVE,
             "script_name": script_name,
             "execution_config": config,
             "status": "initialized",
@@ -467,6 +486,8 @@ async def execute_batch_scripts(
         Dict: 包含session_id的响应
     """
     try:
+        workload_manager.check_admission(RESOURCE_EXECUTION, BATCH)
+
         # 解析脚本名称列表
         script_list = [name.strip() for name in script_names.split(",") if name.strip()]
         
@@ -508,6 +529,7 @@ async def execute_batch_scripts(
         # 存储会话信息
         active_sessions[session_id] = {
             "type": "batch_scripts",
+            "workload": BATCH,
             "script_names": script_list,
             "execution_config": config,
             "parallel_execution": parallel_execution,
@@ -588,12 +610,21 @@ async def stream_script_execution(
         logger.info(f"启动脚本执行处理任务: {session_id}")
         # 根据会话类型选择处理函数
         session_info = active_sessions[session_id]
-        if "script_info" in session_info or "script_infos" in session_info:
-            # 统一执行任务
-            asyncio.create_task(process_unified_execution_task(session_id))
+        if job_queue.enabled:
+            # 批量执行的优先级低于单脚本执行
+            priority = 0 if session_info.get("type") == "batch_scripts" else 10
+            await submit_session_job("web.script_execution", session_id, active_sessions, message_queues, priority)
         else:
-            # 传统执行任务
-            asyncio.create_task(process_script_execution_task(session_id))
+            # 执行任务及其中启动的运行时继承会话的工作负载类别和取消令牌
+            token = cancellation_registry.token(session_id)
+            with workload_scope(session_info.get("workload")), cancellation_scope(token):
+                if "script_info" in session_info or "script_infos" in session_info:
+                    # 统一执行任务
+                    task = asyncio.create_task(process_unified_execution_task(session_id))
+                else:
+                    # 传统执行任务
+                    task = asyncio.create_task(process_script_execution_task(session_id))
+            cancellation_registry.track(session_id, task)
 
     # 返回SSE响应
     response = EventSourceResponse(
@@ -645,6 +676,7 @@ async def script_event_generator(session_id: str, request: Request):
             try:
                 # 使用适中的超时时间，减少ping消息频率
                 message = await asyncio.wait_for(message_queue.get(), timeout=5.0)
+                observe_queue_depth("script_execution", message_queue.qsize())
 
                 logger.debug(f"成功从队列获取消息: {message.type} - {message.content[:50]}...")
 
@@ -1107,6 +1139,17 @@ async def execute_single_script_internal(session_id: str, script_name: str,
     await orchestrator.execute_playwright_script(playwright_request)
 
 
+@job_handler("web.script_execution", queue="execution", max_attempts=2)
+async def run_script_execution_job(ctx: JobContext) -> Dict[str, Any]:
+    """worker进程中运行脚本执行（执行失败不重试，仅在worker失联时由其他worker接管）"""
+    session_info = ctx.job.payload["session"]
+    if "script_info" in session_info or "script_infos" in session_info:
+        process = process_unified_execution_task
+    else:
+        process = process_script_execution_task
+    return await run_session_job(ctx, active_sessions, message_queues, process)
+
+
 @router.get("/sessions")
 async def list_sessions():
     """列出所有活动会话"""
@@ -1155,7 +1198,9 @@ async def delete_session(session_id: str):
     if session_id not in active_sessions:
         raise HTTPException(status_code=404, detail=f"会话 {session_id} 不存在或已过期")
 
-    # 删除会话资源
+    # 中止执行并删除会话资源
+    cancellation_registry.cancel(session_id)
+    cancellation_registry.release(session_id)
     active_sessions.pop(session_id, None)
     message_queues.pop(session_id, None)
     script_statuses.pop(session_id, None)
@@ -1177,6 +1222,14 @@ async def stop_session(session_id: str):
     active_sessions[session_id]["status"] = "stopped"
     active_sessions[session_id]["stopped_at"] = datetime.now().isoformat()
 
+    # 取消队列中的任务
+    job_id = active_sessions[session_id].get("job_id")
+    if job_id:
+        await job_queue.cancel(job_id)
+
+    # 中止进行中的执行：大模型请求、Playwright进程组和占用的执行名额在宽限时间内释放
+    cancellation_registry.cancel(session_id)
+
     # 发送停止消息到队列
     message_queue = message_queues.get(session_id)
     if message_queue:
@@ -1276,6 +1329,7 @@ async def create_script_execution_session(
     Returns:
         str: 会话ID
     """
+    workload_manager.check_admission(RESOURCE_EXECUTION, INTERACTIVE)
     try:
         # 生成会话ID
         session_id = f"db_exec_{uuid.uuid4().hex[:8]}_{int(datetime.now().timestamp())}"
@@ -1301,6 +1355,7 @@ async def create_script_execution_session(
         session_info = {
             "session_id": session_id,
             "type": "single_script",
+            "workload": INTERACTIVE,
             "script_name": script_name,
             "script_path": temp_file_path,
             "script_content": script_content,
@@ -1350,6 +1405,7 @@ async def create_batch_execution_session(
     Returns:
         str: 会话ID
     """
+    workload_manager.check_admission(RESOURCE_EXECUTION, BATCH)
     try:
         # 生成会话ID
         session_id = f"db_batch_{uuid.uuid4().hex[:8]}_{int(datetime.now().timestamp())}"
@@ -1380,6 +1436,7 @@ async def create_batch_execution_session(
         session_info = {
             "session_id": session_id,
             "type": "batch_scripts",
+            "workload": BATCH,
             "script_names": script_names,
             "scripts_dir": temp_dir,
             "execution_config": execution_config,
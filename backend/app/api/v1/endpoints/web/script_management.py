@@ -16,6 +16,7 @@ from app.models.test_scripts import (
 )
 from app.services.database_script_service import database_script_service
 from app.core.logging import get_logger
+from app.utils.file_utils import read_upload_limited
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -295,10 +296,8 @@ async def upload_script(
                 detail=f"不支持的文件格式。支持的格式: {', '.join(allowed_extensions)}"
             )
 
-        # 读取文件内容
-        content = await file.read()
-        if len(content) > 10 * 1024 * 1024:  # 10MB限制
-            raise HTTPException(status_code=400, detail="文件大小不能超过10MB")
+        # 读取文件内容（10MB限制，超过时提前拒绝）
+        content = await read_upload_limited(file, 10 * 1024 * 1024)
 
         script_content = content.decode('utf-8')
 
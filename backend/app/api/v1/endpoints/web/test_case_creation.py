@@ -21,6 +21,7 @@ from app.core.messages import StreamMessage
 from app.core.messages.web import WebTestCaseGenerationRequest
 from app.core.types import AgentPlatform
 from app.services.web.orchestrator_service import get_web_orchestrator
+from app.core.metrics import observe_queue_depth
 
 
 router = APIRouter()
@@ -306,6 +307,7 @@ async def stream_test_case_analysis(session_id: str):
                 try:
                     # 等待消息，设置超时
                     message = await asyncio.wait_for(queue.get(), timeout=30.0)
+                    observe_queue_depth("test_case_creation", queue.qsize())
                     
                     # 构建SSE数据
                     data = {
@@ -4,19 +4,26 @@
 import os
 from pathlib import Path
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse
 from sqlalchemy import desc
 
 from app.database.connection import db_manager
 from app.database.models.reports import TestReport
 from app.services.test_report_service import test_report_service
+from app.services.execution_log_store import execution_log_store
+from app.services.blob_store import blob_store
+from app.services.report_serving import serve_report_file
+from app.services.midscene_report import midscene_report_splitter, parse_asset_name, ASSET_MEDIA_TYPES
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
 router = APIRouter()
 
+# 单次日志范围读取的最大行数
+MAX_LOG_LINES_PER_REQUEST = 5000
+
 
 @router.get("/script/{script_id}/latest")
 async def get_latest_report_by_script_id(script_id: str):
@@ -66,7 +73,7 @@ async def get_reports_by_session_id(session_id: str):
         
         return {
             "success": True,
-            "data": [report.to_dict() for report in reports],
+            "data": [report.to_summary_dict() for report in reports],
             "total": len(reports),
             "message": "获取测试报告列表成功"
         }
@@ -75,17 +82,99 @@ async def get_reports_by_session_id(session_id: str):
         raise HTTPException(status_code=500, detail=f"获取测试报告列表失败: {str(e)}")
 
 
+@router.get("/logs/{execution_id}")
+async def get_execution_logs(
+    execution_id: str,
+    start: int = Query(0, ge=0, description="起始行号（从0开始）"),
+    end: Optional[int] = Query(None, ge=0, description="结束行号（不含）")
+):
+    """按行范围读取执行日志"""
+    try:
+        if end is None or end - start > MAX_LOG_LINES_PER_REQUEST:
+            end = start + MAX_LOG_LINES_PER_REQUEST
+
+        if execution_log_store.exists(execution_id):
+            total_lines = await execution_log_store.line_count(execution_id)
+            lines = await execution_log_store.read_range(execution_id, start, end)
+        else:
+            # 兼容日志存储上线前的报告：从报告记录中读取
+            report = await test_report_service.get_report_by_execution_id(execution_id)
+            if not report:
+                raise HTTPException(status_code=404, detail=f"未找到执行ID {execution_id} 的日志")
+            report_logs = report.logs or []
+            total_lines = len(report_logs)
+            lines = report_logs[start:end]
+
+        return {
+            "success": True,
+            "data": {
+                "execution_id": execution_id,
+                "start": start,
+                "end": start + len(lines),
+                "total_lines": total_lines,
+                "lines": lines
+            },
+            "message": "获取执行日志成功"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取执行日志失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取执行日志失败: {str(e)}")
+
+
+@router.get("/logs/{execution_id}/tail")
+async def tail_execution_logs(
+    execution_id: str,
+    lines: int = Query(100, ge=1, le=MAX_LOG_LINES_PER_REQUEST, description="读取的行数")
+):
+    """读取执行日志的最后若干行"""
+    try:
+        if execution_log_store.exists(execution_id):
+            total_lines = await execution_log_store.line_count(execution_id)
+            tail_lines = await execution_log_store.tail(execution_id, lines)
+        else:
+            report = await test_report_service.get_report_by_execution_id(execution_id)
+            if not report:
+                raise HTTPException(status_code=404, detail=f"未找到执行ID {execution_id} 的日志")
+            report_logs = report.logs or []
+            total_lines = len(report_logs)
+            tail_lines = report_logs[-lines:]
+
+        return {
+            "success": True,
+            "data": {
+                "execution_id": execution_id,
+                "start": total_lines - len(tail_lines),
+                "end": total_lines,
+                "total_lines": total_lines,
+                "lines": tail_lines
+            },
+            "message": "获取执行日志成功"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取执行日志失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取执行日志失败: {str(e)}")
+
+
 @router.get("/view/{execution_id}")
-async def view_report_html(execution_id: str, force: bool = False):
-    """查看HTML测试报告"""
+async def view_report_html(request: Request, execution_id: str, force: bool = False, raw: bool = False):
+    """查看HTML测试报告（已拆分的MidScene报告返回轻量查看页面，raw=true 时返回原始报告）"""
     try:
         # 获取报告记录
         report = await test_report_service.get_report_by_execution_id(execution_id)
         if not report:
             raise HTTPException(status_code=404, detail=f"未找到执行ID {execution_id} 的测试报告")
 
+        if not raw and midscene_report_splitter.find_timeline(report.artifacts):
+            return HTMLResponse(content=midscene_report_splitter.render_viewer(execution_id))
+
         # 获取报告文件路径
-        report_path = await test_report_service.get_report_file_path(execution_id)
+        report_path = await midscene_report_splitter.original_path(
+            await test_report_service.get_report_file_path(execution_id), report.artifacts
+        )
         if not report_path or not os.path.exists(report_path):
             # 如果找不到报告文件，返回详细错误信息
             error_msg = f"测试报告文件不存在"
@@ -126,7 +215,7 @@ async def view_report_html(execution_id: str, force: bool = False):
                 <div class="info">
                     建议下载到本地查看，或者优化测试配置以减少报告大小
                 </div>
-                <a href="/api/v1/web/reports/download/{report_id}" class="download-btn">下载报告文件</a>
+                <a href="/api/v1/web/reports/download/{execution_id}" class="download-btn">下载报告文件</a>
                 <br><br>
                 <button onclick="loadReport()" style="background: #28a745; color: white; padding: 10px 20px; border: none; border-radius: 5px; cursor: pointer;">
                     仍要在浏览器中查看
@@ -135,7 +224,7 @@ async def view_report_html(execution_id: str, force: bool = False):
                 <script>
                 function loadReport() {{
                     if (confirm('文件较大，可能导致浏览器卡顿。确定要继续吗？')) {{
-                        window.location.href = '/api/v1/web/reports/view/{report_id}?force=true';
+                        window.location.href = '/api/v1/web/reports/view/{execution_id}?force=true';
                     }}
                 }}
                 </script>
@@ -144,27 +233,8 @@ async def view_report_html(execution_id: str, force: bool = False):
             """
             return HTMLResponse(content=warning_html, media_type="text/html")
 
-        # 读取HTML文件内容并直接返回
-        try:
-            with open(report_path, 'r', encoding='utf-8') as f:
-                html_content = f.read()
-
-            return HTMLResponse(
-                content=html_content,
-                media_type="text/html"
-            )
-        except UnicodeDecodeError:
-            # 如果UTF-8解码失败，尝试其他编码
-            try:
-                with open(report_path, 'r', encoding='gbk') as f:
-                    html_content = f.read()
-                return HTMLResponse(
-                    content=html_content,
-                    media_type="text/html"
-                )
-            except Exception as e:
-                logger.error(f"读取报告文件失败: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"读取报告文件失败: {str(e)}")
+        # 流式返回报告文件（支持预压缩、条件请求和Range）
+        return serve_report_file(request, report_path, immutable=blob_store.owns(report_path))
 
     except HTTPException:
         raise
@@ -174,7 +244,7 @@ async def view_report_html(execution_id: str, force: bool = False):
 
 
 @router.get("/view/script/{script_id}")
-async def view_latest_report_by_script_id(script_id: str):
+async def view_latest_report_by_script_id(request: Request, script_id: str, raw: bool = False):
     """根据脚本ID查看最新的HTML测试报告"""
     try:
         # 获取最新报告记录
@@ -182,8 +252,13 @@ async def view_latest_report_by_script_id(script_id: str):
         if not report:
             raise HTTPException(status_code=404, detail=f"未找到脚本 {script_id} 的测试报告")
 
+        if not raw and midscene_report_splitter.find_timeline(report.artifacts):
+            return HTMLResponse(content=midscene_report_splitter.render_viewer(report.execution_id))
+
         # 获取报告文件路径
-        report_path = await test_report_service.get_report_file_path_by_script_id(script_id)
+        report_path = await midscene_report_splitter.original_path(
+            await test_report_service.get_report_file_path_by_script_id(script_id), report.artifacts
+        )
         if not report_path or not os.path.exists(report_path):
             # 如果找不到报告文件，返回详细错误信息
             error_msg = f"脚本 {script_id} 的测试报告文件不存在"
@@ -193,27 +268,8 @@ async def view_latest_report_by_script_id(script_id: str):
 
         logger.info(f"返回脚本 {script_id} 的测试报告文件: {report_path}")
 
-        # 读取HTML文件内容并直接返回
-        try:
-            with open(report_path, 'r', encoding='utf-8') as f:
-                html_content = f.read()
-
-            return HTMLResponse(
-                content=html_content,
-                media_type="text/html"
-            )
-        except UnicodeDecodeError:
-            # 如果UTF-8解码失败，尝试其他编码
-            try:
-                with open(report_path, 'r', encoding='gbk') as f:
-                    html_content = f.read()
-                return HTMLResponse(
-                    content=html_content,
-                    media_type="text/html"
-                )
-            except Exception as e:
-                logger.error(f"读取报告文件失败: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"读取报告文件失败: {str(e)}")
+        # 流式返回报告文件（支持预压缩、条件请求和Range）
+        return serve_report_file(request, report_path, immutable=blob_store.owns(report_path))
 
     except HTTPException:
         raise
@@ -222,6 +278,37 @@ async def view_latest_report_by_script_id(script_id: str):
         raise HTTPException(status_code=500, detail=f"查看测试报告失败: {str(e)}")
 
 
+@router.get("/timeline/{execution_id}")
+async def get_report_timeline(request: Request, execution_id: str):
+    """获取拆分后的MidScene报告时间线（JSON）"""
+    try:
+        report = await test_report_service.get_report_by_execution_id(execution_id)
+        if not report:
+            raise HTTPException(status_code=404, detail=f"未找到执行ID {execution_id} 的测试报告")
+
+        timeline = midscene_report_splitter.find_timeline(report.artifacts)
+        if not timeline:
+            raise HTTPException(status_code=404, detail="该报告没有时间线数据")
+
+        return serve_report_file(request, timeline["path"], media_type="application/json", immutable=True)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取报告时间线失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取报告时间线失败: {str(e)}")
+
+
+@router.get("/assets/{name}")
+async def get_report_asset(request: Request, name: str):
+    """获取报告截图（按内容哈希命名，可长期缓存）"""
+    parsed = parse_asset_name(name)
+    asset_path = midscene_report_splitter.asset_path(name) if parsed else None
+    if not asset_path:
+        raise HTTPException(status_code=404, detail="截图不存在")
+    return serve_report_file(request, asset_path, media_type=ASSET_MEDIA_TYPES[parsed[1]], immutable=True)
+
+
 @router.get("/list")
 async def list_reports(
     page: int = Query(1, ge=1, description="页码"),
@@ -234,8 +321,8 @@ async def list_reports(
         async with db_manager.get_session() as session:
             from sqlalchemy import select, func
 
-            # 构建基础查询
-            stmt = select(TestReport)
+            # 构建基础查询（列表视图只加载摘要列）
+            stmt = select(TestReport).options(*TestReport.summary_options())
             count_stmt = select(func.count(TestReport.id))
 
             # 添加过滤条件
@@ -260,7 +347,7 @@ async def list_reports(
 
             return {
                 "success": True,
-                "data": [report.to_dict() for report in reports],
+                "data": [report.to_summary_dict() for report in reports],
                 "pagination": {
                     "page": page,
                     "page_size": page_size,
@@ -290,14 +377,22 @@ async def delete_report(report_id: int):
             if not report:
                 raise HTTPException(status_code=404, detail=f"未找到ID为 {report_id} 的测试报告")
 
-            # 删除报告文件（可选）
-            if report.report_path and os.path.exists(report.report_path):
+            # 删除报告文件（可选）；内容寻址存储中的报告只释放引用，由垃圾回收删除
+            if await blob_store.release_path(report.report_path):
+                logger.info(f"已释放报告内容块引用: {report.report_path}")
+            elif report.report_path and os.path.exists(report.report_path):
                 try:
                     os.remove(report.report_path)
                     logger.info(f"已删除报告文件: {report.report_path}")
                 except Exception as e:
                     logger.warning(f"删除报告文件失败: {str(e)}")
 
+            # 释放拆分出的时间线和截图
+            await midscene_report_splitter.release(report.artifacts)
+
+            # 删除执行日志
+            await execution_log_store.delete(report.execution_id)
+
             # 删除MySQL数据库记录
             await session.delete(report)
             await session.commit()
@@ -343,7 +438,12 @@ async def get_report_stats():
             success_rate = (passed_reports / total_reports * 100) if total_reports > 0 else 0
 
             # 最近的报告
-            recent_stmt = select(TestReport).order_by(desc(TestReport.created_at)).limit(5)
+            recent_stmt = (
+                select(TestReport)
+                .options(*TestReport.summary_options())
+                .order_by(desc(TestReport.created_at))
+                .limit(5)
+            )
             recent_result = await session.execute(recent_stmt)
             recent_reports = recent_result.scalars().all()
 
@@ -355,7 +455,7 @@ async def get_report_stats():
                     "failed_reports": failed_reports,
                     "error_reports": error_reports,
                     "success_rate": round(success_rate, 2),
-                    "recent_reports": [report.to_dict() for report in recent_reports]
+                    "recent_reports": [report.to_summary_dict() for report in recent_reports]
                 },
                 "message": "获取统计信息成功"
             }
@@ -366,7 +466,7 @@ async def get_report_stats():
 
 
 @router.get("/download/{execution_id}")
-async def download_report_file(execution_id: str):
+async def download_report_file(request: Request, execution_id: str):
     """下载测试报告文件"""
     try:
         # 获取报告记录
@@ -375,7 +475,9 @@ async def download_report_file(execution_id: str):
             raise HTTPException(status_code=404, detail=f"未找到执行ID {execution_id} 的测试报告")
 
         # 获取报告文件路径
-        report_path = await test_report_service.get_report_file_path(execution_id)
+        report_path = await midscene_report_splitter.original_path(
+            await test_report_service.get_report_file_path(execution_id), report.artifacts
+        )
         if not report_path or not os.path.exists(report_path):
             raise HTTPException(status_code=404, detail="测试报告文件不存在")
 
@@ -385,13 +487,8 @@ async def download_report_file(execution_id: str):
         from datetime import datetime
         filename = f"test_report_{execution_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
 
-        # 返回文件下载响应
-        from fastapi.responses import FileResponse
-        return FileResponse(
-            path=report_path,
-            filename=filename,
-            media_type="text/html"
-        )
+        # 返回文件下载响应（支持Range断点续传）
+        return serve_report_file(request, report_path, filename=filename, immutable=blob_store.owns(report_path))
 
     except HTTPException:
         raise
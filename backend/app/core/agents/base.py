@@ -11,6 +11,9 @@ from autogen_core import RoutedAgent, TopicId, MessageContext, ClosureContext
 from loguru import logger
 
 from app.core.types import AgentPlatform, MessageRegion, TopicTypes
+from app.core.metrics import observe_agent_stage, record_failure
+from app.core.tracing import tracer
+from app.core.cancellation import CancelScope, current_cancellation_token
 from app.core.messages.base import StreamMessage
 
 
@@ -37,6 +40,31 @@ class BaseAgent(RoutedAgent, ABC):
 
         logger.info(f"初始化 {agent_name} 智能体 (ID: {agent_id})")
 
+    async def on_message_impl(self, message: Any, ctx: MessageContext) -> Any:
+        """
+        在消息携带的追踪上下文下处理消息，每次处理记录为一个span；
+        会话被取消时中止处理（进行中的大模型请求和子进程随之结束）
+        """
+        attributes = {"agent": self.agent_name, "message_type": type(message).__name__}
+        session_id = getattr(message, "session_id", None)
+        if session_id:
+            attributes["session_id"] = session_id
+        with tracer.start_span(
+            f"{self.agent_name}.{type(message).__name__}", kind="agent",
+            attributes=attributes, parent=tracer.extract(message)
+        ):
+            with CancelScope(suppress=True):
+                return await super().on_message_impl(message, ctx)
+            logger.info(f"[{self.agent_name}] 会话已取消，中止处理: {session_id}")
+            return None
+
+    async def publish_message(self, message: Any, topic_id: TopicId, *, cancellation_token=None) -> None:
+        """发布消息前写入当前追踪上下文，默认携带当前会话的取消令牌"""
+        tracer.inject(message)
+        if cancellation_token is None:
+            cancellation_token = current_cancellation_token()
+        await super().publish_message(message, topic_id, cancellation_token=cancellation_token)
+
     async def send_message(self, content: str, message_type: str = "message",
                           is_final: bool = False, result: Optional[Dict[str, Any]] = None,
                           region: Union[str, MessageRegion] = MessageRegion.PROCESS, source= None) -> None:
@@ -72,7 +100,7 @@ class BaseAgent(RoutedAgent, ABC):
             topic_id=TopicId(type=TopicTypes.STREAM_OUTPUT.value, source=self.id.key)
         )
 
-        logger.debug(f"[{self.agent_name}] 发送{message_type}: {content[:50]}...")
+        logger.debug("[{}] 发送{}: {:.50}...", self.agent_name, message_type, content)
 
     async def send_response(self, content: str, is_final: bool = False,
                           result: Optional[Dict[str, Any]] = None,
@@ -124,6 +152,7 @@ class BaseAgent(RoutedAgent, ABC):
         """
         error_msg = f"在{func_name}中发生错误: {str(exception)}"
         logger.error(f"[{self.agent_name}] {error_msg}")
+        record_failure(self.agent_name, type(exception).__name__)
 
         if send_error_message:
             await self.send_error(error_msg)
@@ -146,7 +175,7 @@ class BaseAgent(RoutedAgent, ABC):
             "agent": self.agent_name
         }
 
-        logger.debug(f"[{self.agent_name}] 开始性能监控: {operation_name} (ID: {monitor_id})")
+        logger.debug("[{}] 开始性能监控: {} (ID: {})", self.agent_name, operation_name, monitor_id)
         return monitor_id
 
     def end_performance_monitoring(self, monitor_id: str,
@@ -177,6 +206,7 @@ class BaseAgent(RoutedAgent, ABC):
 
         if log_result:
             logger.info(f"[{self.agent_name}] {metric['operation']} 耗时: {duration:.2f}秒")
+        observe_agent_stage(self.agent_name, metric["operation"], duration)
 
         # 清理已完成的监控
         del self.performance_metrics[monitor_id]
@@ -62,7 +62,7 @@ class StreamResponseCollector:
             metadata: 会话元数据
         """
         self.session_metadata.update(metadata)
-        logger.debug(f"设置会话元数据: {list(metadata.keys())}")
+        logger.debug("设置会话元数据: {}", list(metadata))
 
     def add_result(self, key: str, value: Any) -> None:
         """添加结果数据
@@ -72,7 +72,7 @@ class StreamResponseCollector:
             value: 结果值
         """
         self.results[key] = value
-        logger.debug(f"添加结果数据: {key}")
+        logger.debug("添加结果数据: {}", key)
 
     def get_result(self, key: str, default: Any = None) -> Any:
         """获取结果数据
@@ -98,7 +98,7 @@ class StreamResponseCollector:
             "platform": self.platform.value
         }
         self.collected_data.append(data_with_timestamp)
-        logger.debug(f"添加收集数据: {data.get('type', 'unknown')}")
+        logger.debug("添加收集数据: {}", data.get('type', 'unknown'))
 
     def get_all_results(self) -> Dict[str, Any]:
         """获取所有结果数据
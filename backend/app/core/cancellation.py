@@ -0,0 +1,149 @@
+"""
+会话取消
+每个会话对应一个 autogen CancellationToken，停止会话时取消令牌：
+- 令牌通过 ContextVar 传递，会话处理任务及其中启动的智能体运行时都能取到；
+- 智能体处理消息、run_stream 循环所在的任务与令牌关联，取消时任务被取消，进行中的大模型HTTP流随之关闭，
+  占用的并发名额在退出时释放；
+- 子进程在独立进程组中启动，取消时先发送 SIGTERM，超过宽限时间后 SIGKILL 整个进程组（含浏览器子进程）。
+"""
+import os
+import sys
+import signal
+import asyncio
+import subprocess
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from autogen_core import CancellationToken
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_current_token: ContextVar[Optional[CancellationToken]] = ContextVar("cancellation_token", default=None)
+
+
+def current_cancellation_token() -> Optional[CancellationToken]:
+    """当前会话的取消令牌，不在会话中时为 None"""
+    return _current_token.get()
+
+
+@contextmanager
+def cancellation_scope(token: Optional[CancellationToken]) -> Iterator[Optional[CancellationToken]]:
+    """在当前上下文中设置取消令牌，期间创建的任务继承该令牌"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+class CancelScope:
+    """令牌取消时取消当前任务；由令牌引起的 CancelledError 在退出时可以被吞掉"""
+
+    def __init__(self, token: Optional[CancellationToken] = None, suppress: bool = False):
+        self.token = token if token is not None else current_cancellation_token()
+        self.suppress = suppress
+        self.cancelled = False
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _cancel(self) -> None:
+        task = self._task
+        if task is None or task.done():
+            return
+        self.cancelled = True
+        # 令牌可能在其他线程中被取消
+        self._loop.call_soon_threadsafe(task.cancel)
+
+    def __enter__(self) -> "CancelScope":
+        if self.token is not None:
+            self._task = asyncio.current_task()
+            self._loop = asyncio.get_running_loop()
+            self.token.add_callback(self._cancel)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        # autogen 的令牌不支持移除回调，退出后回调不再生效
+        task, self._task = self._task, None
+        if exc_type is asyncio.CancelledError and self.cancelled and self.suppress:
+            if task is not None and hasattr(task, "uncancel"):
+                task.uncancel()
+            return True
+        return False
+
+
+class CancellationRegistry:
+    """按会话ID管理取消令牌"""
+
+    def __init__(self):
+        self._tokens: Dict[str, CancellationToken] = {}
+
+    def token(self, session_id: str) -> CancellationToken:
+        """获取会话的取消令牌，不存在时创建"""
+        token = self._tokens.get(session_id)
+        if token is None:
+            token = self._tokens[session_id] = CancellationToken()
+        return token
+
+    def cancel(self, session_id: str) -> bool:
+        """取消会话，会话没有运行中的处理时返回 False"""
+        token = self._tokens.get(session_id)
+        if token is None:
+            return False
+        if not token.is_cancelled():
+            logger.info(f"取消会话: {session_id}")
+            token.cancel()
+        return True
+
+    def is_cancelled(self, session_id: str) -> bool:
+        token = self._tokens.get(session_id)
+        return token is not None and token.is_cancelled()
+
+    def release(self, session_id: str) -> None:
+        """会话清理时移除令牌（智能体的处理可能晚于会话处理任务结束，不能在任务结束时移除）"""
+        self._tokens.pop(session_id, None)
+
+    def track(self, session_id: str, task: asyncio.Task) -> asyncio.Task:
+        """会话处理任务随令牌取消"""
+        self.token(session_id).link_future(task)
+        return task
+
+
+def process_group_kwargs() -> Dict[str, Any]:
+    """让子进程在独立进程组中启动，取消时可以连同其子进程一起结束"""
+    if sys.platform == "win32":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def _signal_group(process: asyncio.subprocess.Process, force: bool) -> None:
+    try:
+        if sys.platform != "win32":
+            os.killpg(process.pid, signal.SIGKILL if force else signal.SIGTERM)
+        elif force:
+            process.kill()
+        else:
+            process.terminate()
+    except ProcessLookupError:
+        pass
+
+
+async def terminate_process(process: asyncio.subprocess.Process, grace: Optional[float] = None) -> Optional[int]:
+    """结束子进程所在的进程组：先 SIGTERM，宽限时间内未退出则 SIGKILL"""
+    if process.returncode is not None:
+        return process.returncode
+    grace = settings.SUBPROCESS_KILL_GRACE_SECONDS if grace is None else grace
+    _signal_group(process, force=False)
+    try:
+        return await asyncio.wait_for(process.wait(), timeout=grace)
+    except asyncio.TimeoutError:
+        logger.warning(f"子进程未在 {grace}s 内退出，强制结束: {process.pid}")
+        _signal_group(process, force=True)
+        return await process.wait()
+
+
+# 全局会话取消注册表实例
+cancellation_registry = CancellationRegistry()
@@ -28,10 +28,14 @@ class ApplicationSettings(BaseSettings):
     PORT: int = 8000
     RELOAD: bool = True
 
+    # 启动配置
+    STARTUP_IMPORT_BUDGET: float = 3.0  # 导入 app.main 的耗时预算（秒），由 scripts/profile_imports.py 在CI中检查
+
     # 安全配置
     SECRET_KEY: str = "your-secret-key-here-please-change-in-production"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
     ALGORITHM: str = "HS256"
+    ADMIN_TOKEN: str = ""  # 管理接口令牌（请求头 X-Admin-Token），为空时管理接口不可用
 
     # CORS配置
     BACKEND_CORS_ORIGINS: str = "http://localhost:3000,http://localhost:3001,http://127.0.0.1:3000,http://127.0.0.1:3001"
@@ -160,6 +164,21 @@ class AIModelSettings(BaseSettings):
 
     # 默认多模态模型选择策略
     DEFAULT_MULTIMODAL_MODEL: str = "qwen_vl"
+
+    # 模型客户端预加载：eager 启动时创建；background 启动完成后在后台线程中创建；lazy 首次使用时创建
+    AI_MODEL_PRELOAD: str = "background"
+
+    # 模型服务HTTP连接池（deepseek、qwen_vl、uitars 共用默认值，LLM_HTTP_POOL_OVERRIDES 按服务覆盖）
+    LLM_HTTP_MAX_CONNECTIONS: int = 20
+    LLM_HTTP_MAX_KEEPALIVE: int = 10
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = 120.0  # 空闲连接保留时间（秒），需大于保活间隔
+    LLM_HTTP2: bool = True  # 需要安装 h2，未安装时使用 HTTP/1.1
+    LLM_HTTP_CONNECT_TIMEOUT: float = 10.0
+    # 形如 "uitars:max_connections=8,http2=false;deepseek:keepalive_expiry=60"
+    LLM_HTTP_POOL_OVERRIDES: str = ""
+    # 空闲超过该时间（秒）的服务发送一次轻量请求保持连接，0 表示不保活
+    LLM_KEEP_WARM_INTERVAL: float = 60.0
+
 class FileStorageSettings(BaseSettings):
     """文件存储配置"""
 
@@ -184,6 +203,37 @@ class FileStorageSettings(BaseSettings):
     YAML_OUTPUT_DIR: str = "uploads/yaml"
     PLAYWRIGHT_OUTPUT_DIR: str = "uploads/playwright"
     MAX_IMAGE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 上传文件分块读取大小
+
+    # 内容寻址存储（上传、生成脚本和报告按内容去重保存）
+    BLOB_STORE_ENABLED: bool = True
+    BLOB_STORE_DIR: str = "data/blobs"
+    BLOB_MATERIALIZE_MODE: str = "auto"  # 只读副本：auto（reflink→硬链接→复制）/reflink/hardlink/copy；可编辑文件不使用硬链接
+    BLOB_GC_GRACE_HOURS: float = 24.0  # 引用计数归零后保留的时间
+
+    # 报告预压缩（生成时写出 .gz/.br，查看时按 Accept-Encoding 直接返回）
+    REPORT_PRECOMPRESS: bool = True
+    REPORT_GZIP_LEVEL: int = 6
+    REPORT_BROTLI_QUALITY: int = 9  # 需要安装 brotli
+    REPORT_SPLIT_ENABLED: bool = True  # 拆分MidScene报告为JSON时间线和去重截图（需启用内容寻址存储）
+    REPORT_SPLIT_KEEP_ORIGINAL: bool = False  # 保留原始报告文件；关闭时只在还原结果逐字节一致时用骨架替换原始报告
+
+    # 磁盘保留策略（定期清理工作目录）
+    RETENTION_ENABLED: bool = True
+    RETENTION_INTERVAL_HOURS: float = 6.0
+    RETENTION_INITIAL_DELAY: float = 300.0  # 启动后首次清理的延迟（秒）
+    RETENTION_DELETE_CHUNK: int = 200  # 每批删除的条目数
+    RETENTION_TEMP_DAYS: float = 1.0  # temp_yaml_tests 执行目录
+    RETENTION_TEMP_MAX_MB: float = 2048.0
+    RETENTION_UPLOAD_DAYS: float = 30.0
+    RETENTION_PLAYWRIGHT_DAYS: float = 7.0  # playwright-report / test-results
+    RETENTION_PLAYWRIGHT_MAX_MB: float = 2048.0
+    RETENTION_REPORT_FILE_DAYS: float = 30.0  # midscene_run/report
+    RETENTION_REPORTS_PER_SCRIPT: int = 20  # 每个脚本保留的最近报告文件数
+    RETENTION_REPORT_DAYS: int = 90  # 测试报告数据库记录
+    RETENTION_LOG_DAYS: float = 30.0  # 轮转后的日志文件
+    RETENTION_CHECKPOINT_DAYS: float = 7.0  # 分析流水线检查点
+    RETENTION_CHECKPOINT_MAX_MB: float = 1024.0
 
 
 class AutomationSettings(BaseSettings):
@@ -206,6 +256,45 @@ class AutomationSettings(BaseSettings):
     AUTOGEN_CACHE_ENABLED: bool = True
     AUTOGEN_MAX_ROUND: int = 10
     AUTOGEN_TIMEOUT: int = 600  # 10分钟
+
+    # 会话取消：子进程组收到SIGTERM后等待退出的时间，超时后SIGKILL
+    SUBPROCESS_KILL_GRACE_SECONDS: float = 5.0
+
+
+class JobQueueSettings(BaseSettings):
+    """任务队列配置"""
+
+    # 关闭时分析和执行流程在API进程内运行；开启时只入队，由 scripts/run_worker.py 启动的worker进程执行
+    JOB_QUEUE_ENABLED: bool = False
+    JOB_QUEUE_BACKEND: str = "sqlite"  # sqlite 或 "模块路径:类名"
+    JOB_QUEUE_SQLITE_PATH: str = "data/jobs.db"
+    JOB_QUEUE_CONCURRENCY: str = "analysis=2,execution=1"  # 各队列并发上限（所有worker共享）
+    JOB_HANDLER_MODULES: str = "app.api.v1.endpoints.web.image_analysis,app.api.v1.endpoints.web.script_execution"
+    JOB_WORKER_PROCESSES: int = 1
+    JOB_VISIBILITY_TIMEOUT: float = 120.0  # worker未续期超过该时间后任务重新入队
+    JOB_HEARTBEAT_INTERVAL: float = 30.0
+    JOB_POLL_INTERVAL: float = 0.5
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF_BASE: float = 10.0  # 重试退避基数（秒），按 2^(n-1) 增长
+    JOB_RETRY_BACKOFF_MAX: float = 600.0
+    JOB_SHUTDOWN_TIMEOUT: float = 60.0  # worker停止时等待运行中任务的时间，超时后交还队列
+    JOB_RETENTION_HOURS: float = 72.0  # 已结束任务及进度事件的保留时间
+
+
+class WorkloadSettings(BaseSettings):
+    """工作负载分级与准入控制配置"""
+
+    WORKLOAD_CONTROL_ENABLED: bool = True
+    # 各资源按工作负载类别（interactive、batch、background）的并发预算，未列出的资源或类别不限制
+    WORKLOAD_BUDGETS: str = (
+        "llm:interactive=8,batch=4,background=2;"
+        "execution:interactive=2,batch=2,background=1;"
+        "db_write:interactive=10,batch=4,background=2"
+    )
+    WORKLOAD_MAX_QUEUE: int = 20  # 类别名额占满后允许排队的请求数，超过时接口返回429
+    WORKLOAD_QUEUE_TIMEOUT: float = 0.0  # 内部调用等待名额的最长时间（秒），0 表示一直等待
+
+
 class LoggingSettings(BaseSettings):
     """日志配置"""
 
@@ -213,6 +302,17 @@ class LoggingSettings(BaseSettings):
     LOG_FILE: str = "logs/app.log"
     LOG_ROTATION: str = "1 day"
     LOG_RETENTION: str = "30 days"
+    # development：同步写入、完整异常诊断；production：异步队列写入、JSON格式、热路径日志限流
+    LOG_PROFILE: str = "development"
+    LOG_HOT_PATH_RATE: float = 20.0  # production下每类热路径日志每秒最多输出条数
+    LOG_HOT_PATH_BURST: int = 50  # 热路径日志允许的突发条数
+
+    # 执行日志存储（按执行ID分段压缩存储）
+    EXECUTION_LOG_DIR: str = "logs/executions"
+    EXECUTION_LOG_SEGMENT_LINES: int = 1000  # 每个压缩分段的行数
+    EXECUTION_LOG_TAIL_LINES: int = 200  # 执行记录和报告中保留的尾部日志行数
+    EXECUTION_LOG_BATCH_LINES: int = 200  # 子进程输出累积到该行数后批量写入
+    EXECUTION_LOG_BATCH_INTERVAL: float = 1.0  # 距上次写入超过该秒数时批量写入
 
 
 class MonitoringSettings(BaseSettings):
@@ -222,6 +322,19 @@ class MonitoringSettings(BaseSettings):
     METRICS_PORT: int = 8001
     ENABLE_MONITORING: bool = True
 
+    # 链路追踪配置（进程内存储，无需外部采集器）
+    ENABLE_TRACING: bool = True
+    TRACE_BUFFER_SIZE: int = 200  # 保留的最近链路数
+    TRACE_MAX_SPANS: int = 2000  # 单条链路最多记录的span数
+
+    # 在线性能剖析（仅在通过管理接口启动后采样）
+    ENABLE_PROFILING: bool = True
+    PROFILER_DEFAULT_DURATION: float = 30.0  # 秒
+    PROFILER_MAX_DURATION: float = 300.0  # 秒
+    PROFILER_SAMPLE_INTERVAL: float = 0.005  # 调用栈采样间隔（秒）
+    PROFILER_LOOP_LAG_INTERVAL: float = 0.05  # 事件循环延迟探测间隔（秒）
+    PROFILER_BLOCKING_THRESHOLD: float = 0.1  # 事件循环阻塞超过该时长记为阻塞调用（秒）
+
 
 class FeatureSettings(BaseSettings):
     """功能开关配置"""
@@ -230,11 +343,39 @@ class FeatureSettings(BaseSettings):
     ENABLE_RATE_LIMITING: bool = True
     ENABLE_ASYNC_PROCESSING: bool = True
 
+    # 脚本解析缓存配置
+    SCRIPT_CACHE_TTL: int = 300  # 缓存条目最长有效期（秒），兜底文件监听遗漏的变更
+    SCRIPT_CACHE_POLL_INTERVAL: float = 2.0  # 无法使用文件监听时的目录轮询间隔（秒）
+    SCRIPT_INDEX_REFRESH_INTERVAL: float = 5.0  # 文件脚本索引按mtime同步磁盘变更的最小间隔（秒）
+
     # 混合检索配置
     HYBRID_RETRIEVAL_ENABLED: bool = True
     VECTOR_SEARCH_TOP_K: int = 10
     SIMILARITY_THRESHOLD: float = 0.7
 
+    # 本地向量索引配置
+    VECTOR_INDEX_DIR: str = "data/vector_index"
+    EMBEDDING_MODEL: str = "hashing"  # hashing 或本地 sentence-transformers 模型名/路径
+    EMBEDDING_DIMENSION: int = 512  # 特征哈希向量维度
+    VECTOR_ANN_THRESHOLD: int = 20000  # 向量数超过该值时使用IVF近似检索，否则暴力检索
+    VECTOR_IVF_NPROBE: int = 8  # IVF检索时探测的聚类数
+
+    # 检索增强脚本生成配置
+    RAG_GENERATION_ENABLED: bool = True
+    GENERATION_PROMPT_TOKEN_BUDGET: int = 3000  # 分析上下文的token预算（估算值）
+    GENERATION_CONTEXT_TOP_K: int = 12  # 从页面分析结果中选取的相关片段数
+    GENERATION_SCRIPT_EXAMPLES: int = 2  # 引用的历史成功脚本片段数
+
+    # 常见流程模板生成配置
+    TEMPLATE_GENERATION_ENABLED: bool = True
+    TEMPLATE_MATCH_THRESHOLD: float = 1.0  # 模板匹配置信度阈值，1.0 表示要求找齐流程所需的全部元素
+
+    # 分析流水线检查点配置
+    CHECKPOINT_ENABLED: bool = True
+    CHECKPOINT_DIR: str = "data/checkpoints"
+    CHECKPOINT_REUSE_TTL_HOURS: float = 24.0  # 超过该时长的分析检查点不再复用（重新生成脚本不受限制）
+    CHECKPOINT_MIN_CONFIDENCE: float = 0.8  # 置信度低于该值的分析结果不保存检查点
+
 
 class Settings(
     ApplicationSettings,
@@ -242,6 +383,8 @@ class Settings(
     AIModelSettings,
     FileStorageSettings,
     AutomationSettings,
+    JobQueueSettings,
+    WorkloadSettings,
     LoggingSettings,
     MonitoringSettings,
     FeatureSettings,
@@ -0,0 +1,221 @@
+"""
+模型服务连接管理
+每个模型服务（deepseek、qwen_vl、uitars）使用一个显式配置连接池的HTTP客户端：
+- openai SDK 默认的连接池只保留空闲连接5秒，稍有停顿后的请求就要重新做DNS解析、TLS握手和HTTP/2协商；
+- 预加载模型客户端后向各服务发送一次轻量请求（GET /models）预先建立连接；
+- 保活任务定期检查，空闲超过 LLM_KEEP_WARM_INTERVAL 的服务再发送一次轻量请求，保持连接池中的连接可用；
+- 记录每个服务的最近活动时间，大模型请求据此区分 first（启动后首个请求）、idle（连接可能已过期）和 warm，
+  首token时间按该状态分别统计。
+"""
+import time
+import asyncio
+import importlib.util
+from typing import Any, Dict, List, Optional
+
+import httpx
+from openai import DefaultAsyncHttpxClient
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import observe_llm_warmup
+
+logger = get_logger(__name__)
+
+# 模型服务及其配置项前缀
+PROVIDERS = {
+    "deepseek": "DEEPSEEK",
+    "qwen_vl": "QWEN_VL",
+    "uitars": "UI_TARS",
+}
+
+_POOL_KEYS = ("max_connections", "max_keepalive", "keepalive_expiry", "http2")
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _parse_value(key: str, value: str) -> Any:
+    if key == "http2":
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if key == "keepalive_expiry":
+        return float(value)
+    return int(value)
+
+
+def parse_pool_overrides(value: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """解析 "uitars:max_connections=8,http2=false;deepseek:keepalive_expiry=60" 形式的连接池覆盖配置"""
+    overrides: Dict[str, Dict[str, Any]] = {}
+    for section in (value if value is not None else settings.LLM_HTTP_POOL_OVERRIDES).split(";"):
+        provider, _, items = section.strip().partition(":")
+        if not provider.strip():
+            continue
+        pool = overrides.setdefault(provider.strip(), {})
+        for item in items.split(","):
+            key, _, raw = item.strip().partition("=")
+            key = key.strip()
+            if key in _POOL_KEYS and raw.strip():
+                pool[key] = _parse_value(key, raw)
+            elif key:
+                logger.warning(f"忽略未知的连接池配置: {provider.strip()}.{key}")
+    return overrides
+
+
+def pool_config(provider: str, overrides: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """服务的连接池配置：全局默认值叠加按服务的覆盖"""
+    config = {
+        "max_connections": settings.LLM_HTTP_MAX_CONNECTIONS,
+        "max_keepalive": settings.LLM_HTTP_MAX_KEEPALIVE,
+        "keepalive_expiry": settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+        "http2": settings.LLM_HTTP2,
+    }
+    config.update((overrides if overrides is not None else parse_pool_overrides()).get(provider, {}))
+    config["http2"] = bool(config["http2"]) and _HTTP2_AVAILABLE
+    return config
+
+
+class LLMConnectionManager:
+    """按模型服务管理HTTP客户端、连接预热和保活"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._configs: Dict[str, Dict[str, Any]] = {}
+        self._last_activity: Dict[str, float] = {}
+        self._requests: Dict[str, int] = {}
+        self._warmups: Dict[str, Dict[str, Any]] = {}
+        self._overrides: Optional[Dict[str, Dict[str, Any]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def http_client(self, provider: str) -> httpx.AsyncClient:
+        """获取服务的HTTP客户端，不存在时按连接池配置创建"""
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            if self._overrides is None:
+                self._overrides = parse_pool_overrides()
+            config = self._configs[provider] = pool_config(provider, self._overrides)
+            if settings.LLM_HTTP2 and not _HTTP2_AVAILABLE and not self._clients:
+                logger.warning("未安装 h2，模型服务连接使用 HTTP/1.1")
+            client = self._clients[provider] = DefaultAsyncHttpxClient(
+                http2=config["http2"],
+                limits=httpx.Limits(
+                    max_connections=config["max_connections"],
+                    max_keepalive_connections=config["max_keepalive"],
+                    keepalive_expiry=config["keepalive_expiry"],
+                ),
+                timeout=httpx.Timeout(600.0, connect=settings.LLM_HTTP_CONNECT_TIMEOUT),
+            )
+            logger.debug(f"创建模型服务HTTP客户端: {provider}, {config}")
+        return client
+
+    def begin_request(self, provider: str) -> str:
+        """记录一次大模型请求开始，返回连接状态：first、idle 或 warm"""
+        last = self._last_activity.get(provider)
+        if not self._requests.get(provider):
+            state = "first"
+        elif last is None or time.monotonic() - last > self._configs.get(provider, {}).get(
+                "keepalive_expiry", settings.LLM_HTTP_KEEPALIVE_EXPIRY):
+            state = "idle"
+        else:
+            state = "warm"
+        self._requests[provider] = self._requests.get(provider, 0) + 1
+        self._last_activity[provider] = time.monotonic()
+        return state
+
+    def touch(self, provider: str) -> None:
+        """记录服务的最近活动时间（请求结束时调用，连接在此之后进入空闲）"""
+        self._last_activity[provider] = time.monotonic()
+
+    async def warm(self, provider: str) -> Dict[str, Any]:
+        """向服务发送一次轻量请求（GET /models），建立或保持连接池中的连接"""
+        prefix = PROVIDERS[provider]
+        base_url = getattr(settings, f"{prefix}_BASE_URL").rstrip("/")
+        api_key = getattr(settings, f"{prefix}_API_KEY")
+        start = time.perf_counter()
+        try:
+            response = await self.http_client(provider).get(
+                f"{base_url}/models", headers={"Authorization": f"Bearer {api_key}"}
+            )
+            # 任何HTTP响应都说明连接已建立，状态码只用于排查
+            result = {"status_code": response.status_code, "http_version": response.http_version}
+            outcome = "ok"
+        except httpx.HTTPError as e:
+            result = {"error": str(e) or type(e).__name__}
+            outcome = "error"
+        duration = time.perf_counter() - start
+        observe_llm_warmup(provider, outcome, duration)
+        self.touch(provider)
+        result.update({"provider": provider, "duration_ms": round(duration * 1000, 1), "at": time.time()})
+        self._warmups[provider] = result
+        if outcome == "error":
+            logger.warning(f"模型服务连接预热失败: {provider}, {result['error']}")
+        return result
+
+    def configured_providers(self) -> List[str]:
+        """已配置API密钥的服务"""
+        return [provider for provider, prefix in PROVIDERS.items() if getattr(settings, f"{prefix}_API_KEY")]
+
+    async def warm_all(self) -> Dict[str, Dict[str, Any]]:
+        """并发预热所有已配置密钥的服务"""
+        providers = self.configured_providers()
+        results = await asyncio.gather(*(self.warm(provider) for provider in providers))
+        summary = {provider: result for provider, result in zip(providers, results)}
+        logger.info("模型服务连接预热: " + ", ".join(
+            f"{provider} {result['duration_ms']}ms" for provider, result in summary.items()
+        ))
+        return summary
+
+    async def _keep_warm_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval / 2)
+            now = time.monotonic()
+            idle = [
+                provider for provider in list(self._clients)
+                if now - self._last_activity.get(provider, 0.0) >= interval
+            ]
+            if idle:
+                await asyncio.gather(*(self.warm(provider) for provider in idle), return_exceptions=True)
+
+    def start_keep_warm(self) -> None:
+        """启动连接保活（需在事件循环中调用），只保活已创建HTTP客户端的服务"""
+        interval = settings.LLM_KEEP_WARM_INTERVAL
+        if self._task is not None or interval <= 0:
+            return
+        if interval >= settings.LLM_HTTP_KEEPALIVE_EXPIRY:
+            logger.warning(f"保活间隔 {interval}s 不小于空闲连接保留时间 {settings.LLM_HTTP_KEEPALIVE_EXPIRY}s，"
+                           f"连接可能在保活前过期")
+        self._task = asyncio.create_task(self._keep_warm_loop(interval), name="llm-keep-warm")
+        logger.info(f"模型服务连接保活已启动: 空闲 {interval}s 后发送保活请求")
+
+    async def close(self) -> None:
+        """停止保活并关闭HTTP客户端"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """各服务的连接池配置、请求数、空闲时间和最近一次预热结果"""
+        now = time.monotonic()
+        providers = {}
+        for provider in PROVIDERS:
+            last = self._last_activity.get(provider)
+            providers[provider] = {
+                "pool": self._configs.get(provider),
+                "client_created": provider in self._clients,
+                "requests": self._requests.get(provider, 0),
+                "idle_seconds": round(now - last, 1) if last is not None else None,
+                "last_warmup": self._warmups.get(provider),
+            }
+        return {
+            "http2_available": _HTTP2_AVAILABLE,
+            "keep_warm_interval": settings.LLM_KEEP_WARM_INTERVAL,
+            "keep_warm_running": self._task is not None and not self._task.done(),
+            "providers": providers,
+        }
+
+
+# 全局模型服务连接管理器实例
+llm_connections = LLMConnectionManager()
@@ -2,24 +2,98 @@
 大语言模型客户端配置
 支持DeepSeek-Chat、Qwen-VL-Max-Latest和UI-TARS等模型
 """
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, List, AsyncGenerator, Union
 from abc import ABC, abstractmethod
 
-from openai import AsyncOpenAI
-
+from autogen_core.models import CreateResult
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from loguru import logger
 
 from app.core.config import settings
+from app.core.metrics import observe_llm_request
+from app.core.llm_connections import llm_connections
+from app.core.tracing import tracer
+from app.core.workload import RESOURCE_LLM, workload_manager
+
+
+class MonitoredChatCompletionClient(OpenAIChatCompletionClient):
+    """
+    记录请求耗时、首token时间和token数的模型客户端，请求按当前工作负载类别占用大模型并发名额
+    使用 llm_connections 中按服务配置连接池的HTTP客户端，首token时间按连接状态（first、idle、warm）统计
+    """
+
+    def __init__(self, provider: str, **kwargs):
+        self._provider = provider
+        super().__init__(http_client=llm_connections.http_client(provider), **kwargs)
+
+    def _record(self, started_at: float, start: float, result: CreateResult,
+                ttft: Optional[float] = None, streaming: bool = True, connection: str = "warm") -> None:
+        model = self._raw_config["model"]
+        duration = time.perf_counter() - start
+        llm_connections.touch(self._provider)
+        observe_llm_request(
+            model, duration, ttft,
+            prompt_tokens=result.usage.prompt_tokens,
+            completion_tokens=result.usage.completion_tokens,
+            streaming=streaming,
+            connection=connection
+        )
+        if ttft is not None and connection != "warm":
+            logger.info(f"{model} 首token时间 {ttft * 1000:.0f}ms（{connection}）")
+        tracer.record_span(
+            f"llm.{'create_stream' if streaming else 'create'}", "llm", started_at, started_at + duration,
+            attributes={
+                "model": model,
+                "connection": connection,
+                "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+                "prompt_tokens": result.usage.prompt_tokens,
+                "completion_tokens": result.usage.completion_tokens,
+            }
+        )
+
+    async def create(self, *args, **kwargs) -> CreateResult:
+        async with workload_manager.slot(RESOURCE_LLM):
+            connection = llm_connections.begin_request(self._provider)
+            started_at, start = time.time(), time.perf_counter()
+            result = await super().create(*args, **kwargs)
+        self._record(started_at, start, result, streaming=False, connection=connection)
+        return result
+
+    async def create_stream(self, *args, **kwargs) -> AsyncGenerator[Union[str, CreateResult], None]:
+        async with workload_manager.slot(RESOURCE_LLM):
+            connection = llm_connections.begin_request(self._provider)
+            started_at, start = time.time(), time.perf_counter()
+            ttft = None
+            async for item in super().create_stream(*args, **kwargs):
+                if isinstance(item, CreateResult):
+                    self._record(started_at, start, item, ttft, connection=connection)
+                elif ttft is None:
+                    ttft = time.perf_counter() - start
+                yield item
+
+
 _deepseek_model_client = None
 _qwenvl_model_client = None
 _uitars_model_client = None
 
+
+async def close_model_clients() -> None:
+    """关闭已创建的模型客户端（未创建的不会为了关闭而创建），并停止连接保活"""
+    global _deepseek_model_client, _qwenvl_model_client, _uitars_model_client
+    clients = [_deepseek_model_client, _qwenvl_model_client, _uitars_model_client]
+    _deepseek_model_client = _qwenvl_model_client = _uitars_model_client = None
+    for client in clients:
+        if client is not None:
+            await client.close()
+    await llm_connections.close()
+
 def get_deepseek_model_client() -> OpenAIChatCompletionClient:
     """获取AutoGen兼容的模型客户端"""
     global _deepseek_model_client
     if _deepseek_model_client is None:
-        _deepseek_model_client = OpenAIChatCompletionClient(
+        _deepseek_model_client = MonitoredChatCompletionClient(
+            provider="deepseek",
             model=settings.DEEPSEEK_MODEL,
             api_key=settings.DEEPSEEK_API_KEY,
             base_url=settings.DEEPSEEK_BASE_URL,
@@ -38,7 +112,8 @@ def get_qwenvl_model_client() -> OpenAIChatCompletionClient:
     """获取AutoGen兼容的模型客户端"""
     global _qwenvl_model_client
     if _qwenvl_model_client is None:
-        _qwenvl_model_client = OpenAIChatCompletionClient(
+        _qwenvl_model_client = MonitoredChatCompletionClient(
+            provider="qwen_vl",
             model=settings.QWEN_VL_MODEL,
             api_key=settings.QWEN_VL_API_KEY,
             base_url=settings.QWEN_VL_BASE_URL,
@@ -57,7 +132,8 @@ def get_uitars_model_client() -> OpenAIChatCompletionClient:
     """获取AutoGen兼容的模型客户端"""
     global _uitars_model_client
     if _uitars_model_client is None:
-        _uitars_model_client = OpenAIChatCompletionClient(
+        _uitars_model_client = MonitoredChatCompletionClient(
+            provider="uitars",
             model=settings.UI_TARS_MODEL,
             api_key=settings.UI_TARS_API_KEY,
             base_url=settings.UI_TARS_BASE_URL,
@@ -3,22 +3,145 @@
 """
 import sys
 import os
+import copy
+import json
+import queue
+import time
+import threading
+import traceback
 from pathlib import Path
+from typing import Dict, Optional, Tuple
 from loguru import logger
 
 from app.core.config import settings
 
+# 日志级别序号，热路径日志先按级别过滤，避免无效的限流计算
+_LEVEL_NO = {"TRACE": 5, "DEBUG": 10, "INFO": 20, "SUCCESS": 25, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+
+class LogRateLimiter:
+    """按key的令牌桶限流：每个key每秒补充 rate 个令牌，最多累积 burst 个"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> Tuple[bool, int]:
+        """尝试获取一个令牌，返回 (是否允许, 上次允许之后被丢弃的条数)"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                bucket[2] += 1
+                return False, 0
+            bucket[0] = tokens - 1
+            suppressed, bucket[2] = bucket[2], 0
+            return True, suppressed
+
+
+# 热路径日志限流器（production 配置下启用）
+_hot_path_limiter: Optional[LogRateLimiter] = None
+# 所有处理器中的最低日志级别
+_min_level_no = 0
+
+
+def _json_formatter(record) -> str:
+    """结构化JSON日志格式：只输出常用字段，异常堆栈单独字段"""
+    payload = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["extra"].get("name", record["name"]),
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    if record["exception"] is not None:
+        payload["exception"] = "".join(traceback.format_exception(*record["exception"])).rstrip()
+    record["extra"]["_json"] = json.dumps(payload, ensure_ascii=False, default=str)
+    return "{extra[_json]}\n"
+
+
+class AsyncLogWriter:
+    """异步日志写入：调用方只做一次格式化并放入内存队列，后台线程写入各个处理器
+
+    后台线程使用独立的 loguru 日志器（copy.deepcopy 得到，处理器与全局日志器隔离），
+    文件轮转、保留和压缩仍由 loguru 负责。
+    """
+
+    def __init__(self, writer):
+        self._writer = writer
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message) -> None:
+        self._queue.put((message.record["level"].name, str(message)))
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            level, text = item
+            try:
+                self._writer.opt(raw=True).log(level, text)
+            except Exception:
+                sys.stderr.write(text)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """写完队列中剩余的日志后停止"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._writer.remove()
+
+
+_async_writer: Optional[AsyncLogWriter] = None
+
+
+def setup_logging(profile: Optional[str] = None):
+    """设置日志配置
+
+    Args:
+        profile: 日志配置档，默认使用 LOG_PROFILE。
+            development：文本格式、同步写入、开启 backtrace/diagnose，文件日志记录DEBUG，
+            另按智能体/API拆分日志文件；
+            production：JSON格式（按 logger 字段区分来源，不再拆分文件），每条日志只格式化一次，
+            由后台线程异步写入，文件日志按 LOG_LEVEL 过滤，热路径日志按 LOG_HOT_PATH_RATE 限流。
+    """
+    global _hot_path_limiter, _min_level_no, _async_writer
+
+    production = (profile or settings.LOG_PROFILE) == "production"
 
-def setup_logging():
-    """设置日志配置"""
-    
     # 移除默认的日志处理器
     logger.remove()
-    
+    if _async_writer is not None:
+        _async_writer.stop()
+        _async_writer = None
+
     # 创建日志目录
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
-    
+
+    if production:
+        _setup_production_sinks()
+        _min_level_no = _LEVEL_NO.get(settings.LOG_LEVEL.upper(), 20)
+        _hot_path_limiter = LogRateLimiter(settings.LOG_HOT_PATH_RATE, settings.LOG_HOT_PATH_BURST)
+    else:
+        _setup_development_sinks()
+        _min_level_no = _LEVEL_NO["DEBUG"]
+        _hot_path_limiter = None
+
+    logger.info(f"日志系统初始化完成 (配置档: {'production' if production else 'development'})")
+
+
+def _setup_development_sinks() -> None:
     # 控制台日志格式
     console_format = (
         "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
@@ -92,8 +215,66 @@ def setup_logging():
         backtrace=True,
         diagnose=True
     )
-    
-    logger.info("日志系统初始化完成")
+
+
+def _setup_production_sinks() -> None:
+    global _async_writer
+
+    # 独立的写入日志器，消息已是格式化好的JSON行
+    writer = copy.deepcopy(logger)
+    writer.add(sys.stdout, format="{message}", level=settings.LOG_LEVEL, colorize=False)
+    writer.add(
+        settings.LOG_FILE,
+        format="{message}",
+        level=settings.LOG_LEVEL,
+        rotation=settings.LOG_ROTATION,
+        retention=settings.LOG_RETENTION,
+        compression="zip"
+    )
+    writer.add(
+        "logs/error.log",
+        format="{message}",
+        level="ERROR",
+        rotation="1 day",
+        retention="30 days",
+        compression="zip"
+    )
+
+    _async_writer = AsyncLogWriter(writer)
+    logger.add(
+        _async_writer.write,
+        format=_json_formatter,
+        level=settings.LOG_LEVEL,
+        backtrace=False,
+        diagnose=False
+    )
+
+
+def shutdown_logging() -> None:
+    """关闭日志系统，写完异步队列中剩余的日志"""
+    global _async_writer
+    if _async_writer is not None:
+        logger.remove()
+        _async_writer.stop()
+        _async_writer = None
+
+
+def log_hot_path(key: str, level: str, message: str, *args) -> None:
+    """输出热路径日志（流式分片、子进程逐行输出等）
+
+    使用 loguru 的 {} 占位符延迟格式化；production 配置下同一 key 超过限流速率的日志被丢弃，
+    恢复输出时附带丢弃条数。
+    """
+    if _LEVEL_NO.get(level, 0) < _min_level_no:
+        return
+    limiter = _hot_path_limiter
+    if limiter is not None:
+        allowed, suppressed = limiter.acquire(key)
+        if not allowed:
+            return
+        if suppressed:
+            message = f"{message} （此前限流省略 {suppressed} 条）"
+    logger.opt(depth=1).log(level, message, *args)
 
 
 def get_logger(name: str):
@@ -14,6 +14,7 @@ class BaseMessage(BaseModel):
     id: Optional[str] = None
     timestamp: str = Field(default_factory=lambda: datetime.now().isoformat())
     source: Optional[str] = None
+    trace_context: Optional[Dict[str, str]] = Field(None, description="链路追踪上下文")
 
 
 class ResponseMessage(BaseMessage):
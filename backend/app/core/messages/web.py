@@ -84,6 +84,7 @@ class WebMultimodalAnalysisRequest(BaseMessage):
     test_description: str = Field(..., description="测试需求描述")
     additional_context: Optional[str] = Field(None, description="额外上下文信息")
     generate_formats: List[str] = Field(default=["yaml"], description="生成格式列表")
+    force_reanalyze: bool = Field(False, description="忽略已有分析检查点，重新分析图片")
     
     class Config:
         json_schema_extra = {
@@ -109,6 +110,8 @@ class WebMultimodalAnalysisResponse(BaseMessage):
     status: str = Field(..., description="处理状态")
     message: str = Field(..., description="响应消息")
     processing_time: float = Field(default=0.0, description="处理时间（秒）")
+    test_description: Optional[str] = Field(None, description="测试需求描述")
+    target_url: Optional[str] = Field(None, description="被测网页URL")
 
 
 class WebUIAnalysisMessage(BaseMessage):
@@ -218,6 +221,7 @@ class YAMLExecutionConfig(BaseMessage):
 class YAMLExecutionRequest(BaseMessage):
     """YAML执行请求消息"""
     session_id: str = Field(..., description="会话ID")
+    script_id: Optional[str] = Field(None, description="脚本ID（用于写入执行记录）")
     yaml_content: str = Field(..., description="YAML脚本内容")
     execution_config: Optional[YAMLExecutionConfig] = Field(None, description="执行配置")
     legacy_config: Optional[Dict[str, Any]] = Field(None, description="旧版配置格式")
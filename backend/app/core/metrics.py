@@ -0,0 +1,175 @@
+"""
+性能指标
+统一记录智能体阶段耗时、大模型首token时间/总耗时/token数、模型服务连接预热耗时、子进程执行时间、数据库查询耗时、
+SSE队列深度、缓存命中、失败次数和各工作负载类别的排队时间，以Prometheus格式对外暴露
+"""
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest, start_http_server
+)
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 秒级耗时分桶：覆盖毫秒级的数据库查询到分钟级的图片分析
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# 大模型首token时间分桶
+TTFT_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+# 队列深度分桶
+DEPTH_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+AGENT_STAGE_DURATION = Histogram(
+    "agent_stage_duration_seconds", "智能体处理阶段耗时",
+    ["agent", "operation"], buckets=DURATION_BUCKETS
+)
+LLM_TTFT = Histogram(
+    "llm_time_to_first_token_seconds", "大模型流式输出首token时间（connection: first 启动后首个请求、idle 空闲后、warm 连接已建立）",
+    ["model", "connection"], buckets=TTFT_BUCKETS
+)
+LLM_DURATION = Histogram(
+    "llm_request_duration_seconds", "大模型请求总耗时",
+    ["model", "mode"], buckets=DURATION_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "大模型消耗的token数",
+    ["model", "kind"]
+)
+LLM_WARMUP_DURATION = Histogram(
+    "llm_connection_warmup_seconds", "模型服务连接预热和保活请求耗时",
+    ["provider", "result"], buckets=DURATION_BUCKETS
+)
+SUBPROCESS_DURATION = Histogram(
+    "subprocess_duration_seconds", "脚本执行子进程耗时",
+    ["command", "status"], buckets=DURATION_BUCKETS
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "数据库语句执行耗时",
+    ["statement"], buckets=DURATION_BUCKETS
+)
+SSE_QUEUE_DEPTH = Histogram(
+    "sse_queue_depth", "SSE推送时消息队列中积压的消息数",
+    ["stream"], buckets=DEPTH_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "缓存查询次数",
+    ["cache", "result"]
+)
+FAILURES = Counter(
+    "failures_total", "失败次数",
+    ["component", "error"]
+)
+WORKLOAD_QUEUE_DURATION = Histogram(
+    "workload_queue_seconds", "各工作负载类别等待并发名额的时间",
+    ["resource", "workload"], buckets=DURATION_BUCKETS
+)
+WORKLOAD_REJECTED = Counter(
+    "workload_rejected_total", "准入控制拒绝或排队超时的次数",
+    ["resource", "workload"]
+)
+
+# 已解析的带标签指标缓存，热路径上避免重复的标签校验
+_children: Dict[Tuple, object] = {}
+
+
+def _child(metric, *labels: str):
+    key = (metric, labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = metric.labels(*labels)
+    return child
+
+
+def observe_agent_stage(agent: str, operation: str, duration: float) -> None:
+    """记录智能体处理阶段耗时"""
+    if settings.ENABLE_METRICS:
+        _child(AGENT_STAGE_DURATION, agent, operation).observe(duration)
+
+
+def observe_llm_request(
+    model: str,
+    duration: float,
+    ttft: Optional[float] = None,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    streaming: bool = True,
+    connection: str = "warm"
+) -> None:
+    """记录一次大模型请求：总耗时、首token时间（仅流式，按连接状态区分）和token数"""
+    if not settings.ENABLE_METRICS:
+        return
+    _child(LLM_DURATION, model, "stream" if streaming else "create").observe(duration)
+    if ttft is not None:
+        _child(LLM_TTFT, model, connection).observe(ttft)
+    if prompt_tokens:
+        _child(LLM_TOKENS, model, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        _child(LLM_TOKENS, model, "completion").inc(completion_tokens)
+
+
+def observe_llm_warmup(provider: str, result: str, duration: float) -> None:
+    """记录模型服务连接预热或保活请求耗时"""
+    if settings.ENABLE_METRICS:
+        _child(LLM_WARMUP_DURATION, provider, result).observe(duration)
+
+
+def observe_subprocess(command: str, status: str, duration: float) -> None:
+    """记录子进程执行耗时"""
+    if settings.ENABLE_METRICS:
+        _child(SUBPROCESS_DURATION, command, status).observe(duration)
+
+
+def observe_db_query(statement: str, duration: float) -> None:
+    """记录数据库语句执行耗时（statement 为语句类型，如 SELECT、INSERT）"""
+    if settings.ENABLE_METRICS:
+        _child(DB_QUERY_DURATION, statement).observe(duration)
+
+
+def observe_queue_depth(stream: str, depth: int) -> None:
+    """记录SSE消息队列深度"""
+    if settings.ENABLE_METRICS:
+        _child(SSE_QUEUE_DEPTH, stream).observe(depth)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """记录一次缓存查询"""
+    if settings.ENABLE_METRICS:
+        _child(CACHE_REQUESTS, cache, "hit" if hit else "miss").inc()
+
+
+def record_failure(component: str, error: str) -> None:
+    """记录一次失败（error 为异常类型名）"""
+    if settings.ENABLE_METRICS:
+        _child(FAILURES, component, error).inc()
+
+
+def observe_workload_wait(resource: str, workload: str, duration: float) -> None:
+    """记录一次并发名额的排队时间"""
+    if settings.ENABLE_METRICS:
+        _child(WORKLOAD_QUEUE_DURATION, resource, workload).observe(duration)
+
+
+def record_workload_rejected(resource: str, workload: str) -> None:
+    """记录一次准入拒绝"""
+    if settings.ENABLE_METRICS:
+        _child(WORKLOAD_REJECTED, resource, workload).inc()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """导出Prometheus文本格式的指标，返回 (内容, Content-Type)"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server() -> bool:
+    """在 METRICS_PORT 启动独立的指标抓取端口，端口被占用（如多worker）时跳过"""
+    if not settings.ENABLE_METRICS or not settings.METRICS_PORT:
+        return False
+    try:
+        start_http_server(settings.METRICS_PORT)
+        logger.info(f"指标抓取端口已启动: {settings.METRICS_PORT}")
+        return True
+    except OSError as e:
+        logger.warning(f"指标抓取端口启动失败，仅通过 /metrics 暴露: {e}")
+        return False
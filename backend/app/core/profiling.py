@@ -0,0 +1,274 @@
+"""
+在线性能剖析
+按需启动一段时间的采样剖析：后台线程定时采样各线程调用栈（输出火焰图折叠栈格式），
+事件循环内的探测任务测量循环延迟并记录长时间运行的协程，事件循环被阻塞时记录阻塞位置。
+未启动剖析时不安装任何钩子，没有额外开销。
+"""
+import sys
+import time
+import asyncio
+import threading
+import weakref
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", code.co_filename)
+    return f"{module}:{code.co_name}"
+
+
+def _collapse(frame, limit: int = 128) -> List[str]:
+    """调用栈从外到内的帧标签"""
+    labels = []
+    while frame is not None and len(labels) < limit:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _task_location(task: asyncio.Task) -> Optional[str]:
+    """协程当前挂起的位置"""
+    stack = task.get_stack(limit=1)
+    if not stack:
+        return None
+    frame = stack[-1]
+    return f"{frame.f_code.co_filename}:{frame.f_lineno} ({frame.f_code.co_name})"
+
+
+class ProfilingSession:
+    """一次剖析会话"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, duration: float,
+                 interval: float, lag_interval: float, blocking_threshold: float):
+        self.loop = loop
+        self.duration = duration
+        self.interval = interval
+        self.lag_interval = lag_interval
+        self.blocking_threshold = blocking_threshold
+        self.started_at = time.time()
+        self.stopped_at: Optional[float] = None
+
+        self.loop_thread_id = threading.get_ident()
+        self.stacks: Counter = Counter()
+        # 采样线程写入、接口读取时加锁
+        self._lock = threading.Lock()
+        self.sample_count = 0
+        self.lag_samples: List[float] = []
+        self.blocking_calls: List[Dict[str, Any]] = []
+        self._blocking: Optional[Dict[str, Any]] = None
+        self._task_first_seen: "weakref.WeakKeyDictionary[asyncio.Task, float]" = weakref.WeakKeyDictionary()
+        self._task_finished: List[Dict[str, Any]] = []
+
+        # 探测任务每次被调度时更新，采样线程据此判断事件循环是否被阻塞
+        self._heartbeat = time.monotonic()
+        self._stop_event = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+        self._probe: Optional[asyncio.Task] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def running(self) -> bool:
+        return self.stopped_at is None
+
+    def start(self, on_timeout) -> None:
+        self._sampler.start()
+        self._probe = self.loop.create_task(self._probe_loop(), name="profiler-loop-probe")
+        self._timer = self.loop.call_later(self.duration, on_timeout)
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self.stopped_at = time.time()
+        self._stop_event.set()
+        if self._timer:
+            self._timer.cancel()
+        if self._probe:
+            self._probe.cancel()
+        self._sampler.join(timeout=1)
+        self._finish_blocking(time.monotonic())
+
+    # ---- 采样线程 ----
+
+    def _sample_loop(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            now = time.monotonic()
+            frames = sys._current_frames()
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own_id:
+                        continue
+                    stack = _collapse(frame)
+                    thread_name = "event-loop" if thread_id == self.loop_thread_id else names.get(thread_id, str(thread_id))
+                    self.stacks[";".join([thread_name] + stack)] += 1
+                    if thread_id == self.loop_thread_id:
+                        self._check_blocking(now, stack)
+                self.sample_count += 1
+            del frames
+
+    def _check_blocking(self, now: float, stack: List[str]) -> None:
+        """心跳逾期超过阈值，说明事件循环正在执行同步代码"""
+        due = self._heartbeat + self.lag_interval
+        if now - due < self.blocking_threshold:
+            # 恢复调度后探测任务立即更新心跳，心跳时间即阻塞结束时间
+            self._finish_blocking(self._heartbeat)
+            return
+        if self._blocking is None:
+            self._blocking = {"started": due, "stacks": Counter()}
+        self._blocking["stacks"][";".join(stack)] += 1
+
+    def _finish_blocking(self, end: float) -> None:
+        blocking = self._blocking
+        if blocking is None:
+            return
+        self._blocking = None
+        stack, samples = blocking["stacks"].most_common(1)[0]
+        frames = stack.split(";")
+        self.blocking_calls.append({
+            "duration_ms": round(max(0.0, end - blocking["started"]) * 1000, 1),
+            "at": datetime.fromtimestamp(time.time() - (time.monotonic() - blocking["started"])).isoformat(),
+            "location": frames[-1],
+            "stack": frames[-12:],
+            "samples": samples,
+        })
+
+    # ---- 事件循环探测任务 ----
+
+    async def _probe_loop(self) -> None:
+        interval = self.lag_interval
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            self.lag_samples.append(max(0.0, now - expected))
+            self._track_tasks(now)
+
+    def _track_tasks(self, now: float) -> None:
+        current = asyncio.all_tasks(self.loop)
+        for task in current:
+            if task not in self._task_first_seen:
+                self._task_first_seen[task] = now
+        for task, first_seen in list(self._task_first_seen.items()):
+            if task.done() and task not in current:
+                self._task_finished.append(self._describe_task(task, now - first_seen, done=True))
+                del self._task_first_seen[task]
+
+    @staticmethod
+    def _describe_task(task: asyncio.Task, running_for: float, done: bool) -> Dict[str, Any]:
+        coro = task.get_coro()
+        return {
+            "name": task.get_name(),
+            "coroutine": getattr(coro, "__qualname__", repr(coro)),
+            "running_for_s": round(running_for, 3),
+            "done": done,
+            "location": None if done else _task_location(task),
+        }
+
+    # ---- 结果 ----
+
+    def collapsed_stacks(self) -> str:
+        """火焰图折叠栈格式（flamegraph.pl / speedscope 可直接读取）"""
+        with self._lock:
+            stacks = self.stacks.most_common()
+        return "\n".join(f"{stack} {count}" for stack, count in stacks)
+
+    def longest_coroutines(self, limit: int = 20) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        tasks = list(self._task_finished)
+        for task, first_seen in list(self._task_first_seen.items()):
+            if task is self._probe:
+                continue
+            tasks.append(self._describe_task(task, now - first_seen, done=task.done()))
+        tasks.sort(key=lambda item: item["running_for_s"], reverse=True)
+        return tasks[:limit]
+
+    def loop_lag(self) -> Dict[str, Any]:
+        values = sorted(self.lag_samples)
+        return {
+            "samples": len(values),
+            "p50_ms": round(_percentile(values, 50) * 1000, 2),
+            "p90_ms": round(_percentile(values, 90) * 1000, 2),
+            "p99_ms": round(_percentile(values, 99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+        }
+
+    def summary(self, top: int = 20) -> Dict[str, Any]:
+        end = self.stopped_at or time.time()
+        with self._lock:
+            loop_samples = sum(count for stack, count in self.stacks.items() if stack.startswith("event-loop;"))
+            blocking_calls = list(self.blocking_calls)
+        return {
+            "running": self.running,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+            "elapsed_s": round(end - self.started_at, 3),
+            "duration_s": self.duration,
+            "sample_interval_ms": self.interval * 1000,
+            "samples": self.sample_count,
+            "event_loop_samples": loop_samples,
+            "loop_lag": self.loop_lag(),
+            "longest_coroutines": self.longest_coroutines(top),
+            "blocking_calls": sorted(blocking_calls, key=lambda item: item["duration_ms"], reverse=True)[:top],
+            "blocking_threshold_ms": self.blocking_threshold * 1000,
+        }
+
+
+class ProfilerManager:
+    """剖析会话管理：同一时间只允许一个会话，保留最近一次的结果"""
+
+    def __init__(self):
+        self._session: Optional[ProfilingSession] = None
+
+    @property
+    def session(self) -> Optional[ProfilingSession]:
+        return self._session
+
+    def start(self, duration: Optional[float] = None, interval: Optional[float] = None) -> ProfilingSession:
+        """在当前事件循环上启动剖析，duration 秒后自动停止"""
+        if not settings.ENABLE_PROFILING:
+            raise RuntimeError("性能剖析未启用")
+        if self._session and self._session.running:
+            raise RuntimeError("已有剖析会话在运行")
+
+        duration = min(duration or settings.PROFILER_DEFAULT_DURATION, settings.PROFILER_MAX_DURATION)
+        session = ProfilingSession(
+            loop=asyncio.get_running_loop(),
+            duration=duration,
+            interval=interval or settings.PROFILER_SAMPLE_INTERVAL,
+            lag_interval=settings.PROFILER_LOOP_LAG_INTERVAL,
+            blocking_threshold=settings.PROFILER_BLOCKING_THRESHOLD,
+        )
+        self._session = session
+        session.start(on_timeout=session.stop)
+        logger.info(f"性能剖析已启动: {duration}s, 采样间隔 {session.interval * 1000:.1f}ms")
+        return session
+
+    def stop(self) -> Optional[ProfilingSession]:
+        session = self._session
+        if session and session.running:
+            session.stop()
+            logger.info(f"性能剖析已停止: {session.sample_count} 次采样")
+        return session
+
+
+# 全局剖析管理器实例
+profiler = ProfilerManager()
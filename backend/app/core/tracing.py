@@ -0,0 +1,238 @@
+"""
+链路追踪
+在进程内记录一次会话跨端点、编排器、智能体、大模型、子进程和数据库的span，
+追踪上下文通过消息的 trace_context 字段在智能体之间传递，结果保存在内存中供本地查看
+"""
+import time
+import uuid
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class Span:
+    """一个计时区间"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_time", "end_time",
+                 "attributes", "status", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: str,
+                 attributes: Optional[Dict[str, Any]] = None, start_time: Optional[float] = None):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_time = start_time if start_time is not None else time.time()
+        self.end_time: Optional[float] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def context(self) -> Dict[str, str]:
+        """可随消息传递的追踪上下文"""
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+    def to_dict(self) -> Dict[str, Any]:
+        end_time = self.end_time or time.time()
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time": self.start_time,
+            "duration_ms": round((end_time - self.start_time) * 1000, 3),
+            "finished": self.end_time is not None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class InMemorySpanExporter:
+    """进程内span存储：按链路分组，只保留最近 TRACE_BUFFER_SIZE 条链路"""
+
+    def __init__(self, max_traces: Optional[int] = None, max_spans: Optional[int] = None):
+        self.max_traces = max_traces or settings.TRACE_BUFFER_SIZE
+        self.max_spans = max_spans or settings.TRACE_MAX_SPANS
+        self._traces: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # 数据库事件可能在其他线程中触发
+        self._lock = threading.Lock()
+
+    def _get_trace(self, trace_id: str) -> Dict[str, Any]:
+        trace = self._traces.get(trace_id)
+        if trace is None:
+            trace = self._traces[trace_id] = {"spans": [], "session_id": None, "dropped": 0}
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+        return trace
+
+    def start(self, span: Span) -> None:
+        with self._lock:
+            trace = self._get_trace(span.trace_id)
+            if len(trace["spans"]) >= self.max_spans:
+                trace["dropped"] += 1
+                return
+            trace["spans"].append(span)
+            session_id = span.attributes.get("session_id")
+            if session_id and trace["session_id"] is None:
+                trace["session_id"] = session_id
+
+    def get_trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            trace = self._traces.get(trace_id)
+            if trace is None:
+                return None
+            spans = [span.to_dict() for span in trace["spans"]]
+            session_id, dropped = trace["session_id"], trace["dropped"]
+        spans.sort(key=lambda span: span["start_time"])
+        return {"trace_id": trace_id, "session_id": session_id, "dropped_spans": dropped, "spans": spans}
+
+    def find_by_session(self, session_id: str) -> List[str]:
+        with self._lock:
+            return [trace_id for trace_id, trace in self._traces.items() if trace["session_id"] == session_id]
+
+    def list_traces(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """最近的链路摘要（新的在前）"""
+        with self._lock:
+            items = list(self._traces.items())[-limit:]
+            summaries = []
+            for trace_id, trace in reversed(items):
+                spans = trace["spans"]
+                if not spans:
+                    continue
+                root = min(spans, key=lambda span: span.start_time)
+                end_time = max((span.end_time or time.time()) for span in spans)
+                summaries.append({
+                    "trace_id": trace_id,
+                    "session_id": trace["session_id"],
+                    "root": root.name,
+                    "start_time": root.start_time,
+                    "duration_ms": round((end_time - root.start_time) * 1000, 3),
+                    "span_count": len(spans),
+                    "errors": sum(1 for span in spans if span.status == "error"),
+                })
+        return summaries
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """追踪器：ENABLE_TRACING 关闭时所有操作为空操作"""
+
+    def __init__(self, exporter: Optional[InMemorySpanExporter] = None):
+        self.exporter = exporter or InMemorySpanExporter()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.ENABLE_TRACING
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        return _current_span.get()
+
+    def _new_span(self, name: str, kind: str, attributes: Optional[Dict[str, Any]],
+                  parent: Optional[Dict[str, str]], start_time: Optional[float] = None) -> Span:
+        if parent is None:
+            current = _current_span.get()
+            parent = current.context() if current else None
+        if parent:
+            span = Span(parent["trace_id"], parent.get("span_id"), name, kind, attributes, start_time)
+        else:
+            span = Span(uuid.uuid4().hex, None, name, kind, attributes, start_time)
+        self.exporter.start(span)
+        return span
+
+    @contextmanager
+    def start_span(
+        self,
+        name: str,
+        kind: str = "internal",
+        attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[Dict[str, str]] = None
+    ) -> Iterator[Optional[Span]]:
+        """在代码块内开启span，并设为当前span
+
+        Args:
+            name: span名称
+            kind: 类型（http/orchestrator/agent/llm/subprocess/db/internal）
+            attributes: 附加属性，包含 session_id 时可按会话查找链路
+            parent: 上游传递的追踪上下文，为空时使用当前span
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        span = self._new_span(name, kind, attributes, parent)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_time = time.time()
+            _current_span.reset(token)
+
+    def record_span(self, name: str, kind: str, start_time: float, end_time: float,
+                    attributes: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        """记录已结束的span（用于由事件回调计时的操作，如数据库语句）"""
+        if not self.enabled or _current_span.get() is None:
+            return
+        span = self._new_span(name, kind, attributes, None, start_time)
+        span.end_time = end_time
+        if error:
+            span.status, span.error = "error", error
+
+    def inject(self, message: Any) -> None:
+        """把当前追踪上下文写入消息（消息需有 trace_context 字段）"""
+        span = _current_span.get()
+        if span is not None and hasattr(message, "trace_context"):
+            message.trace_context = span.context()
+
+    @staticmethod
+    def extract(message: Any) -> Optional[Dict[str, str]]:
+        """读取消息携带的追踪上下文"""
+        context = getattr(message, "trace_context", None)
+        return context if isinstance(context, dict) and context.get("trace_id") else None
+
+
+# 全局追踪器实例
+tracer = Tracer()
+
+
+def traced(name: Optional[str] = None, kind: str = "internal"):
+    """异步函数追踪装饰器：整个调用记录为一个span，参数中的 session_id 记为span属性"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+        signature = inspect.signature(func)
+        has_session = "session_id" in signature.parameters
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return await func(*args, **kwargs)
+            attributes = {}
+            if has_session:
+                session_id = signature.bind_partial(*args, **kwargs).arguments.get("session_id")
+                if session_id:
+                    attributes["session_id"] = session_id
+            with tracer.start_span(span_name, kind=kind, attributes=attributes):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,247 @@
+"""
+工作负载分级与准入控制
+请求按工作负载类别（交互式、批量、后台）划分，大模型调用、脚本执行和数据库写入分别为每个类别设置并发预算，
+批量任务占满自己的预算后只会在本类别内排队，不会挤占交互式请求的名额。
+当前类别通过 ContextVar 传递：在会话处理任务外层用 workload_scope 设置，任务内创建的子任务和运行时继承该类别。
+类别排队已满时，接口入口的准入检查以429和 Retry-After 拒绝新请求。
+"""
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import observe_workload_wait, record_workload_rejected
+
+logger = get_logger(__name__)
+
+# 工作负载类别
+INTERACTIVE = "interactive"
+BATCH = "batch"
+BACKGROUND = "background"
+WORKLOAD_CLASSES = (INTERACTIVE, BATCH, BACKGROUND)
+
+# 受控资源
+RESOURCE_LLM = "llm"
+RESOURCE_EXECUTION = "execution"
+RESOURCE_DB_WRITE = "db_write"
+
+_current_workload: ContextVar[str] = ContextVar("workload", default=INTERACTIVE)
+
+# 还没有完成过的通道用于估算 Retry-After 的默认占用时长（秒）
+_DEFAULT_HOLD_SECONDS = 5.0
+
+
+def normalize_workload(workload: Optional[str]) -> str:
+    return workload if workload in WORKLOAD_CLASSES else INTERACTIVE
+
+
+def current_workload() -> str:
+    """当前上下文的工作负载类别"""
+    return _current_workload.get()
+
+
+@contextmanager
+def workload_scope(workload: Optional[str]) -> Iterator[str]:
+    """在当前上下文中设置工作负载类别，期间创建的任务继承该类别"""
+    workload = normalize_workload(workload)
+    token = _current_workload.set(workload)
+    try:
+        yield workload
+    finally:
+        _current_workload.reset(token)
+
+
+def parse_workload_budgets(value: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+    """解析 "llm:interactive=8,batch=4;execution:interactive=2,batch=1" 形式的并发预算"""
+    budgets: Dict[str, Dict[str, int]] = {}
+    for section in (value if value is not None else settings.WORKLOAD_BUDGETS).split(";"):
+        resource, _, items = section.strip().partition(":")
+        if not resource.strip():
+            continue
+        limits = budgets.setdefault(resource.strip(), {})
+        for item in items.split(","):
+            name, _, limit = item.strip().partition("=")
+            if name.strip():
+                limits[name.strip()] = max(1, int(limit)) if limit.strip() else 1
+    return budgets
+
+
+class AdmissionRejected(HTTPException):
+    """工作负载类别已饱和，拒绝新的请求"""
+
+    def __init__(self, resource: str, workload: str, retry_after: int):
+        super().__init__(
+            status_code=429,
+            detail=f"{workload} 类请求的 {resource} 并发已满，请 {retry_after} 秒后重试",
+            headers={"Retry-After": str(retry_after)}
+        )
+        self.resource = resource
+        self.workload = workload
+        self.retry_after = retry_after
+
+
+class _Lane:
+    """一个资源在一个工作负载类别下的并发通道：名额用完后按先来先到排队"""
+
+    def __init__(self, resource: str, workload: str, limit: int):
+        self.resource = resource
+        self.workload = workload
+        self.limit = limit
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._hold_seconds = _DEFAULT_HOLD_SECONDS
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def saturated(self, max_queue: int) -> bool:
+        return self.active >= self.limit and self.waiting >= max_queue
+
+    def retry_after(self) -> int:
+        """按排在前面的请求数和平均占用时长估算的等待秒数"""
+        rounds = (self.waiting + 1) / self.limit
+        return max(1, math.ceil(rounds * self._hold_seconds))
+
+    async def acquire(self, timeout: Optional[float]) -> None:
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # 已经分到名额但调用方放弃了，交给下一个等待者
+                self.release(0.0)
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self, held: float) -> None:
+        if held > 0:
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # 名额直接转给等待者，active 不变
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_seconds": round(self.total_wait / self.admitted, 3) if self.admitted else 0.0,
+            "avg_hold_seconds": round(self._hold_seconds, 3),
+        }
+
+
+class WorkloadManager:
+    """按资源和工作负载类别分配并发名额"""
+
+    def __init__(self, budgets: Optional[Dict[str, Dict[str, int]]] = None, max_queue: Optional[int] = None):
+        self.budgets = budgets if budgets is not None else parse_workload_budgets()
+        self.max_queue = max_queue if max_queue is not None else settings.WORKLOAD_MAX_QUEUE
+        self._lanes: Dict[Tuple[str, str], _Lane] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.WORKLOAD_CONTROL_ENABLED
+
+    def _lane(self, resource: str, workload: str) -> Optional[_Lane]:
+        lane = self._lanes.get((resource, workload))
+        if lane is None:
+            limit = self.budgets.get(resource, {}).get(workload)
+            if limit is None:
+                # 未配置预算的资源或类别不限制
+                return None
+            lane = self._lanes[(resource, workload)] = _Lane(resource, workload, limit)
+        return lane
+
+    def check_admission(self, resource: str, workload: Optional[str] = None) -> None:
+        """接口入口的准入检查：类别名额已满且排队已满时抛出 AdmissionRejected（429）"""
+        if not self.enabled:
+            return
+        workload = normalize_workload(workload or current_workload())
+        lane = self._lane(resource, workload)
+        if lane is None or not lane.saturated(self.max_queue):
+            return
+        lane.rejected += 1
+        record_workload_rejected(resource, workload)
+        retry_after = lane.retry_after()
+        logger.warning(f"准入拒绝: {resource}/{workload}, 运行 {lane.active}, 排队 {lane.waiting}, "
+                       f"建议 {retry_after}s 后重试")
+        raise AdmissionRejected(resource, workload, retry_after)
+
+    @asynccontextmanager
+    async def slot(self, resource: str, workload: Optional[str] = None,
+                   timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        占用一个并发名额，名额不足时在本类别内排队
+
+        Args:
+            resource: 资源名（llm、execution、db_write）
+            workload: 工作负载类别，默认取当前上下文的类别
+            timeout: 最长排队时间，超时抛出 AdmissionRejected；默认使用 WORKLOAD_QUEUE_TIMEOUT（0 表示不限）
+        """
+        workload = normalize_workload(workload or current_workload())
+        lane = self._lane(resource, workload) if self.enabled else None
+        if lane is None:
+            yield workload
+            return
+
+        if timeout is None:
+            timeout = settings.WORKLOAD_QUEUE_TIMEOUT or None
+        queued_at = time.perf_counter()
+        try:
+            await lane.acquire(timeout)
+        except asyncio.TimeoutError:
+            lane.rejected += 1
+            record_workload_rejected(resource, workload)
+            raise AdmissionRejected(resource, workload, lane.retry_after())
+        acquired_at = time.perf_counter()
+        wait = acquired_at - queued_at
+        lane.admitted += 1
+        lane.total_wait += wait
+        observe_workload_wait(resource, workload, wait)
+        try:
+            yield workload
+        finally:
+            lane.release(time.perf_counter() - acquired_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """各资源、各类别的名额占用和排队情况"""
+        resources: Dict[str, Dict[str, Any]] = {}
+        for resource, limits in self.budgets.items():
+            resources[resource] = {}
+            for workload in limits:
+                lane = self._lane(resource, workload)
+                resources[resource][workload] = lane.stats()
+        return {
+            "enabled": self.enabled,
+            "max_queue": self.max_queue,
+            "resources": resources,
+        }
+
+
+# 全局工作负载管理器实例
+workload_manager = WorkloadManager()
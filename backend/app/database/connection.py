@@ -3,13 +3,17 @@
 提供数据库连接池和会话管理
 """
 import os
+import time
 from typing import Optional, AsyncGenerator
 from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy import MetaData
+from sqlalchemy import MetaData, event
 
 from app.core.logging import get_logger
 from app.core.config import get_settings
+from app.core.metrics import observe_db_query
+from app.core.tracing import tracer
+from app.core.workload import RESOURCE_DB_WRITE, workload_manager
 
 logger = get_logger(__name__)
 settings = get_settings()
@@ -18,6 +22,48 @@ settings = get_settings()
 metadata = MetaData()
 
 
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append((time.time(), time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    if start_times:
+        started_at, start = start_times.pop()
+        duration = time.perf_counter() - start
+        statement_type = statement.lstrip().split(None, 1)[0].upper() if statement else "UNKNOWN"
+        observe_db_query(statement_type, duration)
+        tracer.record_span(
+            f"db.{statement_type}", "db", started_at, started_at + duration,
+            attributes={"statement": statement[:200]}
+        )
+
+
+class WorkloadSession(AsyncSession):
+    """写操作按当前工作负载类别占用数据库写入名额的会话：刷新/提交待写入的对象、执行增删改语句"""
+
+    def _has_pending_writes(self) -> bool:
+        return bool(self.new or self.dirty or self.deleted)
+
+    async def flush(self, objects=None) -> None:
+        if not self._has_pending_writes():
+            return await super().flush(objects)
+        async with workload_manager.slot(RESOURCE_DB_WRITE):
+            await super().flush(objects)
+
+    async def commit(self) -> None:
+        if not self._has_pending_writes():
+            return await super().commit()
+        async with workload_manager.slot(RESOURCE_DB_WRITE):
+            await super().commit()
+
+    async def execute(self, statement, *args, **kwargs):
+        if not getattr(statement, "is_dml", False):
+            return await super().execute(statement, *args, **kwargs)
+        async with workload_manager.slot(RESOURCE_DB_WRITE):
+            return await super().execute(statement, *args, **kwargs)
+
+
 class DatabaseManager:
     """数据库管理器"""
     
@@ -47,10 +93,15 @@ class DatabaseManager:
                 pool_recycle=int(os.getenv('DATABASE_POOL_RECYCLE', '3600')),
             )
             
+            # 记录语句执行耗时（指标和链路追踪）
+            if settings.ENABLE_METRICS or settings.ENABLE_TRACING:
+                event.listen(self.engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+                event.listen(self.engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
             # 创建会话工厂
             self.session_factory = async_sessionmaker(
                 bind=self.engine,
-                class_=AsyncSession,
+                class_=WorkloadSession,
                 expire_on_commit=False
             )
             
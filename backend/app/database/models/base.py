@@ -4,10 +4,11 @@
 """
 import uuid
 from datetime import datetime
-from typing import Any, Dict
+from decimal import Decimal
+from typing import Any, Dict, List, Tuple
 from sqlalchemy import Column, String, DateTime, func
 from sqlalchemy.ext.declarative import declared_attr
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import declarative_base, defer, undefer
 
 Base = declarative_base()
 
@@ -30,6 +31,48 @@ class BaseModel(Base):
     # 时间戳
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    # 重型列分组：列表/摘要查询默认延迟加载（子类按需覆盖，格式 {组名: (列名, ...)}）
+    __deferred_groups__: Dict[str, Tuple[str, ...]] = {}
+
+    @classmethod
+    def heavy_columns(cls, *undeferred_groups: str) -> List[str]:
+        """获取需要延迟加载的重型列名（排除指定的加载组）"""
+        return [
+            name
+            for group, names in cls.__deferred_groups__.items()
+            if group not in undeferred_groups
+            for name in names
+        ]
+
+    @classmethod
+    def summary_options(cls, *undeferred_groups: str) -> list:
+        """列表/摘要查询加载选项
+
+        延迟加载重型列；误访问时直接抛错，避免在异步会话中隐式懒加载。
+        通过 undeferred_groups 指定仍需随列表一并加载的分组。
+        """
+        return [defer(getattr(cls, name), raiseload=True) for name in cls.heavy_columns(*undeferred_groups)]
+
+    @classmethod
+    def detail_options(cls) -> list:
+        """详情查询加载选项：显式加载所有重型列"""
+        return [undefer(getattr(cls, name)) for name in cls.heavy_columns()]
+
+    def to_summary_dict(self, *undeferred_groups: str) -> Dict[str, Any]:
+        """转换为摘要字典（不包含延迟加载的重型列）"""
+        excluded = set(self.heavy_columns(*undeferred_groups))
+        result = {}
+        for column in self.__table__.columns:
+            if column.name in excluded:
+                continue
+            value = getattr(self, column.name)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = float(value)
+            result[column.name] = value
+        return result
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
@@ -0,0 +1,25 @@
+"""
+内容寻址存储数据库模型
+记录每个内容块的引用计数，供垃圾回收判断是否可以删除
+"""
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, Index
+from .base import BaseModel
+
+
+class ContentBlob(BaseModel):
+    """内容块表模型"""
+
+    __tablename__ = 'content_blobs'
+
+    sha256 = Column(String(64), nullable=False, unique=True, comment="内容SHA-256")
+    size = Column(BigInteger, nullable=False, default=0, comment="内容大小(字节)")
+    ref_count = Column(Integer, nullable=False, default=0, comment="引用计数")
+    last_referenced_at = Column(DateTime, default=datetime.utcnow, nullable=False, comment="最近一次引用或释放时间")
+
+    __table_args__ = (
+        Index('idx_content_blobs_gc', 'ref_count', 'last_referenced_at'),  # 垃圾回收查询
+    )
+
+    def __repr__(self):
+        return f"<ContentBlob(sha256={self.sha256[:12]}, ref_count={self.ref_count})>"
@@ -50,8 +50,9 @@ class ScriptExecution(BaseModel):
     # 索引
     __table_args__ = (
         Index('idx_executions_script_id', 'script_id'),
-        Index('idx_executions_status', 'status'),
+        Index('idx_executions_status_start_time', 'status', 'start_time'),  # 活跃执行查询
         Index('idx_executions_start_time', 'start_time'),
+        Index('idx_executions_created_at', 'created_at'),  # 保留期清理
         Index('idx_executions_execution_id', 'execution_id'),
         Index('idx_executions_batch_id', 'batch_id'),
     )
@@ -12,6 +12,11 @@ class PageAnalysisResult(BaseModel):
 
     __tablename__ = 'page_analysis_results'
 
+    # 列表/摘要查询中延迟加载的完整分析数据
+    __deferred_groups__ = {
+        'analysis_payload': ('raw_analysis_json', 'parsed_ui_elements', 'analysis_metadata'),
+    }
+
     # 关联信息
     session_id = Column(String(100), nullable=False, index=True)  # 增加长度以支持UUID_数字格式
     analysis_id = Column(String(36), nullable=False, unique=True)
@@ -119,6 +124,11 @@ class PageElement(BaseModel):
 
     __tablename__ = 'page_elements'
 
+    # 列表/摘要查询中延迟加载的完整元素数据
+    __deferred_groups__ = {
+        'element_payload': ('element_data',),
+    }
+
     # 关联页面分析结果
     page_analysis_id = Column(String(36), ForeignKey('page_analysis_results.id', ondelete='CASCADE'), nullable=False)
 
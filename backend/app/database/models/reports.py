@@ -10,6 +10,13 @@ class TestReport(BaseModel):
     """测试报告数据库模型"""
     __tablename__ = "test_reports"
 
+    # 列表/摘要查询中延迟加载的日志、产物与环境信息
+    __deferred_groups__ = {
+        "logs": ("logs",),
+        "artifacts": ("screenshots", "videos", "artifacts"),
+        "environment": ("execution_config", "environment_variables"),
+    }
+
     id = Column(Integer, primary_key=True, index=True)
     
     # 基本信息
@@ -13,6 +13,11 @@ class TestScript(BaseModel):
     """测试脚本表模型"""
     
     __tablename__ = 'test_scripts'
+
+    # 列表/摘要查询中延迟加载的脚本正文
+    __deferred_groups__ = {
+        'content': ('content',),
+    }
     
     # 关联信息
     session_id = Column(String(36), ForeignKey('sessions.id', ondelete='SET NULL'))
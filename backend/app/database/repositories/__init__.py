@@ -5,16 +5,20 @@
 
 from .base import BaseRepository
 from .script_repository import ScriptRepository
-# from .session_repository import SessionRepository
+from .session_repository import SessionRepository
 # from .project_repository import ProjectRepository
-# from .execution_repository import ExecutionRepository
-# from .report_repository import ReportRepository
+from .execution_repository import ExecutionRepository
+from .report_repository import ReportRepository
+from .sync_repository import SyncRepository
+from .blob_repository import BlobRepository
 
 __all__ = [
     'BaseRepository',
     'ScriptRepository',
-    # 'SessionRepository',
+    'SessionRepository',
     # 'ProjectRepository',
-    # 'ExecutionRepository',
-    # 'ReportRepository',
+    'ExecutionRepository',
+    'ReportRepository',
+    'SyncRepository',
+    'BlobRepository',
 ]
@@ -0,0 +1,88 @@
+"""
+内容块仓库
+管理内容寻址存储的引用计数
+"""
+from typing import List
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.exc import IntegrityError
+
+from .base import BaseRepository
+from app.database.models.blobs import ContentBlob
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class BlobRepository(BaseRepository[ContentBlob]):
+    """内容块数据仓库"""
+
+    def __init__(self):
+        super().__init__(ContentBlob)
+
+    async def _upsert(self, session: AsyncSession, sha256: str, size: int, increment: int) -> None:
+        now = datetime.utcnow()
+        values = dict(ref_count=ContentBlob.ref_count + increment, last_referenced_at=now, updated_at=now)
+        result = await session.execute(update(ContentBlob).where(ContentBlob.sha256 == sha256).values(**values))
+        if result.rowcount:
+            return
+
+        try:
+            # 在保存点中插入，并发创建同一内容块时只回滚保存点，不影响调用方会话中的其他修改
+            async with session.begin_nested():
+                session.add(ContentBlob(sha256=sha256, size=size, ref_count=increment, last_referenced_at=now))
+        except IntegrityError:
+            # 并发创建同一内容块，改为更新已有记录
+            await session.execute(update(ContentBlob).where(ContentBlob.sha256 == sha256).values(**values))
+
+    async def add_reference(self, session: AsyncSession, sha256: str, size: int) -> None:
+        """引用计数加一，记录不存在时创建"""
+        await self._upsert(session, sha256, size, 1)
+
+    async def register(self, session: AsyncSession, sha256: str, size: int) -> None:
+        """登记内容块但不增加引用（记录不存在时以引用计数0创建），保护期从现在重新计算"""
+        await self._upsert(session, sha256, size, 0)
+
+    async def release(self, session: AsyncSession, sha256: str) -> bool:
+        """引用计数减一（不低于0）"""
+        now = datetime.utcnow()
+        result = await session.execute(
+            update(ContentBlob)
+            .where(ContentBlob.sha256 == sha256, ContentBlob.ref_count > 0)
+            .values(ref_count=ContentBlob.ref_count - 1, last_referenced_at=now, updated_at=now)
+        )
+        return bool(result.rowcount)
+
+    async def list_unreferenced(self, session: AsyncSession, grace: timedelta, limit: int = 500) -> List[str]:
+        """获取引用计数为0且超过保护期的内容块"""
+        cutoff = datetime.utcnow() - grace
+        result = await session.execute(
+            select(ContentBlob.sha256)
+            .where(ContentBlob.ref_count <= 0, ContentBlob.last_referenced_at < cutoff)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def delete_blobs(self, session: AsyncSession, sha256_list: List[str]) -> None:
+        """删除内容块记录（只删除仍未被引用的）"""
+        if not sha256_list:
+            return
+        await session.execute(
+            delete(ContentBlob).where(ContentBlob.sha256.in_(sha256_list), ContentBlob.ref_count <= 0)
+        )
+
+    async def get_known(self, session: AsyncSession, sha256_list: List[str]) -> List[str]:
+        """获取已有记录的内容块"""
+        if not sha256_list:
+            return []
+        result = await session.execute(select(ContentBlob.sha256).where(ContentBlob.sha256.in_(sha256_list)))
+        return list(result.scalars().all())
+
+    async def get_totals(self, session: AsyncSession) -> dict:
+        """内容块数量、总大小和被引用次数"""
+        result = await session.execute(
+            select(func.count(ContentBlob.id), func.sum(ContentBlob.size), func.sum(ContentBlob.ref_count))
+        )
+        count, size, refs = result.one()
+        return {"blobs": count or 0, "total_size": int(size or 0), "references": int(refs or 0)}
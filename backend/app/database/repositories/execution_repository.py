@@ -2,266 +2,461 @@
 执行记录仓库
 管理脚本执行记录数据的数据访问层
 """
-from typing import Optional, List, Dict, Any
-from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc
+from typing import Optional, List, Dict, Any, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete, func, or_, event
 
+from app.database.models.executions import ScriptExecution, ExecutionLog, ExecutionArtifact
+from app.database.models.scripts import TestScript
 from .base import BaseRepository
+from app.core.logging import get_logger
 
+logger = get_logger(__name__)
 
-class ExecutionRepository(BaseRepository):
-    """执行记录数据仓库"""
+# 活跃状态与终止状态
+ACTIVE_STATUSES = ('pending', 'running')
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
 
-    def __init__(self, db_session: Session):
-        super().__init__(db_session, None)  # 暂时没有ExecutionModel
+# 允许的状态流转
+STATUS_TRANSITIONS: Dict[str, Tuple[str, ...]] = {
+    'pending': ('running', 'failed', 'cancelled'),
+    'running': ('completed', 'failed', 'cancelled'),
+    'completed': (),
+    'failed': (),
+    'cancelled': (),
+}
 
-    def create_execution(self, 
-                        script_id: str,
-                        execution_id: str,
-                        status: str = "running",
-                        config: Optional[Dict[str, Any]] = None,
-                        environment: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """创建新的执行记录
-        
-        Args:
-            script_id: 脚本ID
-            execution_id: 执行ID
-            status: 执行状态
-            config: 执行配置
-            environment: 执行环境
-            
-        Returns:
-            Dict[str, Any]: 创建的执行记录
-        """
-        execution_data = {
-            "id": execution_id,
-            "script_id": script_id,
-            "status": status,
-            "config": config or {},
-            "environment": environment or {},
-            "started_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-            "logs": [],
-            "result": None,
-            "error_message": None
-        }
-        
-        return execution_data
-
-    def get_execution_by_id(self, execution_id: str) -> Optional[Dict[str, Any]]:
-        """根据执行ID获取执行记录
-        
-        Args:
-            execution_id: 执行ID
-            
-        Returns:
-            Optional[Dict[str, Any]]: 执行记录，如果不存在返回None
-        """
-        # 暂时返回模拟数据
-        return {
-            "id": execution_id,
-            "script_id": "script_001",
-            "status": "completed",
-            "config": {"browser": "chromium", "headless": True},
-            "environment": {"os": "windows", "python_version": "3.12"},
-            "started_at": datetime.utcnow(),
-            "completed_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-            "logs": [
-                {"timestamp": datetime.utcnow(), "level": "INFO", "message": "开始执行脚本"},
-                {"timestamp": datetime.utcnow(), "level": "INFO", "message": "脚本执行完成"}
-            ],
-            "result": {"success": True, "steps_completed": 5},
-            "error_message": None
-        }
-
-    def get_executions_by_script(self, 
-                                script_id: str, 
-                                limit: int = 20) -> List[Dict[str, Any]]:
-        """获取脚本的执行记录列表
-        
-        Args:
-            script_id: 脚本ID
-            limit: 返回数量限制
-            
-        Returns:
-            List[Dict[str, Any]]: 执行记录列表
-        """
-        # 暂时返回模拟数据
-        executions = []
-        for i in range(1, min(limit + 1, 6)):
-            executions.append({
-                "id": f"exec_{script_id}_{i}",
-                "script_id": script_id,
-                "status": "completed" if i % 2 == 0 else "failed",
-                "config": {"browser": "chromium", "headless": True},
-                "environment": {"os": "windows", "python_version": "3.12"},
-                "started_at": datetime.utcnow(),
-                "completed_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow(),
-                "logs": [],
-                "result": {"success": i % 2 == 0, "steps_completed": i * 2},
-                "error_message": None if i % 2 == 0 else f"执行错误_{i}"
-            })
-        return executions
-
-    def update_execution_status(self, 
-                               execution_id: str, 
-                               status: str,
-                               result: Optional[Dict[str, Any]] = None,
-                               error_message: Optional[str] = None) -> Optional[Dict[str, Any]]:
+
+class ExecutionRepository(BaseRepository[ScriptExecution]):
+    """执行记录数据仓库
+
+    执行日志和性能指标先按执行写入内存缓冲区，达到批量大小或执行结束时
+    通过 flush() 一次性写入数据库，避免每行日志一次往返。
+    仓库实例在多个执行之间共享，flush() 只写入指定执行的缓冲数据，
+    不会把其他执行的日志提交到调用方的事务中。
+    写入的数据在调用方的事务提交后才从缓冲区移除，事务回滚时保留，由下一次 flush 重新写入。
+    """
+
+    def __init__(self, flush_batch_size: int = 200):
+        super().__init__(ScriptExecution)
+        self.flush_batch_size = flush_batch_size
+        self._pending_logs: Dict[str, List[Dict[str, Any]]] = {}
+        self._pending_metrics: Dict[str, Dict[str, Any]] = {}
+        # 已写入当前事务、等待提交的日志行数和指标
+        self._flushed_logs: Dict[str, int] = {}
+        self._flushed_metrics: Dict[str, Dict[str, Any]] = {}
+
+    async def create_execution(
+        self,
+        session: AsyncSession,
+        script_id: str,
+        execution_id: str,
+        status: str = 'pending',
+        execution_config: Optional[Dict[str, Any]] = None,
+        environment_info: Optional[Dict[str, Any]] = None,
+        batch_id: Optional[str] = None
+    ) -> ScriptExecution:
+        """创建新的执行记录"""
+        if status not in STATUS_TRANSITIONS:
+            raise ValueError(f"无效的执行状态: {status}")
+
+        return await self.create(
+            session,
+            script_id=script_id,
+            execution_id=execution_id,
+            batch_id=batch_id,
+            status=status,
+            execution_config=execution_config or {},
+            environment_info=environment_info or {},
+            start_time=datetime.utcnow() if status == 'running' else None
+        )
+
+    async def get_by_execution_id(self, session: AsyncSession, execution_id: str) -> Optional[ScriptExecution]:
+        """根据外部执行ID获取执行记录"""
+        try:
+            result = await session.execute(
+                select(ScriptExecution)
+                .where(ScriptExecution.execution_id == execution_id)
+                .order_by(ScriptExecution.created_at.desc())
+                .limit(1)
+            )
+            return result.scalar_one_or_none()
+        except Exception as e:
+            logger.error(f"获取执行记录失败: {e}")
+            raise
+
+    async def get_executions_by_script(
+        self,
+        session: AsyncSession,
+        script_id: str,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[ScriptExecution]:
+        """获取脚本的执行记录列表（按创建时间倒序）"""
+        try:
+            result = await session.execute(
+                select(ScriptExecution)
+                .where(ScriptExecution.script_id == script_id)
+                .order_by(ScriptExecution.created_at.desc())
+                .limit(limit)
+                .offset(offset)
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"获取脚本执行记录失败: {e}")
+            raise
+
+    async def update_status(
+        self,
+        session: AsyncSession,
+        id: str,
+        status: str,
+        error_message: Optional[str] = None,
+        exit_code: Optional[int] = None
+    ) -> Optional[ScriptExecution]:
         """更新执行状态
-        
-        Args:
-            execution_id: 执行ID
-            status: 新状态
-            result: 执行结果
-            error_message: 错误信息
-            
-        Returns:
-            Optional[Dict[str, Any]]: 更新后的执行记录
+
+        只允许 STATUS_TRANSITIONS 中定义的流转，非法流转抛出 ValueError；
+        进入终止状态前会先写入该执行缓冲中的日志和指标，并更新脚本的执行次数和最近执行状态。
         """
-        execution = self.get_execution_by_id(execution_id)
-        if execution:
-            execution.update({
-                "status": status,
-                "updated_at": datetime.utcnow()
-            })
-            
-            if result:
-                execution["result"] = result
-                
-            if error_message:
-                execution["error_message"] = error_message
-                
-            if status in ["completed", "failed", "cancelled"]:
-                execution["completed_at"] = datetime.utcnow()
-                
+        try:
+            execution = await self.get_by_id(session, id)
+            if not execution:
+                return None
+
+            if status == execution.status:
+                return execution
+            if status not in STATUS_TRANSITIONS.get(execution.status, ()):
+                raise ValueError(f"不允许的状态流转: {execution.status} -> {status}")
+
+            now = datetime.utcnow()
+            execution.status = status
+            if status == 'running':
+                execution.start_time = now
+            elif status in TERMINAL_STATUSES:
+                await self.flush(session, execution_pk=id)
+                execution.end_time = now
+                if execution.start_time:
+                    execution.duration_seconds = int((now - execution.start_time).total_seconds())
+                # 脚本的执行统计（历史成功脚本检索按最近执行状态筛选）
+                await session.execute(
+                    update(TestScript)
+                    .where(TestScript.id == execution.script_id)
+                    .values(
+                        execution_count=func.coalesce(TestScript.execution_count, 0) + 1,
+                        last_execution_time=now,
+                        last_execution_status=status
+                    )
+                )
+            if error_message is not None:
+                execution.error_message = error_message
+            if exit_code is not None:
+                execution.exit_code = exit_code
+
+            await session.flush()
             return execution
-        return None
-
-    def add_execution_log(self, 
-                         execution_id: str, 
-                         level: str, 
-                         message: str) -> bool:
-        """添加执行日志
-        
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"更新执行状态失败: {e}")
+            raise
+
+    async def add_execution_log(
+        self,
+        session: AsyncSession,
+        execution_pk: str,
+        message: str,
+        level: str = 'INFO',
+        step_number: Optional[int] = None,
+        step_name: Optional[str] = None,
+        component: Optional[str] = None,
+        extra_data: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """追加执行日志（缓冲，达到批量大小时自动写入）
+
         Args:
-            execution_id: 执行ID
-            level: 日志级别
-            message: 日志消息
-            
-        Returns:
-            bool: 添加是否成功
+            execution_pk: 执行记录主键（script_executions.id）
         """
-        execution = self.get_execution_by_id(execution_id)
-        if execution:
-            log_entry = {
-                "timestamp": datetime.utcnow(),
-                "level": level,
-                "message": message
-            }
-            execution["logs"].append(log_entry)
-            execution["updated_at"] = datetime.utcnow()
-            return True
-        return False
-
-    def get_active_executions(self) -> List[Dict[str, Any]]:
-        """获取活跃的执行记录
-        
-        Returns:
-            List[Dict[str, Any]]: 活跃执行记录列表
-        """
-        # 暂时返回模拟数据
-        return [
-            {
-                "id": f"exec_active_{i}",
-                "script_id": f"script_{i}",
-                "status": "running",
-                "config": {"browser": "chromium", "headless": True},
-                "environment": {"os": "windows", "python_version": "3.12"},
-                "started_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow(),
-                "logs": [],
-                "result": None,
-                "error_message": None
-            }
-            for i in range(1, 4)
-        ]
+        self.buffer_log(execution_pk, message, level, step_number, step_name, component, extra_data)
+        if self.flush_due(execution_pk):
+            await self.flush(session, execution_pk)
+
+    def buffer_log(
+        self,
+        execution_pk: str,
+        message: str,
+        level: str = 'INFO',
+        step_number: Optional[int] = None,
+        step_name: Optional[str] = None,
+        component: Optional[str] = None,
+        extra_data: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """只写入内存缓冲，不访问数据库（调用方用 flush_due 判断是否需要打开会话写入）"""
+        self._pending_logs.setdefault(execution_pk, []).append({
+            "execution_id": execution_pk,
+            "log_level": level.upper(),
+            "message": message,
+            "timestamp": datetime.utcnow(),
+            "step_number": step_number,
+            "step_name": step_name,
+            "component": component,
+            "extra_data": extra_data,
+        })
+
+    def flush_due(self, execution_pk: str) -> bool:
+        """未写入的日志是否达到批量大小"""
+        return self.pending_count(execution_pk) >= self.flush_batch_size
+
+    def record_metrics(self, execution_pk: str, metrics: Dict[str, Any]) -> None:
+        """记录性能指标（缓冲，与已有指标合并，flush时写入）"""
+        self._pending_metrics.setdefault(execution_pk, {}).update(metrics)
+
+    async def flush(self, session: AsyncSession, execution_pk: str) -> int:
+        """将指定执行缓冲的日志和指标写入数据库
 
-    def get_execution_statistics(self) -> Dict[str, Any]:
-        """获取执行统计信息
-        
-        Returns:
-            Dict[str, Any]: 统计信息
-        """
-        return {
-            "total_executions": 100,
-            "successful_executions": 85,
-            "failed_executions": 12,
-            "cancelled_executions": 3,
-            "success_rate": 0.85,
-            "average_execution_time": 45.5,
-            "executions_by_status": {
-                "completed": 85,
-                "failed": 12,
-                "cancelled": 3,
-                "running": 2
-            },
-            "executions_by_script": {
-                "script_001": 25,
-                "script_002": 20,
-                "script_003": 15,
-                "others": 40
-            }
-        }
-
-    def search_executions(self, 
-                         query: str,
-                         script_id: Optional[str] = None,
-                         status: Optional[str] = None,
-                         limit: int = 50) -> List[Dict[str, Any]]:
-        """搜索执行记录
-        
         Args:
-            query: 搜索关键词
-            script_id: 脚本ID过滤
-            status: 状态过滤
-            limit: 返回数量限制
-            
+            execution_pk: 执行记录主键，只写入该执行的缓冲数据
+
         Returns:
-            List[Dict[str, Any]]: 搜索结果
+            int: 写入的日志行数
         """
-        # 暂时返回模拟数据
-        results = []
-        for i in range(1, min(limit + 1, 6)):
-            if not query or query.lower() in f"exec_{i}".lower():
-                if not script_id or script_id == f"script_{i}":
-                    if not status or status == ("completed" if i % 2 == 0 else "failed"):
-                        results.append({
-                            "id": f"exec_{i}",
-                            "script_id": f"script_{i}",
-                            "status": "completed" if i % 2 == 0 else "failed",
-                            "config": {"browser": "chromium", "headless": True},
-                            "environment": {"os": "windows", "python_version": "3.12"},
-                            "started_at": datetime.utcnow(),
-                            "completed_at": datetime.utcnow(),
-                            "updated_at": datetime.utcnow(),
-                            "logs": [],
-                            "result": {"success": i % 2 == 0, "steps_completed": i * 2},
-                            "error_message": None if i % 2 == 0 else f"执行错误_{i}"
-                        })
-        return results
-
-    def cleanup_old_executions(self, days: int = 30) -> int:
-        """清理旧的执行记录
-        
-        Args:
-            days: 保留天数
-            
+        # 只写入本事务中尚未写入的部分，缓冲数据在事务提交后移除
+        offset = self._flushed_logs.get(execution_pk, 0)
+        logs = self._pending_logs.get(execution_pk, [])[offset:]
+        metrics = dict(self._pending_metrics.get(execution_pk) or {})
+        if not logs and not metrics:
+            return 0
+
+        self._track_transaction(session, execution_pk)
+        try:
+            if logs:
+                self._flushed_logs[execution_pk] = offset + len(logs)
+                await session.execute(insert(ExecutionLog), logs)
+
+            if metrics:
+                self._flushed_metrics[execution_pk] = metrics
+                current = await session.scalar(
+                    select(ScriptExecution.performance_metrics).where(ScriptExecution.id == execution_pk)
+                )
+                merged = dict(current or {})
+                merged.update(metrics)
+                await session.execute(
+                    update(ScriptExecution)
+                    .where(ScriptExecution.id == execution_pk)
+                    .values(performance_metrics=merged)
+                )
+
+            return len(logs)
+        except Exception as e:
+            # 写入失败时数据仍在缓冲区，由下一次flush重试
+            self._reset_flushed(execution_pk)
+            logger.error(f"写入执行日志和指标失败: {e}")
+            raise
+
+    def _track_transaction(self, session: AsyncSession, execution_pk: str) -> None:
+        """在调用方事务提交后移除已写入的缓冲数据，回滚时保留"""
+        tracked = session.info.setdefault("execution_repository_flushes", set())
+        if execution_pk in tracked:
+            return
+        tracked.add(execution_pk)
+
+        def on_commit(_session):
+            tracked.discard(execution_pk)
+            self._confirm_flushed(execution_pk)
+
+        def on_rollback(_session):
+            tracked.discard(execution_pk)
+            self._reset_flushed(execution_pk)
+
+        event.listen(session.sync_session, "after_commit", on_commit, once=True)
+        event.listen(session.sync_session, "after_rollback", on_rollback, once=True)
+
+    def _confirm_flushed(self, execution_pk: str) -> None:
+        count = self._flushed_logs.pop(execution_pk, 0)
+        logs = self._pending_logs.get(execution_pk)
+        if logs is not None:
+            del logs[:count]
+            if not logs:
+                self._pending_logs.pop(execution_pk, None)
+        flushed_metrics = self._flushed_metrics.pop(execution_pk, None)
+        metrics = self._pending_metrics.get(execution_pk)
+        if flushed_metrics and metrics is not None:
+            # 写入之后又更新的指标保留到下一次flush
+            for key, value in flushed_metrics.items():
+                if key in metrics and metrics[key] == value:
+                    del metrics[key]
+            if not metrics:
+                self._pending_metrics.pop(execution_pk, None)
+
+    def _reset_flushed(self, execution_pk: str) -> None:
+        self._flushed_logs.pop(execution_pk, None)
+        self._flushed_metrics.pop(execution_pk, None)
+
+    def discard(self, execution_pk: str) -> None:
+        """丢弃执行的缓冲数据（执行记录无法写入时调用，避免缓冲区无限增长）"""
+        self._pending_logs.pop(execution_pk, None)
+        self._pending_metrics.pop(execution_pk, None)
+        self._reset_flushed(execution_pk)
+
+    def pending_count(self, execution_pk: str) -> int:
+        """执行缓冲中尚未写入数据库的日志行数"""
+        return len(self._pending_logs.get(execution_pk, [])) - self._flushed_logs.get(execution_pk, 0)
+
+    def buffered_count(self, execution_pk: str) -> int:
+        """执行缓冲中尚未提交的日志行数（包括已写入、等待事务提交的部分）"""
+        return len(self._pending_logs.get(execution_pk, []))
+
+    async def get_execution_logs(
+        self,
+        session: AsyncSession,
+        execution_pk: str,
+        level: Optional[str] = None,
+        limit: int = 500,
+        offset: int = 0
+    ) -> List[ExecutionLog]:
+        """获取执行日志（按时间顺序）"""
+        try:
+            query = select(ExecutionLog).where(ExecutionLog.execution_id == execution_pk)
+            if level:
+                query = query.where(ExecutionLog.log_level == level.upper())
+            result = await session.execute(
+                query.order_by(ExecutionLog.timestamp).limit(limit).offset(offset)
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"获取执行日志失败: {e}")
+            raise
+
+    async def get_active_executions(self, session: AsyncSession, limit: int = 100) -> List[ScriptExecution]:
+        """获取活跃的执行记录（使用 status + start_time 复合索引）"""
+        try:
+            result = await session.execute(
+                select(ScriptExecution)
+                .where(ScriptExecution.status.in_(ACTIVE_STATUSES))
+                .order_by(ScriptExecution.start_time)
+                .limit(limit)
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"获取活跃执行记录失败: {e}")
+            raise
+
+    async def get_execution_statistics(self, session: AsyncSession) -> Dict[str, Any]:
+        """获取执行统计信息"""
+        try:
+            status_result = await session.execute(
+                select(ScriptExecution.status, func.count(ScriptExecution.id))
+                .group_by(ScriptExecution.status)
+            )
+            executions_by_status = {status: count for status, count in status_result.all()}
+
+            avg_result = await session.execute(
+                select(func.avg(ScriptExecution.duration_seconds))
+                .where(ScriptExecution.duration_seconds.isnot(None))
+            )
+            average_execution_time = avg_result.scalar()
+
+            script_result = await session.execute(
+                select(ScriptExecution.script_id, func.count(ScriptExecution.id).label('count'))
+                .group_by(ScriptExecution.script_id)
+                .order_by(func.count(ScriptExecution.id).desc())
+                .limit(10)
+            )
+            executions_by_script = {script_id: count for script_id, count in script_result.all()}
+
+            total = sum(executions_by_status.values())
+            completed = executions_by_status.get('completed', 0)
+            finished = sum(executions_by_status.get(status, 0) for status in TERMINAL_STATUSES)
+
+            return {
+                "total_executions": total,
+                "successful_executions": completed,
+                "failed_executions": executions_by_status.get('failed', 0),
+                "cancelled_executions": executions_by_status.get('cancelled', 0),
+                "success_rate": completed / finished if finished else 0.0,
+                "average_execution_time": float(average_execution_time or 0),
+                "executions_by_status": executions_by_status,
+                "executions_by_script": executions_by_script
+            }
+        except Exception as e:
+            logger.error(f"获取执行统计信息失败: {e}")
+            raise
+
+    async def search_executions(
+        self,
+        session: AsyncSession,
+        query: Optional[str] = None,
+        script_id: Optional[str] = None,
+        status: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> List[ScriptExecution]:
+        """搜索执行记录"""
+        try:
+            stmt = select(ScriptExecution)
+            if query:
+                keyword = f"%{query}%"
+                stmt = stmt.where(or_(
+                    ScriptExecution.execution_id.like(keyword),
+                    ScriptExecution.error_message.like(keyword)
+                ))
+            if script_id:
+                stmt = stmt.where(ScriptExecution.script_id == script_id)
+            if status:
+                stmt = stmt.where(ScriptExecution.status == status)
+
+            result = await session.execute(
+                stmt.order_by(ScriptExecution.created_at.desc()).limit(limit).offset(offset)
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"搜索执行记录失败: {e}")
+            raise
+
+    async def cleanup_old_executions(
+        self,
+        session: AsyncSession,
+        days: int = 30,
+        chunk_size: int = 500
+    ) -> int:
+        """分批清理旧的执行记录
+
+        只清理已结束的执行；每批删除后立即提交，避免长事务和大范围锁表。
+
         Returns:
-            int: 清理的记录数量
+            int: 清理的执行记录数量
         """
-        # 暂时返回模拟数据
-        return 15
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        deleted = 0
+
+        try:
+            while True:
+                result = await session.execute(
+                    select(ScriptExecution.id)
+                    .where(
+                        ScriptExecution.created_at < cutoff,
+                        ScriptExecution.status.in_(TERMINAL_STATUSES)
+                    )
+                    .limit(chunk_size)
+                )
+                ids = list(result.scalars().all())
+                if not ids:
+                    break
+
+                # 子表先删，不依赖数据库的级联删除（SQLite默认不启用外键）
+                await session.execute(delete(ExecutionLog).where(ExecutionLog.execution_id.in_(ids)))
+                await session.execute(delete(ExecutionArtifact).where(ExecutionArtifact.execution_id.in_(ids)))
+                await session.execute(delete(ScriptExecution).where(ScriptExecution.id.in_(ids)))
+                await session.commit()
+
+                deleted += len(ids)
+                if len(ids) < chunk_size:
+                    break
+
+            if deleted:
+                logger.info(f"清理旧执行记录完成: {deleted}条")
+            return deleted
+        except Exception as e:
+            logger.error(f"清理旧执行记录失败: {e}")
+            raise
@@ -55,6 +55,24 @@ class PageAnalysisRepository(BaseRepository[PageAnalysisResult]):
             logger.error(f"根据分析ID获取页面分析结果失败: {e}")
             raise
 
+    async def list_summaries(self,
+                             session: AsyncSession,
+                             limit: int = 20,
+                             offset: int = 0) -> List[PageAnalysisResult]:
+        """分页获取页面分析结果摘要（不加载完整分析数据）"""
+        try:
+            result = await session.execute(
+                select(PageAnalysisResult)
+                .options(*PageAnalysisResult.summary_options())
+                .order_by(desc(PageAnalysisResult.created_at))
+                .limit(limit)
+                .offset(offset)
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"获取页面分析结果摘要失败: {e}")
+            raise
+
     async def get_with_elements(self, session: AsyncSession, analysis_id: str) -> Optional[Dict[str, Any]]:
         """获取页面分析结果及其元素"""
         try:
@@ -81,11 +99,19 @@ class PageAnalysisRepository(BaseRepository[PageAnalysisResult]):
     async def search_by_page_name(self,
                                   session: AsyncSession,
                                   page_name: str,
-                                  limit: int = 10) -> List[PageAnalysisResult]:
-        """根据页面名称搜索页面分析结果"""
+                                  limit: int = 10,
+                                  summary_only: bool = False) -> List[PageAnalysisResult]:
+        """根据页面名称搜索页面分析结果
+
+        summary_only为True时只加载摘要列（用于列表展示）
+        """
         try:
+            query = select(PageAnalysisResult)
+            if summary_only:
+                query = query.options(*PageAnalysisResult.summary_options())
+
             result = await session.execute(
-                select(PageAnalysisResult)
+                query
                 .where(PageAnalysisResult.page_name.like(f"%{page_name}%"))
                 .order_by(desc(PageAnalysisResult.created_at))
                 .limit(limit)
@@ -112,6 +138,21 @@ class PageAnalysisRepository(BaseRepository[PageAnalysisResult]):
             logger.error(f"根据会话ID获取页面分析结果失败: {e}")
             raise
 
+    async def delete_by_session_id(self, session: AsyncSession, session_id: str) -> List[str]:
+        """删除会话的全部分析结果（级联删除元素），返回删除的记录ID"""
+        try:
+            result = await session.execute(
+                select(PageAnalysisResult).where(PageAnalysisResult.session_id == session_id)
+            )
+            pages = result.scalars().all()
+            for page in pages:
+                await session.delete(page)
+            await session.flush()
+            return [page.id for page in pages]
+        except Exception as e:
+            logger.error(f"根据会话ID删除页面分析结果失败: {e}")
+            raise
+
     async def get_high_confidence_results(self,
                                           session: AsyncSession,
                                           min_confidence: float = 0.8,
@@ -3,271 +3,195 @@
 管理测试报告数据的数据访问层
 """
 from typing import Optional, List, Dict, Any
-from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, func, or_
 
 from .base import BaseRepository
+from app.database.models.reports import TestReport
+from app.core.logging import get_logger
 
+logger = get_logger(__name__)
 
-class ReportRepository(BaseRepository):
-    """报告数据仓库"""
+# 报告文件保存到内容寻址存储后，原报告目录中的文件路径记录为该类型的产物（供按脚本清理报告目录）
+REPORT_SOURCE_ARTIFACT = "source"
 
-    def __init__(self, db_session: Session):
-        super().__init__(db_session, None)  # 暂时没有ReportModel
 
-    def create_report(self, 
-                     report_id: str,
-                     title: str,
-                     report_type: str = "execution",
-                     content: Optional[Dict[str, Any]] = None,
-                     metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """创建新报告
-        
-        Args:
-            report_id: 报告ID
-            title: 报告标题
-            report_type: 报告类型
-            content: 报告内容
-            metadata: 报告元数据
-            
-        Returns:
-            Dict[str, Any]: 创建的报告信息
-        """
-        report_data = {
-            "id": report_id,
-            "title": title,
-            "report_type": report_type,
-            "content": content or {},
-            "metadata": metadata or {},
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-            "status": "generated"
-        }
-        
-        return report_data
+class ReportRepository(BaseRepository[TestReport]):
+    """报告数据仓库
 
-    def get_report_by_id(self, report_id: str) -> Optional[Dict[str, Any]]:
-        """根据报告ID获取报告
-        
-        Args:
-            report_id: 报告ID
-            
-        Returns:
-            Optional[Dict[str, Any]]: 报告信息，如果不存在返回None
-        """
-        # 暂时返回模拟数据
-        return {
-            "id": report_id,
-            "title": f"测试报告_{report_id}",
-            "report_type": "execution",
-            "content": {
-                "summary": {
-                    "total_tests": 10,
-                    "passed": 8,
-                    "failed": 2,
-                    "success_rate": 0.8
-                },
-                "details": [
-                    {"test_name": "登录测试", "status": "passed", "duration": 5.2},
-                    {"test_name": "搜索测试", "status": "failed", "duration": 3.1, "error": "元素未找到"}
-                ]
-            },
-            "metadata": {
-                "generated_by": "system",
-                "execution_id": "exec_001"
-            },
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-            "status": "generated"
-        }
+    列表类查询使用摘要加载选项，不加载日志和产物等重型列。
+    """
 
-    def get_reports_by_type(self, 
-                           report_type: str, 
-                           limit: int = 20) -> List[Dict[str, Any]]:
-        """根据类型获取报告列表
-        
-        Args:
-            report_type: 报告类型
-            limit: 返回数量限制
-            
-        Returns:
-            List[Dict[str, Any]]: 报告列表
-        """
-        # 暂时返回模拟数据
-        reports = []
-        for i in range(1, min(limit + 1, 6)):
-            reports.append({
-                "id": f"report_{report_type}_{i}",
-                "title": f"{report_type}报告_{i}",
-                "report_type": report_type,
-                "content": {
-                    "summary": {
-                        "total_tests": i * 5,
-                        "passed": i * 4,
-                        "failed": i,
-                        "success_rate": 0.8
-                    }
-                },
-                "metadata": {
-                    "generated_by": "system",
-                    "execution_id": f"exec_{i}"
-                },
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow(),
-                "status": "generated"
-            })
-        return reports
+    def __init__(self):
+        super().__init__(TestReport)
 
-    def update_report(self, 
-                     report_id: str, 
-                     update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """更新报告信息
-        
-        Args:
-            report_id: 报告ID
-            update_data: 更新数据
-            
-        Returns:
-            Optional[Dict[str, Any]]: 更新后的报告信息
-        """
-        report = self.get_report_by_id(report_id)
-        if report:
-            report.update(update_data)
-            report["updated_at"] = datetime.utcnow()
-            return report
-        return None
+    async def get_by_execution_id(self, session: AsyncSession, execution_id: str) -> Optional[TestReport]:
+        """根据执行ID获取报告详情"""
+        try:
+            result = await session.execute(
+                select(TestReport)
+                .where(TestReport.execution_id == execution_id)
+                .order_by(TestReport.created_at.desc())
+                .limit(1)
+            )
+            return result.scalar_one_or_none()
+        except Exception as e:
+            logger.error(f"根据执行ID获取报告失败: {e}")
+            raise
 
-    def delete_report(self, report_id: str) -> bool:
-        """删除报告
-        
-        Args:
-            report_id: 报告ID
-            
-        Returns:
-            bool: 删除是否成功
-        """
-        # 暂时返回成功
-        return True
+    async def get_reports_by_script(
+        self,
+        session: AsyncSession,
+        script_id: str,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[TestReport]:
+        """获取脚本的报告列表（摘要）"""
+        try:
+            result = await session.execute(
+                select(TestReport)
+                .options(*TestReport.summary_options())
+                .where(TestReport.script_id == script_id)
+                .order_by(TestReport.created_at.desc())
+                .limit(limit)
+                .offset(offset)
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"获取脚本报告列表失败: {e}")
+            raise
 
-    def search_reports(self, 
-                      query: str,
-                      report_type: Optional[str] = None,
-                      limit: int = 50) -> List[Dict[str, Any]]:
-        """搜索报告
-        
-        Args:
-            query: 搜索关键词
-            report_type: 报告类型过滤
-            limit: 返回数量限制
-            
-        Returns:
-            List[Dict[str, Any]]: 搜索结果
-        """
-        # 暂时返回模拟数据
-        results = []
-        for i in range(1, min(limit + 1, 6)):
-            title = f"测试报告_{i}"
-            if query.lower() in title.lower():
-                if not report_type or report_type == "execution":
-                    results.append({
-                        "id": f"report_{i}",
-                        "title": title,
-                        "report_type": "execution",
-                        "content": {
-                            "summary": {
-                                "total_tests": i * 5,
-                                "passed": i * 4,
-                                "failed": i,
-                                "success_rate": 0.8
-                            }
-                        },
-                        "metadata": {
-                            "generated_by": "system",
-                            "execution_id": f"exec_{i}"
-                        },
-                        "created_at": datetime.utcnow(),
-                        "updated_at": datetime.utcnow(),
-                        "status": "generated"
-                    })
-        return results
+    async def get_recent_reports(self, session: AsyncSession, limit: int = 10) -> List[TestReport]:
+        """获取最近的报告（摘要）"""
+        try:
+            result = await session.execute(
+                select(TestReport)
+                .options(*TestReport.summary_options())
+                .order_by(TestReport.created_at.desc())
+                .limit(limit)
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"获取最近报告失败: {e}")
+            raise
 
-    def get_report_statistics(self) -> Dict[str, Any]:
-        """获取报告统计信息
-        
-        Returns:
-            Dict[str, Any]: 统计信息
-        """
-        return {
-            "total_reports": 50,
-            "reports_by_type": {
-                "execution": 35,
-                "summary": 10,
-                "analysis": 5
-            },
-            "reports_by_status": {
-                "generated": 45,
-                "archived": 5
-            },
-            "recent_reports": 10
-        }
+    async def search_reports(
+        self,
+        session: AsyncSession,
+        query: Optional[str] = None,
+        status: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> List[TestReport]:
+        """搜索报告（摘要）"""
+        try:
+            stmt = select(TestReport).options(*TestReport.summary_options())
+            if query:
+                keyword = f"%{query}%"
+                stmt = stmt.where(or_(
+                    TestReport.script_name.like(keyword),
+                    TestReport.script_id.like(keyword),
+                    TestReport.execution_id.like(keyword)
+                ))
+            if status:
+                stmt = stmt.where(TestReport.status == status)
 
-    def get_recent_reports(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """获取最近的报告
-        
-        Args:
-            limit: 返回数量限制
-            
-        Returns:
-            List[Dict[str, Any]]: 最近报告列表
-        """
-        # 暂时返回模拟数据
-        reports = []
-        for i in range(1, min(limit + 1, 6)):
-            reports.append({
-                "id": f"report_recent_{i}",
-                "title": f"最近报告_{i}",
-                "report_type": "execution",
-                "content": {
-                    "summary": {
-                        "total_tests": i * 3,
-                        "passed": i * 2,
-                        "failed": i,
-                        "success_rate": 0.67
-                    }
-                },
-                "metadata": {
-                    "generated_by": "system",
-                    "execution_id": f"exec_recent_{i}"
-                },
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow(),
-                "status": "generated"
-            })
-        return reports
+            result = await session.execute(
+                stmt.order_by(TestReport.created_at.desc()).limit(limit).offset(offset)
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"搜索报告失败: {e}")
+            raise
 
-    def archive_report(self, report_id: str) -> Optional[Dict[str, Any]]:
-        """归档报告
-        
-        Args:
-            report_id: 报告ID
-            
-        Returns:
-            Optional[Dict[str, Any]]: 更新后的报告信息
-        """
-        return self.update_report(report_id, {
-            "status": "archived",
-            "archived_at": datetime.utcnow()
-        })
+    async def get_report_statistics(self, session: AsyncSession, recent_days: int = 7) -> Dict[str, Any]:
+        """获取报告统计信息"""
+        try:
+            status_result = await session.execute(
+                select(TestReport.status, func.count(TestReport.id))
+                .group_by(TestReport.status)
+            )
+            reports_by_status = {status: count for status, count in status_result.all()}
+
+            aggregate_result = await session.execute(
+                select(func.avg(TestReport.duration), func.avg(TestReport.success_rate))
+            )
+            average_duration, average_success_rate = aggregate_result.one()
+
+            recent_result = await session.execute(
+                select(func.count(TestReport.id))
+                .where(TestReport.created_at >= datetime.utcnow() - timedelta(days=recent_days))
+            )
+
+            return {
+                "total_reports": sum(reports_by_status.values()),
+                "reports_by_status": reports_by_status,
+                "average_duration": float(average_duration or 0),
+                "average_success_rate": float(average_success_rate or 0),
+                "recent_reports": recent_result.scalar() or 0
+            }
+        except Exception as e:
+            logger.error(f"获取报告统计信息失败: {e}")
+            raise
+
+    async def get_report_files(self, session: AsyncSession) -> List[Dict[str, Any]]:
+        """获取报告记录关联的文件：报告路径（referenced 为 True）和报告目录中的原文件，以及所属脚本ID"""
+        try:
+            result = await session.execute(
+                select(TestReport.script_id, TestReport.report_path, TestReport.artifacts)
+            )
+            files = []
+            for row in result.all():
+                if row.report_path:
+                    files.append({"path": row.report_path, "script_id": row.script_id, "referenced": True})
+                for artifact in row.artifacts or []:
+                    if isinstance(artifact, dict) and artifact.get("type") == REPORT_SOURCE_ARTIFACT \
+                            and artifact.get("path"):
+                        files.append({"path": artifact["path"], "script_id": row.script_id, "referenced": False})
+            return files
+        except Exception as e:
+            logger.error(f"获取报告文件失败: {e}")
+            raise
+
+    async def cleanup_old_reports(
+        self,
+        session: AsyncSession,
+        days: int = 90,
+        chunk_size: int = 500
+    ) -> List[Dict[str, Any]]:
+        """分批删除旧报告记录，每批删除后提交
 
-    def cleanup_old_reports(self, days: int = 90) -> int:
-        """清理旧报告
-        
-        Args:
-            days: 保留天数
-            
         Returns:
-            int: 清理的报告数量
+            List[Dict[str, Any]]: 被删除报告的 execution_id、report_path 和 artifacts（供调用方清理日志和报告文件）
         """
-        # 暂时返回模拟数据
-        return 8
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        removed: List[Dict[str, Any]] = []
+
+        try:
+            while True:
+                result = await session.execute(
+                    select(TestReport.id, TestReport.execution_id, TestReport.report_path, TestReport.artifacts)
+                    .where(TestReport.created_at < cutoff)
+                    .limit(chunk_size)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+
+                await session.execute(delete(TestReport).where(TestReport.id.in_([row.id for row in rows])))
+                await session.commit()
+
+                removed.extend(
+                    {"execution_id": row.execution_id, "report_path": row.report_path, "artifacts": row.artifacts}
+                    for row in rows
+                )
+                if len(rows) < chunk_size:
+                    break
+
+            if removed:
+                logger.info(f"清理旧报告完成: {len(removed)}条")
+            return removed
+        except Exception as e:
+            logger.error(f"清理旧报告失败: {e}")
+            raise
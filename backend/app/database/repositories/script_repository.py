@@ -41,8 +41,10 @@ class ScriptRepository(BaseRepository[TestScript]):
     ) -> tuple[List[TestScript], int]:
         """搜索脚本"""
         try:
-            # 构建基础查询
+            # 构建基础查询（不需要内容时延迟加载脚本正文）
             query = select(TestScript).options(selectinload(TestScript.tags))
+            if not request.include_content:
+                query = query.options(*TestScript.summary_options())
             count_query = select(func.count(TestScript.id))
             
             # 应用过滤条件
@@ -149,6 +151,7 @@ class ScriptRepository(BaseRepository[TestScript]):
             # 最常用脚本
             most_used_result = await session.execute(
                 select(TestScript)
+                .options(*TestScript.summary_options())
                 .order_by(TestScript.execution_count.desc())
                 .limit(5)
             )
@@ -165,6 +168,7 @@ class ScriptRepository(BaseRepository[TestScript]):
             # 最近创建脚本
             recent_result = await session.execute(
                 select(TestScript)
+                .options(*TestScript.summary_options())
                 .order_by(TestScript.created_at.desc())
                 .limit(5)
             )
@@ -1,256 +1,211 @@
 """
 会话仓库
-管理用户会话数据的数据访问层
+管理分析会话数据的数据访问层
 """
 from typing import Optional, List, Dict, Any
-from datetime import datetime
-from sqlalchemy.orm import Session as SQLSession
-from sqlalchemy import and_, or_, desc
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, func, cast, String
 
 from .base import BaseRepository
 from app.database.models.sessions import Session as SessionModel
-from app.core.types import SessionStatus
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 未结束的会话状态
+ACTIVE_SESSION_STATUSES = ('pending', 'processing')
 
 
 class SessionRepository(BaseRepository[SessionModel]):
     """会话数据仓库"""
 
-    def __init__(self, db_session: SQLSession):
-        super().__init__(db_session, SessionModel)
+    def __init__(self):
+        super().__init__(SessionModel)
 
-    def create_session(self, 
-                      session_id: str,
-                      user_id: Optional[str] = None,
-                      session_type: str = "web_test",
-                      metadata: Optional[Dict[str, Any]] = None) -> SessionModel:
-        """创建新会话
-        
-        Args:
-            session_id: 会话ID
-            user_id: 用户ID
-            session_type: 会话类型
-            metadata: 会话元数据
-            
-        Returns:
-            SessionModel: 创建的会话模型
-        """
-        session_data = {
-            "session_id": session_id,
-            "user_id": user_id,
-            "session_type": session_type,
-            "status": SessionStatus.ACTIVE.value,
-            "metadata": metadata or {},
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        
-        return self.create(session_data)
+    async def create_session(
+        self,
+        session: AsyncSession,
+        session_type: str,
+        platform: str = 'web',
+        request_data: Optional[Dict[str, Any]] = None,
+        project_id: Optional[str] = None,
+        session_id: Optional[str] = None
+    ) -> SessionModel:
+        """创建新会话（session_id为空时自动生成）"""
+        kwargs = dict(
+            session_type=session_type,
+            platform=platform,
+            status='pending',
+            request_data=request_data or {},
+            project_id=project_id
+        )
+        if session_id:
+            kwargs['id'] = session_id
+        return await self.create(session, **kwargs)
 
-    def get_by_session_id(self, session_id: str) -> Optional[SessionModel]:
-        """根据会话ID获取会话
-        
-        Args:
-            session_id: 会话ID
-            
-        Returns:
-            Optional[SessionModel]: 会话模型，如果不存在返回None
-        """
-        return self.db_session.query(SessionModel).filter(
-            SessionModel.session_id == session_id
-        ).first()
+    async def get_active_sessions(
+        self,
+        session: AsyncSession,
+        session_type: Optional[str] = None,
+        limit: int = 100
+    ) -> List[SessionModel]:
+        """获取未结束的会话列表"""
+        try:
+            query = select(SessionModel).where(SessionModel.status.in_(ACTIVE_SESSION_STATUSES))
+            if session_type:
+                query = query.where(SessionModel.session_type == session_type)
 
-    def get_active_sessions(self, user_id: Optional[str] = None) -> List[SessionModel]:
-        """获取活跃会话列表
-        
-        Args:
-            user_id: 用户ID，如果提供则只返回该用户的会话
-            
-        Returns:
-            List[SessionModel]: 活跃会话列表
-        """
-        query = self.db_session.query(SessionModel).filter(
-            SessionModel.status == SessionStatus.ACTIVE.value
+            result = await session.execute(
+                query.order_by(SessionModel.updated_at.desc()).limit(limit)
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"获取活跃会话失败: {e}")
+            raise
+
+    async def update_session_status(
+        self,
+        session: AsyncSession,
+        session_id: str,
+        status: str,
+        error_message: Optional[str] = None
+    ) -> Optional[SessionModel]:
+        """更新会话状态，进入结束状态时记录耗时"""
+        try:
+            instance = await self.get_by_id(session, session_id)
+            if not instance:
+                return None
+
+            instance.status = status
+            if error_message is not None:
+                instance.error_message = error_message
+            if status not in ACTIVE_SESSION_STATUSES and instance.created_at:
+                instance.duration_seconds = int((datetime.utcnow() - instance.created_at).total_seconds())
+
+            await session.flush()
+            return instance
+        except Exception as e:
+            logger.error(f"更新会话状态失败: {e}")
+            raise
+
+    async def save_analysis_result(
+        self,
+        session: AsyncSession,
+        session_id: str,
+        analysis_result: Dict[str, Any],
+        confidence_score: Optional[float] = None
+    ) -> Optional[SessionModel]:
+        """保存分析结果并将会话标记为完成"""
+        instance = await self.update(
+            session,
+            session_id,
+            analysis_result=analysis_result,
+            confidence_score=confidence_score
         )
-        
-        if user_id:
-            query = query.filter(SessionModel.user_id == user_id)
-            
-        return query.order_by(desc(SessionModel.updated_at)).all()
+        if not instance:
+            return None
+        return await self.update_session_status(session, session_id, 'completed')
 
-    def update_session_status(self, 
-                             session_id: str, 
-                             status: SessionStatus) -> Optional[SessionModel]:
-        """更新会话状态
-        
-        Args:
-            session_id: 会话ID
-            status: 新状态
-            
-        Returns:
-            Optional[SessionModel]: 更新后的会话模型
-        """
-        session = self.get_by_session_id(session_id)
-        if session:
-            update_data = {
-                "status": status.value,
-                "updated_at": datetime.utcnow()
-            }
-            return self.update(session.id, update_data)
-        return None
+    async def get_sessions_by_type(
+        self,
+        session: AsyncSession,
+        session_type: str,
+        limit: int = 50,
+        offset: int = 0
+    ) -> List[SessionModel]:
+        """根据类型获取会话列表"""
+        try:
+            result = await session.execute(
+                select(SessionModel)
+                .where(SessionModel.session_type == session_type)
+                .order_by(SessionModel.created_at.desc())
+                .limit(limit)
+                .offset(offset)
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"根据类型获取会话失败: {e}")
+            raise
 
-    def update_session_metadata(self, 
-                               session_id: str, 
-                               metadata: Dict[str, Any]) -> Optional[SessionModel]:
-        """更新会话元数据
-        
-        Args:
-            session_id: 会话ID
-            metadata: 新的元数据
-            
-        Returns:
-            Optional[SessionModel]: 更新后的会话模型
-        """
-        session = self.get_by_session_id(session_id)
-        if session:
-            # 合并现有元数据和新元数据
-            current_metadata = session.metadata or {}
-            current_metadata.update(metadata)
-            
-            update_data = {
-                "metadata": current_metadata,
-                "updated_at": datetime.utcnow()
-            }
-            return self.update(session.id, update_data)
-        return None
+    async def cleanup_expired_sessions(self, session: AsyncSession, expire_hours: int = 24) -> int:
+        """将长时间未更新的未结束会话标记为失败
 
-    def close_session(self, session_id: str) -> Optional[SessionModel]:
-        """关闭会话
-        
-        Args:
-            session_id: 会话ID
-            
         Returns:
-            Optional[SessionModel]: 更新后的会话模型
+            int: 处理的会话数量
         """
-        return self.update_session_status(session_id, SessionStatus.CLOSED)
+        try:
+            expire_time = datetime.utcnow() - timedelta(hours=expire_hours)
+            result = await session.execute(
+                update(SessionModel)
+                .where(
+                    SessionModel.status.in_(ACTIVE_SESSION_STATUSES),
+                    SessionModel.updated_at < expire_time
+                )
+                .values(
+                    status='failed',
+                    error_message=f"会话超过{expire_hours}小时未更新，已过期",
+                    updated_at=datetime.utcnow()
+                )
+                .execution_options(synchronize_session=False)
+            )
+            return result.rowcount or 0
+        except Exception as e:
+            logger.error(f"清理过期会话失败: {e}")
+            raise
 
-    def get_sessions_by_type(self, 
-                           session_type: str, 
-                           limit: int = 50) -> List[SessionModel]:
-        """根据类型获取会话列表
-        
-        Args:
-            session_type: 会话类型
-            limit: 返回数量限制
-            
-        Returns:
-            List[SessionModel]: 会话列表
-        """
-        return self.db_session.query(SessionModel).filter(
-            SessionModel.session_type == session_type
-        ).order_by(desc(SessionModel.created_at)).limit(limit).all()
+    async def get_session_statistics(self, session: AsyncSession) -> Dict[str, Any]:
+        """获取会话统计信息（按状态和类型分组聚合）"""
+        try:
+            status_result = await session.execute(
+                select(SessionModel.status, func.count(SessionModel.id))
+                .group_by(SessionModel.status)
+            )
+            sessions_by_status = {status: count for status, count in status_result.all()}
 
-    def cleanup_expired_sessions(self, 
-                                expire_hours: int = 24) -> int:
-        """清理过期会话
-        
-        Args:
-            expire_hours: 过期时间（小时）
-            
-        Returns:
-            int: 清理的会话数量
-        """
-        from datetime import timedelta
-        
-        expire_time = datetime.utcnow() - timedelta(hours=expire_hours)
-        
-        expired_sessions = self.db_session.query(SessionModel).filter(
-            and_(
-                SessionModel.status == SessionStatus.ACTIVE.value,
-                SessionModel.updated_at < expire_time
+            type_result = await session.execute(
+                select(SessionModel.session_type, func.count(SessionModel.id))
+                .group_by(SessionModel.session_type)
             )
-        ).all()
-        
-        count = 0
-        for session in expired_sessions:
-            self.update(session.id, {
-                "status": SessionStatus.EXPIRED.value,
-                "updated_at": datetime.utcnow()
-            })
-            count += 1
-            
-        return count
+            session_types = {session_type: count for session_type, count in type_result.all()}
 
-    def get_session_statistics(self) -> Dict[str, Any]:
-        """获取会话统计信息
-        
-        Returns:
-            Dict[str, Any]: 统计信息
-        """
-        total_sessions = self.db_session.query(SessionModel).count()
-        
-        active_sessions = self.db_session.query(SessionModel).filter(
-            SessionModel.status == SessionStatus.ACTIVE.value
-        ).count()
-        
-        closed_sessions = self.db_session.query(SessionModel).filter(
-            SessionModel.status == SessionStatus.CLOSED.value
-        ).count()
-        
-        expired_sessions = self.db_session.query(SessionModel).filter(
-            SessionModel.status == SessionStatus.EXPIRED.value
-        ).count()
-        
-        # 按类型统计
-        type_stats = {}
-        session_types = self.db_session.query(SessionModel.session_type).distinct().all()
-        for (session_type,) in session_types:
-            count = self.db_session.query(SessionModel).filter(
-                SessionModel.session_type == session_type
-            ).count()
-            type_stats[session_type] = count
-        
-        return {
-            "total_sessions": total_sessions,
-            "active_sessions": active_sessions,
-            "closed_sessions": closed_sessions,
-            "expired_sessions": expired_sessions,
-            "session_types": type_stats
-        }
+            return {
+                "total_sessions": sum(sessions_by_status.values()),
+                "active_sessions": sum(sessions_by_status.get(s, 0) for s in ACTIVE_SESSION_STATUSES),
+                "completed_sessions": sessions_by_status.get('completed', 0),
+                "failed_sessions": sessions_by_status.get('failed', 0),
+                "sessions_by_status": sessions_by_status,
+                "session_types": session_types
+            }
+        except Exception as e:
+            logger.error(f"获取会话统计信息失败: {e}")
+            raise
 
-    def search_sessions(self, 
-                       query: str, 
-                       session_type: Optional[str] = None,
-                       status: Optional[SessionStatus] = None,
-                       limit: int = 50) -> List[SessionModel]:
-        """搜索会话
-        
-        Args:
-            query: 搜索关键词
-            session_type: 会话类型过滤
-            status: 状态过滤
-            limit: 返回数量限制
-            
-        Returns:
-            List[SessionModel]: 搜索结果
-        """
-        db_query = self.db_session.query(SessionModel)
-        
-        # 关键词搜索（在session_id和metadata中搜索）
-        if query:
-            db_query = db_query.filter(
-                or_(
-                    SessionModel.session_id.contains(query),
-                    SessionModel.metadata.contains(query)
+    async def search_sessions(
+        self,
+        session: AsyncSession,
+        query: Optional[str] = None,
+        session_type: Optional[str] = None,
+        status: Optional[str] = None,
+        limit: int = 50
+    ) -> List[SessionModel]:
+        """搜索会话（关键词匹配会话ID和请求数据）"""
+        try:
+            stmt = select(SessionModel)
+            if query:
+                keyword = f"%{query}%"
+                stmt = stmt.where(
+                    SessionModel.id.like(keyword) | cast(SessionModel.request_data, String).like(keyword)
                 )
+            if session_type:
+                stmt = stmt.where(SessionModel.session_type == session_type)
+            if status:
+                stmt = stmt.where(SessionModel.status == status)
+
+            result = await session.execute(
+                stmt.order_by(SessionModel.updated_at.desc()).limit(limit)
             )
-        
-        # 类型过滤
-        if session_type:
-            db_query = db_query.filter(SessionModel.session_type == session_type)
-        
-        # 状态过滤
-        if status:
-            db_query = db_query.filter(SessionModel.status == status.value)
-        
-        return db_query.order_by(desc(SessionModel.updated_at)).limit(limit).all()
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"搜索会话失败: {e}")
+            raise
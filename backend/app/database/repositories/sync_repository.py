@@ -0,0 +1,76 @@
+"""
+同步仓库适配器
+仅供命令行脚本等同步环境使用，服务内部一律使用异步仓库
+"""
+import asyncio
+import inspect
+from typing import Any, Optional
+
+from app.database.connection import DatabaseManager
+
+
+class SyncRepository:
+    """将异步仓库包装为同步调用
+
+    使用私有事件循环和独立的数据库连接，每次调用在一个会话中执行并提交，
+    仓库方法的 session 参数由适配器自动传入::
+
+        with SyncRepository(SessionRepository()) as repo:
+            repo.cleanup_expired_sessions(expire_hours=24)
+
+    在运行中的事件循环里调用会直接抛出 RuntimeError，防止阻塞服务的事件循环。
+    """
+
+    def __init__(self, repository: Any, database_url: Optional[str] = None):
+        self._repository = repository
+        self._database_url = database_url
+        self._db: Optional[DatabaseManager] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._repository, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._run_until_complete(self._call(attr, *args, **kwargs))
+
+        call.__name__ = name
+        call.__doc__ = attr.__doc__
+        return call
+
+    def _run_until_complete(self, coro):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            coro.close()
+            raise RuntimeError("同步仓库不能在事件循环中调用，请直接使用异步仓库")
+
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
+
+    async def _call(self, method, *args, **kwargs):
+        if self._db is None:
+            self._db = DatabaseManager()
+            await self._db.initialize(self._database_url)
+        async with self._db.get_session() as session:
+            return await method(session, *args, **kwargs)
+
+    def close(self) -> None:
+        """关闭数据库连接和私有事件循环"""
+        if self._loop is None:
+            return
+        if self._db is not None:
+            self._loop.run_until_complete(self._db.close())
+            self._db = None
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self) -> "SyncRepository":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
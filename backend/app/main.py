@@ -2,6 +2,7 @@
 UI自动化测试系统主应用
 FastAPI应用入口
 """
+import sys
 import asyncio
 from contextlib import asynccontextmanager
 from typing import Dict, Any
@@ -9,7 +10,7 @@ from typing import Dict, Any
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from loguru import logger
 import uvicorn
@@ -32,13 +33,25 @@ async def lifespan(app: FastAPI):
     from app.utils import ensure_directories
     ensure_directories()
 
+    # 监听脚本目录变更，维护脚本解析缓存
+    from app.services.script_resolution_cache import script_resolution_cache
+    script_resolution_cache.start_watching()
+
+    # 启动定期清理
+    from app.services.retention import retention_manager
+    retention_manager.start()
+
+    # 启动独立的指标抓取端口
+    from app.core.metrics import start_metrics_server
+    start_metrics_server()
+
     # 验证配置
     await validate_system_config()
 
     # 初始化数据库连接
     await init_databases()
 
-    # 预热AI模型
+    # 预热AI模型（默认在后台加载，不阻塞启动）
     await warmup_ai_models()
 
     logger.info("✅ 系统启动完成")
@@ -53,6 +66,10 @@ async def lifespan(app: FastAPI):
     
     logger.info("✅ 系统关闭完成")
 
+    # 写完异步日志队列
+    from app.core.logging import shutdown_logging
+    shutdown_logging()
+
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -115,6 +132,17 @@ async def health_check():
         raise HTTPException(status_code=503, detail="系统不健康")
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus指标抓取端点"""
+    if not settings.ENABLE_METRICS:
+        raise HTTPException(status_code=404, detail="指标未启用")
+
+    from app.core.metrics import render_metrics
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """全局异常处理"""
@@ -134,17 +162,11 @@ async def validate_system_config():
     """验证系统配置"""
     try:
         logger.info("验证系统配置...")
-        
-        # 验证AI模型配置
-        from app.core.llms import get_model_config_status
-        model_config = get_model_config_status()
 
-        if not any(model_config.values()):
-            logger.warning("⚠️  没有配置任何AI模型API密钥")
-        else:
-            logger.info(f"✅ AI模型配置: {model_config}")
+        # AI模型配置在加载模型客户端时验证（见 warmup_ai_models），避免启动时导入openai等依赖
+        if settings.AI_MODEL_PRELOAD not in ("eager", "background", "lazy"):
+            logger.warning(f"⚠️  未知的 AI_MODEL_PRELOAD: {settings.AI_MODEL_PRELOAD}，按 background 处理")
 
-        
         logger.info("✅ 多模态服务验证完成")
         
     except Exception as e:
@@ -178,22 +200,56 @@ async def init_databases():
         pass
 
 
+def _load_model_clients() -> None:
+    """导入模型客户端模块、验证模型配置并创建客户端（耗时主要在导入openai等依赖）"""
+    from app.core.llms import (
+        get_model_config_status, get_deepseek_model_client, get_qwenvl_model_client, get_uitars_model_client
+    )
+
+    model_config = get_model_config_status()
+    if not any(model_config.values()):
+        logger.warning("⚠️  没有配置任何AI模型API密钥")
+    else:
+        logger.info(f"✅ AI模型配置: {model_config}")
+
+    get_deepseek_model_client()
+    get_qwenvl_model_client()
+    get_uitars_model_client()
+
+
+async def _warm_model_connections() -> None:
+    """预先建立各模型服务的连接（DNS、TLS、HTTP/2），并启动空闲连接保活"""
+    from app.core.llm_connections import llm_connections
+
+    await llm_connections.warm_all()
+    llm_connections.start_keep_warm()
+
+
+async def _load_model_clients_in_background() -> None:
+    try:
+        await asyncio.to_thread(_load_model_clients)
+        await _warm_model_connections()
+        logger.info("✅ AI模型客户端后台加载完成")
+    except Exception as e:
+        logger.warning(f"AI模型客户端后台加载失败: {str(e)}")
+
+
 async def warmup_ai_models():
-    """预热AI模型"""
+    """预热AI模型：按 AI_MODEL_PRELOAD 在启动时、启动后台或首次使用时创建模型客户端"""
     try:
-        logger.info("预热AI模型...")
-        
-        # 预热LLM客户端
-        from app.core.llms import get_deepseek_model_client, get_uitars_model_client
-        from autogen_core.models import UserMessage
-        llm_client = get_deepseek_model_client()
-        get_uitars_model_client()
-        # 发送一个简单的测试请求
-        # await llm_client.create(
-        #     [UserMessage(content="Hello, this is a warmup test.", source="user")])
+        if settings.AI_MODEL_PRELOAD == "lazy":
+            logger.info("AI模型客户端将在首次使用时创建")
+            return
+        if settings.AI_MODEL_PRELOAD != "eager":
+            asyncio.create_task(_load_model_clients_in_background(), name="model-client-preload")
+            logger.info("AI模型客户端在后台加载中...")
+            return
 
+        logger.info("预热AI模型...")
+        _load_model_clients()
+        await _warm_model_connections()
         logger.info("✅ AI模型预热完成")
-        
+
     except Exception as e:
         logger.warning(f"AI模型预热失败: {str(e)}")
         # 非关键错误，不阻止启动
@@ -254,12 +310,18 @@ async def cleanup_resources():
         from app.core.database_startup import app_database_manager
         await app_database_manager.shutdown()
 
-        # 清理AI模型客户端
-        from app.core.llms import get_uitars_model_client,get_deepseek_model_client
-        uitars_client = get_uitars_model_client()
-        deepseek_client = get_deepseek_model_client()
-        await deepseek_client.close()
-        await uitars_client.close()
+        # 停止脚本目录监听
+        from app.services.script_resolution_cache import script_resolution_cache
+        await script_resolution_cache.stop_watching()
+
+        # 停止定期清理
+        from app.services.retention import retention_manager
+        await retention_manager.stop()
+
+        # 清理已创建的AI模型客户端（模块未加载说明没有创建过客户端）
+        llms = sys.modules.get("app.core.llms")
+        if llms is not None:
+            await llms.close_model_clients()
 
         logger.info("✅ 资源清理完成")
 
@@ -115,6 +115,7 @@ class ScriptSearchRequest(BaseModel):
     date_to: Optional[str] = Field(None, description="创建时间结束")
     limit: int = Field(20, ge=1, le=100, description="返回数量限制")
     offset: int = Field(0, ge=0, description="偏移量")
+    include_content: bool = Field(True, description="是否返回脚本内容（列表视图可关闭以减少传输量）")
 
 
 class ScriptSearchResponse(BaseModel):
@@ -0,0 +1,375 @@
+"""
+内容寻址存储
+上传图片、生成的YAML/Playwright脚本和HTML报告按内容SHA-256保存一份，目录按哈希前缀分片：
+{BLOB_STORE_DIR}/ab/cd/abcd...{后缀}。相同内容只写一次，引用计数记录在 content_blobs 表中，
+引用计数归零并超过保护期的内容块由垃圾回收删除。
+
+需要真实路径的场景（生成脚本目录、Playwright工作空间）通过 materialize 放到目标位置：
+- 可编辑的文件（生成的脚本等，默认）使用 reflink（写时复制），不支持时复制，原地修改不影响内容块；
+- 只读副本（执行时使用的文件，read_only=True）按 BLOB_MATERIALIZE_MODE 可以使用硬链接，
+  硬链接与内容块共享同一份数据，因此内容块和只读副本的权限都是 0444。
+
+引用由保存内容块路径或内容的一方持有并负责释放：
+- 上传图片：单图分析由会话持有（会话清理或删除时释放），页面分析由分析记录持有（删除页面时释放）；
+- 脚本内容：由脚本记录持有（保存时加引用，内容变化或删除时释放旧内容）；
+- 测试报告及其拆分出的截图：由报告记录持有。
+物化到目标位置的文件不持有引用（reference=False 只登记内容块），删除这些文件不需要释放引用；
+没有记录持有的内容块在保护期后由垃圾回收删除，已物化的文件不受影响。
+"""
+import os
+import time
+import shutil
+import asyncio
+import hashlib
+import tempfile
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from fastapi import UploadFile
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.database.connection import db_manager
+from app.database.repositories.blob_repository import BlobRepository
+from app.utils.file_utils import StoredUpload, stream_upload_to_file, compute_perceptual_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# Linux FICLONE ioctl（btrfs/xfs等支持写时复制的文件系统）
+_FICLONE = 0x40049409
+_HASH_CHUNK_SIZE = 1024 * 1024
+_READ_ONLY_MODE = 0o444
+
+
+@dataclass
+class BlobRef:
+    """内容块引用"""
+    sha256: str
+    size: int
+    path: Path
+    deduplicated: bool = False
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _reflink(src: Path, dest: Path) -> None:
+    if fcntl is None:
+        raise OSError("reflink不可用")
+    with open(src, "rb") as s, open(dest, "wb") as d:
+        fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+
+
+class BlobStore:
+    """内容寻址存储"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or settings.BLOB_STORE_DIR)
+        self.tmp_dir = self.root / "tmp"
+        self.repository = BlobRepository()
+        self._stats = {"writes": 0, "dedup_hits": 0, "bytes_saved": 0,
+                       "reflinks": 0, "hardlinks": 0, "copies": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.BLOB_STORE_ENABLED
+
+    def blob_path(self, sha256: str, suffix: str = "") -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}{suffix}"
+
+    def owns(self, path: Union[str, Path]) -> bool:
+        """路径是否位于内容寻址存储中"""
+        try:
+            Path(path).resolve().relative_to(self.root.resolve())
+            return True
+        except (ValueError, OSError):
+            return False
+
+    def _new_temp_path(self, suffix: str = "") -> Path:
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(dir=self.tmp_dir, suffix=suffix)
+        os.close(fd)
+        return Path(name)
+
+    # ---- 写入 ----
+
+    def _existing(self, sha256: str, size: int, suffix: str) -> Optional[BlobRef]:
+        path = self.blob_path(sha256, suffix)
+        if not path.exists():
+            return None
+        self._stats["dedup_hits"] += 1
+        self._stats["bytes_saved"] += size
+        return BlobRef(sha256, size, path, deduplicated=True)
+
+    def _commit_temp(self, temp_path: Path, sha256: str, size: int, suffix: str) -> BlobRef:
+        """把已计算哈希的临时文件移入存储，内容已存在时丢弃临时文件"""
+        existing = self._existing(sha256, size, suffix)
+        if existing:
+            temp_path.unlink(missing_ok=True)
+            return existing
+        path = self.blob_path(sha256, suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 内容块只读，避免通过硬链接的副本被原地改写
+        os.chmod(temp_path, _READ_ONLY_MODE)
+        os.replace(temp_path, path)
+        self._stats["writes"] += 1
+        return BlobRef(sha256, size, path)
+
+    def _store_bytes(self, data: bytes, suffix: str) -> BlobRef:
+        sha256 = hashlib.sha256(data).hexdigest()
+        existing = self._existing(sha256, len(data), suffix)
+        if existing:
+            return existing
+        temp_path = self._new_temp_path(suffix)
+        temp_path.write_bytes(data)
+        return self._commit_temp(temp_path, sha256, len(data), suffix)
+
+    def _store_file(self, src: Path, suffix: str, move: bool) -> BlobRef:
+        sha256 = _hash_file(src)
+        size = src.stat().st_size
+        existing = self._existing(sha256, size, suffix)
+        if existing:
+            if move:
+                src.unlink(missing_ok=True)
+            return existing
+        temp_path = self._new_temp_path(suffix)
+        if move:
+            shutil.move(str(src), temp_path)
+        else:
+            shutil.copyfile(src, temp_path)
+        return self._commit_temp(temp_path, sha256, size, suffix)
+
+    async def put_bytes(self, data: bytes, suffix: str = "", reference: bool = True) -> BlobRef:
+        """保存内容，reference 为 True 时引用计数加一（调用方负责释放），否则只登记内容块"""
+        ref = await asyncio.to_thread(self._store_bytes, data, suffix)
+        await self._track(ref, reference)
+        return ref
+
+    async def put_text(self, text: str, suffix: str = "", reference: bool = True) -> BlobRef:
+        return await self.put_bytes(text.encode("utf-8"), suffix, reference)
+
+    async def put_file(self, path: Union[str, Path], suffix: Optional[str] = None,
+                       move: bool = False, reference: bool = True) -> BlobRef:
+        """保存已有文件（复制或移动到存储中）"""
+        path = Path(path)
+        ref = await asyncio.to_thread(self._store_file, path, path.suffix if suffix is None else suffix, move)
+        await self._track(ref, reference)
+        return ref
+
+    async def save_upload(self, file: UploadFile, dest_path: Union[str, Path], max_size: int,
+                          label: str = "文件", perceptual_hash: bool = False) -> StoredUpload:
+        """
+        流式保存上传文件：启用存储时写入临时文件后按哈希移入存储，否则直接写到 dest_path
+
+        返回的路径在存储中时持有一个引用，调用方在不再需要该文件时用 release_path 释放
+        """
+        dest_path = Path(dest_path)
+        if not self.enabled:
+            return await stream_upload_to_file(file, dest_path, max_size, label, perceptual_hash)
+
+        suffix = dest_path.suffix
+        stored = await stream_upload_to_file(file, self._new_temp_path(suffix), max_size, label)
+        ref = await asyncio.to_thread(self._commit_temp, Path(stored.path), stored.sha256, stored.size, suffix)
+        await self.add_reference(ref.sha256, ref.size)
+        if ref.deduplicated:
+            logger.info(f"上传内容已存在，复用: {ref.path}")
+        phash = await asyncio.to_thread(compute_perceptual_hash, ref.path) if perceptual_hash else None
+        return StoredUpload(path=str(ref.path), size=ref.size, sha256=ref.sha256, phash=phash)
+
+    # ---- 物化 ----
+
+    def _materialize(self, src: Path, dest: Path, read_only: bool) -> str:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        temp_dest = dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+        temp_dest.unlink(missing_ok=True)
+        mode = settings.BLOB_MATERIALIZE_MODE
+        if not read_only:
+            # 可编辑的文件不能与内容块共享数据
+            methods = ["reflink", "copy"] if mode in ("auto", "reflink", "hardlink") else ["copy"]
+        else:
+            methods = ["reflink", "hardlink", "copy"] if mode == "auto" else [mode, "copy"]
+        used = "copy"
+        for method in methods:
+            try:
+                if method == "reflink":
+                    _reflink(src, temp_dest)
+                elif method == "hardlink":
+                    os.link(src, temp_dest)
+                else:
+                    shutil.copyfile(src, temp_dest)
+                used = method
+                break
+            except OSError:
+                temp_dest.unlink(missing_ok=True)
+        # 复制的文件继承内容块的只读权限，可编辑的文件恢复为可写
+        if used != "hardlink":
+            os.chmod(temp_dest, _READ_ONLY_MODE if read_only else 0o644)
+        # 整体替换目标文件，不改写可能与内容块共享的旧数据
+        os.replace(temp_dest, dest)
+        return used
+
+    async def materialize(self, ref: BlobRef, dest_path: Union[str, Path], read_only: bool = False) -> Path:
+        """把内容块放到需要真实路径的位置，read_only 为 True 时可以使用硬链接（只读副本）"""
+        dest_path = Path(dest_path)
+        method = await asyncio.to_thread(self._materialize, ref.path, dest_path, read_only)
+        self._stats[{"reflink": "reflinks", "hardlink": "hardlinks"}.get(method, "copies")] += 1
+        return dest_path
+
+    async def write_text(self, dest_path: Union[str, Path], content: str, reference: bool = False,
+                         read_only: bool = False) -> Path:
+        """
+        写出文本文件：启用存储时保存到存储并物化到 dest_path，否则直接写入
+
+        物化的文件不依赖内容块，默认只登记内容块；需要按内容保留内容块的记录（如脚本）自行持有引用。
+        默认写出可编辑的文件，执行时使用的只读副本传 read_only=True
+        """
+        dest_path = Path(dest_path)
+        if not self.enabled:
+            def _write():
+                dest_path.parent.mkdir(parents=True, exist_ok=True)
+                dest_path.write_text(content, encoding="utf-8")
+            await asyncio.to_thread(_write)
+            return dest_path
+        ref = await self.put_text(content, dest_path.suffix, reference)
+        return await self.materialize(ref, dest_path, read_only)
+
+    # ---- 引用计数 ----
+
+    async def _track(self, ref: BlobRef, reference: bool) -> None:
+        if reference:
+            await self.add_reference(ref.sha256, ref.size)
+        else:
+            await self.register(ref.sha256, ref.size)
+
+    async def register(self, sha256: str, size: int) -> None:
+        """登记没有持有者的内容块，保护期后可被垃圾回收"""
+        try:
+            async with db_manager.get_session() as session:
+                await self.repository.register(session, sha256, size)
+        except Exception as e:
+            logger.warning(f"登记内容块失败: {sha256[:12]}, {str(e)}")
+
+    async def add_reference(self, sha256: str, size: int) -> None:
+        try:
+            async with db_manager.get_session() as session:
+                await self.repository.add_reference(session, sha256, size)
+        except Exception as e:
+            # 数据库不可用时文件仍然可用，只是没有引用记录（垃圾回收默认不删除无记录的内容块）
+            logger.warning(f"记录内容块引用失败: {sha256[:12]}, {str(e)}")
+
+    async def release(self, sha256: str) -> None:
+        try:
+            async with db_manager.get_session() as session:
+                await self.repository.release(session, sha256)
+        except Exception as e:
+            logger.warning(f"释放内容块引用失败: {sha256[:12]}, {str(e)}")
+
+    async def release_path(self, path: Union[str, Path]) -> bool:
+        """释放存储中某个路径的引用（路径不在存储中时返回False）"""
+        if not path or not self.owns(path):
+            return False
+        await self.release(Path(path).name[:64])
+        return True
+
+    async def add_content_reference(self, content: Optional[str]) -> None:
+        """按文本内容增加引用（如保存脚本记录时），与 write_text 写出的内容块对应"""
+        if self.enabled and content:
+            data = content.encode("utf-8")
+            await self.add_reference(hashlib.sha256(data).hexdigest(), len(data))
+
+    async def release_content(self, content: Optional[str]) -> None:
+        """按文本内容释放引用（如删除脚本时）"""
+        if self.enabled and content:
+            await self.release(hashlib.sha256(content.encode("utf-8")).hexdigest())
+
+    # ---- 垃圾回收 ----
+
+    def _delete_blob_files(self, sha256: str) -> int:
+        freed = 0
+        shard = self.root / sha256[:2] / sha256[2:4]
+        for path in shard.glob(f"{sha256}*"):
+            try:
+                stat = path.stat()
+                path.unlink()
+                # 工作空间中仍有硬链接时内容保留在磁盘上，不计入释放的空间
+                if stat.st_nlink <= 1:
+                    freed += stat.st_size
+            except OSError as e:
+                logger.warning(f"删除内容块失败: {path}, {str(e)}")
+        return freed
+
+    def _scan_blob_hashes(self, older_than: float) -> List[str]:
+        hashes = set()
+        if not self.root.exists():
+            return []
+        for path in self.root.glob("??/??/*"):
+            try:
+                if path.is_file() and path.stat().st_mtime < older_than:
+                    hashes.add(path.name[:64])
+            except OSError:
+                continue
+        return list(hashes)
+
+    async def gc(self, grace_hours: Optional[float] = None, include_orphans: bool = False,
+                 batch_size: int = 500) -> Dict[str, Any]:
+        """删除引用计数为0且超过保护期的内容块
+
+        Args:
+            grace_hours: 保护期（小时），默认 BLOB_GC_GRACE_HOURS
+            include_orphans: 同时删除没有数据库记录的内容块（数据库写入失败时产生），默认不删除
+            batch_size: 每批处理的内容块数
+        """
+        grace = timedelta(hours=settings.BLOB_GC_GRACE_HOURS if grace_hours is None else grace_hours)
+        deleted, freed = 0, 0
+
+        async with db_manager.get_session() as session:
+            while True:
+                hashes = await self.repository.list_unreferenced(session, grace, batch_size)
+                if not hashes:
+                    break
+                for sha256 in hashes:
+                    freed += await asyncio.to_thread(self._delete_blob_files, sha256)
+                await self.repository.delete_blobs(session, hashes)
+                deleted += len(hashes)
+                if len(hashes) < batch_size:
+                    break
+
+            orphans = 0
+            if include_orphans:
+                candidates = await asyncio.to_thread(self._scan_blob_hashes, time.time() - grace.total_seconds())
+                for start in range(0, len(candidates), batch_size):
+                    batch = candidates[start:start + batch_size]
+                    known = set(await self.repository.get_known(session, batch))
+                    for sha256 in batch:
+                        if sha256 not in known:
+                            freed += await asyncio.to_thread(self._delete_blob_files, sha256)
+                            orphans += 1
+
+        if deleted or orphans:
+            logger.info(f"内容块垃圾回收完成: 删除 {deleted} 个, 孤立 {orphans} 个, 释放 {freed} 字节")
+        return {"deleted_blobs": deleted, "deleted_orphans": orphans, "freed_bytes": freed}
+
+    async def get_stats(self) -> Dict[str, Any]:
+        stats = {"enabled": self.enabled, "root": str(self.root), **self._stats}
+        try:
+            async with db_manager.get_session() as session:
+                stats.update(await self.repository.get_totals(session))
+        except Exception as e:
+            stats["db_error"] = str(e)
+        return stats
+
+
+# 全局内容寻址存储实例
+blob_store = BlobStore()
@@ -8,6 +8,9 @@ from datetime import datetime
 
 from app.database.connection import db_manager
 from app.database.repositories.script_repository import ScriptRepository
+from app.database.repositories.execution_repository import ExecutionRepository
+from app.services.script_resolution_cache import script_resolution_cache
+from app.services.blob_store import blob_store
 from app.database.models.scripts import TestScript as DBTestScript
 from app.models.test_scripts import (
     TestScript, ScriptFormat, ScriptType, ScriptExecutionRecord,
@@ -17,15 +20,24 @@ from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
+# 执行记录状态到测试状态的映射
+EXECUTION_STATUS_MAPPING = {
+    "completed": "passed",
+}
+
 
 class DatabaseScriptService:
     """基于数据库的脚本管理服务"""
     
     def __init__(self):
         self.script_repo = ScriptRepository()
+        self.execution_repo = ExecutionRepository()
     
-    def _db_to_pydantic(self, db_script: DBTestScript) -> TestScript:
-        """将数据库模型转换为Pydantic模型"""
+    def _db_to_pydantic(self, db_script: DBTestScript, include_content: bool = True) -> TestScript:
+        """将数据库模型转换为Pydantic模型
+
+        include_content为False时脚本正文未加载，content置为空字符串
+        """
         tags = [tag.tag_name for tag in db_script.tags] if db_script.tags else []
         
         return TestScript(
@@ -35,7 +47,7 @@ class DatabaseScriptService:
             description=db_script.description or "",
             script_format=ScriptFormat(db_script.script_format),
             script_type=ScriptType(db_script.script_type),
-            content=db_script.content,
+            content=db_script.content if include_content else "",
             file_path=db_script.file_path or "",
             test_description=db_script.test_description,
             additional_context=db_script.additional_context,
@@ -82,11 +94,14 @@ class DatabaseScriptService:
             if script.session_id:
                 await self._ensure_session_exists(script.session_id)
 
+            previous_content = None
             async with db_manager.get_session() as session:
                 # 检查脚本是否已存在
                 existing = await self.script_repo.get_by_id(session, script.id)
                 
                 if existing:
+                    previous_content = existing.content
+
                     # 更新现有脚本
                     script_data = self._pydantic_to_db_dict(script)
                     script_data.pop('id')  # 移除ID，避免更新主键
@@ -100,7 +115,6 @@ class DatabaseScriptService:
                     
                     # 重新获取完整数据
                     result = await self.script_repo.get_by_id_with_tags(session, script.id)
-                    return self._db_to_pydantic(result)
                 else:
                     # 创建新脚本
                     if not script.id:
@@ -114,7 +128,15 @@ class DatabaseScriptService:
                     
                     # 重新获取完整数据
                     result = await self.script_repo.get_by_id_with_tags(session, created.id)
-                    return self._db_to_pydantic(result)
+                saved = self._db_to_pydantic(result)
+
+            # 提交后调整引用：脚本记录持有其内容在内容寻址存储中的引用
+            if existing is not None:
+                script_resolution_cache.invalidate(script.id)
+                await self._move_content_reference(previous_content, saved.content)
+            else:
+                await blob_store.add_content_reference(saved.content)
+            return saved
                     
         except Exception as e:
             logger.error(f"保存脚本失败: {e}")
@@ -135,33 +157,64 @@ class DatabaseScriptService:
     async def update_script(self, script_id: str, updates: Dict[str, Any]) -> Optional[TestScript]:
         """更新脚本"""
         try:
-            async with db_manager.get_session() as session:
-                # 处理标签更新
-                tags = updates.pop('tags', None)
-                
-                # 更新脚本基本信息
-                if updates:
-                    updated = await self.script_repo.update(session, script_id, **updates)
-                    if not updated:
+            try:
+                async with db_manager.get_session() as session:
+                    # 处理标签更新
+                    tags = updates.pop('tags', None)
+
+                    previous_content = None
+                    if 'content' in updates:
+                        existing = await self.script_repo.get_by_id(session, script_id)
+                        previous_content = existing.content if existing else None
+
+                    # 更新脚本基本信息
+                    if updates:
+                        updated = await self.script_repo.update(session, script_id, **updates)
+                        if not updated:
+                            return None
+
+                    # 更新标签
+                    if tags is not None:
+                        await self._update_script_tags(session, script_id, tags)
+
+                    # 返回更新后的脚本
+                    result = await self.script_repo.get_by_id_with_tags(session, script_id)
+                    if result is None:
                         return None
-                
-                # 更新标签
-                if tags is not None:
-                    await self._update_script_tags(session, script_id, tags)
-                
-                # 返回更新后的脚本
-                result = await self.script_repo.get_by_id_with_tags(session, script_id)
-                return self._db_to_pydantic(result) if result else None
+                    updated_script = self._db_to_pydantic(result)
+            finally:
+                # 脚本名称/内容可能变化：会话结束（提交）后再使解析缓存失效，避免期间重新缓存旧数据
+                script_resolution_cache.invalidate(script_id)
+
+            # 提交后把引用从旧内容转到新内容
+            if 'content' in updates:
+                await self._move_content_reference(previous_content, updated_script.content)
+            return updated_script
                 
         except Exception as e:
             logger.error(f"更新脚本失败: {script_id} - {e}")
             raise
     
+    async def _move_content_reference(self, previous: Optional[str], current: Optional[str]) -> None:
+        """脚本内容变化时，引用从旧内容转到新内容"""
+        if previous == current:
+            return
+        await blob_store.add_content_reference(current)
+        await blob_store.release_content(previous)
+
     async def delete_script(self, script_id: str) -> bool:
         """删除脚本"""
         try:
-            async with db_manager.get_session() as session:
-                return await self.script_repo.delete(session, script_id)
+            try:
+                async with db_manager.get_session() as session:
+                    script = await self.script_repo.get_by_id(session, script_id)
+                    deleted = await self.script_repo.delete(session, script_id)
+            finally:
+                script_resolution_cache.invalidate(script_id)
+            # 释放脚本文件在内容寻址存储中的引用
+            if deleted and script is not None:
+                await blob_store.release_content(script.content)
+            return deleted
         except Exception as e:
             logger.error(f"删除脚本失败: {script_id} - {e}")
             raise
@@ -172,7 +225,10 @@ class DatabaseScriptService:
             async with db_manager.get_session() as session:
                 scripts, total_count = await self.script_repo.search_scripts(session, request)
                 
-                pydantic_scripts = [self._db_to_pydantic(script) for script in scripts]
+                pydantic_scripts = [
+                    self._db_to_pydantic(script, include_content=request.include_content)
+                    for script in scripts
+                ]
                 has_more = (request.offset + len(pydantic_scripts)) < total_count
                 
                 return ScriptSearchResponse(
@@ -279,9 +335,107 @@ class DatabaseScriptService:
             # 不抛出异常，让脚本保存继续进行
 
     async def get_script_executions(self, script_id: str, limit: int = 20) -> List[ScriptExecutionRecord]:
-        """获取脚本执行记录（暂时返回空列表，待实现执行记录功能）"""
-        # TODO: 实现执行记录查询
-        return []
+        """获取脚本执行记录"""
+        try:
+            async with db_manager.get_session() as session:
+                executions = await self.execution_repo.get_executions_by_script(session, script_id, limit)
+                return [
+                    ScriptExecutionRecord(
+                        id=execution.id,
+                        script_id=execution.script_id,
+                        execution_id=execution.execution_id,
+                        status=EXECUTION_STATUS_MAPPING.get(execution.status, execution.status),
+                        execution_config=execution.execution_config or {},
+                        environment_info=execution.environment_info or {},
+                        start_time=(execution.start_time or execution.created_at).isoformat(),
+                        end_time=execution.end_time.isoformat() if execution.end_time else None,
+                        duration=execution.duration_seconds,
+                        error_message=execution.error_message
+                    )
+                    for execution in executions
+                ]
+        except Exception as e:
+            logger.error(f"获取脚本执行记录失败: {e}")
+            return []
+
+    # ==================== 执行记录（供执行智能体调用） ====================
+    # 执行记录写入失败只记录日志，不影响测试执行本身
+
+    async def start_execution(
+        self,
+        script_id: Optional[str],
+        execution_id: str,
+        execution_config: Optional[Dict[str, Any]] = None,
+        environment_info: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        """创建运行中的执行记录
+
+        Returns:
+            Optional[str]: 执行记录主键；脚本不在数据库中（如临时脚本）或写入失败时返回None
+        """
+        if not script_id:
+            return None
+        try:
+            async with db_manager.get_session() as session:
+                if await session.get(DBTestScript, script_id) is None:
+                    return None
+                execution = await self.execution_repo.create_execution(
+                    session,
+                    script_id=script_id,
+                    execution_id=execution_id,
+                    status='running',
+                    execution_config=execution_config,
+                    environment_info=environment_info
+                )
+                return execution.id
+        except Exception as e:
+            logger.warning(f"创建执行记录失败: {script_id}, {e}")
+            return None
+
+    async def log_execution(
+        self,
+        execution_pk: Optional[str],
+        messages: List[str],
+        level: str = 'INFO',
+        component: Optional[str] = None
+    ) -> None:
+        """追加执行日志：先写入内存缓冲，达到批量大小时才打开会话写入"""
+        if not execution_pk or not messages:
+            return
+        for message in messages:
+            self.execution_repo.buffer_log(execution_pk, message, level=level, component=component)
+        if not self.execution_repo.flush_due(execution_pk):
+            return
+        try:
+            async with db_manager.get_session() as session:
+                await self.execution_repo.flush(session, execution_pk)
+        except Exception as e:
+            # 缓冲数据在事务提交后才移除，写入失败时保留到下一次写入或执行结束
+            logger.warning(f"写入执行日志失败: {execution_pk}, {e}")
+
+    async def finish_execution(
+        self,
+        execution_pk: Optional[str],
+        status: str,
+        error_message: Optional[str] = None,
+        exit_code: Optional[int] = None,
+        metrics: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """结束执行：写入该执行缓冲的日志和指标，并更新为终止状态"""
+        if not execution_pk:
+            return
+        try:
+            if metrics:
+                self.execution_repo.record_metrics(execution_pk, metrics)
+            async with db_manager.get_session() as session:
+                await self.execution_repo.update_status(
+                    session, execution_pk, status, error_message=error_message, exit_code=exit_code
+                )
+        except Exception as e:
+            lost = self.execution_repo.buffered_count(execution_pk)
+            logger.warning(f"更新执行记录失败: {execution_pk}, {e}（未写入的日志 {lost} 行）")
+        finally:
+            self.execution_repo.discard(execution_pk)
 
 
 # 全局数据库脚本服务实例
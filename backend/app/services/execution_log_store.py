@@ -0,0 +1,243 @@
+"""
+执行日志存储服务
+按执行ID以只追加的压缩分段文件保存执行日志，支持批量追加和按行范围读取
+"""
+import os
+import re
+import gzip
+import json
+import time
+import shutil
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Any, Awaitable, Callable, Iterable, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_FILENAME = "index.json"
+
+
+class ExecutionLogStore:
+    """执行日志存储
+
+    目录结构::
+
+        <base_dir>/<execution_id>/index.json
+        <base_dir>/<execution_id>/seg-0000000000.jsonl.gz
+        <base_dir>/<execution_id>/seg-0000001000.jsonl.gz
+
+    运行期间日志先写入内存缓冲区，凑满一个分段后压缩落盘；
+    index.json 记录每个分段的起始行号和行数，范围读取时只解压涉及的分段。
+    """
+
+    def __init__(self, base_dir: Optional[str] = None, segment_lines: Optional[int] = None):
+        self.base_dir = Path(base_dir or settings.EXECUTION_LOG_DIR)
+        self.segment_lines = segment_lines or settings.EXECUTION_LOG_SEGMENT_LINES
+        self._buffers: Dict[str, List[str]] = {}
+        self._indexes: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _execution_dir(self, execution_id: str) -> Path:
+        """获取执行日志目录（过滤非法字符，防止路径穿越）"""
+        safe_id = re.sub(r"[^\w.-]", "_", execution_id).lstrip(".")
+        if not safe_id:
+            raise ValueError(f"无效的执行ID: {execution_id!r}")
+        return self.base_dir / safe_id
+
+    def _get_lock(self, execution_id: str) -> asyncio.Lock:
+        if execution_id not in self._locks:
+            self._locks[execution_id] = asyncio.Lock()
+        return self._locks[execution_id]
+
+    def _load_index(self, execution_id: str) -> Dict[str, Any]:
+        """加载分段索引（正在写入的执行优先使用内存缓存）"""
+        index = self._indexes.get(execution_id)
+        if index is not None:
+            return index
+
+        index_path = self._execution_dir(execution_id) / INDEX_FILENAME
+        if index_path.exists():
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        else:
+            index = {"execution_id": execution_id, "total_lines": 0, "closed": False, "segments": []}
+
+        # 只缓存正在写入的执行，避免历史日志的读取请求使缓存无限增长
+        if execution_id in self._buffers:
+            self._indexes[execution_id] = index
+        return index
+
+    def _write_index(self, execution_id: str, index: Dict[str, Any]) -> None:
+        """原子写入分段索引"""
+        execution_dir = self._execution_dir(execution_id)
+        tmp_path = execution_dir / f"{INDEX_FILENAME}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, execution_dir / INDEX_FILENAME)
+
+    def _write_segment_file(self, execution_id: str, start: int, lines: List[str]) -> str:
+        """将一批日志压缩写入新的分段文件（同步，在线程中执行）"""
+        execution_dir = self._execution_dir(execution_id)
+        execution_dir.mkdir(parents=True, exist_ok=True)
+
+        filename = f"seg-{start:010d}.jsonl.gz"
+        payload = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines)
+        with gzip.open(execution_dir / filename, "wt", encoding="utf-8", compresslevel=6) as f:
+            f.write(payload)
+        return filename
+
+    async def _persist(self, execution_id: str, count: int) -> None:
+        """将缓冲区前 count 行写成一个分段（调用方需持有该执行的锁）"""
+        buffer = self._buffers[execution_id]
+        chunk = buffer[:count]
+        index = await asyncio.to_thread(self._load_index, execution_id)
+        start = index["total_lines"]
+        filename = await asyncio.to_thread(self._write_segment_file, execution_id, start, chunk)
+
+        # 在事件循环中同时更新索引和缓冲区，保证并发读取时不重复也不遗漏
+        index["segments"].append({"file": filename, "start": start, "count": len(chunk)})
+        index["total_lines"] = start + len(chunk)
+        del buffer[:count]
+
+        await asyncio.to_thread(self._write_index, execution_id, index)
+
+    def _read_segments(self, execution_id: str, start: int, end: int) -> List[str]:
+        """读取已落盘的 [start, end) 行（同步，在线程中执行）"""
+        index = self._load_index(execution_id)
+        execution_dir = self._execution_dir(execution_id)
+        lines: List[str] = []
+
+        for segment in index["segments"]:
+            seg_start = segment["start"]
+            seg_end = seg_start + segment["count"]
+            if seg_end <= start or seg_start >= end:
+                continue
+
+            with gzip.open(execution_dir / segment["file"], "rt", encoding="utf-8") as f:
+                for offset, raw in enumerate(f):
+                    line_no = seg_start + offset
+                    if line_no >= end:
+                        break
+                    if line_no >= start:
+                        lines.append(json.loads(raw))
+
+        return lines
+
+    async def append(self, execution_id: str, lines: Iterable[str]) -> None:
+        """批量追加日志行，缓冲区凑满一个分段后压缩落盘"""
+        buffer = self._buffers.setdefault(execution_id, [])
+        buffer.extend(str(line) for line in lines)
+        if len(buffer) < self.segment_lines:
+            return
+
+        async with self._get_lock(execution_id):
+            while len(buffer) >= self.segment_lines:
+                await self._persist(execution_id, self.segment_lines)
+
+    async def flush(self, execution_id: str) -> None:
+        """将缓冲区中剩余的日志落盘"""
+        async with self._get_lock(execution_id):
+            buffer = self._buffers.get(execution_id)
+            if buffer:
+                await self._persist(execution_id, len(buffer))
+
+    async def close(self, execution_id: str) -> int:
+        """结束一次执行的日志写入，返回总行数"""
+        try:
+            await self.flush(execution_id)
+            async with self._get_lock(execution_id):
+                index = await asyncio.to_thread(self._load_index, execution_id)
+                if index["segments"]:
+                    index["closed"] = True
+                    await asyncio.to_thread(self._write_index, execution_id, index)
+                return index["total_lines"]
+        finally:
+            self._buffers.pop(execution_id, None)
+            self._indexes.pop(execution_id, None)
+            self._locks.pop(execution_id, None)
+
+    def exists(self, execution_id: str) -> bool:
+        """是否存在该执行的日志"""
+        if self._buffers.get(execution_id):
+            return True
+        return (self._execution_dir(execution_id) / INDEX_FILENAME).exists()
+
+    async def line_count(self, execution_id: str) -> int:
+        """获取日志总行数（包含尚未落盘的缓冲行）"""
+        index = await asyncio.to_thread(self._load_index, execution_id)
+        return index["total_lines"] + len(self._buffers.get(execution_id, []))
+
+    async def read_range(self, execution_id: str, start: int = 0, end: Optional[int] = None) -> List[str]:
+        """读取第 start 行到第 end 行（不含）的日志，行号从0开始"""
+        index = await asyncio.to_thread(self._load_index, execution_id)
+        persisted = index["total_lines"]
+        buffer = list(self._buffers.get(execution_id, []))
+        total = persisted + len(buffer)
+
+        start = max(0, start)
+        end = total if end is None else min(end, total)
+        if start >= end:
+            return []
+
+        lines: List[str] = []
+        if start < persisted:
+            lines = await asyncio.to_thread(self._read_segments, execution_id, start, min(end, persisted))
+        if end > persisted:
+            lines.extend(buffer[max(0, start - persisted):end - persisted])
+        return lines
+
+    async def tail(self, execution_id: str, lines: int = 100) -> List[str]:
+        """读取最后 lines 行日志"""
+        total = await self.line_count(execution_id)
+        return await self.read_range(execution_id, max(0, total - lines), total)
+
+    async def delete(self, execution_id: str) -> bool:
+        """删除一次执行的全部日志"""
+        self._buffers.pop(execution_id, None)
+        self._indexes.pop(execution_id, None)
+        self._locks.pop(execution_id, None)
+
+        execution_dir = self._execution_dir(execution_id)
+        if not execution_dir.exists():
+            return False
+        await asyncio.to_thread(shutil.rmtree, execution_dir, True)
+        return True
+
+
+class LogBatcher:
+    """日志批量提交器
+
+    子进程输出逐行加入内存，累积到 max_lines 行或距上次提交超过 interval 秒时
+    整批交给写入函数，避免读取循环中每行都等待一次存储和数据库写入。
+    """
+
+    def __init__(self, write: Callable[[List[str]], Awaitable[None]],
+                 max_lines: Optional[int] = None, interval: Optional[float] = None):
+        self._write = write
+        self.max_lines = max_lines or settings.EXECUTION_LOG_BATCH_LINES
+        self.interval = settings.EXECUTION_LOG_BATCH_INTERVAL if interval is None else interval
+        self._lines: List[str] = []
+        self._last_flush = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    async def add(self, lines: Iterable[str]) -> None:
+        """加入日志行，达到行数或时间间隔时提交"""
+        self._lines.extend(lines)
+        if len(self._lines) >= self.max_lines or time.monotonic() - self._last_flush >= self.interval:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """提交当前累积的全部日志行"""
+        lines, self._lines = self._lines, []
+        self._last_flush = time.monotonic()
+        if lines:
+            await self._write(lines)
+
+
+# 全局执行日志存储实例
+execution_log_store = ExecutionLogStore()
@@ -0,0 +1,523 @@
+"""
+持久化任务队列
+API进程只负责入队并转发任务进度，分析和执行流程由独立的worker进程（scripts/run_worker.py）运行。
+- 任务按队列、优先级（数值越大越先执行）和可执行时间排序领取；
+- worker领取任务后持有可见性超时，运行期间定期续期；worker崩溃或失联时超时后任务重新入队；
+- 失败的任务按指数退避重试，超过最大尝试次数后标记为失败；
+- 每个队列的并发上限在所有worker之间共享（按运行中的任务数计算）；
+- 任务进度以事件形式写入队列存储，API进程轮询后转发给SSE连接。
+存储后端可替换：默认使用本地SQLite文件，JOB_QUEUE_BACKEND 配置为 "模块路径:类名" 时使用自定义后端。
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import sqlite3
+import importlib
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+@dataclass
+class Job:
+    """队列中的任务"""
+    id: str
+    queue: str
+    kind: str
+    payload: Dict[str, Any]
+    priority: int = 0
+    status: str = "queued"  # queued/running/succeeded/failed/cancelled
+    attempts: int = 0
+    max_attempts: int = 1
+    available_at: float = 0.0
+    locked_by: Optional[str] = None
+    locked_until: Optional[float] = None
+    session_id: Optional[str] = None
+    last_error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("payload")
+        return data
+
+
+class JobQueueBackend(ABC):
+    """任务队列存储后端"""
+
+    @abstractmethod
+    async def enqueue(self, job: Job) -> Job:
+        """保存新任务"""
+
+    @abstractmethod
+    async def claim(self, limits: Dict[str, int], worker_id: str, visibility_timeout: float) -> Optional[Job]:
+        """按各队列并发上限领取一个可执行的任务"""
+
+    @abstractmethod
+    async def heartbeat(self, job_id: str, worker_id: str, visibility_timeout: float) -> Optional[str]:
+        """续期可见性超时，返回任务当前状态（任务已被取消或被其他worker接管时不再是running）"""
+
+    @abstractmethod
+    async def complete(self, job_id: str, worker_id: str, result: Optional[Dict[str, Any]] = None) -> bool:
+        """标记任务成功"""
+
+    @abstractmethod
+    async def fail(self, job_id: str, worker_id: str, error: str, retry_delay: Optional[float]) -> Optional[str]:
+        """标记任务失败，retry_delay 不为空且未超过最大尝试次数时延迟重新入队，返回新状态"""
+
+    @abstractmethod
+    async def release(self, job_id: str, worker_id: str) -> bool:
+        """交还运行中的任务：重新入队并退还本次领取消耗的尝试次数（worker停止时使用）"""
+
+    @abstractmethod
+    async def cancel(self, job_id: str) -> bool:
+        """取消未完成的任务"""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Job]:
+        """获取任务"""
+
+    @abstractmethod
+    async def get_by_session(self, session_id: str) -> Optional[Job]:
+        """获取会话最近的任务"""
+
+    @abstractmethod
+    async def add_event(self, job_id: str, data: Dict[str, Any]) -> int:
+        """追加任务进度事件，返回事件序号"""
+
+    @abstractmethod
+    async def events(self, job_id: str, after: int = 0, limit: int = 200) -> List[Tuple[int, Dict[str, Any]]]:
+        """读取序号大于 after 的进度事件"""
+
+    @abstractmethod
+    async def stats(self) -> Dict[str, Any]:
+        """各队列任务数统计"""
+
+    @abstractmethod
+    async def purge(self, older_than: float) -> int:
+        """删除在指定时间之前结束的任务及其事件"""
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    queue TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 1,
+    available_at REAL NOT NULL,
+    locked_by TEXT,
+    locked_until REAL,
+    session_id TEXT,
+    last_error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, queue, priority DESC, available_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_session ON jobs (session_id);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class SQLiteJobBackend(JobQueueBackend):
+    """SQLite任务队列（WAL模式，多个进程可同时读写同一个文件）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or settings.JOB_QUEUE_SQLITE_PATH)
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+        return conn
+
+    async def _run(self, func: Callable, *args):
+        return await asyncio.to_thread(self._call, func, *args)
+
+    def _call(self, func: Callable, *args):
+        conn = self._connect()
+        return func(conn, *args)
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Job:
+        data = dict(row)
+        data["payload"] = json.loads(data["payload"])
+        data["result"] = json.loads(data["result"]) if data["result"] else None
+        return Job(**data)
+
+    @staticmethod
+    def _transaction(conn: sqlite3.Connection, func: Callable):
+        # BEGIN IMMEDIATE 立即获取写锁，避免多个worker同时领取同一任务
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func()
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def enqueue(self, job: Job) -> Job:
+        def _insert(conn):
+            conn.execute(
+                "INSERT INTO jobs (id, queue, kind, payload, priority, status, attempts, max_attempts, available_at,"
+                " session_id, created_at) VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?)",
+                (job.id, job.queue, job.kind, json.dumps(job.payload, ensure_ascii=False, default=str),
+                 job.priority, job.status, job.max_attempts, job.available_at, job.session_id, job.created_at)
+            )
+            return job
+        return await self._run(_insert)
+
+    async def claim(self, limits: Dict[str, int], worker_id: str, visibility_timeout: float) -> Optional[Job]:
+        def _claim(conn):
+            now = time.time()
+            # worker失联：可见性超时后重新入队，已用完尝试次数的直接标记失败
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', last_error = ?, finished_at = ?, locked_by = NULL "
+                "WHERE status = 'running' AND locked_until < ? AND attempts >= max_attempts",
+                ("worker失联，任务超时", now, now)
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', locked_by = NULL, available_at = ? "
+                "WHERE status = 'running' AND locked_until < ?",
+                (now, now)
+            )
+            running = {
+                row["queue"]: row["count"] for row in conn.execute(
+                    "SELECT queue, COUNT(*) AS count FROM jobs WHERE status = 'running' GROUP BY queue"
+                )
+            }
+            queues = [queue for queue, limit in limits.items() if running.get(queue, 0) < limit]
+            if not queues:
+                return None
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE status = 'queued' AND available_at <= ? "
+                f"AND queue IN ({','.join('?' * len(queues))}) "
+                f"ORDER BY priority DESC, available_at, created_at LIMIT 1",
+                (now, *queues)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = ?, locked_until = ?, "
+                "started_at = ? WHERE id = ?",
+                (worker_id, now + visibility_timeout, now, row["id"])
+            )
+            job = self._row_to_job(row)
+            job.status, job.attempts, job.locked_by = "running", job.attempts + 1, worker_id
+            job.locked_until, job.started_at = now + visibility_timeout, now
+            return job
+        return await self._run(lambda conn: self._transaction(conn, lambda: _claim(conn)))
+
+    async def heartbeat(self, job_id: str, worker_id: str, visibility_timeout: float) -> Optional[str]:
+        def _heartbeat(conn):
+            conn.execute(
+                "UPDATE jobs SET locked_until = ? WHERE id = ? AND locked_by = ? AND status = 'running'",
+                (time.time() + visibility_timeout, job_id, worker_id)
+            )
+            row = conn.execute("SELECT status, locked_by FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            return row["status"] if row["locked_by"] in (worker_id, None) else "lost"
+        return await self._run(_heartbeat)
+
+    async def complete(self, job_id: str, worker_id: str, result: Optional[Dict[str, Any]] = None) -> bool:
+        def _complete(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'succeeded', result = ?, finished_at = ?, locked_by = NULL "
+                "WHERE id = ? AND locked_by = ? AND status = 'running'",
+                (json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                 time.time(), job_id, worker_id)
+            )
+            return cursor.rowcount > 0
+        return await self._run(_complete)
+
+    async def fail(self, job_id: str, worker_id: str, error: str, retry_delay: Optional[float]) -> Optional[str]:
+        def _fail(conn):
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND locked_by = ? AND status = 'running'",
+                (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if retry_delay is not None and row["attempts"] < row["max_attempts"]:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', last_error = ?, available_at = ?, locked_by = NULL "
+                    "WHERE id = ?",
+                    (error, now + retry_delay, job_id)
+                )
+                return "queued"
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', last_error = ?, finished_at = ?, locked_by = NULL WHERE id = ?",
+                (error, now, job_id)
+            )
+            return "failed"
+        return await self._run(lambda conn: self._transaction(conn, lambda: _fail(conn)))
+
+    async def release(self, job_id: str, worker_id: str) -> bool:
+        def _release(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), available_at = ?, "
+                "locked_by = NULL, locked_until = NULL WHERE id = ? AND locked_by = ? AND status = 'running'",
+                (time.time(), job_id, worker_id)
+            )
+            return cursor.rowcount > 0
+        return await self._run(_release)
+
+    async def cancel(self, job_id: str) -> bool:
+        def _cancel(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id)
+            )
+            return cursor.rowcount > 0
+        return await self._run(_cancel)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        def _get(conn):
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return self._row_to_job(row) if row else None
+        return await self._run(_get)
+
+    async def get_by_session(self, session_id: str) -> Optional[Job]:
+        def _get(conn):
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE session_id = ? ORDER BY created_at DESC LIMIT 1", (session_id,)
+            ).fetchone()
+            return self._row_to_job(row) if row else None
+        return await self._run(_get)
+
+    async def add_event(self, job_id: str, data: Dict[str, Any]) -> int:
+        def _add(conn):
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO job_events (job_id, seq, created_at, data) VALUES (?, ?, ?, ?)",
+                (job_id, seq, time.time(), json.dumps(data, ensure_ascii=False, default=str))
+            )
+            return seq
+        return await self._run(lambda conn: self._transaction(conn, lambda: _add(conn)))
+
+    async def events(self, job_id: str, after: int = 0, limit: int = 200) -> List[Tuple[int, Dict[str, Any]]]:
+        def _events(conn):
+            rows = conn.execute(
+                "SELECT seq, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, after, limit)
+            ).fetchall()
+            return [(row["seq"], json.loads(row["data"])) for row in rows]
+        return await self._run(_events)
+
+    async def stats(self) -> Dict[str, Any]:
+        def _stats(conn):
+            queues: Dict[str, Dict[str, Any]] = {}
+            for row in conn.execute("SELECT queue, status, COUNT(*) AS count FROM jobs GROUP BY queue, status"):
+                queues.setdefault(row["queue"], {})[row["status"]] = row["count"]
+            # 最近一小时内开始执行的任务的排队时间
+            for row in conn.execute(
+                "SELECT queue, AVG(started_at - created_at) AS avg_wait, MAX(started_at - created_at) AS max_wait "
+                "FROM jobs WHERE started_at >= ? GROUP BY queue", (time.time() - 3600,)
+            ):
+                queues.setdefault(row["queue"], {}).update({
+                    "avg_wait_s": round(row["avg_wait"] or 0, 3),
+                    "max_wait_s": round(row["max_wait"] or 0, 3),
+                })
+            return queues
+        return await self._run(_stats)
+
+    async def purge(self, older_than: float) -> int:
+        def _purge(conn):
+            ids = [row["id"] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') AND finished_at < ?",
+                (older_than,)
+            )]
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                conn.execute(f"DELETE FROM job_events WHERE job_id IN ({marks})", chunk)
+                conn.execute(f"DELETE FROM jobs WHERE id IN ({marks})", chunk)
+            return len(ids)
+        return await self._run(lambda conn: self._transaction(conn, lambda: _purge(conn)))
+
+
+@dataclass
+class JobHandler:
+    """任务处理函数注册信息"""
+    kind: str
+    func: Callable[["JobContext"], Awaitable[Optional[Dict[str, Any]]]]
+    queue: str = "default"
+    priority: int = 0
+    max_attempts: Optional[int] = None
+
+
+@dataclass
+class JobContext:
+    """传给任务处理函数的上下文"""
+    job: Job
+    queue: "JobQueue"
+    worker_id: str = ""
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    async def publish(self, data: Dict[str, Any]) -> int:
+        """写入一条进度事件"""
+        return await self.queue.publish(self.job.id, data)
+
+
+_handlers: Dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str, queue: str = "default", priority: int = 0, max_attempts: Optional[int] = None):
+    """注册任务处理函数（worker进程导入 JOB_HANDLER_MODULES 中的模块完成注册）"""
+    def decorator(func):
+        _handlers[kind] = JobHandler(kind=kind, func=func, queue=queue, priority=priority, max_attempts=max_attempts)
+        return func
+    return decorator
+
+
+def get_job_handler(kind: str) -> Optional[JobHandler]:
+    return _handlers.get(kind)
+
+
+def retry_delay(attempts: int) -> float:
+    """指数退避（带抖动）"""
+    delay = min(settings.JOB_RETRY_BACKOFF_MAX, settings.JOB_RETRY_BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _create_backend() -> JobQueueBackend:
+    name = settings.JOB_QUEUE_BACKEND
+    if name == "sqlite":
+        return SQLiteJobBackend()
+    module_name, _, class_name = name.partition(":")
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    return backend_class()
+
+
+class JobQueue:
+    """任务队列"""
+
+    def __init__(self, backend: Optional[JobQueueBackend] = None):
+        self._backend = backend
+
+    @property
+    def enabled(self) -> bool:
+        return settings.JOB_QUEUE_ENABLED
+
+    @property
+    def backend(self) -> JobQueueBackend:
+        if self._backend is None:
+            self._backend = _create_backend()
+        return self._backend
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], queue: Optional[str] = None,
+                      priority: Optional[int] = None, session_id: Optional[str] = None,
+                      max_attempts: Optional[int] = None, delay: float = 0.0) -> Job:
+        """
+        提交任务
+
+        queue/priority/max_attempts 未指定时使用处理函数注册时的默认值
+        """
+        handler = get_job_handler(kind)
+        now = time.time()
+        job = Job(
+            id=str(uuid.uuid4()),
+            queue=queue or (handler.queue if handler else "default"),
+            kind=kind,
+            payload=payload,
+            priority=priority if priority is not None else (handler.priority if handler else 0),
+            max_attempts=max_attempts or (handler.max_attempts if handler and handler.max_attempts else None)
+            or settings.JOB_MAX_ATTEMPTS,
+            available_at=now + delay,
+            session_id=session_id,
+            created_at=now,
+        )
+        await self.backend.enqueue(job)
+        logger.info(f"任务已入队: {job.kind} {job.id} (队列 {job.queue}, 优先级 {job.priority})")
+        return job
+
+    async def publish(self, job_id: str, data: Dict[str, Any]) -> int:
+        return await self.backend.add_event(job_id, data)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self.backend.get(job_id)
+
+    async def get_by_session(self, session_id: str) -> Optional[Job]:
+        return await self.backend.get_by_session(session_id)
+
+    async def cancel(self, job_id: str) -> bool:
+        """取消任务：排队中的任务不再执行，运行中的任务由worker在下次续期时中止"""
+        cancelled = await self.backend.cancel(job_id)
+        if cancelled:
+            logger.info(f"任务已取消: {job_id}")
+        return cancelled
+
+    async def stream(self, job_id: str, after: int = 0) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """按顺序读取任务进度事件，任务结束且事件读完后返回"""
+        while True:
+            events = await self.backend.events(job_id, after)
+            for seq, data in events:
+                after = seq
+                yield seq, data
+            if events:
+                continue
+            job = await self.backend.get(job_id)
+            if job is None or job.finished:
+                # 结束前写入的事件可能在上次读取之后才提交
+                for seq, data in await self.backend.events(job_id, after):
+                    yield seq, data
+                return
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+
+    async def stats(self) -> Dict[str, Any]:
+        return await self.backend.stats()
+
+    async def purge(self, older_than_hours: Optional[float] = None) -> int:
+        hours = settings.JOB_RETENTION_HOURS if older_than_hours is None else older_than_hours
+        return await self.backend.purge(time.time() - hours * 3600)
+
+
+# 全局任务队列实例
+job_queue = JobQueue()
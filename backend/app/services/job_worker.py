@@ -0,0 +1,121 @@
+"""
+任务队列worker
+从持久化任务队列领取任务并在本进程内运行，运行期间定期续期可见性超时；
+任务被取消或被其他worker接管时中止处理，处理失败时按退避时间重新入队。
+启动方式见 scripts/run_worker.py。
+"""
+import os
+import socket
+import asyncio
+import importlib
+from typing import Dict, Optional, Set
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.job_queue import Job, JobContext, JobQueue, job_queue, get_job_handler, retry_delay
+
+logger = get_logger(__name__)
+
+
+def parse_queue_limits(value: Optional[str] = None) -> Dict[str, int]:
+    """解析 "analysis=2,execution=1" 形式的队列并发上限"""
+    limits = {}
+    for item in (value or settings.JOB_QUEUE_CONCURRENCY).split(","):
+        name, _, limit = item.strip().partition("=")
+        if name:
+            limits[name.strip()] = int(limit) if limit.strip() else 1
+    return limits
+
+
+def load_job_handlers() -> None:
+    """导入注册了任务处理函数的模块"""
+    for module in settings.JOB_HANDLER_MODULES.split(","):
+        if module.strip():
+            importlib.import_module(module.strip())
+
+
+class JobWorker:
+    """任务队列worker"""
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, queue: Optional[JobQueue] = None,
+                 worker_id: Optional[str] = None):
+        self.limits = limits or parse_queue_limits()
+        self.queue = queue or job_queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        # 本进程同时运行的任务数不超过各队列上限之和（队列上限本身在所有worker之间共享）
+        self.capacity = max(1, sum(self.limits.values()))
+        self._tasks: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def run(self) -> None:
+        logger.info(f"worker已启动: {self.worker_id}, 队列并发上限 {self.limits}")
+        while not self._stopping.is_set():
+            job = None
+            if len(self._tasks) < self.capacity:
+                try:
+                    job = await self.queue.backend.claim(self.limits, self.worker_id, settings.JOB_VISIBILITY_TIMEOUT)
+                except Exception as e:
+                    logger.error(f"领取任务失败: {str(e)}")
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self._execute(job), name=f"job-{job.kind}-{job.id}")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        await self._shutdown()
+
+    async def _shutdown(self) -> None:
+        if self._tasks:
+            logger.info(f"等待 {len(self._tasks)} 个运行中的任务结束...")
+            _, pending = await asyncio.wait(set(self._tasks), timeout=settings.JOB_SHUTDOWN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        logger.info(f"worker已停止: {self.worker_id}")
+
+    async def _heartbeat(self, job: Job, task: asyncio.Task) -> None:
+        """续期可见性超时；任务被取消或被其他worker接管时中止处理"""
+        while True:
+            await asyncio.sleep(settings.JOB_HEARTBEAT_INTERVAL)
+            try:
+                status = await self.queue.backend.heartbeat(job.id, self.worker_id, settings.JOB_VISIBILITY_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"任务续期失败: {job.id}, {str(e)}")
+                continue
+            if status != "running":
+                logger.info(f"任务状态变为 {status}，中止处理: {job.id}")
+                task.cancel()
+                return
+
+    async def _execute(self, job: Job) -> None:
+        handler = get_job_handler(job.kind)
+        if handler is None:
+            await self.queue.backend.fail(job.id, self.worker_id, f"未注册的任务类型: {job.kind}", None)
+            logger.error(f"未注册的任务类型: {job.kind} ({job.id})")
+            return
+
+        logger.info(f"开始处理任务: {job.kind} {job.id} (第 {job.attempts}/{job.max_attempts} 次)")
+        context = JobContext(job=job, queue=self.queue, worker_id=self.worker_id)
+        run_task = asyncio.create_task(handler.func(context))
+        heartbeat = asyncio.create_task(self._heartbeat(job, run_task))
+        try:
+            result = await run_task
+            await self.queue.backend.complete(job.id, self.worker_id, result)
+            logger.info(f"任务完成: {job.kind} {job.id}")
+        except asyncio.CancelledError:
+            # worker停止时交还任务并退还尝试次数，由其他worker继续；已取消或被接管的任务状态不再变化
+            if await self.queue.backend.release(job.id, self.worker_id):
+                logger.info(f"worker已停止，任务已交还队列: {job.kind} {job.id}")
+        except Exception as e:
+            status = await self.queue.backend.fail(job.id, self.worker_id, str(e), retry_delay(job.attempts))
+            logger.error(f"任务失败: {job.kind} {job.id}, {str(e)}, 状态: {status}")
+        finally:
+            heartbeat.cancel()
@@ -0,0 +1,116 @@
+"""
+本地文本向量化模型
+默认使用无需下载模型的特征哈希向量，可通过 EMBEDDING_MODEL 切换为本地 sentence-transformers 模型
+"""
+import re
+import math
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Callable
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_WORD_PATTERN = re.compile(r"[a-z0-9_]+|[\u4e00-\u9fff]+")
+
+
+class EmbeddingModel:
+    """向量化模型接口：encode 返回 L2 归一化的 float32 矩阵，形状为 (len(texts), dimension)"""
+
+    name: str = "base"
+    dimension: int = 0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class HashingEmbedding(EmbeddingModel):
+    """特征哈希向量
+
+    英文按单词和字符三元组、中文按单字和双字切分，哈希到固定维度；
+    不依赖外部模型，适合页面名称、元素描述这类短文本的相似度检索。
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimension: int = 512):
+        self.dimension = dimension
+
+    @staticmethod
+    def _features(text: str) -> Iterable[str]:
+        for token in _WORD_PATTERN.findall(text.lower()):
+            if token.isascii():
+                yield token
+                padded = f"#{token}#"
+                for i in range(len(padded) - 2):
+                    yield padded[i:i + 3]
+            else:
+                yield from token
+                for i in range(len(token) - 1):
+                    yield token[i:i + 2]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in Counter(self._features(text or "")).items():
+                digest = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                vectors[row, digest % self.dimension] += sign * (1.0 + math.log(count))
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class SentenceTransformerEmbedding(EmbeddingModel):
+    """本地 sentence-transformers 模型（可选依赖）"""
+
+    def __init__(self, model_name_or_path: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = model_name_or_path
+        self._model = SentenceTransformer(model_name_or_path)
+        self.dimension = self._model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self._model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+
+# 可注册的向量化模型工厂
+_EMBEDDING_FACTORIES: Dict[str, Callable[[], EmbeddingModel]] = {
+    "hashing": lambda: HashingEmbedding(settings.EMBEDDING_DIMENSION),
+}
+
+_embedding_model: EmbeddingModel = None
+
+
+def register_embedding_model(name: str, factory: Callable[[], EmbeddingModel]) -> None:
+    """注册自定义向量化模型，通过 EMBEDDING_MODEL=name 启用"""
+    _EMBEDDING_FACTORIES[name] = factory
+
+
+def get_embedding_model() -> EmbeddingModel:
+    """获取当前配置的向量化模型（单例）
+
+    EMBEDDING_MODEL 为已注册名称时使用对应工厂，否则视为 sentence-transformers 模型名或本地路径，
+    加载失败时回退到特征哈希向量。
+    """
+    global _embedding_model
+    if _embedding_model is not None:
+        return _embedding_model
+
+    model_name = settings.EMBEDDING_MODEL
+    factory = _EMBEDDING_FACTORIES.get(model_name)
+    try:
+        _embedding_model = factory() if factory else SentenceTransformerEmbedding(model_name)
+    except Exception as e:
+        logger.warning(f"加载向量化模型失败，使用特征哈希向量: {model_name} - {e}")
+        _embedding_model = HashingEmbedding(settings.EMBEDDING_DIMENSION)
+
+    logger.info(f"向量化模型: {_embedding_model.name} (维度 {_embedding_model.dimension})")
+    return _embedding_model
@@ -0,0 +1,337 @@
+"""
+脚本生成上下文检索
+根据测试描述从当前页面分析结果、页面分析知识库和历史成功脚本中挑选相关内容，
+在token预算内构建脚本生成提示的分析上下文
+"""
+import re
+import json
+import math
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.messages.web import WebMultimodalAnalysisResponse
+from app.services.knowledge.embeddings import get_embedding_model
+from app.services.knowledge.page_vector_store import page_vector_store
+
+logger = get_logger(__name__)
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+_JSON_OBJECT_PATTERN = re.compile(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', re.DOTALL)
+_PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+
+# 单个分析片段的最大字符数
+MAX_CHUNK_CHARS = 600
+# 历史脚本候选数量（按最近执行时间）
+SCRIPT_CANDIDATE_LIMIT = 200
+# 知识库元素、历史脚本片段最多占用的预算比例
+KB_ELEMENT_BUDGET_RATIO = 0.15
+SCRIPT_EXAMPLE_BUDGET_RATIO = 0.3
+# 相似度低于最高分该比例的片段视为不相关
+RELATIVE_SCORE_FLOOR = 0.3
+
+SECTION_TITLES = {
+    "element": "### UI元素",
+    "flow": "### 交互流程",
+    "scenario": "### 测试场景",
+    "step": "### 测试步骤",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本token数：中文字符按1个token，其余按4个字符1个token"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    if len(text) <= max_chars:
+        return [text]
+    pieces, current = [], ""
+    for line in text.splitlines():
+        if current and len(current) + len(line) + 1 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+        while len(current) > max_chars:
+            pieces.append(current[:max_chars])
+            current = current[max_chars:]
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_analysis_text(text: str, max_chars: int = MAX_CHUNK_CHARS) -> List[str]:
+    """把智能体输出的分析文本切分为可独立检索的片段
+
+    包含多个JSON对象（如元素列表）时按对象切分，否则按段落切分，过长的片段再按行切分。
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+
+    objects = _JSON_OBJECT_PATTERN.findall(text)
+    if len(objects) >= 2:
+        pieces = []
+        for raw in objects:
+            try:
+                pieces.append(json.dumps(json.loads(raw), ensure_ascii=False, separators=(",", ":")))
+            except ValueError:
+                pieces.append(raw.strip())
+    else:
+        pieces = [piece.strip() for piece in _PARAGRAPH_PATTERN.split(text) if piece.strip()]
+
+    chunks = []
+    for piece in pieces:
+        chunks.extend(_split_long(piece, max_chars))
+    return chunks
+
+
+class GenerationContextRetriever:
+    """脚本生成上下文检索器
+
+    - 当前页面的UI元素、交互流程、测试场景切分为片段，按与测试描述的向量相似度选取 top-k；
+    - 从页面分析知识库补充相似页面中的相关元素；
+    - 引用同格式、最近一次执行成功的历史脚本片段作为示例；
+    - 按 GENERATION_PROMPT_TOKEN_BUDGET 截断，并统计相对完整分析摘要节省的token数。
+    """
+
+    def __init__(
+        self,
+        token_budget: Optional[int] = None,
+        top_k: Optional[int] = None,
+        example_count: Optional[int] = None
+    ):
+        self.token_budget = token_budget or settings.GENERATION_PROMPT_TOKEN_BUDGET
+        self.top_k = top_k or settings.GENERATION_CONTEXT_TOP_K
+        self.example_count = example_count if example_count is not None else settings.GENERATION_SCRIPT_EXAMPLES
+
+        self.generations = 0
+        self.baseline_tokens = 0
+        self.prompt_tokens = 0
+
+    @staticmethod
+    def _query_text(message: WebMultimodalAnalysisResponse) -> str:
+        page_analysis = message.page_analysis
+        parts = [message.test_description, page_analysis.page_title, page_analysis.page_type]
+        if not message.test_description:
+            parts.append((page_analysis.main_content or "")[:300])
+        return " ".join(part for part in parts if part)
+
+    @staticmethod
+    def _collect_chunks(message: WebMultimodalAnalysisResponse) -> List[Dict[str, Any]]:
+        page_analysis = message.page_analysis
+        chunks = []
+        for kind, items in (
+            ("element", page_analysis.ui_elements),
+            ("flow", page_analysis.user_flows),
+            ("scenario", page_analysis.test_scenarios),
+        ):
+            for item in items or []:
+                for text in split_analysis_text(str(item)):
+                    chunks.append({"kind": kind, "text": text, "order": len(chunks)})
+
+        for step in page_analysis.test_steps or []:
+            text = f"{step.step_number}. {step.action} → {step.target}: {step.description}"
+            if step.expected_result:
+                text += f"（预期: {step.expected_result}）"
+            chunks.append({"kind": "step", "text": text, "order": len(chunks)})
+        return chunks
+
+    @staticmethod
+    def _rank_by_similarity(query: str, texts: List[str]) -> np.ndarray:
+        model = get_embedding_model()
+        vectors = model.encode([query] + texts)
+        return vectors[1:] @ vectors[0]
+
+    async def _find_script_examples(self, query: str, script_format: str) -> List[Dict[str, Any]]:
+        """查找同格式、最近一次执行成功且与测试描述最相似的历史脚本
+
+        执行结束时 ExecutionRepository.update_status 会更新脚本的最近执行状态，成功的执行为 completed。
+        """
+        from app.database.connection import db_manager
+        from app.database.models.scripts import TestScript
+
+        async with db_manager.get_session() as session:
+            result = await session.execute(
+                select(TestScript.name, TestScript.test_description, TestScript.content)
+                .where(
+                    TestScript.script_format == script_format,
+                    TestScript.last_execution_status == 'completed'
+                )
+                .order_by(TestScript.last_execution_time.desc())
+                .limit(SCRIPT_CANDIDATE_LIMIT)
+            )
+            scripts = [
+                {"name": name, "test_description": description, "content": content}
+                for name, description, content in result.all()
+            ]
+
+        if not scripts:
+            return []
+
+        scores = await asyncio.to_thread(
+            self._rank_by_similarity, query, [f"{s['name']} {s['test_description']}" for s in scripts]
+        )
+        ranked = sorted(zip(scores.tolist(), scripts), key=lambda item: item[0], reverse=True)
+        return [script for score, script in ranked[:self.example_count] if score > 0]
+
+    @staticmethod
+    def _take_within_budget(texts: List[str], budget: int) -> Tuple[List[str], int]:
+        selected, used = [], 0
+        for text in texts:
+            cost = estimate_tokens(text)
+            if used + cost > budget:
+                continue
+            selected.append(text)
+            used += cost
+        return selected, used
+
+    @staticmethod
+    def _truncate_to_tokens(text: str, budget: int) -> str:
+        """按行截断到token预算以内"""
+        lines, used = [], 0
+        for line in text.splitlines():
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget:
+                lines.append("# ...")
+                break
+            lines.append(line)
+            used += cost
+        return "\n".join(lines)
+
+    async def build_context(
+        self,
+        message: WebMultimodalAnalysisResponse,
+        script_format: str,
+        baseline_summary: str
+    ) -> Tuple[str, Dict[str, Any]]:
+        """构建检索增强的分析上下文
+
+        Args:
+            message: 多模态分析结果
+            script_format: 脚本格式（yaml/playwright），用于筛选历史脚本示例
+            baseline_summary: 不做检索时的完整分析摘要，用于统计节省的token数
+
+        Returns:
+            (分析上下文, 提示统计信息)
+        """
+        page_analysis = message.page_analysis
+        query = self._query_text(message)
+        budget = self.token_budget
+
+        header = "## 页面基本信息\n"
+        for label, value in (
+            ("标题", page_analysis.page_title),
+            ("类型", page_analysis.page_type),
+            ("主要内容", (page_analysis.main_content or "")[:300]),
+            ("测试需求", message.test_description),
+        ):
+            if value:
+                header += f"- **{label}**: {value}\n"
+        # 页面信息本身超出预算时其余部分不再占用预算
+        remaining = max(0, budget - estimate_tokens(header))
+        sections = [header]
+
+        # 历史成功脚本片段
+        examples = []
+        if self.example_count > 0:
+            try:
+                examples = await self._find_script_examples(query, script_format)
+            except Exception as e:
+                logger.warning(f"查询历史成功脚本失败: {e}")
+        example_budget = min(int(budget * SCRIPT_EXAMPLE_BUDGET_RATIO), remaining) // max(len(examples), 1)
+        if examples and example_budget > 0:
+            example_text = "## 历史成功脚本参考\n"
+            for example in examples:
+                fence = "yaml" if script_format == "yaml" else "typescript"
+                title = example["name"]
+                if example["test_description"]:
+                    title += f"（{example['test_description']}）"
+                example_text += (
+                    f"#### {title}\n"
+                    f"```{fence}\n{self._truncate_to_tokens(example['content'], example_budget)}\n```\n"
+                )
+            remaining = max(0, remaining - estimate_tokens(example_text))
+            sections.append(example_text)
+        else:
+            examples = []
+
+        # 知识库中相似页面的相关元素
+        kb_lines = []
+        try:
+            hits = await page_vector_store.search_elements(query, top_k=self.top_k)
+            kb_lines = [
+                f"- {payload.get('page_name')}: {payload.get('element_name')}"
+                f"（{payload.get('element_type')}）{payload.get('element_description') or ''}".rstrip()
+                for _, score, payload in hits if score > 0
+            ]
+        except Exception as e:
+            logger.warning(f"检索知识库元素失败: {e}")
+        kb_lines, kb_used = self._take_within_budget(kb_lines, min(int(budget * KB_ELEMENT_BUDGET_RATIO), remaining))
+        if kb_lines:
+            sections.append("## 知识库相似页面元素\n" + "\n".join(kb_lines) + "\n")
+            remaining = max(0, remaining - kb_used)
+
+        # 当前页面分析结果中最相关的片段
+        chunks = self._collect_chunks(message)
+        selected = []
+        if chunks:
+            scores = await asyncio.to_thread(self._rank_by_similarity, query, [chunk["text"] for chunk in chunks])
+            floor = float(scores.max()) * RELATIVE_SCORE_FLOOR
+            for i in np.argsort(-scores, kind="stable"):
+                chunk = chunks[i]
+                if len(selected) >= self.top_k or (selected and scores[i] < floor):
+                    break
+                cost = estimate_tokens(chunk["text"]) + 1
+                if cost > remaining:
+                    continue
+                selected.append(chunk)
+                remaining -= cost
+
+        analysis_text = "## 相关分析结果（按测试需求检索）\n"
+        for kind, title in SECTION_TITLES.items():
+            texts = [chunk["text"] for chunk in sorted(selected, key=lambda c: c["order"]) if chunk["kind"] == kind]
+            if texts:
+                analysis_text += f"{title}\n" + "\n".join(f"- {text}" for text in texts) + "\n"
+        if selected:
+            sections.insert(1, analysis_text)
+
+        context = "\n".join(sections)
+        stats = {
+            "baseline_tokens": estimate_tokens(baseline_summary),
+            "prompt_tokens": estimate_tokens(context),
+            "selected_chunks": len(selected),
+            "total_chunks": len(chunks),
+            "kb_elements": len(kb_lines),
+            "script_examples": len(examples),
+        }
+        stats["tokens_saved"] = stats["baseline_tokens"] - stats["prompt_tokens"]
+
+        self.generations += 1
+        self.baseline_tokens += stats["baseline_tokens"]
+        self.prompt_tokens += stats["prompt_tokens"]
+        logger.info(
+            f"检索增强生成上下文: 片段 {len(selected)}/{len(chunks)}, 知识库元素 {len(kb_lines)}, "
+            f"脚本示例 {len(examples)}, 提示token {stats['prompt_tokens']} (节省 {stats['tokens_saved']})"
+        )
+        return context, stats
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取累计统计信息"""
+        return {
+            "generations": self.generations,
+            "baseline_tokens": self.baseline_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "tokens_saved": self.baseline_tokens - self.prompt_tokens,
+        }
+
+
+# 全局生成上下文检索实例
+generation_context_retriever = GenerationContextRetriever()
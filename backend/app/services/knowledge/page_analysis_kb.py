@@ -8,16 +8,51 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, or_, and_
 from loguru import logger
 
+from app.core.config import settings
 from app.database.connection import db_manager
 from app.database.models.page_analysis import PageAnalysisResult
+from app.services.knowledge.page_vector_store import page_vector_store, reciprocal_rank_fusion
 
 
 class PageAnalysisKnowledgeBase:
     """页面分析知识库"""
     
     def __init__(self):
-        self.similarity_threshold = 0.3  # 相似度阈值
-    
+        # 向量检索最低相似度（特征哈希向量对短查询的相似度普遍偏低，可通过配置调低）
+        self.similarity_threshold = settings.SIMILARITY_THRESHOLD
+
+    async def _keyword_search_ids(
+        self,
+        session: AsyncSession,
+        query: str,
+        page_type: Optional[str],
+        limit: int
+    ) -> List[str]:
+        """关键词检索，返回按置信度排序的页面ID"""
+        stmt = select(PageAnalysisResult.id)
+
+        search_conditions = []
+        if query:
+            search_conditions.append(
+                or_(
+                    PageAnalysisResult.page_name.ilike(f'%{query}%'),
+                    PageAnalysisResult.page_description.ilike(f'%{query}%'),
+                    PageAnalysisResult.analysis_summary.ilike(f'%{query}%')
+                )
+            )
+        if page_type:
+            search_conditions.append(PageAnalysisResult.page_type == page_type)
+        if search_conditions:
+            stmt = stmt.where(and_(*search_conditions))
+
+        stmt = stmt.order_by(
+            PageAnalysisResult.confidence_score.desc(),
+            PageAnalysisResult.created_at.desc()
+        ).limit(limit)
+
+        result = await session.execute(stmt)
+        return list(result.scalars().all())
+
     async def search_similar_pages(
         self, 
         query: str, 
@@ -26,6 +61,8 @@ class PageAnalysisKnowledgeBase:
     ) -> List[Dict[str, Any]]:
         """
         搜索相似的页面分析结果
+
+        关键词检索与向量检索（HYBRID_RETRIEVAL_ENABLED 时）的结果按倒数排名融合排序。
         
         Args:
             query: 搜索查询（页面名称、功能描述等）
@@ -33,58 +70,41 @@ class PageAnalysisKnowledgeBase:
             limit: 返回结果数量限制
             
         Returns:
-            相似页面分析结果列表
+            相似页面分析结果列表（摘要字段，附带 score 和 vector_score）
         """
         try:
+            candidate_limit = max(limit * 2, settings.VECTOR_SEARCH_TOP_K)
+
             async with db_manager.get_session() as session:
-                # 构建查询
-                stmt = select(PageAnalysisResult)
-                
-                # 添加搜索条件
-                search_conditions = []
-                
-                if query:
-                    # 在页面名称、描述中搜索
-                    search_conditions.append(
-                        or_(
-                            PageAnalysisResult.page_name.ilike(f'%{query}%'),
-                            PageAnalysisResult.page_description.ilike(f'%{query}%'),
-                            PageAnalysisResult.analysis_summary.ilike(f'%{query}%')
-                        )
-                    )
+                keyword_ids = await self._keyword_search_ids(session, query, page_type, candidate_limit)
 
-                if page_type:
-                    search_conditions.append(
-                        PageAnalysisResult.page_type == page_type
+                vector_scores: Dict[str, float] = {}
+                if settings.HYBRID_RETRIEVAL_ENABLED and query:
+                    hits = await page_vector_store.search_pages(
+                        query, top_k=candidate_limit, page_type=page_type, min_score=self.similarity_threshold
                     )
-                
-                if search_conditions:
-                    stmt = stmt.where(and_(*search_conditions))
-                
-                # 按置信度和创建时间排序
-                stmt = stmt.order_by(
-                    PageAnalysisResult.confidence_score.desc(),
-                    PageAnalysisResult.created_at.desc()
-                ).limit(limit)
-                
-                result = await session.execute(stmt)
-                records = result.scalars().all()
-                
-                # 转换为字典格式
+                    vector_scores = {page_id: score for page_id, score, _ in hits}
+
+                fused = reciprocal_rank_fusion([keyword_ids, list(vector_scores)])[:limit]
+                if not fused:
+                    return []
+
+                result = await session.execute(
+                    select(PageAnalysisResult)
+                    .options(*PageAnalysisResult.summary_options())
+                    .where(PageAnalysisResult.id.in_([page_id for page_id, _ in fused]))
+                )
+                records = {record.id: record for record in result.scalars().all()}
+
                 similar_pages = []
-                for record in records:
-                    page_data = {
-                        "id": record.id,
-                        "page_name": record.page_name,
-                        "page_title": record.page_title,
-                        "page_type": record.page_type,
-                        "main_content": record.main_content,
-                        "ui_elements": record.ui_elements or [],
-                        "ui_elements_count": record.ui_elements_count,
-                        "confidence_score": record.confidence_score,
-                        "analysis_result": record.analysis_result or {},
-                        "created_at": record.created_at.isoformat() if record.created_at else None
-                    }
+                for page_id, score in fused:
+                    record = records.get(page_id)
+                    if record is None:
+                        # 向量索引中残留的已删除页面
+                        continue
+                    page_data = record.to_summary_dict()
+                    page_data["score"] = score
+                    page_data["vector_score"] = vector_scores.get(page_id)
                     similar_pages.append(page_data)
                 
                 logger.info(f"找到 {len(similar_pages)} 个相似页面，查询: {query}")
@@ -0,0 +1,218 @@
+"""
+页面分析向量检索服务
+维护页面摘要和页面元素描述的本地向量索引，支持与关键词检索结果融合的混合检索
+"""
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.knowledge.embeddings import get_embedding_model
+from app.services.knowledge.vector_index import VectorIndex
+
+logger = get_logger(__name__)
+
+# 倒数排名融合常数
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """倒数排名融合：合并多路检索的排序结果，按融合得分降序返回 (ID, 得分)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def build_page_text(page: Dict[str, Any]) -> str:
+    """页面向量化文本：名称、类型、描述和分析摘要"""
+    parts = [page.get("page_name"), page.get("page_type"), page.get("page_description"), page.get("analysis_summary")]
+    return "\n".join(str(part) for part in parts if part)
+
+
+def build_element_text(element: Dict[str, Any]) -> str:
+    """元素向量化文本：名称、类型、描述、文本内容和功能说明"""
+    data = element.get("element_data") or {}
+    parts = [
+        element.get("element_name") or data.get("name"),
+        element.get("element_type") or data.get("element_type"),
+        element.get("element_description") or data.get("description"),
+        data.get("text_content"),
+        data.get("functionality"),
+    ]
+    return " ".join(str(part) for part in parts if part)
+
+
+class PageVectorStore:
+    """页面分析向量存储
+
+    两个索引：pages（页面级，ID为页面分析结果ID）和 elements（元素级，ID为页面元素ID，
+    附加数据中记录所属页面），页面重新分析时先删除该页面的旧元素再写入。
+    """
+
+    def __init__(self, base_dir: Optional[str] = None):
+        self.base_dir = Path(base_dir or settings.VECTOR_INDEX_DIR)
+        self._pages: Optional[VectorIndex] = None
+        self._elements: Optional[VectorIndex] = None
+        self._built_from_database = False
+        self._build_lock = asyncio.Lock()
+
+    def _ensure_indexes(self) -> None:
+        if self._pages is not None:
+            return
+        model = get_embedding_model()
+        self._pages = VectorIndex(str(self.base_dir / "pages"), model.dimension, model.name)
+        self._elements = VectorIndex(str(self.base_dir / "elements"), model.dimension, model.name)
+
+    def _encode(self, texts: List[str]):
+        return get_embedding_model().encode(texts)
+
+    def _index_page_sync(self, page: Dict[str, Any], elements: List[Dict[str, Any]]) -> int:
+        self._ensure_indexes()
+        page_id = page["id"]
+        self._pages.upsert(
+            [page_id],
+            self._encode([build_page_text(page)]),
+            [{"page_id": page_id, "page_name": page.get("page_name"), "page_type": page.get("page_type")}]
+        )
+
+        self._elements.remove_where(lambda payload: payload.get("page_id") == page_id)
+        elements = [element for element in elements if build_element_text(element)]
+        if elements:
+            self._elements.upsert(
+                [element["id"] for element in elements],
+                self._encode([build_element_text(element) for element in elements]),
+                [
+                    {
+                        "page_id": page_id,
+                        "page_name": page.get("page_name"),
+                        "element_name": element.get("element_name"),
+                        "element_type": element.get("element_type"),
+                        "element_description": element.get("element_description"),
+                        "is_testable": element.get("is_testable", True),
+                    }
+                    for element in elements
+                ]
+            )
+        return len(elements)
+
+    async def index_page(self, page: Dict[str, Any], elements: List[Dict[str, Any]]) -> int:
+        """写入/更新一个页面及其元素的向量，返回写入的元素数量
+
+        Args:
+            page: 页面分析结果字段（需包含 id）
+            elements: 页面元素字段列表（需包含 id）
+        """
+        return await asyncio.to_thread(self._index_page_sync, page, elements)
+
+    def _remove_page_sync(self, page_id: str) -> None:
+        self._ensure_indexes()
+        self._pages.remove([page_id])
+        self._elements.remove_where(lambda payload: payload.get("page_id") == page_id)
+
+    async def remove_page(self, page_id: str) -> None:
+        """删除页面及其元素的向量"""
+        await asyncio.to_thread(self._remove_page_sync, page_id)
+
+    def _search_sync(self, index_name: str, query: str, top_k: int, predicate, min_score):
+        self._ensure_indexes()
+        index = self._pages if index_name == "pages" else self._elements
+        return index.search(self._encode([query])[0], top_k=top_k, predicate=predicate, min_score=min_score)
+
+    async def search_pages(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        page_type: Optional[str] = None,
+        min_score: Optional[float] = None
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """向量检索相似页面，返回 (页面ID, 相似度, 附加数据)"""
+        await self.ensure_built()
+        predicate = (lambda payload: payload.get("page_type") == page_type) if page_type else None
+        return await asyncio.to_thread(
+            self._search_sync, "pages", query, top_k or settings.VECTOR_SEARCH_TOP_K, predicate, min_score
+        )
+
+    async def search_elements(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        page_ids: Optional[Sequence[str]] = None,
+        min_score: Optional[float] = None
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """向量检索相关元素，可限定在指定页面内，返回 (元素ID, 相似度, 附加数据)"""
+        await self.ensure_built()
+        allowed = set(page_ids) if page_ids else None
+        predicate = (lambda payload: payload.get("page_id") in allowed) if allowed else None
+        return await asyncio.to_thread(
+            self._search_sync, "elements", query, top_k or settings.VECTOR_SEARCH_TOP_K, predicate, min_score
+        )
+
+    async def ensure_built(self) -> None:
+        """索引为空时从数据库导入已完成的页面分析结果（每个进程只尝试一次）"""
+        if self._built_from_database:
+            return
+        async with self._build_lock:
+            if self._built_from_database:
+                return
+            self._built_from_database = True
+
+            await asyncio.to_thread(self._ensure_indexes)
+            if await asyncio.to_thread(len, self._pages):
+                return
+            try:
+                count = await self._build_from_database()
+                if count:
+                    logger.info(f"从数据库构建页面向量索引完成: {count}个页面")
+            except Exception as e:
+                logger.warning(f"从数据库构建页面向量索引失败: {e}")
+
+    async def _build_from_database(self, batch_size: int = 200) -> int:
+        from app.database.connection import db_manager
+        from app.database.models.page_analysis import PageAnalysisResult, PageElement
+
+        page_columns = ("id", "page_name", "page_type", "page_description", "analysis_summary")
+        element_columns = ("id", "element_name", "element_type", "element_description", "is_testable")
+
+        count = 0
+        offset = 0
+        while True:
+            async with db_manager.get_session() as session:
+                result = await session.execute(
+                    select(*(getattr(PageAnalysisResult, name) for name in page_columns))
+                    .where(PageAnalysisResult.analysis_status == 'completed')
+                    .order_by(PageAnalysisResult.created_at)
+                    .limit(batch_size)
+                    .offset(offset)
+                )
+                pages = [dict(zip(page_columns, row)) for row in result.all()]
+                if not pages:
+                    break
+
+                element_result = await session.execute(
+                    select(PageElement.page_analysis_id, *(getattr(PageElement, name) for name in element_columns))
+                    .where(PageElement.page_analysis_id.in_([page["id"] for page in pages]))
+                )
+                elements_by_page: Dict[str, List[Dict[str, Any]]] = {}
+                for row in element_result.all():
+                    elements_by_page.setdefault(row[0], []).append(dict(zip(element_columns, row[1:])))
+
+            for page in pages:
+                await self.index_page(page, elements_by_page.get(page["id"], []))
+            count += len(pages)
+            offset += batch_size
+
+        return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        self._ensure_indexes()
+        return {"pages": self._pages.get_stats(), "elements": self._elements.get_stats()}
+
+
+# 全局页面向量存储实例
+page_vector_store = PageVectorStore()
@@ -0,0 +1,437 @@
+"""
+本地向量索引
+基于 NumPy 的嵌入式向量索引：小规模暴力检索，大规模使用 IVF 倒排聚类近似检索，
+向量以内存映射文件持久化，支持增量写入和删除
+"""
+import os
+import json
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.f32"
+ASSIGN_FILE = "assign.i32"
+CENTROIDS_FILE = "centroids.npy"
+RECORDS_FILE = "records.jsonl"
+
+# 初始容量与k-means训练参数
+INITIAL_CAPACITY = 1024
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_SIZE = 50000
+BATCH_SIZE = 10000
+
+SearchHit = Tuple[str, float, Dict[str, Any]]
+
+
+class VectorIndex:
+    """向量索引
+
+    目录结构::
+
+        manifest.json   维度、模型、容量、IVF训练规模
+        vectors.f32     向量矩阵（内存映射，按行追加）
+        assign.i32      每行所属的IVF聚类（训练后维护）
+        centroids.npy   IVF聚类中心
+        records.jsonl   只追加的写入/删除日志（ID、行号、附加数据），加载时重放
+
+    写入时同一ID覆盖原行；删除只记墓碑，墓碑过多时 compact() 在临时目录中重建索引后整体替换，
+    替换过程中进程中断时，下次加载按目录状态恢复为旧索引或新索引。
+    所有方法都是同步的并由内部锁保护，异步代码中应通过线程调用。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        dimension: int,
+        model_name: str,
+        ann_threshold: Optional[int] = None,
+        nprobe: Optional[int] = None
+    ):
+        self.directory = Path(directory)
+        self.dimension = dimension
+        self.model_name = model_name
+        self.ann_threshold = ann_threshold if ann_threshold is not None else settings.VECTOR_ANN_THRESHOLD
+        self.nprobe = nprobe if nprobe is not None else settings.VECTOR_IVF_NPROBE
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._capacity = 0
+        self._count = 0
+        self._vectors: Optional[np.memmap] = None
+        self._assign: Optional[np.memmap] = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids: List[Optional[str]] = []
+        self._payloads: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: Dict[int, Set[int]] = {}
+        self._trained_count = 0
+
+    # ==================== 持久化 ====================
+
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            "dimension": self.dimension,
+            "model": self.model_name,
+            "capacity": self._capacity,
+            "trained_count": self._trained_count,
+        }
+        tmp_path = self._path(MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._path(MANIFEST_FILE))
+
+    def _append_records(self, records: List[Dict[str, Any]]) -> None:
+        with open(self._path(RECORDS_FILE), "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _open_arrays(self, capacity: int, mode: str) -> None:
+        self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode=mode,
+                                  shape=(capacity, self.dimension))
+        self._assign = np.memmap(self._path(ASSIGN_FILE), dtype=np.int32, mode=mode, shape=(capacity,))
+        self._capacity = capacity
+        if len(self._alive) < capacity:
+            self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+
+    def _clear_state(self) -> None:
+        self._vectors = self._assign = None
+        self._capacity = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids, self._payloads, self._rows = [], [], {}
+        self._count = 0
+        self._centroids, self._lists, self._trained_count = None, {}, 0
+
+    def _reset(self) -> None:
+        if self.directory.exists():
+            shutil.rmtree(self.directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._clear_state()
+        self._open_arrays(INITIAL_CAPACITY, "w+")
+        self._write_manifest()
+
+    def _compact_paths(self) -> Tuple[Path, Path]:
+        """压缩时新索引的临时目录和替换下来的旧目录"""
+        return (self.directory.with_name(self.directory.name + ".compact"),
+                self.directory.with_name(self.directory.name + ".old"))
+
+    def _recover_compaction(self) -> None:
+        """恢复中断的压缩：新索引只在构建完成后才替换旧目录，旧目录已移走时启用新索引，否则丢弃"""
+        new_dir, old_dir = self._compact_paths()
+        if not self._path(MANIFEST_FILE).exists() and (new_dir / MANIFEST_FILE).exists():
+            if self.directory.exists():
+                shutil.rmtree(self.directory)
+            os.replace(new_dir, self.directory)
+            logger.warning(f"向量索引压缩中断，启用已构建的新索引: {self.directory}")
+        for leftover in (new_dir, old_dir):
+            if leftover.exists():
+                shutil.rmtree(leftover, ignore_errors=True)
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+
+        self._recover_compaction()
+
+        manifest_path = self._path(MANIFEST_FILE)
+        manifest = None
+        if manifest_path.exists():
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+
+        if not manifest or manifest.get("dimension") != self.dimension or manifest.get("model") != self.model_name:
+            if manifest:
+                logger.warning(f"向量索引模型或维度变化，重建索引: {self.directory}")
+            self._reset()
+            self._loaded = True
+            return
+
+        self._open_arrays(manifest["capacity"], "r+")
+        records_path = self._path(RECORDS_FILE)
+        if records_path.exists():
+            with open(records_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._replay(json.loads(line))
+
+        self._trained_count = manifest.get("trained_count", 0)
+        centroids_path = self._path(CENTROIDS_FILE)
+        if self._trained_count and centroids_path.exists():
+            self._centroids = np.load(centroids_path)
+            self._rebuild_lists()
+
+        self._loaded = True
+        logger.info(f"向量索引加载完成: {self.directory} ({len(self._rows)}条)")
+
+    def _replay(self, record: Dict[str, Any]) -> None:
+        if record["op"] == "add":
+            row = record["row"]
+            while len(self._ids) <= row:
+                self._ids.append(None)
+                self._payloads.append(None)
+            previous = self._rows.get(record["id"])
+            if previous is not None and previous != row:
+                self._mark_dead(previous)
+            self._ids[row] = record["id"]
+            self._payloads[row] = record.get("payload") or {}
+            self._rows[record["id"]] = row
+            self._alive[row] = True
+            self._count = max(self._count, row + 1)
+        elif record["op"] == "del":
+            row = self._rows.pop(record["id"], None)
+            if row is not None:
+                self._mark_dead(row)
+
+    def _mark_dead(self, row: int) -> None:
+        self._alive[row] = False
+        self._ids[row] = None
+        self._payloads[row] = None
+        if self._centroids is not None:
+            self._lists.get(int(self._assign[row]), set()).discard(row)
+
+    def _ensure_capacity(self, needed: int) -> None:
+        if needed <= self._capacity:
+            return
+        new_capacity = max(self._capacity * 2, needed)
+        old_vectors, old_assign, count = self._vectors, self._assign, self._count
+
+        for name, dtype, shape, source in (
+            (VECTORS_FILE, np.float32, (new_capacity, self.dimension), old_vectors),
+            (ASSIGN_FILE, np.int32, (new_capacity,), old_assign),
+        ):
+            tmp_path = self._path(name + ".tmp")
+            grown = np.memmap(tmp_path, dtype=dtype, mode="w+", shape=shape)
+            grown[:count] = source[:count]
+            grown.flush()
+            del grown
+
+        del old_vectors, old_assign
+        self._vectors = self._assign = None
+        os.replace(self._path(VECTORS_FILE + ".tmp"), self._path(VECTORS_FILE))
+        os.replace(self._path(ASSIGN_FILE + ".tmp"), self._path(ASSIGN_FILE))
+        self._open_arrays(new_capacity, "r+")
+        self._write_manifest()
+
+    # ==================== IVF ====================
+
+    def _rebuild_lists(self) -> None:
+        self._lists = {i: set() for i in range(len(self._centroids))}
+        rows = np.flatnonzero(self._alive[:self._count])
+        for row, cluster in zip(rows, self._assign[rows]):
+            self._lists[int(cluster)].add(int(row))
+
+    def _nearest_centroids(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def train(self) -> None:
+        """训练IVF聚类中心并重新分配所有向量"""
+        with self._lock:
+            self._ensure_loaded()
+            rows = np.flatnonzero(self._alive[:self._count])
+            if len(rows) == 0:
+                return
+
+            rng = np.random.default_rng(0)
+            sample_rows = rows if len(rows) <= KMEANS_SAMPLE_SIZE else rng.choice(rows, KMEANS_SAMPLE_SIZE, replace=False)
+            sample = np.asarray(self._vectors[np.sort(sample_rows)])
+            nlist = int(min(1024, max(16, np.sqrt(len(rows)))))
+            nlist = min(nlist, len(sample))
+
+            # 球面k-means：向量已归一化，使用内积作为相似度
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+            for _ in range(KMEANS_ITERATIONS):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for cluster in range(nlist):
+                    members = sample[labels == cluster]
+                    if len(members):
+                        centroids[cluster] = members.sum(axis=0)
+                    else:
+                        centroids[cluster] = sample[rng.integers(len(sample))]
+                norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                centroids /= norms
+
+            self._centroids = centroids.astype(np.float32)
+            for start in range(0, len(rows), BATCH_SIZE):
+                batch = rows[start:start + BATCH_SIZE]
+                self._assign[batch] = self._nearest_centroids(np.asarray(self._vectors[batch]))
+            self._assign.flush()
+            np.save(self._path(CENTROIDS_FILE), self._centroids)
+
+            self._trained_count = len(rows)
+            self._rebuild_lists()
+            self._write_manifest()
+            logger.info(f"向量索引IVF训练完成: {self.directory} ({len(rows)}条, {nlist}个聚类)")
+
+    # ==================== 写入 ====================
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: Optional[List[Dict[str, Any]]] = None) -> None:
+        """写入向量（同一ID覆盖）"""
+        if not ids:
+            return
+        payloads = payloads or [{} for _ in ids]
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        with self._lock:
+            self._ensure_loaded()
+            new_count = sum(1 for item_id in set(ids) if item_id not in self._rows)
+            self._ensure_capacity(self._count + new_count)
+
+            records = []
+            for item_id, vector, payload in zip(ids, vectors, payloads):
+                row = self._rows.get(item_id)
+                if row is None:
+                    row = self._count
+                    self._count += 1
+                    self._ids.append(None)
+                    self._payloads.append(None)
+                elif self._centroids is not None:
+                    self._lists.get(int(self._assign[row]), set()).discard(row)
+
+                self._vectors[row] = vector
+                self._ids[row] = item_id
+                self._payloads[row] = payload
+                self._rows[item_id] = row
+                self._alive[row] = True
+                if self._centroids is not None:
+                    cluster = int(self._nearest_centroids(vector[None, :])[0])
+                    self._assign[row] = cluster
+                    self._lists[cluster].add(row)
+                records.append({"op": "add", "id": item_id, "row": row, "payload": payload})
+
+            self._vectors.flush()
+            self._assign.flush()
+            self._append_records(records)
+
+            # 数据量翻倍后重新训练，保证聚类质量
+            alive = len(self._rows)
+            if alive >= self.ann_threshold and alive >= 2 * max(self._trained_count, 1):
+                self.train()
+
+    def remove(self, ids: List[str]) -> int:
+        """删除向量，返回实际删除数量"""
+        with self._lock:
+            self._ensure_loaded()
+            records = []
+            for item_id in ids:
+                row = self._rows.pop(item_id, None)
+                if row is not None:
+                    self._mark_dead(row)
+                    records.append({"op": "del", "id": item_id})
+            if records:
+                self._append_records(records)
+                if self._count - len(self._rows) > max(INITIAL_CAPACITY, len(self._rows)):
+                    self.compact()
+            return len(records)
+
+    def remove_where(self, predicate: Callable[[Dict[str, Any]], bool]) -> int:
+        """按附加数据条件删除向量"""
+        with self._lock:
+            self._ensure_loaded()
+            ids = [item_id for item_id, row in self._rows.items() if predicate(self._payloads[row])]
+            return self.remove(ids)
+
+    def compact(self) -> None:
+        """清理墓碑：在临时目录中重建索引，完成后替换原目录（中断时原索引保持不变）"""
+        with self._lock:
+            self._ensure_loaded()
+            rows = np.flatnonzero(self._alive[:self._count])
+            ids = [self._ids[row] for row in rows]
+            payloads = [self._payloads[row] for row in rows]
+            vectors = np.asarray(self._vectors[rows]) if len(rows) else np.zeros((0, self.dimension), np.float32)
+
+            new_dir, old_dir = self._compact_paths()
+            for leftover in (new_dir, old_dir):
+                if leftover.exists():
+                    shutil.rmtree(leftover)
+            compacted = VectorIndex(str(new_dir), self.dimension, self.model_name,
+                                    ann_threshold=self.ann_threshold, nprobe=self.nprobe)
+            compacted.upsert(ids, vectors, payloads)
+            with compacted._lock:
+                compacted._ensure_loaded()
+                compacted._clear_state()
+            del compacted
+
+            # 先释放内存映射再替换目录
+            self._clear_state()
+            self._loaded = False
+            os.replace(self.directory, old_dir)
+            os.replace(new_dir, self.directory)
+            shutil.rmtree(old_dir, ignore_errors=True)
+            self._ensure_loaded()
+            logger.info(f"向量索引压缩完成: {self.directory} ({len(ids)}条)")
+
+    # ==================== 检索 ====================
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int = 10,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+        min_score: Optional[float] = None
+    ) -> List[SearchHit]:
+        """检索最相似的向量，返回 (ID, 相似度, 附加数据) 列表"""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+
+        with self._lock:
+            self._ensure_loaded()
+            if not self._rows:
+                return []
+
+            if self._centroids is not None and len(self._rows) >= self.ann_threshold:
+                probe = np.argsort(-(self._centroids @ query))[:self.nprobe]
+                candidates = np.fromiter(
+                    (row for cluster in probe for row in self._lists.get(int(cluster), ())),
+                    dtype=np.int64
+                )
+            else:
+                candidates = np.flatnonzero(self._alive[:self._count])
+            if len(candidates) == 0:
+                return []
+
+            scores = np.asarray(self._vectors[candidates]) @ query
+            order = np.argsort(-scores)
+
+            hits: List[SearchHit] = []
+            for position in order:
+                score = float(scores[position])
+                if min_score is not None and score < min_score:
+                    break
+                row = int(candidates[position])
+                payload = self._payloads[row]
+                if predicate is not None and not predicate(payload):
+                    continue
+                hits.append((self._ids[row], score, payload))
+                if len(hits) >= top_k:
+                    break
+            return hits
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._rows)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                "vectors": len(self._rows),
+                "rows": self._count,
+                "capacity": self._capacity,
+                "dimension": self.dimension,
+                "model": self.model_name,
+                "mode": "ivf" if self._centroids is not None and len(self._rows) >= self.ann_threshold else "brute_force",
+                "clusters": len(self._centroids) if self._centroids is not None else 0,
+            }
@@ -0,0 +1,474 @@
+"""
+MidScene报告拆分
+MidScene HTML报告把每一步的截图以base64内嵌在执行数据（midscene_web_dump）中，查看一次报告就要下载全部截图。
+报告保存后解析出执行数据，截图解码后按内容保存到内容寻址存储（跨报告去重），执行数据替换为截图引用后
+保存为紧凑的JSON时间线；查看报告时返回轻量页面，按需加载每一步的截图。
+
+原始报告去掉执行数据和截图后只剩MidScene自带的查看器页面（各报告相同，在存储中只保存一份），
+未配置保留原始报告时只保存该页面骨架，下载原始报告时再由骨架、时间线和截图还原。
+拆分时先在内存中还原一次，与原始报告逐字节一致才用骨架替换原始报告，否则保留原始报告。
+"""
+import os
+import re
+import json
+import html
+import base64
+import asyncio
+import binascii
+import hashlib
+from pathlib import Path
+from urllib.parse import quote, unquote
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.blob_store import blob_store
+from app.services.report_serving import precompress_report
+
+logger = get_logger(__name__)
+
+TIMELINE_ARTIFACT = "midscene_timeline"
+# 时间线中截图引用的前缀，查看页面据此替换为截图地址
+ASSET_PREFIX = "midscene-asset:"
+
+_DUMP_PATTERN = re.compile(
+    r'(?P<open><script\b(?P<attrs>[^>]*\btype="midscene_web_dump"[^>]*)>)(?P<body>.*?)(?P<close></script>)', re.S
+)
+_IMAGE_PATTERN = re.compile(
+    r'(?P<open><script\b(?P<attrs>[^>]*\btype="midscene-image"[^>]*)>)(?P<body>.*?)(?P<close></script>)', re.S
+)
+_PLACEHOLDER_PATTERN = re.compile(r"__MIDSCENE_SPLIT_(DUMP|IMAGE)_(\d+)__")
+_ATTR_PATTERN = re.compile(r'([\w:-]+)="([^"]*)"')
+_DATA_URI_PATTERN = re.compile(r"^data:image/(?P<ext>png|jpeg|jpg|webp|gif);base64,", re.I)
+_ASSET_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.(png|jpeg|webp|gif)$")
+
+ASSET_MEDIA_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp", "gif": "image/gif"}
+
+
+def _unescape_script(text: str) -> str:
+    """还原MidScene写入<script>标签时转义的标签文本"""
+    return text.replace("&lt;/script&gt;", "</script>").replace("&lt;script", "<script")
+
+
+def _escape_script(text: str) -> str:
+    return text.replace("<script", "&lt;script").replace("</script>", "&lt;/script&gt;")
+
+
+def _strip_body(body: str) -> Tuple[str, str, str]:
+    """拆出标签内容前后的空白，占位符保留原空白以便逐字节还原"""
+    core = body.strip()
+    if not core:
+        return body, "", ""
+    start = body.index(core)
+    return body[:start], core, body[start + len(core):]
+
+
+def _read_text(path: Union[str, Path]) -> str:
+    """按原样读取文本（不转换换行符）"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+def _parse_attrs(attrs: str) -> Dict[str, str]:
+    return {key: unquote(html.unescape(value)) for key, value in _ATTR_PATTERN.findall(attrs) if key != "type"}
+
+
+def parse_asset_name(name: str) -> Optional[Tuple[str, str]]:
+    """校验截图名称，返回 (sha256, 扩展名)"""
+    if not _ASSET_NAME_PATTERN.match(name or ""):
+        return None
+    sha256, ext = name.split(".", 1)
+    return sha256, ext
+
+
+class _Extractor:
+    """从执行数据中提取内嵌截图"""
+
+    def __init__(self):
+        self.assets: Dict[str, bytes] = {}
+        self._decoded: Dict[str, str] = {}
+
+    def asset(self, data_uri: str) -> Optional[str]:
+        if data_uri in self._decoded:
+            return self._decoded[data_uri]
+        match = _DATA_URI_PATTERN.match(data_uri)
+        if not match:
+            return None
+        try:
+            data = base64.b64decode(data_uri[match.end():], validate=False)
+        except (binascii.Error, ValueError):
+            return None
+        ext = match.group("ext").lower().replace("jpg", "jpeg")
+        name = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+        self.assets[name] = data
+        self._decoded[data_uri] = name
+        return name
+
+    def walk(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {key: self.walk(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.walk(item) for item in value]
+        if isinstance(value, str) and value.startswith("data:image/"):
+            name = self.asset(value)
+            if name:
+                return ASSET_PREFIX + name
+        return value
+
+
+def extract_report(content: str) -> Optional[Dict[str, Any]]:
+    """
+    解析MidScene报告内容
+
+    Returns:
+        {"groups": 执行数据分组, "images": 外置图片ID到截图名称, "assets": {名称: 图片内容}, "skeleton": 页面骨架}，
+        不是MidScene报告时返回None
+    """
+    extractor = _Extractor()
+    groups: List[Dict[str, Any]] = []
+    images: List[Dict[str, str]] = []
+
+    def replace_dump(match) -> str:
+        lead, body, trail = _strip_body(match.group("body"))
+        if not body:
+            return match.group(0)
+        try:
+            dump = json.loads(_unescape_script(body))
+        except json.JSONDecodeError:
+            logger.warning("MidScene执行数据解析失败，保留原内容")
+            return match.group(0)
+        groups.append({"attributes": _parse_attrs(match.group("attrs")), "dump": extractor.walk(dump)})
+        return f"{match.group('open')}{lead}__MIDSCENE_SPLIT_DUMP_{len(groups) - 1}__{trail}{match.group('close')}"
+
+    def replace_image(match) -> str:
+        # 新版报告把截图单独放在 midscene-image 标签中，执行数据里只保存图片ID
+        image_id = _parse_attrs(match.group("attrs")).get("data-id")
+        lead, body, trail = _strip_body(match.group("body"))
+        name = extractor.asset(body)
+        if not image_id or not name:
+            return match.group(0)
+        images.append({"id": image_id, "asset": name})
+        return f"{match.group('open')}{lead}__MIDSCENE_SPLIT_IMAGE_{len(images) - 1}__{trail}{match.group('close')}"
+
+    skeleton = _DUMP_PATTERN.sub(replace_dump, content)
+    if not groups:
+        return None
+    skeleton = _IMAGE_PATTERN.sub(replace_image, skeleton)
+    return {"groups": groups, "images": images, "assets": extractor.assets, "skeleton": skeleton}
+
+
+def _inline_assets(value: Any, load) -> Any:
+    if isinstance(value, dict):
+        return {key: _inline_assets(item, load) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_inline_assets(item, load) for item in value]
+    if isinstance(value, str) and value.startswith(ASSET_PREFIX):
+        return load(value[len(ASSET_PREFIX):])
+    return value
+
+
+def restore_report(skeleton: str, timeline: Dict[str, Any], read_asset) -> str:
+    """由页面骨架、时间线和截图还原原始报告内容"""
+    cache: Dict[str, str] = {}
+
+    def load(name: str) -> str:
+        if name not in cache:
+            ext = name.rsplit(".", 1)[-1]
+            cache[name] = f"data:{ASSET_MEDIA_TYPES.get(ext, 'image/png')};base64," + \
+                base64.b64encode(read_asset(name)).decode("ascii")
+        return cache[name]
+
+    groups = timeline.get("groups") or []
+    images = timeline.get("images") or []
+
+    def replace(match) -> str:
+        index = int(match.group(2))
+        if match.group(1) == "DUMP":
+            dump = _inline_assets(groups[index]["dump"], load)
+            return _escape_script(json.dumps(dump, ensure_ascii=False, separators=(",", ":")))
+        return load(images[index]["asset"])
+
+    return _PLACEHOLDER_PATTERN.sub(replace, skeleton)
+
+
+class MidsceneReportSplitter:
+    """MidScene报告拆分（时间线、截图和页面骨架保存在内容寻址存储中）"""
+
+    @property
+    def enabled(self) -> bool:
+        return settings.REPORT_SPLIT_ENABLED and blob_store.enabled
+
+    @property
+    def restored_dir(self) -> Path:
+        """还原的原始报告缓存目录（由保留策略定期清理）"""
+        return blob_store.root.parent / "restored_reports"
+
+    async def split(self, report_path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+        """
+        拆分报告，返回时间线产物记录（保存在报告的 artifacts 中）；不是MidScene报告或拆分失败时返回None
+
+        未配置保留原始报告时记录中包含页面骨架路径（skeleton），调用方用它替换报告路径。
+        """
+        if not self.enabled or not report_path or not Path(report_path).is_file():
+            return None
+        try:
+            path = Path(report_path)
+            original_size = path.stat().st_size
+            content = await asyncio.to_thread(_read_text, path)
+            extracted = await asyncio.to_thread(extract_report, content)
+            if not extracted:
+                return None
+
+            stored_bytes = 0
+            for name, data in extracted["assets"].items():
+                _, ext = parse_asset_name(name)
+                ref = await blob_store.put_bytes(data, f".{ext}")
+                if not ref.deduplicated:
+                    stored_bytes += ref.size
+
+            timeline = {
+                "version": 1,
+                "original_size": original_size,
+                "groups": extracted["groups"],
+                "images": extracted["images"],
+                "assets": {name: len(data) for name, data in extracted["assets"].items()},
+            }
+            text = json.dumps(timeline, ensure_ascii=False, separators=(",", ":"))
+            # 只有还原结果与原始报告逐字节一致时才能只保存骨架（执行数据的JSON格式与MidScene输出不同时保留原始报告）
+            keep_original = settings.REPORT_SPLIT_KEEP_ORIGINAL or not await asyncio.to_thread(
+                self._restores_exactly, content, extracted, text
+            )
+            del content
+            timeline_ref = await blob_store.put_text(text, ".json")
+            stored_bytes += 0 if timeline_ref.deduplicated else timeline_ref.size
+            await precompress_report(timeline_ref.path)
+
+            artifact = {
+                "type": TIMELINE_ARTIFACT,
+                "path": str(timeline_ref.path),
+                "size": timeline_ref.size,
+                "assets": list(extracted["assets"]),
+                "original_size": original_size,
+            }
+            if not keep_original:
+                skeleton_ref = await blob_store.put_text(extracted["skeleton"], path.suffix or ".html")
+                stored_bytes += 0 if skeleton_ref.deduplicated else skeleton_ref.size
+                artifact["skeleton"] = str(skeleton_ref.path)
+            artifact["stored_bytes"] = stored_bytes
+
+            logger.info(
+                f"MidScene报告拆分完成: {path.name} {original_size / 1024 / 1024:.2f}MB -> "
+                f"时间线 {timeline_ref.size / 1024:.1f}KB + {len(extracted['assets'])} 张截图，"
+                f"新增存储 {stored_bytes / 1024 / 1024:.2f}MB"
+            )
+            return artifact
+        except Exception as e:
+            logger.warning(f"MidScene报告拆分失败: {report_path}, {str(e)}")
+            return None
+
+    @staticmethod
+    def _restores_exactly(content: str, extracted: Dict[str, Any], timeline_text: str) -> bool:
+        """在内存中由骨架、时间线和截图还原报告，检查是否与原始内容逐字节一致"""
+        restored = restore_report(extracted["skeleton"], json.loads(timeline_text), extracted["assets"].__getitem__)
+        if restored != content:
+            logger.warning("MidScene报告还原结果与原始报告不一致，保留原始报告")
+            return False
+        return True
+
+    @staticmethod
+    def find_timeline(artifacts: Optional[List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """从报告产物中查找时间线记录"""
+        for artifact in artifacts or []:
+            if isinstance(artifact, dict) and artifact.get("type") == TIMELINE_ARTIFACT:
+                if artifact.get("path") and Path(artifact["path"]).is_file():
+                    return artifact
+        return None
+
+    @staticmethod
+    def asset_path(name: str) -> Optional[Path]:
+        """截图在存储中的路径"""
+        parsed = parse_asset_name(name)
+        if not parsed:
+            return None
+        sha256, ext = parsed
+        path = blob_store.blob_path(sha256, f".{ext}")
+        return path if path.is_file() else None
+
+    def _restore(self, artifact: Dict[str, Any], dest: Path) -> Path:
+        timeline = json.loads(_read_text(artifact["path"]))
+        skeleton = _read_text(artifact["skeleton"])
+
+        def read_asset(name: str) -> bytes:
+            path = self.asset_path(name)
+            if path is None:
+                raise FileNotFoundError(f"截图不存在: {name}")
+            return path.read_bytes()
+
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest.with_name(dest.name + f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(restore_report(skeleton, timeline, read_asset))
+        os.replace(tmp_path, dest)
+        return dest
+
+    async def original_path(self, report_path: Optional[str],
+                            artifacts: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+        """
+        原始报告文件路径：报告路径指向页面骨架时还原原始报告（缓存在还原目录中）
+
+        Returns:
+            可直接返回给客户端的报告文件路径，无法获取时返回None
+        """
+        artifact = self.find_timeline(artifacts)
+        if not artifact or not artifact.get("skeleton") or report_path != artifact["skeleton"]:
+            return report_path if report_path and os.path.isfile(report_path) else None
+        if not os.path.isfile(artifact["skeleton"]):
+            return None
+
+        skeleton = Path(artifact["skeleton"])
+        dest = self.restored_dir / f"{Path(artifact['path']).stem[:64]}_{skeleton.stem[:16]}{skeleton.suffix}"
+        if not dest.is_file():
+            await asyncio.to_thread(self._restore, artifact, dest)
+            await precompress_report(dest)
+        return str(dest)
+
+    async def release(self, artifacts: Optional[List[Dict[str, Any]]]) -> None:
+        """删除报告时释放时间线和截图的引用（页面骨架即报告路径，由调用方释放）"""
+        for artifact in artifacts or []:
+            if not isinstance(artifact, dict) or artifact.get("type") != TIMELINE_ARTIFACT:
+                continue
+            await blob_store.release_path(artifact.get("path"))
+            for name in artifact.get("assets") or []:
+                parsed = parse_asset_name(name)
+                if parsed:
+                    await blob_store.release(parsed[0])
+
+    @staticmethod
+    def render_viewer(execution_id: str, base_url: str = "/api/v1/web/reports") -> str:
+        """轻量查看页面：先加载时间线，展开步骤时再加载截图"""
+        return _VIEWER_TEMPLATE.replace("{{EXECUTION_ID}}", quote(execution_id, safe="")) \
+            .replace("{{BASE_URL}}", base_url).replace("{{ASSET_PREFIX}}", ASSET_PREFIX)
+
+
+_VIEWER_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>测试报告</title>
+<style>
+  body { font-family: -apple-system, "Segoe UI", Arial, sans-serif; margin: 0; background: #f5f6f8; color: #222; }
+  header { background: #fff; padding: 12px 24px; border-bottom: 1px solid #e5e7eb; display: flex; gap: 16px; align-items: center; }
+  header a { color: #1677ff; text-decoration: none; font-size: 14px; }
+  main { padding: 16px 24px; }
+  .group { background: #fff; border-radius: 6px; margin-bottom: 16px; padding: 12px 16px; }
+  .group h2 { font-size: 16px; margin: 4px 0 8px; }
+  .execution h3 { font-size: 14px; margin: 12px 0 4px; color: #555; }
+  .task { border-top: 1px solid #f0f0f0; padding: 6px 0; }
+  .task summary { cursor: pointer; font-size: 13px; }
+  .status-failed, .status-error { color: #d4380d; }
+  .status-finished, .status-passed { color: #389e0d; }
+  .cost { color: #999; margin-left: 8px; }
+  .error { color: #d4380d; white-space: pre-wrap; font-size: 12px; }
+  .shots img { max-width: 100%; border: 1px solid #eee; margin: 6px 0; }
+  pre { font-size: 12px; background: #fafafa; padding: 8px; overflow: auto; max-height: 240px; }
+</style>
+</head>
+<body>
+<header>
+  <strong>测试报告</strong>
+  <span id="meta"></span>
+  <a href="{{BASE_URL}}/view/{{EXECUTION_ID}}?raw=true">原始报告</a>
+  <a href="{{BASE_URL}}/download/{{EXECUTION_ID}}">下载原始报告</a>
+</header>
+<main id="root">加载中...</main>
+<script>
+const ASSET_PREFIX = "{{ASSET_PREFIX}}";
+const ASSET_URL = "{{BASE_URL}}/assets/";
+
+function el(tag, attrs, text) {
+  const node = document.createElement(tag);
+  Object.entries(attrs || {}).forEach(([key, value]) => node.setAttribute(key, value));
+  if (text !== undefined && text !== null) node.textContent = text;
+  return node;
+}
+
+let IMAGE_IDS = {};
+
+function collectAssets(value, found) {
+  if (typeof value === "string") {
+    const name = value.startsWith(ASSET_PREFIX) ? value.slice(ASSET_PREFIX.length) : IMAGE_IDS[value];
+    if (name && !found.includes(name)) found.push(name);
+  } else if (Array.isArray(value)) {
+    value.forEach(item => collectAssets(item, found));
+  } else if (value && typeof value === "object") {
+    Object.values(value).forEach(item => collectAssets(item, found));
+  }
+  return found;
+}
+
+function stripAssets(value) {
+  return JSON.stringify(value, (key, item) => (key === "recorder" || key === "uiContext") ? undefined : item, 2);
+}
+
+function renderTask(task) {
+  const details = el("details", {class: "task"});
+  const status = task.status || "";
+  const title = [task.type, task.subType].filter(Boolean).join(" / ");
+  const prompt = (task.param && (task.param.prompt || task.param.userInstruction || task.param.value)) || task.thought || "";
+  const summary = el("summary");
+  summary.appendChild(el("span", {class: "status-" + status}, status ? "[" + status + "] " : ""));
+  summary.appendChild(document.createTextNode(title + (prompt ? " - " + prompt : "")));
+  const cost = task.timing && task.timing.cost;
+  if (cost) summary.appendChild(el("span", {class: "cost"}, (cost / 1000).toFixed(2) + "s"));
+  details.appendChild(summary);
+
+  details.addEventListener("toggle", () => {
+    if (!details.open || details.dataset.loaded) return;
+    details.dataset.loaded = "1";
+    if (task.error || task.errorMessage) details.appendChild(el("div", {class: "error"}, task.errorMessage || JSON.stringify(task.error)));
+    const shots = el("div", {class: "shots"});
+    collectAssets(task, []).forEach(name => {
+      shots.appendChild(el("img", {src: ASSET_URL + name, loading: "lazy"}));
+    });
+    details.appendChild(shots);
+    details.appendChild(el("pre", {}, stripAssets(task)));
+  });
+  return details;
+}
+
+function render(timeline) {
+  const root = document.getElementById("root");
+  root.textContent = "";
+  (timeline.images || []).forEach(image => { IMAGE_IDS[image.id] = image.asset; });
+  const assetCount = Object.keys(timeline.assets || {}).length;
+  document.getElementById("meta").textContent =
+    "原始报告 " + (timeline.original_size / 1024 / 1024).toFixed(2) + "MB，截图 " + assetCount + " 张";
+  timeline.groups.forEach(group => {
+    const dump = group.dump || {};
+    const section = el("div", {class: "group"});
+    const attrs = group.attributes || {};
+    section.appendChild(el("h2", {}, dump.groupName || attrs.playwright_test_title || attrs["data-group-id"] || "执行记录"));
+    (dump.executions || []).forEach(execution => {
+      const block = el("div", {class: "execution"});
+      block.appendChild(el("h3", {}, execution.name || execution.description || ""));
+      (execution.tasks || []).forEach(task => block.appendChild(renderTask(task)));
+      section.appendChild(block);
+    });
+    root.appendChild(section);
+  });
+}
+
+fetch("{{BASE_URL}}/timeline/{{EXECUTION_ID}}")
+  .then(response => { if (!response.ok) throw new Error(response.status); return response.json(); })
+  .then(render)
+  .catch(error => {
+    document.getElementById("root").textContent = "时间线加载失败（" + error.message + "），请查看原始报告";
+  });
+</script>
+</body>
+</html>
+"""
+
+
+# 全局MidScene报告拆分实例
+midscene_report_splitter = MidsceneReportSplitter()
@@ -0,0 +1,205 @@
+"""
+分析流水线检查点
+按输入内容哈希持久化各阶段的产出（团队分析原始结果、整合后的分析结果、生成的脚本），
+重试或重新生成脚本时从最近的有效检查点继续，避免重复执行耗时的图片分析
+"""
+import os
+import re
+import json
+import asyncio
+import hashlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import record_cache
+
+logger = get_logger(__name__)
+
+# 流水线阶段
+STAGE_TEAM_RESULTS = "team_results"
+STAGE_ANALYSIS = "analysis"
+SCRIPT_STAGE_PREFIX = "script_"
+
+# 会话ID、分析ID和内容哈希会拼接到文件路径中，只接受UUID或十六进制摘要
+_UUID_PATTERN = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+_HEX_DIGEST_PATTERN = re.compile(r"^[0-9a-fA-F]{32,128}$")
+
+
+def is_valid_checkpoint_key(value: Optional[str]) -> bool:
+    """是否为可用作检查点索引文件名的ID（UUID或十六进制摘要）"""
+    return bool(value) and bool(_UUID_PATTERN.match(value) or _HEX_DIGEST_PATTERN.match(value))
+
+
+def script_stage(script_format: str) -> str:
+    """脚本生成阶段名称，如 script_yaml、script_playwright"""
+    return f"{SCRIPT_STAGE_PREFIX}{script_format}"
+
+
+def compute_content_hash(
+    image_data: Optional[str] = None,
+    image_url: Optional[str] = None,
+    image_path: Optional[str] = None,
+    test_description: Optional[str] = None,
+    additional_context: Optional[str] = None
+) -> str:
+    """计算分析输入的内容哈希：图片来源、测试需求和额外上下文相同则分析结果可复用"""
+    digest = hashlib.sha256()
+    for part in (image_data, image_url, image_path, test_description, additional_context):
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class PipelineCheckpointStore:
+    """流水线检查点存储
+
+    目录结构：
+    - {base_dir}/{content_hash}/{stage}.json：阶段检查点（记录会话ID、分析ID、创建时间和数据）；
+    - {base_dir}/_sessions/{session_id}、{base_dir}/_analyses/{analysis_id}：指向内容哈希的索引文件。
+    写入先写临时文件再原子替换，进程中断不会留下半个检查点。
+    """
+
+    def __init__(self, base_dir: Optional[str] = None):
+        self.base_dir = Path(base_dir or settings.CHECKPOINT_DIR)
+        self.hits = 0
+        self.misses = 0
+
+    # ==================== 文件操作 ====================
+
+    @staticmethod
+    def _write_atomic(path: Path, content: str) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(content, encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_text(path: Path) -> Optional[str]:
+        try:
+            return path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    def _stage_path(self, content_hash: str, stage: str) -> Path:
+        return self.base_dir / content_hash / f"{stage}.json"
+
+    def _pointer_path(self, kind: str, key: str) -> Path:
+        if not is_valid_checkpoint_key(key):
+            raise ValueError(f"无效的检查点索引ID: {key!r}")
+        return self.base_dir / f"_{kind}" / key
+
+    def _save_sync(self, content_hash: str, stage: str, data: Any,
+                   session_id: Optional[str], analysis_id: Optional[str]) -> None:
+        record = {
+            "content_hash": content_hash,
+            "stage": stage,
+            "session_id": session_id,
+            "analysis_id": analysis_id,
+            "created_at": datetime.now().isoformat(),
+            "data": data,
+        }
+        self._write_atomic(self._stage_path(content_hash, stage), json.dumps(record, ensure_ascii=False, default=str))
+        if is_valid_checkpoint_key(session_id):
+            self._write_atomic(self._pointer_path("sessions", session_id), content_hash)
+        if is_valid_checkpoint_key(analysis_id):
+            self._write_atomic(self._pointer_path("analyses", analysis_id), content_hash)
+
+    def _load_sync(self, content_hash: str, stage: str) -> Optional[Dict[str, Any]]:
+        content = self._read_text(self._stage_path(content_hash, stage))
+        if content is None:
+            return None
+        try:
+            return json.loads(content)
+        except ValueError:
+            logger.warning(f"检查点文件损坏，已忽略: {content_hash}/{stage}")
+            return None
+
+    def _resolve_sync(self, kind: str, key: str) -> Optional[str]:
+        if not is_valid_checkpoint_key(key):
+            return None
+        content = self._read_text(self._pointer_path(kind, key))
+        content_hash = content.strip() if content else None
+        return content_hash if is_valid_checkpoint_key(content_hash) else None
+
+    def _stages_sync(self, content_hash: str) -> List[str]:
+        directory = self.base_dir / content_hash
+        if not directory.is_dir():
+            return []
+        return sorted(path.stem for path in directory.glob("*.json"))
+
+    # ==================== 对外接口 ====================
+
+    async def save(
+        self,
+        content_hash: str,
+        stage: str,
+        data: Any,
+        session_id: Optional[str] = None,
+        analysis_id: Optional[str] = None
+    ) -> None:
+        """保存阶段检查点，失败时只记录日志，不影响流水线"""
+        try:
+            await asyncio.to_thread(self._save_sync, content_hash, stage, data, session_id, analysis_id)
+            logger.debug(f"保存流水线检查点: {content_hash[:12]}/{stage}")
+        except Exception as e:
+            logger.warning(f"保存流水线检查点失败: {stage} - {e}")
+
+    @staticmethod
+    def _age_hours(record: Dict[str, Any]) -> float:
+        try:
+            return (datetime.now() - datetime.fromisoformat(record["created_at"])).total_seconds() / 3600
+        except (KeyError, TypeError, ValueError):
+            return float("inf")
+
+    async def load(self, content_hash: str, stage: str,
+                   max_age_hours: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """读取阶段检查点，返回完整记录（数据在 data 字段）
+
+        Args:
+            max_age_hours: 超过该时长的检查点视为未命中（None 表示不限制）
+        """
+        record = await asyncio.to_thread(self._load_sync, content_hash, stage)
+        if record is not None and max_age_hours is not None and self._age_hours(record) > max_age_hours:
+            logger.debug(f"流水线检查点已过期: {content_hash[:12]}/{stage}")
+            record = None
+        if record is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        record_cache("pipeline_checkpoint", record is not None)
+        return record
+
+    async def resolve_analysis(self, analysis_id: str) -> Optional[str]:
+        """根据分析ID查找内容哈希"""
+        return await asyncio.to_thread(self._resolve_sync, "analyses", analysis_id)
+
+    async def resolve_session(self, session_id: str) -> Optional[str]:
+        """根据会话ID查找最近一次写入的内容哈希"""
+        return await asyncio.to_thread(self._resolve_sync, "sessions", session_id)
+
+    async def save_script(self, analysis_id: str, script_format: str, data: Dict[str, Any],
+                          session_id: Optional[str] = None) -> None:
+        """保存脚本生成检查点（通过分析ID定位所属的分析检查点）"""
+        content_hash = await self.resolve_analysis(analysis_id)
+        if content_hash:
+            await self.save(content_hash, script_stage(script_format), data, session_id, analysis_id)
+
+    async def list_stages(self, content_hash: str) -> List[str]:
+        """列出已完成的阶段"""
+        return await asyncio.to_thread(self._stages_sync, content_hash)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取检查点命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+# 全局流水线检查点存储实例
+pipeline_checkpoints = PipelineCheckpointStore()
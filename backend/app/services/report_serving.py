@@ -0,0 +1,165 @@
+"""
+报告文件服务
+- 报告生成时预先压缩出 .gz/.br 文件（只压缩一次）；
+- 按 Accept-Encoding 选择预压缩文件，通过 FileResponse 分块流式返回（文件读取在线程池中执行）；
+- 支持 ETag/Last-Modified 条件请求（304）和 Range 请求（下载续传）。
+内容寻址存储中的报告内容不可变，ETag 直接使用内容哈希（返回预压缩文件时加上编码后缀，
+如 "<sha>-gzip"），并允许浏览器长期缓存。
+"""
+import gzip
+import os
+import shutil
+import asyncio
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = get_logger(__name__)
+
+_ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def _compressed_path(path: Path, encoding: str) -> Path:
+    return path.with_name(path.name + _ENCODING_SUFFIXES[encoding])
+
+
+def _precompress(path: Path) -> List[str]:
+    created = []
+    mtime = path.stat().st_mtime
+    gz_path = _compressed_path(path, "gzip")
+    if not gz_path.exists() or gz_path.stat().st_mtime < mtime:
+        tmp_path = gz_path.with_name(gz_path.name + ".tmp")
+        with open(path, "rb") as src, gzip.open(tmp_path, "wb", compresslevel=settings.REPORT_GZIP_LEVEL) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(tmp_path, gz_path)
+        created.append("gzip")
+
+    br_path = _compressed_path(path, "br")
+    if brotli is not None and (not br_path.exists() or br_path.stat().st_mtime < mtime):
+        compressor = brotli.Compressor(quality=settings.REPORT_BROTLI_QUALITY)
+        tmp_path = br_path.with_name(br_path.name + ".tmp")
+        with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+            for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                dst.write(compressor.process(chunk))
+            dst.write(compressor.finish())
+        os.replace(tmp_path, br_path)
+        created.append("br")
+    return created
+
+
+async def precompress_report(path: Union[str, Path]) -> List[str]:
+    """为报告文件生成 .gz（以及安装了brotli时的 .br）预压缩文件，返回新生成的编码"""
+    if not settings.REPORT_PRECOMPRESS or not path or not os.path.isfile(path):
+        return []
+    try:
+        created = await asyncio.to_thread(_precompress, Path(path))
+        if created:
+            logger.info(f"报告预压缩完成: {path} ({', '.join(created)})")
+        return created
+    except Exception as e:
+        logger.warning(f"报告预压缩失败: {path}, {str(e)}")
+        return []
+
+
+def _accepted_encodings(request: Request) -> Dict[str, float]:
+    accepted = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    return accepted
+
+
+def _etag(path: Path, stat: os.stat_result, immutable: bool, encoding: Optional[str] = None) -> str:
+    """ETag按返回的编码区分（原始、gzip、br 的字节不同，不能共用同一个强ETag）"""
+    tag = path.name[:64] if immutable else f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    if encoding:
+        tag = f"{tag}-{encoding}"
+    return f'"{tag}"' if immutable else f'W/"{tag}"'
+
+
+def _not_modified(request: Request, etag: str, stat: os.stat_result) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags or etag.removeprefix("W/") in {tag.removeprefix("W/") for tag in tags}
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(stat.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def serve_report_file(
+    request: Request,
+    path: Union[str, Path],
+    filename: Optional[str] = None,
+    media_type: str = "text/html",
+    immutable: bool = False
+) -> Response:
+    """
+    流式返回报告文件
+
+    Args:
+        request: 当前请求（读取条件请求、Range和Accept-Encoding头）
+        path: 报告文件路径
+        filename: 下载文件名，为空时内联展示
+        media_type: 内容类型
+        immutable: 内容是否不可变（内容寻址存储中的文件），不可变时使用内容哈希作为ETag并长期缓存
+    """
+    path = Path(path)
+    stat = path.stat()
+    headers = {
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": "private, max-age=31536000, immutable" if immutable else "private, no-cache",
+        "Vary": "Accept-Encoding",
+        "Accept-Ranges": "bytes",
+    }
+
+    serve_path, served_encoding = path, None
+    # Range 请求针对原始内容，不使用预压缩文件
+    if "range" not in request.headers:
+        accepted = _accepted_encodings(request)
+        for encoding in ("br", "gzip"):
+            if accepted.get(encoding, 0) <= 0:
+                continue
+            candidate = _compressed_path(path, encoding)
+            try:
+                if candidate.stat().st_mtime >= stat.st_mtime:
+                    serve_path, served_encoding = candidate, encoding
+                    headers["Content-Encoding"] = encoding
+                    break
+            except OSError:
+                continue
+
+    etag = headers["ETag"] = _etag(path, stat, immutable, served_encoding)
+    if _not_modified(request, etag, stat):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(
+        path=serve_path,
+        filename=filename,
+        media_type=media_type,
+        headers=headers,
+        content_disposition_type="attachment" if filename else "inline",
+    )
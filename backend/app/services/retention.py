@@ -0,0 +1,423 @@
+"""
+磁盘保留策略与定期清理
+按目录配置保留策略（最长保留天数、目录总大小上限、按脚本保留最近N个），定期在后台清理：
+- 按脚本保留时，文件所属的脚本取自测试报告记录（TestReport.script_id），没有报告记录的文件只按保留天数清理；
+- 候选文件的扫描和删除在线程中分批执行，不阻塞事件循环；
+- 旧测试报告通过 ReportRepository.cleanup_old_reports 删除，同时删除执行日志并释放报告内容块，
+  仍被报告记录引用的报告文件不会被目录策略删除；
+- 最后执行内容块垃圾回收，统计每个策略释放的空间。
+
+工作空间中的脚本文件和上传文件可能是内容寻址存储中内容块的硬链接，删除这样的文件不释放磁盘空间，
+链接本身也不持有引用（引用由脚本记录等持有者释放），内容块没有持有者时由垃圾回收删除。
+因此只有删除最后一个链接（st_nlink 为 1）的文件才计入释放的空间，目录大小上限也只按这部分计算。
+"""
+import time
+import shutil
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.workload import BACKGROUND, workload_scope
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class RetentionPolicy:
+    """目录保留策略
+
+    Attributes:
+        name: 策略名称
+        paths: 目录列表
+        max_age_days: 超过该天数的条目删除
+        max_total_mb: 目录总大小上限，超出时从最旧的条目开始删除
+        keep_last: 每个分组保留最近的条目数
+        group_by: keep_last 的分组函数，默认整个目录为一组；返回 None 的条目不参与 keep_last
+        group_by_script: 按报告记录中的脚本ID分组（覆盖 group_by），没有报告记录的文件只按保留天数清理
+        unit: 清理单位，file 为递归的文件，dir 为第一层子目录（如每次执行的临时目录）
+        pattern: 文件匹配模式
+        recursive: unit 为 file 时是否递归子目录
+        exclude: 不参与清理的文件名
+        protect_reports: 跳过仍被测试报告引用的文件
+    """
+    name: str
+    paths: List[Path]
+    max_age_days: Optional[float] = None
+    max_total_mb: Optional[float] = None
+    keep_last: Optional[int] = None
+    group_by: Optional[Callable[[Path], Optional[str]]] = None
+    group_by_script: bool = False
+    unit: str = "file"
+    pattern: str = "*"
+    recursive: bool = True
+    exclude: Set[str] = field(default_factory=set)
+    protect_reports: bool = False
+
+
+@dataclass
+class _Entry:
+    path: Path
+    size: int
+    mtime: float
+    freeable: int = 0  # 删除后实际释放的空间（不含仍有其他链接的文件）
+
+
+def _freeable_size(stat) -> int:
+    """文件删除后释放的空间：还有其他硬链接（如内容寻址存储中的内容块）时不释放"""
+    return stat.st_size if stat.st_nlink <= 1 else 0
+
+
+def _dir_size(path: Path) -> Tuple[int, int, float]:
+    """目录总大小、删除后释放的空间和最近修改时间"""
+    total, freeable, latest = 0, 0, path.stat().st_mtime
+    for child in path.rglob("*"):
+        try:
+            stat = child.stat()
+        except OSError:
+            continue
+        if child.is_file():
+            total += stat.st_size
+            freeable += _freeable_size(stat)
+        latest = max(latest, stat.st_mtime)
+    return total, freeable, latest
+
+
+def _scan(policy: RetentionPolicy) -> List[_Entry]:
+    entries = []
+    for root in policy.paths:
+        if not root.is_dir():
+            continue
+        if policy.unit == "dir":
+            candidates = (child for child in root.iterdir() if child.is_dir())
+        else:
+            candidates = root.rglob(policy.pattern) if policy.recursive else root.glob(policy.pattern)
+        for path in candidates:
+            if path.name in policy.exclude:
+                continue
+            try:
+                if policy.unit == "dir":
+                    size, freeable, mtime = _dir_size(path)
+                elif path.is_file():
+                    stat = path.stat()
+                    size, freeable, mtime = stat.st_size, _freeable_size(stat), stat.st_mtime
+                else:
+                    continue
+            except OSError:
+                continue
+            entries.append(_Entry(path, size, mtime, freeable))
+    return entries
+
+
+def select_expired(policy: RetentionPolicy, entries: List[_Entry], now: Optional[float] = None,
+                   group_by: Optional[Callable[[Path], Optional[str]]] = None) -> List[_Entry]:
+    """按策略选出需要删除的条目（新的在前保留），group_by 覆盖策略的分组函数"""
+    now = now or time.time()
+    group_by = group_by or policy.group_by
+    entries = sorted(entries, key=lambda entry: entry.mtime, reverse=True)
+    expired: Dict[Path, _Entry] = {}
+
+    if policy.max_age_days is not None:
+        cutoff = now - policy.max_age_days * 86400
+        for entry in entries:
+            if entry.mtime < cutoff:
+                expired[entry.path] = entry
+
+    if policy.keep_last is not None:
+        seen: Dict[str, int] = {}
+        for entry in entries:
+            key = group_by(entry.path) if group_by else ""
+            if key is None:
+                continue
+            seen[key] = seen.get(key, 0) + 1
+            if seen[key] > policy.keep_last:
+                expired[entry.path] = entry
+
+    if policy.max_total_mb is not None:
+        budget = policy.max_total_mb * 1024 * 1024
+        total = 0
+        for entry in entries:
+            if entry.path in expired:
+                continue
+            total += entry.freeable
+            if total > budget:
+                expired[entry.path] = entry
+
+    return list(expired.values())
+
+
+def _delete_entries(entries: List[_Entry]) -> Tuple[int, int, List[str]]:
+    deleted, freed, errors = 0, 0, []
+    for entry in entries:
+        try:
+            # 删除前重新统计：扫描之后内容块可能已被垃圾回收，文件成为最后一个链接
+            if entry.path.is_dir():
+                freed_size = _dir_size(entry.path)[1]
+                shutil.rmtree(entry.path)
+            else:
+                freed_size = _freeable_size(entry.path.stat())
+                entry.path.unlink()
+            deleted += 1
+            freed += freed_size
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            errors.append(f"{entry.path}: {e}")
+    return deleted, freed, errors
+
+
+def default_policies() -> List[RetentionPolicy]:
+    """根据配置生成默认保留策略"""
+    workspace = Path(settings.UI_UIAUTOMATION_DIR)
+    log_dir = Path(settings.LOG_FILE).parent
+    active_logs = {Path(settings.LOG_FILE).name, "error.log", "agents.log", "api.log"}
+    report_dirs = [workspace / "midscene_run" / "report", workspace / "e2e" / "midscene_run" / "report"]
+    playwright_dirs = [workspace / "playwright-report", workspace / "e2e" / "playwright-report",
+                       workspace / "test-results", workspace / "e2e" / "test-results"]
+
+    return [
+        RetentionPolicy(
+            name="temp_yaml_tests",
+            paths=[Path("temp_yaml_tests")],
+            unit="dir",
+            max_age_days=settings.RETENTION_TEMP_DAYS,
+            max_total_mb=settings.RETENTION_TEMP_MAX_MB,
+        ),
+        RetentionPolicy(
+            # 执行器写入的临时测试文件，正常结束时已删除，进程中断时由此清理
+            name="e2e_temp_specs",
+            paths=[workspace / "e2e"],
+            pattern="test-*.spec.ts",
+            recursive=False,
+            max_age_days=settings.RETENTION_TEMP_DAYS,
+        ),
+        RetentionPolicy(
+            name="uploads",
+            paths=[Path(settings.UPLOAD_DIR)],
+            max_age_days=settings.RETENTION_UPLOAD_DAYS,
+        ),
+        RetentionPolicy(
+            name="playwright_results",
+            paths=playwright_dirs,
+            max_age_days=settings.RETENTION_PLAYWRIGHT_DAYS,
+            max_total_mb=settings.RETENTION_PLAYWRIGHT_MAX_MB,
+            protect_reports=True,
+        ),
+        RetentionPolicy(
+            name="midscene_reports",
+            paths=report_dirs,
+            max_age_days=settings.RETENTION_REPORT_FILE_DAYS,
+            keep_last=settings.RETENTION_REPORTS_PER_SCRIPT,
+            group_by_script=True,
+            recursive=False,
+            protect_reports=True,
+        ),
+        RetentionPolicy(
+            name="restored_reports",
+            paths=[Path(settings.BLOB_STORE_DIR).parent / "restored_reports"],
+            max_age_days=settings.RETENTION_TEMP_DAYS,
+        ),
+        RetentionPolicy(
+            name="checkpoints",
+            paths=[Path(settings.CHECKPOINT_DIR)],
+            unit="dir",
+            max_age_days=settings.RETENTION_CHECKPOINT_DAYS,
+            max_total_mb=settings.RETENTION_CHECKPOINT_MAX_MB,
+            exclude={"_sessions", "_analyses"},
+        ),
+        RetentionPolicy(
+            # 会话和分析ID到内容哈希的索引文件，指向的检查点删除后读取时视为未命中
+            name="checkpoint_pointers",
+            paths=[Path(settings.CHECKPOINT_DIR) / "_sessions", Path(settings.CHECKPOINT_DIR) / "_analyses"],
+            max_age_days=settings.RETENTION_CHECKPOINT_DAYS,
+        ),
+        RetentionPolicy(
+            name="logs",
+            paths=[log_dir],
+            max_age_days=settings.RETENTION_LOG_DAYS,
+            recursive=False,  # logs/executions 由报告清理负责
+            exclude=active_logs,
+        ),
+    ]
+
+
+@dataclass
+class ReportFiles:
+    """测试报告记录关联的文件（路径均已 resolve）"""
+    protected: Set[Path] = field(default_factory=set)  # 报告记录引用的文件
+    script_ids: Dict[Path, str] = field(default_factory=dict)  # 文件所属的脚本
+
+
+class RetentionManager:
+    """保留策略执行与定期调度"""
+
+    def __init__(self, policies: Optional[List[RetentionPolicy]] = None):
+        self._policies = policies
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    @property
+    def policies(self) -> List[RetentionPolicy]:
+        if self._policies is None:
+            self._policies = default_policies()
+        return self._policies
+
+    async def _report_files(self) -> Optional[ReportFiles]:
+        """测试报告记录关联的文件；数据库不可用时返回None"""
+        try:
+            from app.database.connection import db_manager
+            from app.database.repositories.report_repository import ReportRepository
+
+            async with db_manager.get_session() as session:
+                files = await ReportRepository().get_report_files(session)
+        except Exception as e:
+            logger.warning(f"获取报告引用的文件失败，跳过报告目录清理: {str(e)}")
+            return None
+        report_files = ReportFiles()
+        for item in files:
+            path = Path(item["path"]).resolve()
+            report_files.script_ids[path] = item["script_id"]
+            if item["referenced"]:
+                report_files.protected.add(path)
+        return report_files
+
+    async def apply_policy(self, policy: RetentionPolicy, report_files: Optional[ReportFiles],
+                           dry_run: bool = False) -> Dict[str, Any]:
+        """执行单个策略：线程中扫描，分批删除"""
+        result = {"policy": policy.name, "deleted": 0, "freed_bytes": 0, "errors": []}
+        if (policy.protect_reports or policy.group_by_script) and report_files is None:
+            result["skipped"] = "数据库不可用，无法确认报告引用"
+            return result
+
+        entries = await asyncio.to_thread(_scan, policy)
+        group_by = None
+        if policy.group_by_script:
+            group_by = lambda path: report_files.script_ids.get(path.resolve())
+        expired = select_expired(policy, entries, group_by=group_by)
+        if policy.protect_reports:
+            protected = report_files.protected
+            expired = [entry for entry in expired if entry.path.resolve() not in protected]
+        result["scanned"] = len(entries)
+
+        if dry_run:
+            result["deleted"] = len(expired)
+            result["freed_bytes"] = sum(entry.freeable for entry in expired)
+            return result
+
+        chunk_size = settings.RETENTION_DELETE_CHUNK
+        for start in range(0, len(expired), chunk_size):
+            deleted, freed, errors = await asyncio.to_thread(_delete_entries, expired[start:start + chunk_size])
+            result["deleted"] += deleted
+            result["freed_bytes"] += freed
+            result["errors"].extend(errors[:10])
+            # 批次之间让出事件循环
+            await asyncio.sleep(0)
+        return result
+
+    async def cleanup_reports(self, dry_run: bool = False) -> Dict[str, Any]:
+        """删除过期测试报告记录，同时删除执行日志和报告文件引用"""
+        from app.database.connection import db_manager
+        from app.database.repositories.report_repository import ReportRepository
+        from app.services.execution_log_store import execution_log_store
+        from app.services.blob_store import blob_store
+        from app.services.midscene_report import midscene_report_splitter
+
+        result = {"policy": "test_reports", "deleted": 0, "freed_bytes": 0, "errors": []}
+        if dry_run:
+            return result
+        try:
+            async with db_manager.get_session() as session:
+                removed = await ReportRepository().cleanup_old_reports(session, days=settings.RETENTION_REPORT_DAYS)
+        except Exception as e:
+            result["errors"].append(str(e))
+            return result
+
+        for report in removed:
+            await execution_log_store.delete(report["execution_id"])
+            # 内容寻址存储中的报告释放引用；其余报告文件由目录策略按保留期清理
+            await blob_store.release_path(report["report_path"])
+            await midscene_report_splitter.release(report.get("artifacts"))
+        result["deleted"] = len(removed)
+        return result
+
+    async def run(self, dry_run: bool = False) -> Dict[str, Any]:
+        """执行一次全部策略"""
+        async with self._lock:
+            started = time.perf_counter()
+            results = [await self.cleanup_reports(dry_run)]
+
+            report_files = None
+            if any(policy.protect_reports or policy.group_by_script for policy in self.policies):
+                report_files = await self._report_files()
+            for policy in self.policies:
+                try:
+                    results.append(await self.apply_policy(policy, report_files, dry_run))
+                except Exception as e:
+                    logger.error(f"保留策略执行失败: {policy.name}, {str(e)}")
+                    results.append({"policy": policy.name, "deleted": 0, "freed_bytes": 0, "errors": [str(e)]})
+
+            if not dry_run and settings.BLOB_STORE_ENABLED:
+                from app.services.blob_store import blob_store
+                try:
+                    gc_result = await blob_store.gc()
+                    results.append({"policy": "blobs", "deleted": gc_result["deleted_blobs"],
+                                    "freed_bytes": gc_result["freed_bytes"], "errors": []})
+                except Exception as e:
+                    results.append({"policy": "blobs", "deleted": 0, "freed_bytes": 0, "errors": [str(e)]})
+
+            if not dry_run and settings.JOB_QUEUE_ENABLED:
+                from app.services.job_queue import job_queue
+                try:
+                    purged = await job_queue.purge()
+                    results.append({"policy": "jobs", "deleted": purged, "freed_bytes": 0, "errors": []})
+                except Exception as e:
+                    results.append({"policy": "jobs", "deleted": 0, "freed_bytes": 0, "errors": [str(e)]})
+
+            summary = {
+                "dry_run": dry_run,
+                "finished_at": datetime.now().isoformat(),
+                "duration_s": round(time.perf_counter() - started, 3),
+                "deleted": sum(item["deleted"] for item in results),
+                "freed_bytes": sum(item["freed_bytes"] for item in results),
+                "policies": results,
+            }
+            if not dry_run:
+                self.last_result = summary
+                logger.info(f"定期清理完成: 删除 {summary['deleted']} 项, 释放 {summary['freed_bytes'] / 1024 / 1024:.1f}MB")
+            return summary
+
+    async def _loop(self) -> None:
+        await asyncio.sleep(settings.RETENTION_INITIAL_DELAY)
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"定期清理失败: {str(e)}")
+            await asyncio.sleep(settings.RETENTION_INTERVAL_HOURS * 3600)
+
+    def start(self) -> None:
+        """启动定期清理（需在事件循环中调用）"""
+        if self._task is not None or not settings.RETENTION_ENABLED:
+            return
+        # 清理中的数据库写入按后台类别占用名额
+        with workload_scope(BACKGROUND):
+            self._task = asyncio.create_task(self._loop(), name="retention-scheduler")
+        logger.info(f"定期清理已启动: 每 {settings.RETENTION_INTERVAL_HOURS} 小时")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+# 全局保留策略管理器实例
+retention_manager = RetentionManager()
@@ -0,0 +1,312 @@
+"""
+文件脚本索引
+为基于文件的脚本服务维护内存索引，避免每次查询都遍历并解析所有元数据文件
+"""
+import os
+import json
+import time
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Iterable, Callable, Any, Tuple
+
+from app.models.test_scripts import TestScript, ScriptExecutionRecord, ScriptSearchRequest
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 参与关键词检索的文本字段
+TEXT_FIELDS = ("name", "description", "test_description", "additional_context")
+
+
+def _grams(text: str) -> Set[str]:
+    """文本的单字和双字片段（小写），关键词的所有片段都出现时才可能包含该关键词"""
+    text = text.lower()
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def _query_grams(query: str) -> Set[str]:
+    query = query.lower()
+    if len(query) == 1:
+        return {query}
+    return {query[i:i + 2] for i in range(len(query) - 1)}
+
+
+class _JsonDirectory:
+    """按文件mtime增量加载的JSON目录"""
+
+    def __init__(self, directory: Path, loader: Callable[[Dict[str, Any]], Any]):
+        self.directory = directory
+        self.loader = loader
+        self.mtimes: Dict[str, int] = {}
+
+    def scan(self) -> Dict[str, int]:
+        """扫描目录，返回 ID -> mtime_ns（只stat，不读取内容）"""
+        result = {}
+        if self.directory.exists():
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and entry.is_file():
+                        result[entry.name[:-5]] = entry.stat().st_mtime_ns
+        return result
+
+    def load(self, item_id: str) -> Optional[Any]:
+        path = self.directory / f"{item_id}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return self.loader(json.load(f))
+        except Exception as e:
+            logger.warning(f"读取索引文件失败: {path} - {e}")
+            return None
+
+    def changes(self, known: Dict[str, int]) -> Tuple[List[str], List[Tuple[str, Optional[Any], int]]]:
+        """与已知的mtime比较，返回 (已删除的ID, [(变化的ID, 重新加载的内容, mtime)])，只读磁盘"""
+        current = self.scan()
+        removed = [item_id for item_id in known if item_id not in current]
+        loaded = [
+            (item_id, self.load(item_id), mtime)
+            for item_id, mtime in current.items() if known.get(item_id) != mtime
+        ]
+        return removed, loaded
+
+    def mtime(self, item_id: str) -> Optional[int]:
+        try:
+            return (self.directory / f"{item_id}.json").stat().st_mtime_ns
+        except OSError:
+            return None
+
+
+class ScriptIndex:
+    """脚本内存索引
+
+    - 按ID、格式、类型、分类、标签建立倒排索引，关键词检索使用单字/双字片段索引筛选候选后再精确匹配；
+    - 执行记录按脚本ID分组；
+    - 脚本服务的保存/更新/删除直接增量更新索引；
+    - 其他进程直接改动文件时，按 refresh_interval 节流扫描目录mtime，只重新加载变化的文件；
+      事件循环中通过 refresh_async 在线程中扫描和读取文件，回到事件循环后再更新索引。
+    """
+
+    def __init__(self, metadata_dir: Path, executions_dir: Path, refresh_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self._metadata = _JsonDirectory(metadata_dir, lambda data: TestScript(**data))
+        self._executions = _JsonDirectory(executions_dir, lambda data: ScriptExecutionRecord(**data))
+
+        self._scripts: Dict[str, TestScript] = {}
+        self._by_format: Dict[str, Set[str]] = {}
+        self._by_type: Dict[str, Set[str]] = {}
+        self._by_category: Dict[str, Set[str]] = {}
+        self._by_tag: Dict[str, Set[str]] = {}
+        self._by_gram: Dict[str, Set[str]] = {}
+
+        self._records: Dict[str, ScriptExecutionRecord] = {}
+        self._records_by_script: Dict[str, Set[str]] = {}
+
+        self._loaded = False
+        self._last_refresh = 0.0
+        self._refresh_lock = asyncio.Lock()
+
+    # ==================== 索引维护 ====================
+
+    @staticmethod
+    def _add_posting(postings: Dict[str, Set[str]], keys: Iterable[Optional[str]], item_id: str) -> None:
+        for key in keys:
+            if key is not None:
+                postings.setdefault(key, set()).add(item_id)
+
+    @staticmethod
+    def _remove_posting(postings: Dict[str, Set[str]], keys: Iterable[Optional[str]], item_id: str) -> None:
+        for key in keys:
+            ids = postings.get(key)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del postings[key]
+
+    @staticmethod
+    def _script_keys(script: TestScript) -> Dict[str, List[Optional[str]]]:
+        text_grams: Set[str] = set()
+        for field in TEXT_FIELDS:
+            text_grams |= _grams(getattr(script, field) or "")
+        return {
+            "format": [script.script_format.value],
+            "type": [script.script_type.value],
+            "category": [script.category],
+            "tag": list(script.tags),
+            "gram": list(text_grams),
+        }
+
+    def _postings(self) -> Dict[str, Dict[str, Set[str]]]:
+        return {
+            "format": self._by_format,
+            "type": self._by_type,
+            "category": self._by_category,
+            "tag": self._by_tag,
+            "gram": self._by_gram,
+        }
+
+    def upsert_script(self, script: TestScript, mtime: Optional[int] = None) -> None:
+        """新增或更新脚本索引"""
+        self.remove_script(script.id)
+        self._scripts[script.id] = script
+        postings = self._postings()
+        for name, keys in self._script_keys(script).items():
+            self._add_posting(postings[name], keys, script.id)
+        self._metadata.mtimes[script.id] = mtime if mtime is not None else self._metadata.mtime(script.id)
+
+    def remove_script(self, script_id: str) -> None:
+        """移除脚本索引"""
+        script = self._scripts.pop(script_id, None)
+        self._metadata.mtimes.pop(script_id, None)
+        if script is None:
+            return
+        postings = self._postings()
+        for name, keys in self._script_keys(script).items():
+            self._remove_posting(postings[name], keys, script_id)
+
+    def upsert_execution(self, record: ScriptExecutionRecord, mtime: Optional[int] = None) -> None:
+        """新增或更新执行记录索引"""
+        self.remove_execution(record.id)
+        self._records[record.id] = record
+        self._records_by_script.setdefault(record.script_id, set()).add(record.id)
+        self._executions.mtimes[record.id] = mtime if mtime is not None else self._executions.mtime(record.id)
+
+    def remove_execution(self, record_id: str) -> None:
+        """移除执行记录索引"""
+        record = self._records.pop(record_id, None)
+        self._executions.mtimes.pop(record_id, None)
+        if record is not None:
+            self._remove_posting(self._records_by_script, [record.script_id], record_id)
+
+    def _directories(self) -> Dict[str, Tuple[_JsonDirectory, Callable, Callable]]:
+        return {
+            "metadata": (self._metadata, self.upsert_script, self.remove_script),
+            "executions": (self._executions, self.upsert_execution, self.remove_execution),
+        }
+
+    def _known_mtimes(self) -> Dict[str, Dict[str, int]]:
+        return {name: dict(directory.mtimes) for name, (directory, _, _) in self._directories().items()}
+
+    def _collect_changes(self, known: Dict[str, Dict[str, int]]) -> Dict[str, Tuple[List[str], List]]:
+        """扫描目录并读取变化的文件（不修改索引，可在线程中执行）"""
+        return {name: directory.changes(known[name]) for name, (directory, _, _) in self._directories().items()}
+
+    def _apply_changes(self, known: Dict[str, Dict[str, int]], changes: Dict[str, Tuple[List[str], List]]) -> int:
+        """将扫描结果写入索引；扫描期间已由本进程增量更新的条目以索引中的为准"""
+        changed = 0
+        for name, (directory, upsert, remove) in self._directories().items():
+            removed, loaded = changes[name]
+            for item_id in removed:
+                if directory.mtimes.get(item_id) == known[name].get(item_id):
+                    remove(item_id)
+                    changed += 1
+            for item_id, item, mtime in loaded:
+                if directory.mtimes.get(item_id) != known[name].get(item_id):
+                    continue
+                if item is None:
+                    # 无法解析的文件记录mtime，文件再次变化前不重复读取
+                    remove(item_id)
+                    directory.mtimes[item_id] = mtime
+                else:
+                    upsert(item, mtime)
+                changed += 1
+        return changed
+
+    def _refresh_due(self, force: bool) -> bool:
+        return not self._loaded or force or time.monotonic() - self._last_refresh >= self.refresh_interval
+
+    def _finish_refresh(self, started_at: float, started: float, changed: int) -> None:
+        self._last_refresh = started_at
+        if not self._loaded:
+            self._loaded = True
+            logger.info(
+                f"脚本索引构建完成: {len(self._scripts)}个脚本, {len(self._records)}条执行记录, "
+                f"耗时{time.perf_counter() - started:.3f}s"
+            )
+        elif changed:
+            logger.debug(f"脚本索引同步磁盘变更: {changed}个文件")
+
+    def refresh(self, force: bool = False) -> None:
+        """按mtime同步磁盘上的变更（节流，首次调用时完整加载）"""
+        if not self._refresh_due(force):
+            return
+        started_at, started = time.monotonic(), time.perf_counter()
+        known = self._known_mtimes()
+        self._finish_refresh(started_at, started, self._apply_changes(known, self._collect_changes(known)))
+
+    async def refresh_async(self, force: bool = False) -> None:
+        """refresh 的异步版本：目录扫描和文件读取在线程中执行，不阻塞事件循环"""
+        if not self._refresh_due(force):
+            return
+        async with self._refresh_lock:
+            # 等待锁期间其他调用可能已完成刷新
+            if not force and not self._refresh_due(False):
+                return
+            started_at, started = time.monotonic(), time.perf_counter()
+            known = self._known_mtimes()
+            changes = await asyncio.to_thread(self._collect_changes, known)
+            self._finish_refresh(started_at, started, self._apply_changes(known, changes))
+
+    # ==================== 查询 ====================
+
+    def get_script(self, script_id: str) -> Optional[TestScript]:
+        self.refresh()
+        return self._scripts.get(script_id)
+
+    def all_scripts(self) -> List[TestScript]:
+        self.refresh()
+        return list(self._scripts.values())
+
+    def search(self, request: ScriptSearchRequest) -> List[TestScript]:
+        """按搜索条件筛选脚本（按更新时间倒序）"""
+        self.refresh()
+
+        candidates: Optional[Set[str]] = None
+
+        def narrow(ids: Set[str]) -> None:
+            nonlocal candidates
+            candidates = set(ids) if candidates is None else candidates & ids
+
+        if request.script_format:
+            narrow(self._by_format.get(request.script_format.value, set()))
+        if request.script_type:
+            narrow(self._by_type.get(request.script_type.value, set()))
+        if request.category:
+            narrow(self._by_category.get(request.category, set()))
+        if request.tags:
+            narrow(set().union(*(self._by_tag.get(tag, set()) for tag in request.tags)))
+        if request.query:
+            for gram in _query_grams(request.query):
+                narrow(self._by_gram.get(gram, set()))
+                if not candidates:
+                    break
+
+        scripts = self._scripts.values() if candidates is None else (self._scripts[i] for i in candidates)
+
+        query_lower = request.query.lower() if request.query else None
+        results = []
+        for script in scripts:
+            # 片段索引只能筛选候选，仍需确认关键词连续出现
+            if query_lower and not any(
+                query_lower in (getattr(script, field) or "").lower() for field in TEXT_FIELDS
+            ):
+                continue
+            if request.date_from and script.created_at < request.date_from:
+                continue
+            if request.date_to and script.created_at > request.date_to:
+                continue
+            results.append(script)
+
+        results.sort(key=lambda x: x.updated_at, reverse=True)
+        return results
+
+    def get_executions(self, script_id: str, limit: int = 20) -> List[ScriptExecutionRecord]:
+        """获取脚本的执行记录（按开始时间倒序）"""
+        self.refresh()
+        records = [self._records[i] for i in self._records_by_script.get(script_id, ())]
+        records.sort(key=lambda x: x.start_time, reverse=True)
+        return records[:limit]
+
+    def get_execution(self, record_id: str) -> Optional[ScriptExecutionRecord]:
+        self.refresh()
+        return self._records.get(record_id)
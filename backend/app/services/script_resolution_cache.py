@@ -0,0 +1,213 @@
+"""
+脚本解析缓存服务
+按脚本ID缓存数据库记录解析出的脚本信息和磁盘路径，避免每次执行都查询数据库和探测文件
+"""
+import os
+import time
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Set
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import record_cache
+
+logger = get_logger(__name__)
+
+
+class ScriptResolutionCache:
+    """脚本解析缓存
+
+    - 条目按脚本ID保存解析结果（名称、文件名、路径、描述）；
+    - 脚本更新/删除时由脚本服务调用 invalidate() 失效；
+    - e2e 目录的文件变更通过 watchfiles 监听（不可用时退化为目录轮询），
+      变更文件对应的条目和脚本列表缓存一并失效；监听异常退出时清空缓存并按退避间隔重启；
+    - 条目超过 SCRIPT_CACHE_TTL 后重新解析，兜底监听遗漏的变更。
+    """
+
+    def __init__(self, script_dir: Optional[str] = None, ttl: Optional[int] = None):
+        self.script_dir = Path(script_dir or Path(settings.UI_UIAUTOMATION_DIR) / "e2e")
+        self.ttl = ttl if ttl is not None else settings.SCRIPT_CACHE_TTL
+        self.enabled = settings.ENABLE_CACHING
+
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._ids_by_path: Dict[str, Set[str]] = {}
+        self._listing: Optional[List[Dict[str, Any]]] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self._watch_started_at = 0.0
+        self._restart_handle: Optional[asyncio.TimerHandle] = None
+        self._restarts = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, script_id: str) -> Optional[Dict[str, Any]]:
+        """获取缓存的解析结果（返回副本），未命中返回None"""
+        entry = self._entries.get(script_id) if self.enabled else None
+        if entry is None or time.monotonic() - entry["cached_at"] > self.ttl:
+            if entry is not None:
+                self.invalidate(script_id)
+            self.misses += 1
+            record_cache("script_resolution", False)
+            return None
+
+        self.hits += 1
+        record_cache("script_resolution", True)
+        return dict(entry["info"])
+
+    def put(self, script_id: str, info: Dict[str, Any]) -> None:
+        """缓存解析结果
+
+        Args:
+            info: resolve_script_by_id 的返回结果（必须包含 path）
+        """
+        if not self.enabled:
+            return
+
+        self.invalidate(script_id)
+        path = os.path.normpath(info["path"])
+        self._entries[script_id] = {
+            "info": dict(info),
+            "path": path,
+            "cached_at": time.monotonic(),
+        }
+        self._ids_by_path.setdefault(path, set()).add(script_id)
+
+    def invalidate(self, script_id: str) -> None:
+        """使指定脚本的缓存失效"""
+        entry = self._entries.pop(script_id, None)
+        if entry is None:
+            return
+        ids = self._ids_by_path.get(entry["path"])
+        if ids is not None:
+            ids.discard(script_id)
+            if not ids:
+                self._ids_by_path.pop(entry["path"], None)
+
+    def invalidate_path(self, path: str) -> None:
+        """文件变更时使对应条目和脚本列表缓存失效"""
+        self._listing = None
+        for script_id in list(self._ids_by_path.get(os.path.normpath(path), ())):
+            self.invalidate(script_id)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+        self._ids_by_path.clear()
+        self._listing = None
+
+    def list_scripts(self) -> List[Dict[str, Any]]:
+        """获取 e2e 目录下的 *.spec.ts 脚本列表（单次目录扫描，结果缓存到文件变更为止）"""
+        if self._listing is not None and self.enabled:
+            return [dict(item) for item in self._listing]
+
+        scripts = []
+        if self.script_dir.exists():
+            with os.scandir(self.script_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".spec.ts") or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    scripts.append({
+                        "name": entry.name,
+                        "path": entry.path,
+                        "size": stat.st_size,
+                        "mtime": stat.st_mtime,
+                    })
+        scripts.sort(key=lambda item: item["mtime"], reverse=True)
+
+        self._listing = scripts
+        return [dict(item) for item in scripts]
+
+    def _snapshot(self) -> Dict[str, tuple]:
+        """目录快照：文件路径 -> (mtime_ns, size)"""
+        snapshot = {}
+        if self.script_dir.exists():
+            with os.scandir(self.script_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        snapshot[os.path.normpath(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    async def _watch_with_watchfiles(self, awatch) -> None:
+        async for changes in awatch(self.script_dir, recursive=False):
+            for _, path in changes:
+                self.invalidate_path(path)
+
+    async def _watch_with_polling(self, interval: float) -> None:
+        previous = await asyncio.to_thread(self._snapshot)
+        while True:
+            await asyncio.sleep(interval)
+            current = await asyncio.to_thread(self._snapshot)
+            for path in previous.keys() | current.keys():
+                if previous.get(path) != current.get(path):
+                    self.invalidate_path(path)
+            previous = current
+
+    def start_watching(self) -> None:
+        """启动文件变更监听（需在事件循环中调用）"""
+        self._restart_handle = None
+        if self._watch_task is not None or not self.enabled:
+            return
+
+        try:
+            from watchfiles import awatch
+        except ImportError:
+            awatch = None
+
+        if awatch is not None and self.script_dir.exists():
+            coro = self._watch_with_watchfiles(awatch)
+            mode = "watchfiles"
+        else:
+            coro = self._watch_with_polling(settings.SCRIPT_CACHE_POLL_INTERVAL)
+            mode = "polling"
+
+        self._watch_task = asyncio.create_task(coro)
+        self._watch_task.add_done_callback(self._on_watch_done)
+        self._watch_started_at = time.monotonic()
+        logger.info(f"脚本解析缓存开始监听目录变更: {self.script_dir} ({mode})")
+
+    def _on_watch_done(self, task: asyncio.Task) -> None:
+        self._watch_task = None
+        if task.cancelled():
+            return
+        # 监听退出后无法感知文件变更：清空缓存，按退避间隔重启（运行超过1分钟后退避重新计算）
+        logger.warning(f"脚本目录监听退出: {task.exception() or '目录监听结束'}")
+        self.clear()
+        if time.monotonic() - self._watch_started_at > 60:
+            self._restarts = 0
+        delay = min(60.0, 2.0 ** self._restarts)
+        self._restarts += 1
+        self._restart_handle = asyncio.get_running_loop().call_later(delay, self.start_watching)
+        logger.info(f"脚本目录监听将在 {delay:.0f}s 后重启")
+
+    async def stop_watching(self) -> None:
+        """停止文件变更监听"""
+        if self._restart_handle is not None:
+            self._restart_handle.cancel()
+            self._restart_handle = None
+        task = self._watch_task
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "watching": self._watch_task is not None,
+            "watch_restarts": self._restarts,
+        }
+
+
+# 全局脚本解析缓存实例
+script_resolution_cache = ScriptResolutionCache()
@@ -12,7 +12,9 @@ from app.models.test_scripts import (
     TestScript, ScriptFormat, ScriptType, ScriptExecutionRecord,
     ScriptSearchRequest, ScriptSearchResponse, ScriptStatistics
 )
+from app.core.config import settings
 from app.core.logging import get_logger
+from app.services.script_index import ScriptIndex
 
 logger = get_logger(__name__)
 
@@ -33,6 +35,13 @@ class ScriptService:
         (self.storage_path / "scripts").mkdir(exist_ok=True)
         (self.storage_path / "executions").mkdir(exist_ok=True)
         (self.storage_path / "metadata").mkdir(exist_ok=True)
+
+        # 元数据和执行记录的内存索引（首次查询时构建，之后增量维护）
+        self.index = ScriptIndex(
+            self.storage_path / "metadata",
+            self.storage_path / "executions",
+            refresh_interval=settings.SCRIPT_INDEX_REFRESH_INTERVAL
+        )
         
         logger.info(f"脚本服务初始化完成，存储路径: {self.storage_path}")
     
@@ -65,6 +74,8 @@ class ScriptService:
             metadata_path = self.storage_path / "metadata" / f"{script.id}.json"
             with open(metadata_path, 'w', encoding='utf-8') as f:
                 json.dump(script.model_dump(), f, ensure_ascii=False, indent=2)
+
+            self.index.upsert_script(script.model_copy(deep=True))
             
             logger.info(f"脚本保存成功: {script.id} - {script.name}")
             return script
@@ -83,14 +94,9 @@ class ScriptService:
             脚本对象或None
         """
         try:
-            metadata_path = self.storage_path / "metadata" / f"{script_id}.json"
-            if not metadata_path.exists():
-                return None
-            
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            return TestScript(**data)
+            script = self.index.get_script(script_id)
+            # 返回副本，调用方修改不影响索引
+            return script.model_copy(deep=True) if script else None
             
         except Exception as e:
             logger.error(f"获取脚本失败: {script_id} - {e}")
@@ -155,6 +161,8 @@ class ScriptService:
             metadata_path = self.storage_path / "metadata" / f"{script_id}.json"
             if metadata_path.exists():
                 metadata_path.unlink()
+
+            self.index.remove_script(script_id)
             
             logger.info(f"脚本删除成功: {script_id}")
             return True
@@ -173,30 +181,8 @@ class ScriptService:
             搜索结果
         """
         try:
-            scripts = []
-            metadata_dir = self.storage_path / "metadata"
-
-            if not metadata_dir.exists():
-                return ScriptSearchResponse(scripts=[], total_count=0, has_more=False)
-
-            # 获取所有脚本元数据
-            for metadata_file in metadata_dir.glob("*.json"):
-                try:
-                    with open(metadata_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-
-                    script = TestScript(**data)
-
-                    # 应用过滤条件
-                    if self._matches_search_criteria(script, request):
-                        scripts.append(script)
-
-                except Exception as e:
-                    logger.warning(f"读取脚本元数据失败: {metadata_file} - {e}")
-                    continue
-
-            # 排序
-            scripts.sort(key=lambda x: x.updated_at, reverse=True)
+            # 索引已按更新时间倒序返回匹配的脚本
+            scripts = self.index.search(request)
 
             # 分页
             total_count = len(scripts)
@@ -205,6 +191,12 @@ class ScriptService:
             page_scripts = scripts[start_idx:end_idx]
             has_more = end_idx < total_count
 
+            # 列表视图不需要内容时清空脚本正文
+            if not request.include_content:
+                page_scripts = [script.model_copy(update={"content": ""}) for script in page_scripts]
+            else:
+                page_scripts = [script.model_copy(deep=True) for script in page_scripts]
+
             return ScriptSearchResponse(
                 scripts=page_scripts,
                 total_count=total_count,
@@ -215,55 +207,6 @@ class ScriptService:
             logger.error(f"搜索脚本失败: {e}")
             return ScriptSearchResponse(scripts=[], total_count=0, has_more=False)
 
-    def _matches_search_criteria(self, script: TestScript, request: ScriptSearchRequest) -> bool:
-        """检查脚本是否匹配搜索条件
-
-        Args:
-            script: 脚本对象
-            request: 搜索请求
-
-        Returns:
-            是否匹配
-        """
-        # 关键词搜索
-        if request.query:
-            query_lower = request.query.lower()
-            if not any([
-                query_lower in script.name.lower(),
-                query_lower in script.description.lower(),
-                query_lower in script.test_description.lower(),
-                query_lower in (script.additional_context or "").lower()
-            ]):
-                return False
-
-        # 格式过滤
-        if request.script_format and script.script_format != request.script_format:
-            return False
-
-        # 类型过滤
-        if request.script_type and script.script_type != request.script_type:
-            return False
-
-        # 分类过滤
-        if request.category and script.category != request.category:
-            return False
-
-        # 标签过滤
-        if request.tags:
-            if not any(tag in script.tags for tag in request.tags):
-                return False
-
-        # 日期过滤
-        if request.date_from:
-            if script.created_at < request.date_from:
-                return False
-
-        if request.date_to:
-            if script.created_at > request.date_to:
-                return False
-
-        return True
-
     def get_script_statistics(self) -> ScriptStatistics:
         """获取脚本统计信息
 
@@ -272,12 +215,7 @@ class ScriptService:
         """
         try:
             stats = ScriptStatistics()
-            metadata_dir = self.storage_path / "metadata"
-
-            if not metadata_dir.exists():
-                return stats
-
-            scripts = []
+            scripts = self.index.all_scripts()
             total_executions = 0
             successful_executions = 0
             failed_executions = 0
@@ -285,26 +223,15 @@ class ScriptService:
             execution_count = 0
 
             # 统计脚本信息
-            for metadata_file in metadata_dir.glob("*.json"):
-                try:
-                    with open(metadata_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
+            for script in scripts:
+                # 统计格式
+                if script.script_format == ScriptFormat.YAML:
+                    stats.yaml_scripts += 1
+                elif script.script_format == ScriptFormat.PLAYWRIGHT:
+                    stats.playwright_scripts += 1
 
-                    script = TestScript(**data)
-                    scripts.append(script)
-
-                    # 统计格式
-                    if script.script_format == ScriptFormat.YAML:
-                        stats.yaml_scripts += 1
-                    elif script.script_format == ScriptFormat.PLAYWRIGHT:
-                        stats.playwright_scripts += 1
-
-                    # 统计执行次数
-                    total_executions += script.execution_count
-
-                except Exception as e:
-                    logger.warning(f"读取脚本统计失败: {metadata_file} - {e}")
-                    continue
+                # 统计执行次数
+                total_executions += script.execution_count
 
             stats.total_scripts = len(scripts)
             stats.total_executions = total_executions
@@ -319,7 +246,7 @@ class ScriptService:
             stats.average_execution_time = 45.5
 
             # 最常用脚本
-            scripts.sort(key=lambda x: x.execution_count, reverse=True)
+            scripts = sorted(scripts, key=lambda x: x.execution_count, reverse=True)
             stats.most_used_scripts = [
                 {
                     "id": script.id,
@@ -367,6 +294,8 @@ class ScriptService:
             with open(execution_path, 'w', encoding='utf-8') as f:
                 json.dump(record.model_dump(), f, ensure_ascii=False, indent=2)
 
+            self.index.upsert_execution(record.model_copy(deep=True))
+
             # 更新脚本的执行统计
             script = self.get_script(record.script_id)
             if script:
@@ -392,14 +321,8 @@ class ScriptService:
             执行记录或None
         """
         try:
-            execution_path = self.storage_path / "executions" / f"{record_id}.json"
-            if not execution_path.exists():
-                return None
-
-            with open(execution_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            return ScriptExecutionRecord(**data)
+            record = self.index.get_execution(record_id)
+            return record.model_copy(deep=True) if record else None
 
         except Exception as e:
             logger.error(f"获取执行记录失败: {record_id} - {e}")
@@ -416,30 +339,7 @@ class ScriptService:
             执行记录列表
         """
         try:
-            records = []
-            executions_dir = self.storage_path / "executions"
-
-            if not executions_dir.exists():
-                return records
-
-            # 查找该脚本的所有执行记录
-            for execution_file in executions_dir.glob("*.json"):
-                try:
-                    with open(execution_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-
-                    record = ScriptExecutionRecord(**data)
-                    if record.script_id == script_id:
-                        records.append(record)
-
-                except Exception as e:
-                    logger.warning(f"读取执行记录失败: {execution_file} - {e}")
-                    continue
-
-            # 按开始时间排序
-            records.sort(key=lambda x: x.start_time, reverse=True)
-
-            return records[:limit]
+            return [record.model_copy(deep=True) for record in self.index.get_executions(script_id, limit)]
 
         except Exception as e:
             logger.error(f"获取脚本执行记录失败: {script_id} - {e}")
@@ -0,0 +1,381 @@
+"""
+脚本模板引擎
+识别登录、表单提交、搜索、表格翻页等常见流程，直接按模板生成MidScene.js YAML和Playwright脚本，
+无法可靠匹配的流程或没有被测页面URL的请求交由大模型生成
+"""
+import re
+import json
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.messages.web import PageAnalysis
+
+logger = get_logger(__name__)
+
+_JSON_OBJECT_PATTERN = re.compile(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', re.DOTALL)
+_QUOTED_PATTERN = re.compile(r'[“"‘\'「]([^”"’\'」]{1,30})[”"’\'」]')
+
+INPUT_TYPES = {"input", "textbox", "textarea", "text_input", "search", "password", "select", "combobox",
+               "email", "tel", "phone", "number", "date", "url"}
+SELECT_TYPES = {"select", "combobox"}
+BUTTON_TYPES = {"button", "submit", "link"}
+
+# 流程定义：意图关键词、必需元素（类型 + 关键词）
+FLOW_RULES = {
+    "login": {
+        "label": "用户登录",
+        "intent": ("登录", "登陆", "login", "log in", "sign in", "signin"),
+        "page_types": ("login", "signin"),
+        "elements": {
+            "username": (INPUT_TYPES, ("用户名", "账号", "帐号", "手机", "邮箱", "username", "account", "email", "user")),
+            "password": (INPUT_TYPES, ("密码", "password")),
+            "submit": (BUTTON_TYPES, ("登录", "登陆", "login", "log in", "sign in")),
+        },
+    },
+    "search": {
+        "label": "搜索",
+        "intent": ("搜索", "查询", "检索", "search", "query"),
+        "page_types": ("search",),
+        "elements": {
+            "keyword": (INPUT_TYPES, ("搜索", "查询", "检索", "关键词", "search", "keyword", "query")),
+        },
+    },
+    "form": {
+        "label": "表单提交",
+        "intent": ("表单", "提交", "填写", "注册", "保存", "form", "submit", "register", "sign up"),
+        "page_types": ("form", "register", "signup"),
+        "elements": {
+            "submit": (BUTTON_TYPES, ("提交", "保存", "确定", "确认", "注册", "submit", "save", "confirm", "register")),
+        },
+        "min_inputs": 2,
+    },
+    "pagination": {
+        "label": "表格翻页",
+        "intent": ("分页", "翻页", "下一页", "页码", "pagination", "next page", "paging"),
+        "page_types": ("list", "table"),
+        "elements": {
+            "list": (None, ("表格", "列表", "数据", "table", "list", "grid")),
+            "next": (None, ("下一页", "分页", "页码", "next", "pagination", "pager")),
+        },
+    },
+}
+
+# 置信度阈值低于1.0时允许缺少部分元素，缺少的元素按描述交由MidScene定位
+FALLBACK_TARGETS = {
+    "username": "用户名或账号输入框",
+    "password": "密码输入框",
+    "submit": "提交按钮",
+    "keyword": "搜索输入框",
+    "list": "数据列表",
+    "next": "下一页按钮",
+}
+
+DEFAULT_INPUT_VALUES = {
+    "username": "test_user",
+    "password": "Test@123456",
+    "keyword": "测试",
+}
+
+# 按字段类型选择输入值：依次匹配元素类型、名称和描述中的关键词
+FIELD_VALUE_RULES = (
+    (("email", "邮箱", "邮件"), "test_user@example.com"),
+    (("phone", "mobile", "tel", "手机", "电话"), "13800138000"),
+    (("password", "密码"), "Test@123456"),
+    (("验证码", "captcha", "verification code"), "123456"),
+    (("身份证", "id card"), "110101199001011234"),
+    (("date", "日期", "生日", "birthday"), "2024-01-01"),
+    (("年龄", "age"), "25"),
+    (("number", "数量", "数字", "金额", "价格", "quantity", "amount", "price"), "10"),
+    (("url", "网址", "链接", "website"), "https://www.example.com"),
+    (("姓名", "联系人", "full name", "real name"), "张三"),
+    (("地址", "address"), "北京市海淀区中关村大街1号"),
+    (("textarea", "备注", "描述", "说明", "remark", "comment", "description"), "这是一段测试内容"),
+)
+
+
+def extract_ui_elements(page_analysis: PageAnalysis) -> List[Dict[str, str]]:
+    """从智能体输出的UI元素文本中提取结构化元素（name/element_type/description）"""
+    elements = []
+    for item in page_analysis.ui_elements or []:
+        for raw in _JSON_OBJECT_PATTERN.findall(str(item)):
+            try:
+                data = json.loads(raw)
+            except ValueError:
+                continue
+            if not isinstance(data, dict) or not (data.get("name") or data.get("description")):
+                continue
+            elements.append({
+                "name": str(data.get("name") or ""),
+                "element_type": str(data.get("element_type") or data.get("type") or "unknown").lower(),
+                "description": str(data.get("description") or data.get("visual_description") or ""),
+            })
+    return elements
+
+
+def _contains_any(text: str, keywords) -> bool:
+    text = text.lower()
+    return any(keyword in text for keyword in keywords)
+
+
+class ScriptTemplateEngine:
+    """脚本模板引擎
+
+    只有测试需求明确指向单一常见流程、且页面分析中找齐该流程所需的全部元素时才使用模板，
+    组合流程或元素缺失时返回None由大模型生成；同时统计模板处理的请求比例。
+    """
+
+    def __init__(self, threshold: Optional[float] = None):
+        self.threshold = threshold if threshold is not None else settings.TEMPLATE_MATCH_THRESHOLD
+        self.requests = 0
+        self.handled_by_flow: Dict[str, int] = {}
+
+    # ==================== 流程识别 ====================
+
+    @staticmethod
+    def _detect_intents(page_analysis: PageAnalysis, test_description: Optional[str]) -> List[str]:
+        text = " ".join([test_description or ""] + [step.description for step in page_analysis.test_steps or []])
+        page_type = (page_analysis.page_type or "").lower()
+
+        intents = [name for name, rule in FLOW_RULES.items() if _contains_any(text, rule["intent"])]
+        if not intents:
+            intents = [name for name, rule in FLOW_RULES.items() if page_type in rule["page_types"]]
+        # 登录、注册页面天然包含提交按钮，只在没有其他意图时才视为通用表单
+        if "form" in intents and len(intents) > 1 and not _contains_any(text, ("表单", "form")):
+            intents.remove("form")
+        return intents
+
+    @staticmethod
+    def _find_element(elements: List[Dict[str, str]], types, keywords, used: set) -> Optional[Dict[str, str]]:
+        for index, element in enumerate(elements):
+            if index in used:
+                continue
+            if types is not None and element["element_type"] not in types:
+                continue
+            if _contains_any(f"{element['name']} {element['description']}", keywords):
+                used.add(index)
+                return element
+        return None
+
+    def _match_flow(self, flow: str, elements: List[Dict[str, str]]) -> Optional[Dict[str, Any]]:
+        rule = FLOW_RULES[flow]
+        used: set = set()
+        matched = {}
+        for role, (types, keywords) in rule["elements"].items():
+            element = self._find_element(elements, types, keywords, used)
+            if element is not None:
+                matched[role] = element
+
+        required = len(rule["elements"])
+        inputs = []
+        if rule.get("min_inputs"):
+            inputs = [
+                element for index, element in enumerate(elements)
+                if index not in used and element["element_type"] in INPUT_TYPES
+            ]
+            required += 1
+            if len(inputs) >= rule["min_inputs"]:
+                matched["inputs"] = inputs
+
+        # 意图明确占一半置信度，其余按必需元素的覆盖率计算
+        confidence = 0.5 + 0.5 * len(matched) / required
+        return {"flow": flow, "label": rule["label"], "elements": matched, "confidence": confidence}
+
+    def match(self, page_analysis: PageAnalysis, test_description: Optional[str] = None,
+              url: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """识别常见流程并生成步骤计划，无法可靠匹配或没有被测页面URL时返回None
+
+        Returns:
+            {"flow", "label", "confidence", "url", "steps", "assertion"} 或 None
+        """
+        if not settings.TEMPLATE_GENERATION_ENABLED:
+            return None
+
+        self.requests += 1
+        if not url:
+            # 模板脚本直接打开被测页面，没有URL时由大模型根据分析结果生成
+            logger.debug("未提供被测页面URL，不使用模板生成")
+            return None
+        try:
+            intents = self._detect_intents(page_analysis, test_description)
+            if len(intents) != 1:
+                return None
+
+            elements = extract_ui_elements(page_analysis)
+            candidate = self._match_flow(intents[0], elements)
+            if candidate["confidence"] < self.threshold:
+                logger.debug(f"模板匹配置信度不足: {candidate['flow']} ({candidate['confidence']:.2f})")
+                return None
+
+            plan = self._build_plan(candidate, page_analysis, test_description)
+            plan["url"] = url
+            self.handled_by_flow[plan["flow"]] = self.handled_by_flow.get(plan["flow"], 0) + 1
+            logger.info(f"模板匹配成功: {plan['label']} (置信度 {plan['confidence']:.2f})")
+            return plan
+
+        except Exception as e:
+            logger.warning(f"模板匹配失败，交由大模型生成: {str(e)}")
+            return None
+
+    # ==================== 步骤计划 ====================
+
+    @staticmethod
+    def _locate(element: Dict[str, str]) -> str:
+        return element["description"] or element["name"]
+
+    @staticmethod
+    def _typed_value(element: Dict[str, str]) -> Optional[str]:
+        """按字段类型（元素类型、名称和描述）选择符合格式的输入值"""
+        text = f"{element['element_type']} {element['name']} {element['description']}"
+        for keywords, value in FIELD_VALUE_RULES:
+            if _contains_any(text, keywords):
+                return value
+        return None
+
+    @classmethod
+    def _input_value(cls, role: str, element: Dict[str, str], page_analysis: PageAnalysis,
+                     test_description: Optional[str]) -> str:
+        """优先使用分析结果中测试步骤的输入值，其次是测试需求中引号内的内容，再按字段类型选择"""
+        for step in page_analysis.test_steps or []:
+            if step.input_value and element["name"] and element["name"] in step.target:
+                return step.input_value
+        if role == "keyword":
+            quoted = _QUOTED_PATTERN.search(test_description or "")
+            return quoted.group(1) if quoted else DEFAULT_INPUT_VALUES["keyword"]
+        return cls._typed_value(element) or DEFAULT_INPUT_VALUES.get(role, "测试数据")
+
+    def _build_plan(self, candidate: Dict[str, Any], page_analysis: PageAnalysis,
+                    test_description: Optional[str]) -> Dict[str, Any]:
+        flow = candidate["flow"]
+        elements = {
+            role: {"name": "", "element_type": "", "description": target}
+            for role, target in FALLBACK_TARGETS.items()
+        }
+        elements.update(candidate["elements"])
+        steps: List[Dict[str, Any]] = []
+
+        def add_input(role: str, element: Dict[str, str]) -> None:
+            if element["element_type"] in SELECT_TYPES:
+                # 下拉框无法直接输入，展开后选择第一个可选项
+                steps.append({"action": "tap", "target": self._locate(element)})
+                steps.append({"action": "tap", "target": f"{self._locate(element)}展开后的第一个可选项"})
+                return
+            steps.append({
+                "action": "input",
+                "target": self._locate(element),
+                "value": self._input_value(role, element, page_analysis, test_description),
+            })
+
+        if flow == "login":
+            add_input("username", elements["username"])
+            add_input("password", elements["password"])
+            steps.append({"action": "tap", "target": self._locate(elements["submit"])})
+            steps.append({"action": "wait", "target": "登录完成，页面跳转或显示登录后的用户信息"})
+            assertion = "页面显示登录成功后的内容，没有出现登录失败的错误提示"
+        elif flow == "search":
+            add_input("keyword", elements["keyword"])
+            steps.append({"action": "keyboard", "target": self._locate(elements["keyword"]), "value": "Enter"})
+            steps.append({"action": "wait", "target": "搜索结果加载完成"})
+            assertion = f"页面显示与“{steps[0]['value']}”相关的搜索结果"
+        elif flow == "form":
+            for element in elements.get("inputs", []):
+                add_input("field", element)
+            steps.append({"action": "tap", "target": self._locate(elements["submit"])})
+            steps.append({"action": "wait", "target": "表单提交完成"})
+            assertion = "页面显示提交成功的提示，没有出现表单校验错误"
+        else:
+            steps.append({"action": "wait", "target": f"{self._locate(elements['list'])}已加载数据"})
+            steps.append({"action": "tap", "target": self._locate(elements["next"])})
+            steps.append({"action": "wait", "target": "下一页数据加载完成"})
+            assertion = f"{self._locate(elements['list'])}显示了第2页的数据"
+
+        return {
+            "flow": flow,
+            "label": candidate["label"],
+            "confidence": candidate["confidence"],
+            "name": f"{page_analysis.page_title or '页面'}{candidate['label']}测试",
+            "context": f"这是一个{page_analysis.page_type}页面，标题为{page_analysis.page_title}，测试{candidate['label']}流程",
+            "steps": steps,
+            "assertion": assertion,
+        }
+
+    # ==================== 脚本渲染 ====================
+
+    @staticmethod
+    def render_yaml(plan: Dict[str, Any]) -> Dict[str, Any]:
+        """渲染为MidScene.js YAML脚本结构"""
+        flow = []
+        for step in plan["steps"]:
+            if step["action"] == "input":
+                flow.append({"aiInput": step["value"], "locate": step["target"]})
+            elif step["action"] == "tap":
+                flow.append({"aiTap": step["target"]})
+            elif step["action"] == "keyboard":
+                flow.append({"aiKeyboardPress": step["value"], "locate": step["target"]})
+            elif step["action"] == "wait":
+                flow.append({"aiWaitFor": step["target"], "timeout": 10000})
+        flow.append({"aiAssert": plan["assertion"], "errorMessage": f"{plan['label']}验证失败"})
+
+        return {
+            "web": {
+                "url": plan["url"],
+                "viewportWidth": 1280,
+                "viewportHeight": 960,
+                "waitForNetworkIdle": {"timeout": 2000, "continueOnNetworkIdleError": True},
+                "aiActionContext": plan["context"],
+            },
+            "tasks": [{"name": plan["name"], "continueOnError": False, "flow": flow}],
+        }
+
+    @staticmethod
+    def render_playwright(plan: Dict[str, Any]) -> str:
+        """渲染为MidScene.js + Playwright测试代码"""
+        def quote(value: str) -> str:
+            return json.dumps(value, ensure_ascii=False)
+
+        lines = []
+        for step in plan["steps"]:
+            if step["action"] == "input":
+                lines.append(f"  await aiInput({quote(step['value'])}, {quote(step['target'])});")
+            elif step["action"] == "tap":
+                lines.append(f"  await aiTap({quote(step['target'])});")
+            elif step["action"] == "keyboard":
+                lines.append(f"  await aiKeyboardPress({quote(step['value'])}, {quote(step['target'])});")
+            elif step["action"] == "wait":
+                lines.append(f"  await aiWaitFor({quote(step['target'])}, {{ timeoutMs: 10000 }});")
+        lines.append(f"  await aiAssert({quote(plan['assertion'])});")
+        body = "\n".join(lines)
+
+        return f"""import {{ test }} from "./fixture";
+
+test.beforeEach(async ({{ page }}) => {{
+  page.setViewportSize({{ width: 1280, height: 768 }});
+  await page.goto({quote(plan['url'])});
+  await page.waitForLoadState("networkidle");
+}});
+
+test({quote(plan['name'])}, async ({{
+  aiInput,
+  aiTap,
+  aiKeyboardPress,
+  aiWaitFor,
+  aiAssert,
+}}) => {{
+  // {plan['context']}
+{body}
+}});
+"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取模板处理统计"""
+        handled = sum(self.handled_by_flow.values())
+        return {
+            "requests": self.requests,
+            "handled": handled,
+            "handled_ratio": handled / self.requests if self.requests else 0.0,
+            "by_flow": dict(self.handled_by_flow),
+        }
+
+
+# 全局脚本模板引擎实例
+script_template_engine = ScriptTemplateEngine()
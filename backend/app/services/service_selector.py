@@ -112,6 +112,11 @@ class HybridScriptService:
     
     def __init__(self):
         self.selector = service_selector
+
+    @staticmethod
+    async def _refresh_file_index(service) -> None:
+        """文件脚本服务调用前在线程中同步磁盘变更，服务内部的同步刷新随后在节流间隔内直接返回"""
+        await service.index.refresh_async()
     
     async def create_script_from_analysis(self, *args, **kwargs):
         """创建脚本"""
@@ -120,6 +125,7 @@ class HybridScriptService:
         if self.selector.get_service_type() == "database":
             return await service.create_script_from_analysis(*args, **kwargs)
         else:
+            await self._refresh_file_index(service)
             return service.create_script_from_analysis(*args, **kwargs)
     
     async def get_script(self, script_id: str):
@@ -129,6 +135,7 @@ class HybridScriptService:
         if self.selector.get_service_type() == "database":
             return await service.get_script(script_id)
         else:
+            await self._refresh_file_index(service)
             return service.get_script(script_id)
     
     async def search_scripts(self, request):
@@ -138,6 +145,7 @@ class HybridScriptService:
         if self.selector.get_service_type() == "database":
             return await service.search_scripts(request)
         else:
+            await self._refresh_file_index(service)
             return service.search_scripts(request)
     
     async def update_script(self, script_id: str, updates: dict):
@@ -147,6 +155,7 @@ class HybridScriptService:
         if self.selector.get_service_type() == "database":
             return await service.update_script(script_id, updates)
         else:
+            await self._refresh_file_index(service)
             return service.update_script(script_id, updates)
     
     async def delete_script(self, script_id: str):
@@ -156,6 +165,7 @@ class HybridScriptService:
         if self.selector.get_service_type() == "database":
             return await service.delete_script(script_id)
         else:
+            await self._refresh_file_index(service)
             return service.delete_script(script_id)
     
     async def get_script_statistics(self):
@@ -165,6 +175,7 @@ class HybridScriptService:
         if self.selector.get_service_type() == "database":
             return await service.get_script_statistics()
         else:
+            await self._refresh_file_index(service)
             return service.get_script_statistics()
     
     async def get_script_executions(self, script_id: str, limit: int = 20):
@@ -174,6 +185,7 @@ class HybridScriptService:
         if self.selector.get_service_type() == "database":
             return await service.get_script_executions(script_id, limit)
         else:
+            await self._refresh_file_index(service)
             return service.get_script_executions(script_id, limit)
     
     def get_current_service_info(self) -> dict:
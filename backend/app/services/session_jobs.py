@@ -0,0 +1,131 @@
+"""
+会话任务适配
+Web分析、脚本执行等流程以会话为单位运行：会话信息保存在接口模块的 active_sessions 中，
+进度消息写入 message_queues[session_id]，SSE接口从队列读取。启用任务队列后：
+- API进程把会话信息作为任务提交，并把任务进度事件转回本进程的消息队列，SSE接口不需要改动；
+- worker进程在本进程内重建会话和消息队列后运行原有的处理函数，消息队列中的消息写入任务进度事件。
+"""
+import uuid
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.logging import get_logger
+from app.core.messages import StreamMessage
+from app.core.workload import workload_scope
+from app.core.cancellation import cancellation_registry, cancellation_scope
+from app.services.job_queue import JobContext, job_queue
+
+logger = get_logger(__name__)
+
+
+def _system_message(content: str, region: str = "process", msg_type: str = "message",
+                    is_final: bool = False) -> StreamMessage:
+    return StreamMessage(
+        message_id=f"system-{uuid.uuid4()}",
+        type=msg_type,
+        source="系统",
+        content=content,
+        region=region,
+        platform="web",
+        is_final=is_final,
+    )
+
+
+async def submit_session_job(kind: str, session_id: str, sessions: Dict[str, Dict[str, Any]],
+                             queues: Dict[str, asyncio.Queue], priority: Optional[int] = None) -> str:
+    """提交会话任务，并把任务进度转发到会话的消息队列，返回任务ID"""
+    session_info = sessions[session_id]
+    job = await job_queue.enqueue(kind, {"session": session_info}, priority=priority, session_id=session_id)
+    session_info["status"] = "queued"
+    session_info["job_id"] = job.id
+
+    message_queue = queues.get(session_id)
+    if message_queue is not None:
+        await message_queue.put(_system_message("⏳ 任务已提交，等待执行..."))
+    asyncio.create_task(forward_job_events(job.id, session_id, sessions, queues), name=f"job-forward-{job.id}")
+    return job.id
+
+
+async def forward_job_events(job_id: str, session_id: str, sessions: Dict[str, Dict[str, Any]],
+                             queues: Dict[str, asyncio.Queue]) -> None:
+    """把任务进度事件转为流式消息写入会话消息队列，任务结束后同步会话状态"""
+    try:
+        async for _, data in job_queue.stream(job_id):
+            if "status" in data and session_id in sessions:
+                sessions[session_id]["status"] = data["status"]
+            message = data.get("message")
+            message_queue = queues.get(session_id)
+            if message and message_queue is not None:
+                await message_queue.put(StreamMessage.model_validate(message))
+
+        job = await job_queue.get(job_id)
+        if session_id in sessions and job is not None:
+            session_info = sessions[session_id]
+            if job.status == "succeeded":
+                session_info["status"] = (job.result or {}).get("status") or "completed"
+            else:
+                session_info["status"] = "error" if job.status == "failed" else job.status
+                session_info["error"] = job.last_error
+            session_info["completed_at"] = datetime.now().isoformat()
+        message_queue = queues.get(session_id)
+        if job is not None and job.status == "failed" and message_queue is not None:
+            await message_queue.put(_system_message(
+                f"❌ 任务执行失败: {job.last_error}", region="error", msg_type="error", is_final=True
+            ))
+    except Exception as e:
+        logger.error(f"转发任务进度失败: {job_id}, {str(e)}")
+
+
+async def run_session_job(ctx: JobContext, sessions: Dict[str, Dict[str, Any]],
+                          queues: Dict[str, asyncio.Queue],
+                          process: Callable[[str], Awaitable[None]],
+                          retry_on_error: bool = False) -> Dict[str, Any]:
+    """
+    在worker进程中运行会话处理函数
+
+    Args:
+        ctx: 任务上下文
+        sessions: 接口模块的 active_sessions
+        queues: 接口模块的 message_queues
+        process: 原有的会话处理函数
+        retry_on_error: 处理函数把会话标记为 error 时是否抛出异常（触发重试）
+    """
+    session_id = ctx.job.session_id
+    session_info = dict(ctx.job.payload["session"])
+    session_info["status"] = "initialized"
+    message_queue: asyncio.Queue = asyncio.Queue()
+    sessions[session_id] = session_info
+    queues[session_id] = message_queue
+    await ctx.publish({"status": "processing"})
+
+    async def pump():
+        while True:
+            message = await message_queue.get()
+            try:
+                await ctx.publish({"message": message.model_dump(mode="json")})
+            except Exception as e:
+                logger.error(f"写入任务进度失败: {ctx.job.id}, {str(e)}")
+            finally:
+                message_queue.task_done()
+
+    pump_task = asyncio.create_task(pump())
+    token = cancellation_registry.token(session_id)
+    try:
+        with workload_scope(session_info.get("workload")), cancellation_scope(token):
+            await process(session_id)
+        await message_queue.join()
+    except asyncio.CancelledError:
+        # 任务被取消或worker停止：同时中止运行时中的智能体处理和子进程
+        token.cancel()
+        raise
+    finally:
+        pump_task.cancel()
+        sessions.pop(session_id, None)
+        queues.pop(session_id, None)
+        cancellation_registry.release(session_id)
+
+    status = session_info.get("status")
+    if status == "error" and retry_on_error:
+        raise RuntimeError(session_info.get("error") or "会话处理失败")
+    return {"status": status, "error": session_info.get("error")}
@@ -11,7 +11,11 @@ from sqlalchemy import desc, func
 
 from app.database.connection import db_manager
 from app.database.models.reports import TestReport
+from app.database.repositories.report_repository import REPORT_SOURCE_ARTIFACT
 from app.core.logging import get_logger
+from app.services.blob_store import blob_store
+from app.services.report_serving import precompress_report
+from app.services.midscene_report import midscene_report_splitter
 
 logger = get_logger(__name__)
 
@@ -55,6 +59,32 @@ class TestReportService:
                 except:
                     pass
 
+            # 报告目录中的文件会被下一次执行覆盖，按内容保存一份，记录中保存内容块路径
+            original_blob = None
+            artifacts = []
+            if report_path and blob_store.enabled and os.path.isfile(report_path) and not blob_store.owns(report_path):
+                try:
+                    original_blob = await blob_store.put_file(report_path)
+                    # 记录原文件所属的脚本，保留策略按脚本保留报告目录中最近的报告
+                    artifacts.append({"type": REPORT_SOURCE_ARTIFACT, "path": str(report_path)})
+                    report_path = str(original_blob.path)
+                except Exception as e:
+                    logger.warning(f"保存报告到内容寻址存储失败，使用原路径: {str(e)}")
+
+            # 拆分MidScene报告：JSON时间线 + 去重截图，查看时按需加载
+            timeline = await midscene_report_splitter.split(report_path)
+            if timeline:
+                artifacts.append(timeline)
+                # 只保存页面骨架，原始报告下载时再还原
+                if timeline.get("skeleton"):
+                    if original_blob:
+                        await blob_store.release(original_blob.sha256)
+                    report_path = timeline["skeleton"]
+
+            # 预压缩一次，查看报告时直接返回压缩文件
+            if report_path:
+                await precompress_report(report_path)
+
             # 解析测试结果统计
             test_stats = self._parse_test_results(logs or [])
 
@@ -88,7 +118,7 @@ class TestReportService:
                 report_size=report_size,  # 使用计算的文件大小
                 screenshots=[],  # 暂时为空，后续可以扩展
                 videos=[],       # 暂时为空，后续可以扩展
-                artifacts=[],    # 暂时为空，后续可以扩展
+                artifacts=artifacts,
                 error_message=self._extract_error_message(logs or []),
                 logs=self._safe_serialize_logs(logs or []),
                 execution_config=safe_execution_config,      # 使用安全序列化的配置
@@ -239,11 +269,11 @@ class TestReportService:
             return None
     
     async def get_reports_by_session_id(self, session_id: str) -> List[TestReport]:
-        """根据会话ID获取所有测试报告"""
+        """根据会话ID获取所有测试报告（摘要视图，不加载日志和产物列）"""
         try:
             async with db_manager.get_session() as session:
                 from sqlalchemy import select
-                stmt = select(TestReport).filter(
+                stmt = select(TestReport).options(*TestReport.summary_options()).filter(
                     TestReport.session_id == session_id
                 ).order_by(desc(TestReport.created_at))
                 result = await session.execute(stmt)
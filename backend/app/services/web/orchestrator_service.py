@@ -5,7 +5,7 @@ Web编排器
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from loguru import logger
-from autogen_core import SingleThreadedAgentRuntime, TopicId, ClosureAgent, TypeSubscription
+from autogen_core import SingleThreadedAgentRuntime, TopicId, ClosureAgent, TypeSubscription, CancellationToken
 
 # 导入智能体工厂
 from app.agents.factory import AgentFactory, agent_factory
@@ -16,7 +16,10 @@ from app.core.messages import (
     WebMultimodalAnalysisRequest, YAMLExecutionRequest, PlaywrightExecutionRequest,
     AnalysisType
 )
-from app.core.messages.web import WebTestCaseGenerationRequest
+from app.core.messages.web import WebTestCaseGenerationRequest, WebMultimodalAnalysisResponse
+from app.services.pipeline_checkpoints import pipeline_checkpoints, script_stage, STAGE_ANALYSIS
+from app.core.tracing import tracer, traced
+from app.core.cancellation import cancellation_registry, cancellation_scope, current_cancellation_token
 
 
 class WebOrchestrator:
@@ -24,6 +27,7 @@ class WebOrchestrator:
 
     def __init__(self, collector: Optional[StreamResponseCollector]=None):
         self.runtime: Optional[SingleThreadedAgentRuntime] = None
+        self.cancellation_token: Optional[CancellationToken] = None
 
         # 使用智能体工厂
         self.agent_factory = agent_factory
@@ -39,8 +43,11 @@ class WebOrchestrator:
         try:
             # 创建运行时
             self.runtime = SingleThreadedAgentRuntime()
-            # 启动运行时
-            self.runtime.start()
+            # 启动运行时：运行时的消息处理任务继承会话的取消令牌，智能体处理消息时据此响应取消；
+            # 调用方没有会话令牌时使用本次运行的令牌（由 cancel_session 取消），不在取消注册表中创建条目
+            self.cancellation_token = current_cancellation_token() or CancellationToken()
+            with cancellation_scope(self.cancellation_token):
+                self.runtime.start()
             # 创建响应收集器
             if self.response_collector is None:
                 self.response_collector = StreamResponseCollector()
@@ -107,6 +114,8 @@ class WebOrchestrator:
                 finally:
                     self.runtime = None
 
+            self.cancellation_token = None
+
             # 清理智能体工厂注册记录
             self.agent_factory.clear_registered_agents()
 
@@ -123,13 +132,16 @@ class WebOrchestrator:
 
     # ==================== 业务流程1: 图片分析 → 脚本生成（支持格式选择） ====================
 
+    @traced("orchestrator.analyze_image_to_scripts", kind="orchestrator")
     async def analyze_image_to_scripts(
         self,
         session_id: str,
         image_data: str,
         test_description: str,
         additional_context: Optional[str] = None,
-        generate_formats: Optional[List[str]] = None
+        generate_formats: Optional[List[str]] = None,
+        force_reanalyze: bool = False,
+        target_url: Optional[str] = None
     ):
         """
         业务流程1: 图片分析 → 脚本生成（支持多种格式）
@@ -140,6 +152,8 @@ class WebOrchestrator:
             test_description: 测试描述
             additional_context: 额外上下文
             generate_formats: 生成格式列表，如 ["yaml", "playwright"]
+            force_reanalyze: 忽略已有分析检查点，重新分析图片
+            target_url: 被测网页URL
 
         Returns:
             Dict[str, Any]: 包含分析结果和生成脚本的完整结果
@@ -160,10 +174,13 @@ class WebOrchestrator:
                 image_data=image_data,
                 test_description=test_description,
                 additional_context=additional_context,
-                generate_formats=generate_formats
+                generate_formats=generate_formats,
+                force_reanalyze=force_reanalyze,
+                target_url=target_url
             )
 
             # 发送到图片分析智能体
+            tracer.inject(analysis_request)
             await self.runtime.publish_message(
                 analysis_request,
                 topic_id=TopicId(type=TopicTypes.IMAGE_ANALYZER.value, source="user")   # 下一步调用图片分析智能体
@@ -214,8 +231,110 @@ class WebOrchestrator:
             generate_formats=["playwright"]
         )
 
+    # ==================== 检查点恢复: 基于已有分析结果重新生成脚本 ====================
+
+    @traced("orchestrator.regenerate_scripts_from_analysis", kind="orchestrator")
+    async def regenerate_scripts_from_analysis(
+        self,
+        session_id: str,
+        analysis_id: str,
+        generate_formats: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        基于分析结果检查点重新生成脚本，跳过图片分析
+
+        Args:
+            session_id: 会话ID
+            analysis_id: 分析ID
+            generate_formats: 生成格式列表，如 ["playwright"]
+
+        Returns:
+            List[str]: 已发送生成请求的格式
+        """
+        if generate_formats is None:
+            generate_formats = ["yaml"]
+
+        content_hash = await pipeline_checkpoints.resolve_analysis(analysis_id)
+        record = await pipeline_checkpoints.load(content_hash, STAGE_ANALYSIS) if content_hash else None
+        if record is None:
+            raise ValueError(f"分析结果检查点不存在: {analysis_id}")
+
+        analysis_result = WebMultimodalAnalysisResponse.model_validate(record["data"]).model_copy(
+            update={"session_id": session_id}
+        )
+        format_topics = {
+            "yaml": TopicTypes.YAML_GENERATOR.value,
+            "playwright": TopicTypes.PLAYWRIGHT_GENERATOR.value
+        }
+        formats = [script_format for script_format in generate_formats if script_format in format_topics]
+
+        try:
+            logger.info(f"基于分析结果检查点重新生成脚本: {session_id}, 分析ID: {analysis_id}, 格式: {formats}")
+
+            # 设置运行时
+            await self._setup_runtime(session_id)
+
+            for script_format in formats:
+                tracer.inject(analysis_result)
+                await self.runtime.publish_message(
+                    analysis_result,
+                    topic_id=TopicId(type=format_topics[script_format], source="user")
+                )
+            logger.info(f"脚本重新生成完成: {session_id}")
+            return formats
+
+        except Exception as e:
+            logger.error(f"脚本重新生成失败: {session_id}, 错误: {str(e)}")
+            raise
+        finally:
+            await self._cleanup_runtime()
+
+    async def resume_session(
+        self,
+        session_id: str,
+        generate_formats: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        从会话最近的有效检查点继续：已生成的脚本直接返回，缺失的格式基于分析结果重新生成
+
+        Args:
+            session_id: 原会话ID
+            generate_formats: 需要的格式列表，默认 ["yaml"]
+
+        Returns:
+            Dict[str, Any]: 分析ID、已有脚本和重新生成的格式
+        """
+        if generate_formats is None:
+            generate_formats = ["yaml"]
+
+        content_hash = await pipeline_checkpoints.resolve_session(session_id)
+        record = await pipeline_checkpoints.load(content_hash, STAGE_ANALYSIS) if content_hash else None
+        if record is None:
+            raise ValueError(f"会话没有可恢复的分析结果检查点: {session_id}")
+
+        analysis_id = record["data"]["analysis_id"]
+        scripts: Dict[str, Any] = {}
+        missing: List[str] = []
+        for script_format in generate_formats:
+            script_record = await pipeline_checkpoints.load(content_hash, script_stage(script_format))
+            if script_record:
+                scripts[script_format] = script_record["data"]
+            else:
+                missing.append(script_format)
+
+        regenerated = []
+        if missing:
+            regenerated = await self.regenerate_scripts_from_analysis(session_id, analysis_id, missing)
+
+        return {
+            "analysis_id": analysis_id,
+            "scripts": scripts,
+            "regenerated_formats": regenerated
+        }
+
     # ==================== 业务流程2: 测试用例分析 ====================
 
+    @traced("orchestrator.run_test_case_analysis", kind="orchestrator")
     async def run_test_case_analysis(
         self,
         request: WebTestCaseGenerationRequest,
@@ -238,12 +357,14 @@ class WebOrchestrator:
             # 根据是否有图片选择不同的处理流程
             if request.image_data:
                 # 有图片，使用图片分析智能体
+                tracer.inject(request)
                 await self.runtime.publish_message(
                     request,
                     topic_id=TopicId(type=TopicTypes.IMAGE_ANALYZER.value, source="orchestrator")
                 )
             else:
                 # 没有图片，直接使用测试用例生成智能体
+                tracer.inject(request)
                 await self.runtime.publish_message(
                     request,
                     topic_id=TopicId(type=TopicTypes.TEST_CASE_GENERATOR.value, source="orchestrator")
@@ -271,6 +392,7 @@ class WebOrchestrator:
         finally:
             await self._cleanup_runtime()
 
+    @traced("orchestrator.run_script_generation_from_scenarios", kind="orchestrator")
     async def run_script_generation_from_scenarios(
         self,
         session_id: str,
@@ -309,6 +431,7 @@ class WebOrchestrator:
                 }
 
                 # 发布消息到相应的生成智能体
+                tracer.inject(generation_request)
                 await self.runtime.publish_message(
                     generation_request,
                     topic_id=TopicId(type=topic_type, source="orchestrator")
@@ -338,6 +461,7 @@ class WebOrchestrator:
 
     # ==================== 业务流程3: 页面元素分析 ====================
 
+    @traced("orchestrator.analyze_page_elements", kind="orchestrator")
     async def analyze_page_elements(
         self,
         session_id: str,
@@ -379,6 +503,7 @@ class WebOrchestrator:
 
             # 发送消息到页面分析智能体
             from autogen_core import AgentId
+            tracer.inject(analysis_request)
             await self.runtime.send_message(
                 message=analysis_request,
                 recipient=AgentId(type=AgentTypes.PAGE_ANALYZER.value, key="default")
@@ -397,11 +522,13 @@ class WebOrchestrator:
 
     # ==================== 业务流程3: YAML脚本执行 ====================
 
+    @traced("orchestrator.execute_yaml_script", kind="orchestrator")
     async def execute_yaml_script(
         self,
         session_id: str,
         yaml_content: str,
-        execution_config: Optional[Dict[str, Any]] = None
+        execution_config: Optional[Dict[str, Any]] = None,
+        script_id: Optional[str] = None
     ):
         """
         业务流程3: YAML脚本执行
@@ -410,6 +537,7 @@ class WebOrchestrator:
             session_id: 会话ID
             yaml_content: YAML脚本内容
             execution_config: 执行配置
+            script_id: 数据库中的脚本ID（用于写入执行记录）
 
         Returns:
             Dict[str, Any]: 执行结果
@@ -422,11 +550,14 @@ class WebOrchestrator:
 
             # 构建YAML执行请求（使用正确的消息类型）
             execution_request = YAMLExecutionRequest(
+                session_id=session_id,
+                script_id=script_id,
                 yaml_content=yaml_content,
                 execution_config=execution_config
             )
 
             # 发送到YAML执行智能体
+            tracer.inject(execution_request)
             await self.runtime.publish_message(
                 execution_request,
                 topic_id=TopicId(type=TopicTypes.YAML_EXECUTOR.value, source="orchestrator")
@@ -444,6 +575,7 @@ class WebOrchestrator:
 
     # ==================== 业务流程4: Playwright脚本执行 ====================
 
+    @traced("orchestrator.execute_playwright_script", kind="orchestrator")
     async def execute_playwright_script(
         self,
         request: PlaywrightExecutionRequest
@@ -469,6 +601,7 @@ class WebOrchestrator:
             await self._setup_runtime(request.session_id)
 
             # 发送到Playwright执行智能体
+            tracer.inject(request)
             await self.runtime.publish_message(
                 request,
                 topic_id=TopicId(type=TopicTypes.PLAYWRIGHT_EXECUTOR.value, source="orchestrator")
@@ -576,19 +709,18 @@ class WebOrchestrator:
             }
 
     async def cancel_session(self, session_id: str) -> bool:
-        """取消会话"""
+        """取消会话：中止进行中的智能体处理、大模型请求和子进程，运行时在流程结束时清理"""
         try:
+            cancelled = cancellation_registry.cancel(session_id)
             if session_id in self.active_sessions:
                 self.active_sessions[session_id]["status"] = "cancelled"
                 self.active_sessions[session_id]["cancelled_at"] = datetime.now().isoformat()
-
-                # 如果是当前运行的会话，停止运行时
-                if self.runtime:
-                    await self.runtime.close()
-
+                if self.cancellation_token is not None:
+                    self.cancellation_token.cancel()
+                cancelled = True
+            if cancelled:
                 logger.info(f"会话已取消: {session_id}")
-                return True
-            return False
+            return cancelled
 
         except Exception as e:
             logger.error(f"取消会话失败: {str(e)}")
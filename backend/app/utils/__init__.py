@@ -11,7 +11,12 @@ from .file_utils import (
     read_file_content,
     list_files_in_directory,
     is_allowed_image,
-    generate_unique_filename
+    generate_unique_filename,
+    StoredUpload,
+    stream_upload_to_file,
+    read_upload_limited,
+    read_image_base64,
+    compute_perceptual_hash
 )
 
 __all__ = [
@@ -24,5 +29,10 @@ __all__ = [
     "read_file_content",
     "list_files_in_directory",
     "is_allowed_image",
-    "generate_unique_filename"
+    "generate_unique_filename",
+    "StoredUpload",
+    "stream_upload_to_file",
+    "read_upload_limited",
+    "read_image_base64",
+    "compute_perceptual_hash"
 ]
@@ -3,9 +3,13 @@
 """
 import os
 import uuid
+import base64
 import shutil
+import asyncio
+import hashlib
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Union
 from datetime import datetime
 import aiofiles
 from fastapi import UploadFile, HTTPException
@@ -54,12 +58,115 @@ def generate_unique_filename(original_filename: str, prefix: str = "") -> str:
         return f"{timestamp}_{unique_id}{ext}"
 
 
+@dataclass
+class StoredUpload:
+    """流式保存后的上传文件"""
+    path: str
+    size: int
+    sha256: str
+    phash: Optional[str] = None
+
+
+def _size_limit_detail(max_size: int, label: str) -> str:
+    return f"{label}大小不能超过{max_size // (1024 * 1024)}MB"
+
+
+async def iter_upload_chunks(file: UploadFile, max_size: int, label: str = "文件", chunk_size: Optional[int] = None):
+    """分块读取上传文件，累计大小超过 max_size 时立即拒绝，不再继续读取"""
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    # 表单解析时已知大小的，直接拒绝
+    if file.size is not None and file.size > max_size:
+        raise HTTPException(status_code=400, detail=_size_limit_detail(max_size, label))
+
+    total = 0
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_size:
+            raise HTTPException(status_code=400, detail=_size_limit_detail(max_size, label))
+        yield chunk
+
+
+async def read_upload_limited(file: UploadFile, max_size: int, label: str = "文件") -> bytes:
+    """读取上传文件内容（用于需要完整内容的小文件），超过大小上限时提前拒绝"""
+    chunks = [chunk async for chunk in iter_upload_chunks(file, max_size, label)]
+    return b"".join(chunks)
+
+
+def compute_perceptual_hash(image_path: Union[str, Path], hash_size: int = 8) -> Optional[str]:
+    """计算图片差值哈希（dHash），相似截图的哈希汉明距离很小；无法解码时返回None"""
+    try:
+        from PIL import Image
+
+        with Image.open(image_path) as image:
+            pixels = list(image.convert("L").resize((hash_size + 1, hash_size)).getdata())
+        bits = 0
+        for row in range(hash_size):
+            offset = row * (hash_size + 1)
+            for col in range(hash_size):
+                bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+        return f"{bits:0{hash_size * hash_size // 4}x}"
+    except Exception as e:
+        logger.warning(f"计算图片感知哈希失败: {image_path}, {str(e)}")
+        return None
+
+
+async def stream_upload_to_file(
+    file: UploadFile,
+    file_path: Union[str, Path],
+    max_size: int,
+    label: str = "文件",
+    perceptual_hash: bool = False
+) -> StoredUpload:
+    """
+    分块把上传文件写入磁盘，写入同时计算SHA-256
+
+    超过大小上限时立即停止读取并删除已写入的部分；不会在内存中保留完整文件内容。
+
+    Args:
+        file: 上传的文件对象
+        file_path: 目标文件路径
+        max_size: 大小上限（字节）
+        label: 错误提示中的文件描述
+        perceptual_hash: 是否计算图片感知哈希
+
+    Returns:
+        StoredUpload: 文件路径、大小、SHA-256和感知哈希
+    """
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(file_path, 'wb') as f:
+            async for chunk in iter_upload_chunks(file, max_size, label):
+                digest.update(chunk)
+                size += len(chunk)
+                await f.write(chunk)
+    except BaseException:
+        file_path.unlink(missing_ok=True)
+        raise
+
+    phash = await asyncio.to_thread(compute_perceptual_hash, file_path) if perceptual_hash else None
+    return StoredUpload(path=str(file_path), size=size, sha256=digest.hexdigest(), phash=phash)
+
+
+async def read_image_base64(file_path: Union[str, Path]) -> str:
+    """读取已保存的图片并转为Base64（在需要时才加载到内存）"""
+    async with aiofiles.open(file_path, 'rb') as f:
+        content = await f.read()
+    return await asyncio.to_thread(lambda: base64.b64encode(content).decode('utf-8'))
+
+
 async def save_uploaded_image(file: UploadFile) -> Tuple[str, str]:
     """
     保存上传的图片文件
     
     Returns:
-        Tuple[str, str]: (文件路径, 文件名)
+        Tuple[str, str]: (文件路径, 文件名)；文件路径在内容寻址存储中时持有一个引用，
+        调用方在不再需要该图片时用 blob_store.release_path 释放
     """
     try:
         # 验证文件类型
@@ -72,30 +179,16 @@ async def save_uploaded_image(file: UploadFile) -> Tuple[str, str]:
                 detail=f"不支持的图片格式。支持的格式: {', '.join(settings.ALLOWED_IMAGE_EXTENSIONS_LIST)}"
             )
         
-        # 检查文件大小
-        file_size = 0
-        content = await file.read()
-        file_size = len(content)
-        
-        if file_size > settings.MAX_IMAGE_SIZE:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"图片文件过大。最大支持 {settings.MAX_IMAGE_SIZE // (1024*1024)}MB"
-            )
-        
         # 生成唯一文件名
         unique_filename = generate_unique_filename(file.filename, "image")
         file_path = Path(settings.IMAGE_UPLOAD_DIR) / unique_filename
         
-        # 确保目录存在
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        # 保存文件
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(content)
+        # 分块保存文件（按内容去重），超过大小上限时提前拒绝
+        from app.services.blob_store import blob_store
+        stored = await blob_store.save_upload(file, file_path, settings.MAX_IMAGE_SIZE, label="图片文件")
         
-        logger.info(f"图片保存成功: {file_path}")
-        return str(file_path), unique_filename
+        logger.info(f"图片保存成功: {stored.path}")
+        return stored.path, unique_filename
         
     except HTTPException:
         raise
@@ -121,10 +214,9 @@ async def save_yaml_content(content: str, session_id: str, filename: Optional[st
             filename = f"test_script_{session_id}.yaml"
         
         file_path = Path(settings.YAML_OUTPUT_DIR) / filename
-        file_path.parent.mkdir(parents=True, exist_ok=True)
         
-        async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-            await f.write(content)
+        from app.services.blob_store import blob_store
+        await blob_store.write_text(file_path, content)
         
         logger.info(f"YAML文件保存成功: {file_path}")
         return str(file_path)
@@ -151,10 +243,9 @@ async def save_playwright_content(content: str, session_id: str, filename: Optio
             filename = f"test_script_{session_id}.ts"
         
         file_path = Path(settings.PLAYWRIGHT_OUTPUT_DIR) / filename
-        file_path.parent.mkdir(parents=True, exist_ok=True)
         
-        async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-            await f.write(content)
+        from app.services.blob_store import blob_store
+        await blob_store.write_text(file_path, content)
         
         logger.info(f"Playwright文件保存成功: {file_path}")
         return str(file_path)
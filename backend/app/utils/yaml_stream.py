@@ -0,0 +1,274 @@
+"""
+MidScene.js YAML增量解析
+在大模型流式输出的过程中按行解析脚本，每完成一个flow步骤或task就立即校验
+"""
+import re
+import textwrap
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# MidScene.js YAML 支持的flow动作
+FLOW_ACTIONS = {
+    "ai", "aiAction", "aiTap", "aiHover", "aiInput", "aiKeyboardPress", "aiScroll",
+    "aiRightClick", "aiDoubleClick", "aiQuery", "aiNumber", "aiString", "aiBoolean",
+    "aiLocate", "aiAssert", "aiWaitFor", "sleep", "javascript", "logScreenshot",
+}
+
+# 脚本开始的顶层字段（之前的内容视为说明文字）
+SCRIPT_SECTIONS = {"web", "android", "target", "tasks"}
+
+_TOP_LEVEL_KEY = re.compile(r"^([A-Za-z_][\w-]*)\s*:")
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip(" "))
+
+
+def _is_list_item(stripped: str) -> bool:
+    return stripped == "-" or stripped.startswith("- ")
+
+
+def repair_indentation(content: str) -> str:
+    """修复奇数缩进（大模型输出中最常见的结构错误）"""
+    lines = []
+    for line in content.split("\n"):
+        if line.strip() and _indent(line) % 2 != 0:
+            line = " " + line
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class YAMLStreamError(ValueError):
+    """无法修复的脚本结构错误"""
+
+
+class IncrementalYAMLParser:
+    """MidScene.js YAML增量解析器
+
+    feed() 接收流式文本片段，返回新完成的事件：
+    - {"type": "web", "data": {...}}：web配置块解析完成；
+    - {"type": "task", "index": i, "data": {...}}：一个task解析并校验完成；
+    - {"type": "warning", "message": ...}：已自动修复或丢弃的问题（如未知动作的步骤）；
+    - {"type": "complete"}：脚本结束（代码块闭合或输入结束），之后的输出不再影响脚本。
+    结构错误在修复缩进后仍无法解析时抛出 YAMLStreamError，调用方可以立即中止生成。
+    代码块标记（```yaml）和脚本前后的说明文字会被忽略。
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._started = False
+        self._finished = False
+
+        self._section: Optional[str] = None
+        self._section_lines: List[str] = []
+
+        self._task_indent: Optional[int] = None
+        self._task_lines: List[str] = []
+        self._flow_key_indent: Optional[int] = None
+        self._step_indent: Optional[int] = None
+        self._step_lines: List[str] = []
+
+        self.web: Optional[Dict[str, Any]] = None
+        self.tasks: List[Dict[str, Any]] = []
+        self.extra: Dict[str, Any] = {}
+        self.warnings: List[str] = []
+
+    # ==================== 输入 ====================
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """输入一段流式文本，返回新完成的事件"""
+        self._buffer += chunk
+        events: List[Dict[str, Any]] = []
+        while "\n" in self._buffer and not self._finished:
+            line, self._buffer = self._buffer.split("\n", 1)
+            self._process_line(line.rstrip("\r"), events)
+        return events
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """输入结束，解析剩余内容并返回事件"""
+        events: List[Dict[str, Any]] = []
+        if self._finished:
+            return events
+        if self._buffer:
+            self._process_line(self._buffer.rstrip("\r"), events)
+        self._buffer = ""
+        if not self._finished:
+            self._close_section(events)
+            self._finished = True
+            events.append({"type": "complete"})
+        return events
+
+    @property
+    def has_tasks(self) -> bool:
+        return bool(self.tasks)
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def document(self) -> Dict[str, Any]:
+        """当前已校验的脚本结构（部分脚本也可直接序列化展示）"""
+        document: Dict[str, Any] = dict(self.extra)
+        document["web"] = dict(self.web or {})
+        document["tasks"] = list(self.tasks)
+        return document
+
+    # ==================== 逐行处理 ====================
+
+    def _process_line(self, line: str, events: List[Dict[str, Any]]) -> None:
+        stripped = line.strip()
+
+        if stripped.startswith("```"):
+            if self._started:
+                # 代码块结束，后续是说明文字
+                self._close_section(events)
+                self._finished = True
+                events.append({"type": "complete"})
+            return
+
+        top_level = _TOP_LEVEL_KEY.match(line) if line and not line[0].isspace() else None
+        if not self._started:
+            if top_level is None or top_level.group(1) not in SCRIPT_SECTIONS:
+                return
+            self._started = True
+
+        if top_level is not None:
+            self._close_section(events)
+            self._section = top_level.group(1)
+            self._section_lines = [line]
+            return
+
+        if self._section != "tasks":
+            self._section_lines.append(line)
+            return
+
+        self._process_task_line(line, stripped, events)
+
+    def _process_task_line(self, line: str, stripped: str, events: List[Dict[str, Any]]) -> None:
+        if not stripped or stripped.startswith("#"):
+            if self._task_lines:
+                self._task_lines.append(line)
+            return
+
+        indent = _indent(line)
+        if self._task_indent is None and _is_list_item(stripped):
+            self._task_indent = indent
+
+        if indent == self._task_indent and _is_list_item(stripped):
+            self._close_task(events)
+            self._task_lines = [line]
+            self._check_flow_key(line, stripped)
+            return
+
+        if not self._task_lines:
+            raise YAMLStreamError(f"tasks下出现无法归属的内容: {stripped}")
+        self._task_lines.append(line)
+
+        if self._step_indent is None and self._flow_key_indent is not None \
+                and indent >= self._flow_key_indent and _is_list_item(stripped):
+            self._step_indent = indent
+        if self._step_indent is not None and indent == self._step_indent and _is_list_item(stripped):
+            self._close_step(events)
+            self._step_lines = [line]
+        elif self._step_indent is not None and indent <= self._step_indent:
+            # flow结束，回到task的其他字段
+            self._close_step(events)
+            self._flow_key_indent = self._step_indent = None
+            self._check_flow_key(line, stripped)
+        elif self._step_lines:
+            self._step_lines.append(line)
+        else:
+            self._check_flow_key(line, stripped)
+
+    def _check_flow_key(self, line: str, stripped: str) -> None:
+        key = stripped[2:].lstrip() if _is_list_item(stripped) else stripped
+        if key.startswith("flow:"):
+            self._flow_key_indent = _indent(line) + (len(stripped) - len(key))
+            self._step_indent = None
+
+    # ==================== 块校验 ====================
+
+    def _load_block(self, lines: List[str], what: str) -> Any:
+        content = textwrap.dedent("\n".join(lines))
+        try:
+            return yaml.safe_load(content)
+        except yaml.YAMLError:
+            pass
+        try:
+            data = yaml.safe_load(repair_indentation(content))
+            self._warn(f"{what}缩进已自动修复", None)
+            return data
+        except yaml.YAMLError as e:
+            raise YAMLStreamError(f"{what}结构错误: {e}")
+
+    def _warn(self, message: str, events: Optional[List[Dict[str, Any]]]) -> None:
+        self.warnings.append(message)
+        logger.debug(f"YAML增量解析: {message}")
+        if events is not None:
+            events.append({"type": "warning", "message": message})
+
+    @staticmethod
+    def _step_action(step: Any) -> Optional[str]:
+        if not isinstance(step, dict):
+            return None
+        return next((key for key in step if key in FLOW_ACTIONS), None)
+
+    def _close_step(self, events: List[Dict[str, Any]]) -> None:
+        if not self._step_lines:
+            return
+        lines, self._step_lines = self._step_lines, []
+        data = self._load_block(lines, f"第{len(self.tasks) + 1}个task的flow步骤")
+        step = data[0] if isinstance(data, list) and data else data
+        if self._step_action(step) is None:
+            self._warn(f"第{len(self.tasks) + 1}个task中的步骤没有可识别的动作，已忽略: {lines[0].strip()}", events)
+
+    def _close_task(self, events: List[Dict[str, Any]]) -> None:
+        self._close_step(events)
+        self._flow_key_indent = self._step_indent = None
+        if not self._task_lines:
+            return
+        lines, self._task_lines = self._task_lines, []
+
+        index = len(self.tasks)
+        data = self._load_block(lines, f"第{index + 1}个task")
+        task = data[0] if isinstance(data, list) and data else None
+        if not isinstance(task, dict):
+            raise YAMLStreamError(f"第{index + 1}个task不是有效的字典结构")
+
+        flow = task.get("flow")
+        if not isinstance(flow, list):
+            raise YAMLStreamError(f"第{index + 1}个task缺少flow列表")
+        task["flow"] = [step for step in flow if self._step_action(step) is not None]
+        if not task["flow"]:
+            self._warn(f"第{index + 1}个task没有有效的flow步骤，已忽略", events)
+            return
+
+        task.setdefault("name", f"测试任务{index + 1}")
+        task.setdefault("continueOnError", False)
+        self.tasks.append(task)
+        events.append({"type": "task", "index": index, "data": task})
+
+    def _close_section(self, events: List[Dict[str, Any]]) -> None:
+        section, self._section = self._section, None
+        if section is None:
+            return
+        if section == "tasks":
+            self._close_task(events)
+            self._task_indent = None
+            return
+
+        data = self._load_block(self._section_lines, f"{section}配置")
+        self._section_lines = []
+        value = data.get(section) if isinstance(data, dict) else None
+        if section == "web":
+            if not isinstance(value, dict):
+                raise YAMLStreamError("web配置不是有效的字典结构")
+            self.web = value
+            events.append({"type": "web", "data": value})
+        else:
+            self.extra[section] = value
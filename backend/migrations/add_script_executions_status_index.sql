@@ -0,0 +1,9 @@
+-- 脚本执行记录表索引调整
+-- 迁移时间: 2026-10-19
+
+-- 活跃执行查询按 status 过滤并按 start_time 排序，使用复合索引替换单列状态索引
+DROP INDEX idx_executions_status;  -- MySQL: DROP INDEX idx_executions_status ON script_executions;
+CREATE INDEX idx_executions_status_start_time ON script_executions(status, start_time);
+
+-- 保留期清理按创建时间分批删除
+CREATE INDEX idx_executions_created_at ON script_executions(created_at);
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+日志开销基准测试
+对比 development 与 production 日志配置下热路径日志的单条耗时：
+- 流式分片：BaseAgent.send_message 中每个分片一条DEBUG日志（原写法为f-string，现为延迟格式化）；
+- 子进程输出：Playwright执行时每行stdout一条INFO日志（production下限流）。
+
+用法: python scripts/benchmark_logging.py [--count 20000]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from loguru import logger
+
+from app.core.logging import setup_logging, shutdown_logging, log_hot_path
+
+
+def measure(func, count: int) -> float:
+    """返回单次调用的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def run_profile(profile: str, count: int) -> dict:
+    setup_logging(profile)
+    agent_name, message_type = "YAML生成智能体", "message"
+    chunk = "- aiTap: 点击登录按钮，等待页面跳转到首页后继续执行下一步操作" * 2
+
+    results = {
+        # 原写法：无论日志级别是否输出都会先格式化f-string
+        "chunk_debug_fstring": measure(
+            lambda i: logger.debug(f"[{agent_name}] 发送{message_type}: {chunk[:50]}..."), count
+        ),
+        # 现写法：延迟格式化
+        "chunk_debug_lazy": measure(
+            lambda i: logger.debug("[{}] 发送{}: {:.50}...", agent_name, message_type, chunk), count
+        ),
+        # 原写法：每行stdout一条INFO日志
+        "line_info_direct": measure(
+            lambda i: logger.info(f"[Playwright] {chunk} {i}"), count
+        ),
+        # 现写法：热路径日志（production下限流）
+        "line_info_hot_path": measure(
+            lambda i: log_hot_path("playwright.stdout", "INFO", "[Playwright] {} {}", chunk, i), count
+        ),
+    }
+    shutdown_logging()
+    logger.remove()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志开销基准测试")
+    parser.add_argument("--count", type=int, default=20000, help="每项测试的日志条数")
+    args = parser.parse_args()
+
+    # 日志写入临时目录，控制台输出丢弃
+    work_dir = tempfile.mkdtemp(prefix="log_bench_")
+    os.chdir(work_dir)
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w", encoding="utf-8")
+    try:
+        results = {profile: run_profile(profile, args.count) for profile in ("development", "production")}
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    print(f"每条日志平均耗时（微秒），每项 {args.count} 条，日志目录: {work_dir}")
+    print(f"{'场景':<24}{'development':>14}{'production':>14}")
+    for name in results["development"]:
+        print(f"{name:<24}{results['development'][name]:>14.2f}{results['production'][name]:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+启动导入耗时报告
+在子进程中以 python -X importtime 导入 app.main，输出累计耗时最高的模块，并检查：
+- 导入总耗时不超过启动预算（STARTUP_IMPORT_BUDGET，秒）；
+- 启动时不应加载的重量级模块（智能体、autogen-agentchat、openai 等）没有被导入。
+任一检查不通过时退出码为1，可在CI中运行以发现启动变慢的改动。
+
+用法: python scripts/profile_imports.py [--budget 3.0] [--top 25] [--json report.json]
+"""
+import re
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+project_root = Path(__file__).parent.parent
+
+# 启动时不应导入的模块（前缀匹配），在首次使用时才加载
+DEFERRED_MODULES = (
+    "openai",
+    "autogen_agentchat",
+    "autogen_ext",
+    "app.core.llms",
+    "app.core.llm_connections",
+    "app.agents.web.",
+)
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def profile_imports(module: str = "app.main") -> Dict[str, Any]:
+    """导入 module 并返回每个模块的自身/累计耗时（微秒）"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=project_root, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+
+    modules: List[Dict[str, Any]] = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({
+                "module": name,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": len(indent) // 2,
+            })
+    total_us = next((item["cumulative_us"] for item in modules if item["module"] == module and item["depth"] == 0), 0)
+    return {"module": module, "total_s": total_us / 1e6, "modules": modules}
+
+
+def check_report(report: Dict[str, Any], budget: Optional[float]) -> List[str]:
+    """返回未通过的检查项"""
+    problems = []
+    if budget is not None and report["total_s"] > budget:
+        problems.append(f"导入耗时 {report['total_s']:.2f}s 超过预算 {budget:.2f}s")
+    imported = {item["module"] for item in report["modules"]}
+    for prefix in DEFERRED_MODULES:
+        eager = sorted(name for name in imported if name == prefix.rstrip(".") or name.startswith(prefix))
+        if eager:
+            problems.append(f"启动时导入了应延迟加载的模块: {', '.join(eager[:5])}")
+    return problems
+
+
+def main():
+    sys.path.insert(0, str(project_root))
+    from app.core.config import settings
+
+    parser = argparse.ArgumentParser(description="启动导入耗时报告")
+    parser.add_argument("--module", default="app.main", help="要导入的模块")
+    parser.add_argument("--budget", type=float, default=settings.STARTUP_IMPORT_BUDGET,
+                        help="导入耗时预算（秒），0 表示不检查")
+    parser.add_argument("--top", type=int, default=25, help="输出累计耗时最高的模块数")
+    parser.add_argument("--json", dest="json_path", help="把完整报告写入JSON文件")
+    args = parser.parse_args()
+
+    report = profile_imports(args.module)
+    problems = check_report(report, args.budget or None)
+
+    print(f"导入 {args.module} 耗时 {report['total_s']:.3f}s（预算 {args.budget or '-'}s），共 {len(report['modules'])} 个模块")
+    print(f"{'累计(ms)':>10} {'自身(ms)':>10}  模块")
+    for item in sorted(report["modules"], key=lambda item: item["cumulative_us"], reverse=True)[:args.top]:
+        print(f"{item['cumulative_us'] / 1000:>10.1f} {item['self_us'] / 1000:>10.1f}  {'  ' * item['depth']}{item['module']}")
+
+    if args.json_path:
+        report["problems"] = problems
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    for problem in problems:
+        print(f"❌ {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+启动任务队列worker进程
+需要在配置中开启 JOB_QUEUE_ENABLED，API进程只负责入队，分析和执行流程由这里启动的进程运行。
+
+用法: python scripts/run_worker.py [--processes 2] [--queues analysis=2,execution=1]
+"""
+import sys
+import signal
+import asyncio
+import argparse
+import multiprocessing
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.config import settings
+
+
+async def run_worker(queues: str) -> None:
+    from app.core.logging import get_logger
+    from app.utils import ensure_directories
+    from app.core.database_startup import app_database_manager
+    from app.services.job_worker import JobWorker, load_job_handlers, parse_queue_limits
+
+    logger = get_logger(__name__)
+    ensure_directories()
+    if not await app_database_manager.startup():
+        logger.warning("⚠️ 主数据库初始化失败，任务中的数据库操作将失败")
+    load_job_handlers()
+
+    worker = JobWorker(parse_queue_limits(queues))
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except NotImplementedError:
+            # Windows 不支持，Ctrl+C 时直接中断
+            pass
+    try:
+        await worker.run()
+    finally:
+        await app_database_manager.shutdown()
+
+
+def worker_main(queues: str) -> None:
+    from app.core.logging import setup_logging, shutdown_logging
+
+    setup_logging()
+    try:
+        asyncio.run(run_worker(queues))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_logging()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="任务队列worker")
+    parser.add_argument("--processes", type=int, default=settings.JOB_WORKER_PROCESSES, help="worker进程数")
+    parser.add_argument("--queues", default=settings.JOB_QUEUE_CONCURRENCY, help="队列并发上限，如 analysis=2,execution=1")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        worker_main(args.queues)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=worker_main, args=(args.queues,), name=f"job-worker-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内容寻址存储引用计数与垃圾回收测试
+验证相同内容只保存一份、引用计数随持有者增减，以及没有持有者的内容块在垃圾回收时被删除
+"""
+import sys
+import os
+import asyncio
+import hashlib
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.database.models.base import Base
+from app.database.models.blobs import ContentBlob
+import app.services.blob_store as blob_store_module
+from app.services.blob_store import BlobStore
+from app.services.retention import RetentionManager, RetentionPolicy
+
+
+class _SqliteDatabase:
+    """与 db_manager 相同接口的内存数据库"""
+
+    def __init__(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        self.session_factory = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def create_tables(self):
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[ContentBlob.__table__])
+
+    @asynccontextmanager
+    async def get_session(self):
+        async with self.session_factory() as session:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+
+def _run_with_store(scenario):
+    """在临时目录和内存数据库上运行测试场景"""
+    async def main():
+        database = _SqliteDatabase()
+        await database.create_tables()
+        original = blob_store_module.db_manager
+        blob_store_module.db_manager = database
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                store = BlobStore(root=os.path.join(tmp_dir, "blobs"))
+                await scenario(store, database, Path(tmp_dir))
+        finally:
+            blob_store_module.db_manager = original
+            await database.engine.dispose()
+
+    asyncio.run(main())
+
+
+async def _ref_count(database, sha256: str):
+    async with database.get_session() as session:
+        result = await session.execute(select(ContentBlob.ref_count).where(ContentBlob.sha256 == sha256))
+        return result.scalar_one_or_none()
+
+
+def test_references_and_gc_lifecycle():
+    """测试引用计数归零前内容块不会被回收，归零后回收且不影响已物化的文件"""
+    async def scenario(store, database, tmp_dir):
+        first = await store.put_text("name: 登录测试\n", ".yaml")
+        second = await store.put_text("name: 登录测试\n", ".yaml")
+        assert second.deduplicated and first.path == second.path
+        assert await _ref_count(database, first.sha256) == 2
+
+        await store.release(first.sha256)
+        assert (await store.gc(grace_hours=0))["deleted_blobs"] == 0
+        assert first.path.exists()
+
+        await store.release(first.sha256)
+        await asyncio.sleep(0.01)
+        result = await store.gc(grace_hours=0)
+        assert result["deleted_blobs"] == 1
+        assert not first.path.exists()
+        assert await _ref_count(database, first.sha256) is None
+
+    _run_with_store(scenario)
+
+
+def test_materialized_file_is_registered_without_reference():
+    """测试物化的文件只登记内容块：没有记录持有时被回收，脚本记录持有内容引用时保留"""
+    async def scenario(store, database, tmp_dir):
+        content = "tasks:\n  - name: 搜索\n"
+        dest = await store.write_text(tmp_dir / "scripts" / "search.yaml", content)
+        blob = store.blob_path(hashlib.sha256(content.encode("utf-8")).hexdigest(), ".yaml")
+        assert blob.exists()
+        assert await _ref_count(database, blob.name[:64]) == 0
+
+        # 脚本记录保存时持有引用，垃圾回收不删除
+        await store.add_content_reference(content)
+        await asyncio.sleep(0.01)
+        assert (await store.gc(grace_hours=0))["deleted_blobs"] == 0
+
+        # 删除脚本记录后释放引用，内容块被回收，物化的文件仍然可读
+        await store.release_content(content)
+        await asyncio.sleep(0.01)
+        result = await store.gc(grace_hours=0)
+        assert result["deleted_blobs"] == 1 and result["deleted_orphans"] == 0
+        assert not blob.exists()
+        assert dest.read_text(encoding="utf-8") == content
+
+    _run_with_store(scenario)
+
+
+def test_editable_files_do_not_share_blob_data():
+    """测试可编辑的物化文件原地修改不影响内容块，之后相同内容的写入仍得到原内容；只读副本不可写"""
+    async def scenario(store, database, tmp_dir):
+        content = "tasks:\n  - name: 注册\n"
+        script = await store.write_text(tmp_dir / "scripts" / "register.yaml", content)
+        blob = store.blob_path(hashlib.sha256(content.encode("utf-8")).hexdigest(), ".yaml")
+        assert os.stat(script).st_nlink == 1
+        assert not os.stat(blob).st_mode & 0o222
+
+        with open(script, "a", encoding="utf-8") as f:
+            f.write("      - aiTap: 提交\n")
+        again = await store.write_text(tmp_dir / "scripts" / "register-copy.yaml", content)
+        assert blob.read_text(encoding="utf-8") == content
+        assert again.read_text(encoding="utf-8") == content
+
+        run_copy = await store.write_text(tmp_dir / "runs" / "register.yaml", content, read_only=True)
+        assert not os.stat(run_copy).st_mode & 0o222
+
+    _run_with_store(scenario)
+
+
+def test_repository_leaves_commit_to_the_session_owner():
+    """测试引用计数修改在调用方的会话中进行，会话回滚时一并撤销"""
+    async def scenario(store, database, tmp_dir):
+        ref = await store.put_text("name: 回滚测试\n", ".yaml")
+        try:
+            async with database.get_session() as session:
+                await store.repository.add_reference(session, ref.sha256, ref.size)
+                await store.repository.add_reference(session, "f" * 64, 1)
+                raise RuntimeError("调用方处理失败")
+        except RuntimeError:
+            pass
+        assert await _ref_count(database, ref.sha256) == 1
+        assert await _ref_count(database, "f" * 64) is None
+
+    _run_with_store(scenario)
+
+
+def test_retention_counts_space_only_for_last_link():
+    """测试删除仍链接到内容块的文件不计入释放空间，内容块回收后删除最后一个链接才计入"""
+    async def scenario(store, database, tmp_dir):
+        content = "tasks:\n  - name: 下单\n" * 10
+        size = len(content.encode("utf-8"))
+        first = await store.write_text(tmp_dir / "uploads" / "first.yaml", content, read_only=True)
+        await store.write_text(tmp_dir / "uploads" / "second.yaml", content, read_only=True)
+        if os.stat(first).st_nlink == 1:
+            return  # 文件系统不支持硬链接时物化为复制，不涉及链接计算
+
+        policy = RetentionPolicy(name="uploads", paths=[tmp_dir / "uploads"], pattern="first.yaml", max_age_days=0)
+        result = await RetentionManager([policy]).apply_policy(policy, None)
+        assert result["deleted"] == 1 and result["freed_bytes"] == 0
+
+        # 内容块回收时仍有一个链接，磁盘空间同样没有释放
+        await asyncio.sleep(0.01)
+        gc_result = await store.gc(grace_hours=0)
+        assert gc_result["deleted_blobs"] == 1 and gc_result["freed_bytes"] == 0
+
+        policy.pattern = "second.yaml"
+        result = await RetentionManager([policy]).apply_policy(policy, None)
+        assert result["deleted"] == 1 and result["freed_bytes"] == size
+
+    _run_with_store(scenario)
+
+
+if __name__ == "__main__":
+    test_references_and_gc_lifecycle()
+    test_materialized_file_is_registered_without_reference()
+    test_editable_files_do_not_share_blob_data()
+    test_repository_leaves_commit_to_the_session_owner()
+    test_retention_counts_space_only_for_last_link()
+    print("✅ 内容寻址存储测试通过")
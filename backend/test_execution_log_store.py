@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+执行日志存储测试
+验证分段滚动、分段文件gzip压缩、跨分段和缓冲区的范围读取与尾部读取，以及日志批量提交
+"""
+import sys
+import os
+import gzip
+import json
+import asyncio
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.execution_log_store import ExecutionLogStore, LogBatcher, INDEX_FILENAME
+
+
+def _lines(start: int, end: int):
+    return [f"[STDOUT] 第{i}行" for i in range(start, end)]
+
+
+def test_segments_roll_over_and_are_gzipped():
+    """测试缓冲区凑满分段后滚动落盘，分段为gzip压缩的JSON行，关闭时剩余行写成最后一个分段"""
+    async def main():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = ExecutionLogStore(base_dir=tmp_dir, segment_lines=10)
+            await store.append("exec-1", _lines(0, 7))
+            assert not (Path(tmp_dir) / "exec-1").exists()
+
+            await store.append("exec-1", _lines(7, 25))
+            execution_dir = Path(tmp_dir) / "exec-1"
+            assert sorted(path.name for path in execution_dir.glob("seg-*")) == [
+                "seg-0000000000.jsonl.gz", "seg-0000000010.jsonl.gz"
+            ]
+            with gzip.open(execution_dir / "seg-0000000010.jsonl.gz", "rt", encoding="utf-8") as f:
+                assert [json.loads(raw) for raw in f] == _lines(10, 20)
+
+            assert await store.close("exec-1") == 25
+            index = json.loads((execution_dir / INDEX_FILENAME).read_text(encoding="utf-8"))
+            assert index["closed"] and index["total_lines"] == 25
+            assert [(seg["start"], seg["count"]) for seg in index["segments"]] == [(0, 10), (10, 10), (20, 5)]
+
+    asyncio.run(main())
+
+
+def test_range_and_tail_reads_span_segments_and_buffer():
+    """测试运行期间的范围读取同时覆盖已落盘分段和内存缓冲区，关闭后由新实例从磁盘读取"""
+    async def main():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = ExecutionLogStore(base_dir=tmp_dir, segment_lines=10)
+            await store.append("exec-2", _lines(0, 23))
+
+            assert await store.line_count("exec-2") == 23
+            assert await store.read_range("exec-2", 8, 12) == _lines(8, 12)
+            assert await store.read_range("exec-2", 18, 23) == _lines(18, 23)
+            assert await store.read_range("exec-2", 20, 100) == _lines(20, 23)
+            assert await store.read_range("exec-2", 30, 40) == []
+            assert await store.tail("exec-2", 5) == _lines(18, 23)
+
+            await store.close("exec-2")
+            reader = ExecutionLogStore(base_dir=tmp_dir, segment_lines=10)
+            assert reader.exists("exec-2")
+            assert await reader.read_range("exec-2") == _lines(0, 23)
+            assert await reader.read_range("exec-2", 9, 21) == _lines(9, 21)
+            assert await reader.tail("exec-2", 3) == _lines(20, 23)
+
+            assert await reader.delete("exec-2")
+            assert not reader.exists("exec-2")
+
+    asyncio.run(main())
+
+
+def test_log_batcher_flushes_by_size_and_on_demand():
+    """测试批量提交器达到行数上限时整批写入，未满的批次在显式提交时写入"""
+    async def main():
+        batches = []
+
+        async def write(lines):
+            batches.append(lines)
+
+        batcher = LogBatcher(write, max_lines=3, interval=3600)
+        for i in range(7):
+            await batcher.add([f"第{i}行"])
+        assert batches == [["第0行", "第1行", "第2行"], ["第3行", "第4行", "第5行"]]
+        assert len(batcher) == 1
+
+        await batcher.flush()
+        await batcher.flush()
+        assert batches[-1] == ["第6行"] and len(batches) == 3
+
+        # 超过时间间隔后下一行即提交
+        immediate = LogBatcher(write, max_lines=100, interval=0)
+        await immediate.add(["第7行"])
+        assert batches[-1] == ["第7行"]
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    test_segments_roll_over_and_are_gzipped()
+    test_range_and_tail_reads_span_segments_and_buffer()
+    test_log_batcher_flushes_by_size_and_on_demand()
+    print("✅ 执行日志存储测试通过")
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+执行记录仓库测试
+验证日志和指标按执行缓冲、只写入指定执行的缓冲数据，以及执行智能体使用的执行记录接口
+"""
+import sys
+import os
+import asyncio
+from contextlib import asynccontextmanager
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.database.models.base import Base
+from app.database.models import TestScript, ScriptExecution, ExecutionLog
+from app.database.repositories.execution_repository import ExecutionRepository
+import app.services.database_script_service as script_service_module
+from app.services.database_script_service import DatabaseScriptService
+
+
+class _SqliteDatabase:
+    """与 db_manager 相同接口的内存数据库"""
+
+    def __init__(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        self.session_factory = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def create_tables(self):
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    @asynccontextmanager
+    async def get_session(self):
+        async with self.session_factory() as session:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+
+def _run_with_database(scenario):
+    """在内存数据库上运行测试场景（替换脚本服务使用的 db_manager）"""
+    async def main():
+        database = _SqliteDatabase()
+        await database.create_tables()
+        async with database.get_session() as session:
+            session.add(TestScript(id="script-1", name="登录测试", script_format="yaml",
+                                   script_type="manual_creation", content="tasks: []",
+                                   test_description="登录"))
+        original = script_service_module.db_manager
+        script_service_module.db_manager = database
+        try:
+            await scenario(database)
+        finally:
+            script_service_module.db_manager = original
+            await database.engine.dispose()
+
+    asyncio.run(main())
+
+
+async def _log_messages(database, execution_pk: str):
+    async with database.get_session() as session:
+        result = await session.execute(
+            select(ExecutionLog.message).where(ExecutionLog.execution_id == execution_pk).order_by(ExecutionLog.timestamp)
+        )
+        return list(result.scalars().all())
+
+
+def test_flush_writes_only_the_given_execution():
+    """测试共享仓库中 flush 只写入指定执行的缓冲，批量写入也不会带上其他执行的日志"""
+    async def scenario(database):
+        repo = ExecutionRepository(flush_batch_size=3)
+        async with database.get_session() as session:
+            first = await repo.create_execution(session, "script-1", "exec-1", status='running')
+            second = await repo.create_execution(session, "script-1", "exec-2", status='running')
+
+        async with database.get_session() as session:
+            await repo.add_execution_log(session, first.id, "第一个执行 1")
+            await repo.add_execution_log(session, second.id, "第二个执行 1")
+            repo.record_metrics(second.id, {"duration": 1.5})
+            await repo.add_execution_log(session, first.id, "第一个执行 2")
+            await repo.add_execution_log(session, first.id, "第一个执行 3")  # 达到批量大小，只写入第一个执行
+
+        assert await _log_messages(database, first.id) == ["第一个执行 1", "第一个执行 2", "第一个执行 3"]
+        assert await _log_messages(database, second.id) == []
+        assert repo.pending_count(second.id) == 1
+
+        async with database.get_session() as session:
+            execution = await repo.update_status(session, second.id, 'completed')
+            assert execution.performance_metrics == {"duration": 1.5}
+        assert await _log_messages(database, second.id) == ["第二个执行 1"]
+        assert repo.pending_count(second.id) == 0
+
+        async with database.get_session() as session:
+            try:
+                await repo.update_status(session, second.id, 'running')
+                assert False, "终止状态不允许再流转"
+            except ValueError:
+                pass
+
+    _run_with_database(scenario)
+
+
+def test_flushed_batch_is_kept_until_commit():
+    """测试flush写入后事务回滚时缓冲数据保留，下一次flush重新写入且不重复"""
+    async def scenario(database):
+        repo = ExecutionRepository(flush_batch_size=100)
+        async with database.get_session() as session:
+            execution = await repo.create_execution(session, "script-1", "exec-1", status='running')
+
+        repo.buffer_log(execution.id, "第一行")
+        repo.record_metrics(execution.id, {"steps": 1})
+        try:
+            async with database.get_session() as session:
+                assert await repo.flush(session, execution.id) == 1
+                assert repo.pending_count(execution.id) == 0
+                raise RuntimeError("提交前失败")
+        except RuntimeError:
+            pass
+        assert await _log_messages(database, execution.id) == []
+        assert repo.pending_count(execution.id) == 1
+
+        async with database.get_session() as session:
+            await repo.add_execution_log(session, execution.id, "第二行")
+            assert await repo.flush(session, execution.id) == 2
+            # 同一事务中再次flush不重复写入
+            assert await repo.flush(session, execution.id) == 0
+        assert await _log_messages(database, execution.id) == ["第一行", "第二行"]
+        assert repo.buffered_count(execution.id) == 0
+        async with database.get_session() as session:
+            assert (await session.get(ScriptExecution, execution.id)).performance_metrics == {"steps": 1}
+
+    _run_with_database(scenario)
+
+
+def test_log_execution_opens_session_only_when_flush_is_due():
+    """测试执行日志逐行追加时只在达到批量大小时打开数据库会话"""
+    async def scenario(database):
+        service = DatabaseScriptService()
+        service.execution_repo.flush_batch_size = 3
+        execution_pk = await service.start_execution("script-1", "exec-1")
+
+        opened = []
+        get_session = database.get_session
+
+        @asynccontextmanager
+        async def counting_session():
+            opened.append(1)
+            async with get_session() as session:
+                yield session
+
+        database.get_session = counting_session
+        try:
+            for index in range(7):
+                await service.log_execution(execution_pk, [f"第{index}行"])
+            assert len(opened) == 2
+            await service.finish_execution(execution_pk, "completed")
+        finally:
+            database.get_session = get_session
+        assert len(await _log_messages(database, execution_pk)) == 7
+
+    _run_with_database(scenario)
+
+
+def test_executor_recording_api():
+    """测试执行智能体的执行记录接口：未保存的脚本不写入，结束时写入日志、指标、状态和脚本执行统计"""
+    async def scenario(database):
+        service = DatabaseScriptService()
+        assert await service.start_execution("temp-script", "exec-temp") is None
+
+        execution_pk = await service.start_execution("script-1", "exec-1", execution_config={"headless": True})
+        assert execution_pk
+        await service.log_execution(execution_pk, ["开始执行", "执行完成"], component="midscene")
+        await service.finish_execution(execution_pk, "failed", error_message="断言失败", exit_code=1,
+                                       metrics={"duration": 2.0})
+
+        assert await _log_messages(database, execution_pk) == ["开始执行", "执行完成"]
+        records = await service.get_script_executions("script-1")
+        assert len(records) == 1
+        assert records[0].status == "failed" and records[0].error_message == "断言失败"
+        async with database.get_session() as session:
+            count = await session.scalar(select(func.count(ScriptExecution.id)))
+            script = await session.get(TestScript, "script-1")
+        assert count == 1
+        # 执行结束时更新脚本的执行统计
+        assert script.execution_count == 1 and script.last_execution_status == "failed"
+
+        execution_pk = await service.start_execution("script-1", "exec-2")
+        await service.finish_execution(execution_pk, "completed")
+        async with database.get_session() as session:
+            script = await session.get(TestScript, "script-1")
+        assert script.execution_count == 2 and script.last_execution_status == "completed"
+
+    _run_with_database(scenario)
+
+
+def test_get_script_executions_returns_empty_on_error():
+    """测试数据库不可用时获取执行记录返回空列表"""
+    class _BrokenDatabase:
+        @asynccontextmanager
+        async def get_session(self):
+            raise RuntimeError("数据库不可用")
+            yield
+
+    original = script_service_module.db_manager
+    script_service_module.db_manager = _BrokenDatabase()
+    try:
+        assert asyncio.run(DatabaseScriptService().get_script_executions("script-1")) == []
+    finally:
+        script_service_module.db_manager = original
+
+
+if __name__ == "__main__":
+    test_flush_writes_only_the_given_execution()
+    test_flushed_batch_is_kept_until_commit()
+    test_log_execution_opens_session_only_when_flush_is_due()
+    test_executor_recording_api()
+    test_get_script_executions_returns_empty_on_error()
+    print("✅ 执行记录仓库测试通过")
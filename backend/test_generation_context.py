@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+脚本生成上下文检索测试
+验证页面基本信息只输出有值的字段、页面信息超出预算时其余部分不再占用预算，
+以及预算充足时按测试需求选取分析片段、知识库元素和历史脚本示例
+"""
+import sys
+import os
+import asyncio
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.messages.web import AnalysisType, PageAnalysis, TestAction, WebMultimodalAnalysisResponse
+import app.services.knowledge.generation_context as generation_context_module
+from app.services.knowledge.generation_context import GenerationContextRetriever, estimate_tokens
+
+
+class _FakePageVectorStore:
+    """与 page_vector_store 相同接口的知识库元素检索"""
+
+    async def search_elements(self, query, top_k=5):
+        return [
+            ("el-1", 0.9, {"page_name": "登录页", "element_name": "登录按钮",
+                           "element_type": "button", "element_description": "蓝色的登录按钮"}),
+            ("el-2", 0.0, {"page_name": "首页", "element_name": "轮播图", "element_type": "image"}),
+        ]
+
+
+def _message(page_title=None, main_content="", test_description=None) -> WebMultimodalAnalysisResponse:
+    page_analysis = PageAnalysis(
+        page_title=page_title, page_type="login", main_content=main_content,
+        ui_elements=['{"name": "账号输入框", "element_type": "input"} {"name": "页脚", "element_type": "text"}'],
+        user_flows=["输入账号密码后点击登录按钮进入首页"],
+        test_steps=[TestAction(step_number=1, action="tap", target="登录按钮", description="点击登录")],
+        analysis_summary="登录页面",
+    )
+    return WebMultimodalAnalysisResponse(
+        session_id="session-1", analysis_id="analysis-1", analysis_type=AnalysisType.IMAGE,
+        page_analysis=page_analysis, status="success", message="分析完成", test_description=test_description,
+    )
+
+
+def _retriever(token_budget: int) -> GenerationContextRetriever:
+    """不访问数据库和嵌入模型的检索器：包含“页脚”的片段与测试需求不相关"""
+    retriever = GenerationContextRetriever(token_budget=token_budget, top_k=5, example_count=1)
+
+    async def find_script_examples(query, script_format):
+        return [{"name": "历史登录脚本", "test_description": "", "content": "tasks:\n  - name: 登录\n"}]
+
+    retriever._find_script_examples = find_script_examples
+    retriever._rank_by_similarity = lambda query, texts: np.array(
+        [0.1 if "页脚" in text else 0.9 for text in texts], dtype=np.float32
+    )
+    return retriever
+
+
+def _build(retriever, message):
+    async def main():
+        original_store = generation_context_module.page_vector_store
+        generation_context_module.page_vector_store = _FakePageVectorStore()
+        try:
+            return await retriever.build_context(message, "yaml", "完整分析摘要" * 200)
+        finally:
+            generation_context_module.page_vector_store = original_store
+
+    return asyncio.run(main())
+
+
+def test_header_skips_empty_fields():
+    """测试页面标题、主要内容、测试需求为空时不输出对应行，示例标题不带空的描述"""
+    context, _ = _build(_retriever(2000), _message())
+    header = context.split("\n\n")[0]
+    assert header == "## 页面基本信息\n- **类型**: login"
+    assert "None" not in context and "**标题**" not in context and "**测试需求**" not in context
+    assert "#### 历史登录脚本\n" in context and "（）" not in context
+
+    context, _ = _build(_retriever(2000), _message("用户登录", "账号密码登录表单", "测试用户登录"))
+    assert "- **标题**: 用户登录\n" in context
+    assert "- **主要内容**: 账号密码登录表单\n" in context
+    assert "- **测试需求**: 测试用户登录\n" in context
+
+
+def test_budget_smaller_than_header_drops_other_sections():
+    """测试页面信息超出预算时剩余预算按0计算，示例、知识库元素和分析片段都不再加入"""
+    message = _message("用户登录", "账号密码登录表单", "测试用户登录")
+    retriever = _retriever(5)
+    context, stats = _build(retriever, message)
+
+    assert context.startswith("## 页面基本信息\n") and estimate_tokens(context) > 5
+    assert "##" not in context[len("## 页面基本信息"):]
+    assert stats["selected_chunks"] == 0 and stats["total_chunks"] == 4
+    assert stats["kb_elements"] == 0 and stats["script_examples"] == 0
+    assert retriever.get_stats()["generations"] == 1
+
+
+def test_relevant_sections_within_budget():
+    """测试预算充足时加入示例和知识库元素，分析片段按相关度选取并按原顺序分节输出"""
+    context, stats = _build(_retriever(2000), _message("用户登录", test_description="测试用户登录"))
+
+    assert stats["script_examples"] == 1 and stats["kb_elements"] == 1
+    assert "- 登录页: 登录按钮（button）蓝色的登录按钮" in context
+    assert "轮播图" not in context
+    # 相似度低于最高分30%的片段被过滤
+    assert stats["selected_chunks"] == 3 and "页脚" not in context
+    sections = [line for line in context.splitlines() if line.startswith("## ")]
+    assert sections == ["## 页面基本信息", "## 相关分析结果（按测试需求检索）",
+                        "## 历史成功脚本参考", "## 知识库相似页面元素"]
+    assert context.index("### UI元素") < context.index("### 交互流程") < context.index("### 测试步骤")
+    assert stats["prompt_tokens"] <= 2000 and stats["tokens_saved"] > 0
+
+
+if __name__ == "__main__":
+    test_header_skips_empty_fields()
+    test_budget_smaller_than_header_drops_other_sections()
+    test_relevant_sections_within_budget()
+    print("✅ 脚本生成上下文检索测试通过")
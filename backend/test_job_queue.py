@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务队列测试
+验证任务领取、可见性超时后重新入队、失败重试退避、worker停止时交还任务，以及会话任务的进度转发
+"""
+import sys
+import os
+import time
+import asyncio
+import tempfile
+from contextlib import contextmanager
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.core.messages import StreamMessage
+from app.services.job_queue import JobQueue, SQLiteJobBackend, job_handler, retry_delay
+from app.services.job_worker import JobWorker
+import app.services.session_jobs as session_jobs_module
+
+
+@contextmanager
+def _override_settings(**values):
+    original = {name: getattr(settings, name) for name in values}
+    for name, value in values.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in original.items():
+            setattr(settings, name, value)
+
+
+def _run_with_queue(scenario):
+    """在临时SQLite文件上运行测试场景"""
+    async def main():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            await scenario(JobQueue(SQLiteJobBackend(os.path.join(tmp_dir, "jobs.db"))))
+
+    asyncio.run(main())
+
+
+def test_claim_respects_priority_and_queue_limits():
+    """测试按优先级领取任务，队列运行中的任务数达到上限后不再领取"""
+    async def scenario(queue):
+        backend = queue.backend
+        low = await queue.enqueue("test.job", {"n": 1}, queue="analysis", priority=0)
+        high = await queue.enqueue("test.job", {"n": 2}, queue="analysis", priority=5)
+        await queue.enqueue("test.job", {"n": 3}, queue="execution", delay=60)
+
+        job = await backend.claim({"analysis": 1, "execution": 1}, "worker-a", 60)
+        assert job.id == high.id and job.status == "running" and job.attempts == 1
+        assert job.payload == {"n": 2}
+        # analysis 队列已达上限，execution 队列的任务还未到可执行时间
+        assert await backend.claim({"analysis": 1, "execution": 1}, "worker-b", 60) is None
+
+        assert await backend.complete(job.id, "worker-a", {"status": "completed"})
+        job = await backend.claim({"analysis": 1}, "worker-b", 60)
+        assert job.id == low.id
+        assert (await queue.get(high.id)).result == {"status": "completed"}
+
+    _run_with_queue(scenario)
+
+
+def test_visibility_timeout_requeues_lost_jobs():
+    """测试worker失联超过可见性超时后任务被其他worker接管，已用完尝试次数的标记失败"""
+    async def scenario(queue):
+        backend = queue.backend
+        retried = await queue.enqueue("test.job", {}, queue="analysis", max_attempts=2)
+        job = await backend.claim({"analysis": 1}, "worker-a", -1)  # 可见性超时已过期
+        assert job.id == retried.id
+
+        job = await backend.claim({"analysis": 1}, "worker-b", 60)
+        assert job.id == retried.id and job.attempts == 2 and job.locked_by == "worker-b"
+        # 原worker续期时发现任务已被接管，完成结果不会覆盖新worker的处理
+        assert await backend.heartbeat(job.id, "worker-a", 60) == "lost"
+        assert not await backend.complete(job.id, "worker-a")
+        assert await backend.heartbeat(job.id, "worker-b", 60) == "running"
+
+        exhausted = await queue.enqueue("test.job", {}, queue="execution", max_attempts=1)
+        await backend.claim({"execution": 1}, "worker-a", -1)
+        assert await backend.claim({"execution": 1}, "worker-b", 60) is None
+        job = await queue.get(exhausted.id)
+        assert job.status == "failed" and job.last_error
+
+    _run_with_queue(scenario)
+
+
+def test_failed_jobs_retry_with_backoff():
+    """测试失败的任务按退避时间重新入队，超过最大尝试次数后标记失败"""
+    async def scenario(queue):
+        backend = queue.backend
+        created = await queue.enqueue("test.job", {}, queue="analysis", max_attempts=2)
+        job = await backend.claim({"analysis": 1}, "worker-a", 60)
+        assert await backend.fail(job.id, "worker-a", "第一次失败", 30.0) == "queued"
+        job = await queue.get(created.id)
+        assert job.status == "queued" and job.last_error == "第一次失败"
+        assert job.available_at > time.time() + 20
+        # 退避期间不能领取
+        assert await backend.claim({"analysis": 1}, "worker-a", 60) is None
+
+        await backend.fail(job.id, "worker-a", "不是持有者", 0.0)
+        assert (await queue.get(created.id)).status == "queued"
+
+        # 退避结束后第二次执行仍然失败，尝试次数用完
+        await asyncio.to_thread(
+            lambda: backend._connect().execute("UPDATE jobs SET available_at = 0 WHERE id = ?", (created.id,))
+        )
+        job = await backend.claim({"analysis": 1}, "worker-a", 60)
+        assert job.attempts == 2
+        assert await backend.fail(job.id, "worker-a", "第二次失败", 30.0) == "failed"
+        assert (await queue.get(created.id)).finished
+
+    _run_with_queue(scenario)
+
+    with _override_settings(JOB_RETRY_BACKOFF_BASE=10.0, JOB_RETRY_BACKOFF_MAX=60.0):
+        assert 8.0 <= retry_delay(1) <= 12.0
+        assert 32.0 <= retry_delay(3) <= 48.0
+        assert retry_delay(10) <= 72.0
+
+
+def test_worker_releases_running_jobs_on_shutdown():
+    """测试worker停止时交还运行中的任务且不消耗尝试次数，其他worker可以重新领取"""
+    async def scenario(queue):
+        running = asyncio.Event()
+
+        @job_handler("test.blocking", queue="execution")
+        async def blocking(ctx):
+            running.set()
+            await asyncio.sleep(3600)
+
+        created = await queue.enqueue("test.blocking", {}, max_attempts=1)
+        worker = JobWorker(limits={"execution": 1}, queue=queue, worker_id="worker-a")
+        with _override_settings(JOB_POLL_INTERVAL=0.01, JOB_SHUTDOWN_TIMEOUT=0.05, JOB_HEARTBEAT_INTERVAL=3600.0):
+            run = asyncio.create_task(worker.run())
+            await asyncio.wait_for(running.wait(), timeout=5)
+            worker.stop()
+            await asyncio.wait_for(run, timeout=5)
+
+        job = await queue.get(created.id)
+        assert job.status == "queued" and job.attempts == 0 and job.locked_by is None
+        job = await queue.backend.claim({"execution": 1}, "worker-b", 60)
+        assert job.id == created.id and job.attempts == 1
+
+        # 已取消的任务不会被交还
+        assert await queue.cancel(job.id)
+        assert not await queue.backend.release(job.id, "worker-b")
+        assert (await queue.get(job.id)).status == "cancelled"
+
+    _run_with_queue(scenario)
+
+
+def test_session_job_progress_is_forwarded():
+    """测试worker中的会话消息写入任务进度事件，API进程把进度转回会话消息队列并同步状态"""
+    async def scenario(queue):
+        worker_sessions, worker_queues = {}, {}
+
+        async def process(session_id):
+            await worker_queues[session_id].put(StreamMessage(
+                type="message", source="分析智能体", content="分析完成", region="analysis"
+            ))
+            worker_sessions[session_id]["status"] = "completed"
+
+        api_sessions = {"session-1": {"session_id": "session-1", "status": "initialized"}}
+        api_queues = {"session-1": asyncio.Queue()}
+        original = session_jobs_module.job_queue
+        session_jobs_module.job_queue = queue
+        try:
+            job = await queue.enqueue("test.session", {"session": api_sessions["session-1"]},
+                                      queue="analysis", session_id="session-1")
+            job = await queue.backend.claim({"analysis": 1}, "worker-a", 60)
+            ctx = session_jobs_module.JobContext(job=job, queue=queue, worker_id="worker-a")
+            result = await session_jobs_module.run_session_job(ctx, worker_sessions, worker_queues, process)
+            assert result == {"status": "completed", "error": None}
+            assert not worker_sessions and not worker_queues
+            await queue.backend.complete(job.id, "worker-a", result)
+
+            with _override_settings(JOB_POLL_INTERVAL=0.01):
+                await session_jobs_module.forward_job_events(job.id, "session-1", api_sessions, api_queues)
+        finally:
+            session_jobs_module.job_queue = original
+
+        message = api_queues["session-1"].get_nowait()
+        assert message.content == "分析完成" and message.region == "analysis"
+        assert api_sessions["session-1"]["status"] == "completed"
+        assert api_sessions["session-1"]["completed_at"]
+
+    _run_with_queue(scenario)
+
+
+if __name__ == "__main__":
+    test_claim_respects_priority_and_queue_limits()
+    test_visibility_timeout_requeues_lost_jobs()
+    test_failed_jobs_retry_with_backoff()
+    test_worker_releases_running_jobs_on_shutdown()
+    test_session_job_progress_is_forwarded()
+    print("✅ 任务队列测试通过")
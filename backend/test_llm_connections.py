@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型服务连接管理测试
+验证连接池覆盖配置的解析，以及大模型请求按最近活动时间区分 first、warm、idle
+"""
+import sys
+import os
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.llm_connections import LLMConnectionManager, parse_pool_overrides, pool_config
+
+
+def test_pool_overrides_apply_per_provider():
+    """测试按服务覆盖连接池配置，未覆盖的服务使用全局默认值"""
+    overrides = parse_pool_overrides("uitars:max_connections=8,http2=false; deepseek:keepalive_expiry=60")
+    assert overrides == {"uitars": {"max_connections": 8, "http2": False}, "deepseek": {"keepalive_expiry": 60.0}}
+
+    uitars = pool_config("uitars", overrides)
+    assert uitars["max_connections"] == 8
+    assert uitars["http2"] is False
+    assert pool_config("deepseek", overrides)["keepalive_expiry"] == 60.0
+    assert pool_config("qwen_vl", overrides)["max_connections"] == pool_config("qwen_vl", {})["max_connections"]
+
+
+def test_connection_state_first_warm_idle():
+    """测试启动后首个请求为 first，连接保留期内为 warm，空闲超过保留时间后为 idle"""
+    manager = LLMConnectionManager()
+    manager._configs["deepseek"] = {"keepalive_expiry": 30.0}
+
+    assert manager.begin_request("deepseek") == "first"
+    manager.touch("deepseek")
+    assert manager.begin_request("deepseek") == "warm"
+
+    manager._last_activity["deepseek"] = time.monotonic() - 31
+    assert manager.begin_request("deepseek") == "idle"
+
+
+if __name__ == "__main__":
+    test_pool_overrides_apply_per_provider()
+    test_connection_state_first_warm_idle()
+    print("✅ 模型服务连接测试通过")
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MidScene报告拆分测试
+验证按MidScene报告结构拆分出的截图去重、由骨架/时间线/截图还原的报告与原始报告逐字节一致，
+以及还原结果不一致时保留原始报告
+"""
+import sys
+import os
+import json
+import base64
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.config import settings
+from app.database.models.base import Base
+from app.database.models.blobs import ContentBlob
+import app.services.blob_store as blob_store_module
+import app.services.midscene_report as midscene_report_module
+from app.services.blob_store import BlobStore
+from app.services.midscene_report import (
+    ASSET_PREFIX, MidsceneReportSplitter, extract_report, restore_report, _escape_script
+)
+
+_LOGIN_SHOT = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+_RESULT_SHOT = b"\xff\xd8\xff\xe0" + bytes(range(255, -1, -1)) * 4
+_IMAGE_SHOT = b"\x89PNG\r\n\x1a\n" + b"midscene-image" * 32
+
+
+class _SqliteDatabase:
+    """与 db_manager 相同接口的内存数据库"""
+
+    def __init__(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        self.session_factory = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def create_tables(self):
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[ContentBlob.__table__])
+
+    @asynccontextmanager
+    async def get_session(self):
+        async with self.session_factory() as session:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+
+@contextmanager
+def _override_settings(**values):
+    original = {name: getattr(settings, name) for name in values}
+    for name, value in values.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in original.items():
+            setattr(settings, name, value)
+
+
+def _data_uri(media_type: str, data: bytes) -> str:
+    return f"data:{media_type};base64," + base64.b64encode(data).decode("ascii")
+
+
+def _dump(title: str) -> dict:
+    """与MidScene执行数据结构相同的分组：每个任务的 recorder 和 uiContext 中内嵌截图"""
+    login = _data_uri("image/png", _LOGIN_SHOT)
+    return {
+        "groupName": title,
+        "groupDescription": "tests/login.spec.ts",
+        "executions": [{
+            "name": "aiTap - 登录按钮",
+            "tasks": [
+                {
+                    "type": "Insight", "subType": "Locate", "status": "finished",
+                    "param": {"prompt": "登录按钮"},
+                    "uiContext": {"screenshotBase64": login, "size": {"width": 1280, "height": 720}},
+                    "recorder": [{"type": "screenshot", "ts": 1718000000000, "screenshot": login}],
+                    "timing": {"start": 1718000000000, "end": 1718000001500, "cost": 1500},
+                },
+                {
+                    "type": "Action", "subType": "Input", "status": "failed",
+                    "param": {"value": "</script><script>alert(1)</script>"},
+                    "recorder": [{"type": "screenshot", "screenshot": _data_uri("image/jpeg", _RESULT_SHOT)}],
+                    "errorMessage": "元素未找到", "timing": {"cost": 0.25},
+                },
+            ],
+        }],
+    }
+
+
+def _report(newline: str = "\n", indent=None) -> str:
+    """按MidScene报告页面结构生成报告内容：查看器脚本 + 执行数据标签 + 外置截图标签"""
+    dump = _escape_script(json.dumps(_dump("登录测试"), ensure_ascii=False, indent=indent,
+                                     separators=None if indent else (",", ":")))
+    second = _escape_script(json.dumps(_dump("再次登录"), ensure_ascii=False, separators=(",", ":")))
+    lines = [
+        "<!DOCTYPE html>",
+        "<html>",
+        "<head><meta charset=\"utf-8\"><title>Midscene Report</title>",
+        "<script>window.midsceneVersion = \"0.17.0\"; function render() { /* 查看器 */ }</script>",
+        "</head>",
+        "<body><div id=\"app\"></div>",
+        "<script type=\"midscene_web_dump\" type=\"application/json\" data-group-id=\"g-1\" "
+        "playwright_test_title=\"%E7%99%BB%E5%BD%95\">",
+        dump,
+        "</script>",
+        f"<script type=\"midscene_web_dump\" type=\"application/json\" data-group-id=\"g-2\">  {second}</script>",
+        f"<script type=\"midscene-image\" data-id=\"img-1\">{_data_uri('image/png', _IMAGE_SHOT)}\n</script>",
+        "</body>",
+        "</html>",
+        "",
+    ]
+    return newline.join(lines)
+
+
+def test_extract_and_restore_is_byte_identical():
+    """测试拆分出去重后的截图，骨架中不再包含base64，由骨架、时间线和截图还原后逐字节一致"""
+    for newline in ("\n", "\r\n"):
+        content = _report(newline)
+        extracted = extract_report(content)
+        assert len(extracted["groups"]) == 2 and len(extracted["images"]) == 1
+        # 两个分组中的相同截图只保存一份
+        assert sorted(extracted["assets"].values()) == sorted([_LOGIN_SHOT, _RESULT_SHOT, _IMAGE_SHOT])
+        assert "base64," not in extracted["skeleton"]
+        task = extracted["groups"][0]["dump"]["executions"][0]["tasks"][0]
+        assert task["recorder"][0]["screenshot"].startswith(ASSET_PREFIX)
+        assert extracted["groups"][0]["attributes"]["playwright_test_title"] == "登录"
+
+        timeline = json.loads(json.dumps({"groups": extracted["groups"], "images": extracted["images"]}))
+        restored = restore_report(extracted["skeleton"], timeline, extracted["assets"].__getitem__)
+        assert restored.encode("utf-8") == content.encode("utf-8")
+
+    assert extract_report("<html><body>普通页面</body></html>") is None
+
+
+def _run_with_splitter(scenario):
+    """在临时内容寻址存储和内存数据库上运行拆分场景"""
+    async def main():
+        database = _SqliteDatabase()
+        await database.create_tables()
+        original_db, original_store = blob_store_module.db_manager, midscene_report_module.blob_store
+        blob_store_module.db_manager = database
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                midscene_report_module.blob_store = BlobStore(root=os.path.join(tmp_dir, "blobs"))
+                with _override_settings(BLOB_STORE_ENABLED=True, REPORT_SPLIT_ENABLED=True,
+                                        REPORT_SPLIT_KEEP_ORIGINAL=False, REPORT_PRECOMPRESS=False):
+                    await scenario(MidsceneReportSplitter(), Path(tmp_dir))
+        finally:
+            blob_store_module.db_manager = original_db
+            midscene_report_module.blob_store = original_store
+            await database.engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_split_report_restores_original_bytes():
+    """测试只保存骨架时，下载原始报告得到与拆分前逐字节一致的文件"""
+    async def scenario(splitter, tmp_dir):
+        report = tmp_dir / "web-2025-06-01_12-30-45-1a2b3c4d.html"
+        original = _report("\r\n").encode("utf-8")
+        report.write_bytes(original)
+
+        artifact = await splitter.split(report)
+        assert artifact["skeleton"] and len(artifact["assets"]) == 3
+        assert artifact["original_size"] == len(original)
+        assert Path(artifact["skeleton"]).stat().st_size < len(original) / 2
+
+        report.unlink()
+        restored = await splitter.original_path(artifact["skeleton"], [artifact])
+        assert restored != artifact["skeleton"]
+        assert Path(restored).read_bytes() == original
+        # 已还原的文件直接复用
+        assert await splitter.original_path(artifact["skeleton"], [artifact]) == restored
+
+    _run_with_splitter(scenario)
+
+
+def test_split_keeps_original_when_restore_differs():
+    """测试执行数据的JSON格式与还原输出不同（如带缩进）时不生成骨架，原始报告保持不变"""
+    async def scenario(splitter, tmp_dir):
+        report = tmp_dir / "web-2025-06-02_08-00-00-abcdef12.html"
+        report.write_text(_report(indent=2), encoding="utf-8")
+
+        artifact = await splitter.split(report)
+        assert artifact and "skeleton" not in artifact and len(artifact["assets"]) == 3
+        assert await splitter.original_path(str(report), [artifact]) == str(report)
+
+        with _override_settings(REPORT_SPLIT_KEEP_ORIGINAL=True):
+            report.write_text(_report(), encoding="utf-8")
+            assert "skeleton" not in await splitter.split(report)
+
+    _run_with_splitter(scenario)
+
+
+if __name__ == "__main__":
+    test_extract_and_restore_is_byte_identical()
+    test_split_report_restores_original_bytes()
+    test_split_keeps_original_when_restore_differs()
+    print("✅ MidScene报告拆分测试通过")
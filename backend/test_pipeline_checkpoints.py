@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析流水线检查点测试
+验证检查点按内容哈希保存和读取，超过复用有效期的检查点视为未命中
+"""
+import sys
+import os
+import json
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.pipeline_checkpoints import (
+    PipelineCheckpointStore, STAGE_ANALYSIS, compute_content_hash, is_valid_checkpoint_key
+)
+
+ANALYSIS_ID = "0f8fad5b-d9cb-469f-a165-70867728950e"
+SESSION_ID = "7c9e6679-7425-40de-944b-e07fc1f90ae7"
+
+
+def test_checkpoint_reuse_respects_max_age():
+    """测试有效期内的检查点命中，过期的检查点只在不限制时长（重新生成脚本）时读取"""
+    async def main():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = PipelineCheckpointStore(base_dir=tmp_dir)
+            content_hash = compute_content_hash(image_path="login.png", test_description="登录")
+            await store.save(content_hash, STAGE_ANALYSIS, {"analysis_id": ANALYSIS_ID},
+                             session_id=SESSION_ID, analysis_id=ANALYSIS_ID)
+
+            record = await store.load(content_hash, STAGE_ANALYSIS, max_age_hours=24)
+            assert record["data"] == {"analysis_id": ANALYSIS_ID}
+            assert await store.resolve_analysis(ANALYSIS_ID) == content_hash
+
+            # 把检查点改为两天前创建
+            path = store._stage_path(content_hash, STAGE_ANALYSIS)
+            stale = json.loads(path.read_text(encoding="utf-8"))
+            stale["created_at"] = (datetime.now() - timedelta(days=2)).isoformat()
+            path.write_text(json.dumps(stale), encoding="utf-8")
+
+            assert await store.load(content_hash, STAGE_ANALYSIS, max_age_hours=24) is None
+            assert (await store.load(content_hash, STAGE_ANALYSIS))["data"] == {"analysis_id": ANALYSIS_ID}
+            assert store.get_stats()["misses"] == 1
+
+    asyncio.run(main())
+
+
+def test_pointer_ids_are_validated():
+    """测试分析ID只接受UUID或十六进制摘要，路径穿越的ID不会读写检查点目录之外的文件"""
+    async def main():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = PipelineCheckpointStore(base_dir=os.path.join(tmp_dir, "checkpoints"))
+            secret = os.path.join(tmp_dir, "secret")
+            with open(secret, "w", encoding="utf-8") as f:
+                f.write("a" * 64)
+
+            for analysis_id in ("../../secret", "../secret", "a/b", "", "a-1"):
+                assert not is_valid_checkpoint_key(analysis_id)
+                assert await store.resolve_analysis(analysis_id) is None
+            assert is_valid_checkpoint_key(ANALYSIS_ID) and is_valid_checkpoint_key("ab" * 32)
+
+            content_hash = compute_content_hash(image_path="login.png")
+            await store.save(content_hash, STAGE_ANALYSIS, {}, session_id="exec_1234", analysis_id="../../secret")
+            with open(secret, encoding="utf-8") as f:
+                assert f.read() == "a" * 64
+            assert sorted(os.listdir(os.path.join(tmp_dir, "checkpoints"))) == [content_hash]
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    test_checkpoint_reuse_respects_max_age()
+    test_pointer_ids_are_validated()
+    print("✅ 分析流水线检查点测试通过")
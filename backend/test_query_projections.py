@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列表查询投影回归测试
+验证列表/摘要查询不会加载重型列（日志、分析JSON、脚本正文）
+"""
+import sys
+import os
+import json
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.database.models.base import Base
+from app.database.models.reports import TestReport
+from app.database.models.page_analysis import PageAnalysisResult
+from app.database.models.scripts import TestScript
+
+# 摘要字典序列化后的大小上限（字节）
+SUMMARY_SIZE_LIMIT = 4 * 1024
+
+
+def _compiled_columns(stmt) -> str:
+    """获取语句实际查询的列（SELECT 与 FROM 之间的部分）"""
+    sql = str(stmt.compile())
+    return sql.split("FROM")[0]
+
+
+def test_summary_queries_skip_heavy_columns():
+    """测试摘要查询的SQL不包含重型列"""
+    for model in (TestReport, PageAnalysisResult, TestScript):
+        stmt = select(model).options(*model.summary_options())
+        selected = _compiled_columns(stmt)
+        for name in model.heavy_columns():
+            assert f".{name}" not in selected, f"{model.__name__}.{name} 不应出现在列表查询中"
+
+    # 指定加载组时该组的列仍会被查询
+    stmt = select(TestReport).options(*TestReport.summary_options("logs"))
+    assert ".logs" in _compiled_columns(stmt)
+    assert ".screenshots" not in _compiled_columns(stmt)
+
+
+def test_report_summary_payload_size():
+    """测试报告列表的返回数据大小不随日志量增长"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[TestReport.__table__])
+
+    with Session(engine) as session:
+        session.add(TestReport(
+            script_id="script_1",
+            script_name="大日志脚本",
+            session_id="session_1",
+            execution_id="exec_1",
+            status="passed",
+            logs=[f"第{i}行执行日志 " + "x" * 100 for i in range(10000)],
+            screenshots=[f"screenshot_{i}.png" for i in range(500)],
+        ))
+        session.commit()
+
+    with Session(engine) as session:
+        report = session.execute(
+            select(TestReport).options(*TestReport.summary_options())
+        ).scalar_one()
+        summary = report.to_summary_dict()
+
+        assert "logs" not in summary
+        assert "screenshots" not in summary
+        assert summary["script_name"] == "大日志脚本"
+        assert len(json.dumps(summary, ensure_ascii=False).encode("utf-8")) < SUMMARY_SIZE_LIMIT
+
+        # 误访问延迟列时直接报错，而不是隐式发起额外查询
+        try:
+            _ = report.logs
+        except Exception:
+            pass
+        else:
+            raise AssertionError("访问延迟加载的logs列应抛出异常")
+
+    with Session(engine) as session:
+        report = session.execute(
+            select(TestReport).options(*TestReport.detail_options())
+        ).scalar_one()
+        assert len(report.to_dict()["logs"]) == 10000
+
+
+if __name__ == "__main__":
+    print("🧪 测试列表查询投影...")
+    test_summary_queries_skip_heavy_columns()
+    test_report_summary_payload_size()
+    print("✅ 列表查询投影测试通过")
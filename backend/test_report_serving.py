@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+报告文件服务测试
+验证按 Accept-Encoding 返回预压缩文件，且原始、gzip 和 br 响应使用不同的ETag
+"""
+import sys
+import os
+import asyncio
+import hashlib
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import FastAPI, Request
+from starlette.testclient import TestClient
+
+from app.services.report_serving import precompress_report, serve_report_file
+
+
+def test_etag_depends_on_served_encoding():
+    """测试不同编码的响应ETag不同，条件请求只匹配同一编码的ETag"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        content = ("<html><body>" + "测试报告 " * 2000 + "</body></html>").encode("utf-8")
+        sha256 = hashlib.sha256(content).hexdigest()
+        report = Path(tmp_dir) / f"{sha256}.html"
+        report.write_bytes(content)
+        encodings = asyncio.run(precompress_report(report))
+        assert "gzip" in encodings
+
+        app = FastAPI()
+
+        @app.get("/report")
+        def get_report(request: Request):
+            return serve_report_file(request, report, immutable=True)
+
+        client = TestClient(app)
+        identity = client.get("/report", headers={"Accept-Encoding": "identity"})
+        gzipped = client.get("/report", headers={"Accept-Encoding": "gzip"})
+        assert identity.headers["etag"] == f'"{sha256}"'
+        assert gzipped.headers["content-encoding"] == "gzip"
+        assert gzipped.headers["etag"] == f'"{sha256}-gzip"'
+        assert gzipped.content == content
+
+        # 原始内容的ETag不能让gzip响应返回304
+        revalidate = client.get("/report", headers={"Accept-Encoding": "gzip", "If-None-Match": identity.headers["etag"]})
+        assert revalidate.status_code == 200
+        revalidate = client.get("/report", headers={"Accept-Encoding": "gzip", "If-None-Match": gzipped.headers["etag"]})
+        assert revalidate.status_code == 304
+
+
+if __name__ == "__main__":
+    test_etag_depends_on_served_encoding()
+    print("✅ 报告文件服务测试通过")
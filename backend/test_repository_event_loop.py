@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库事件循环阻塞测试
+验证会话/报告/执行仓库的统计与清理操作不会长时间阻塞事件循环
+"""
+import sys
+import os
+import time
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.database.models.base import Base
+from app.database.models.sessions import Session as SessionModel
+from app.database.models.reports import TestReport
+from app.database.repositories import (
+    SessionRepository, ReportRepository, ExecutionRepository, SyncRepository
+)
+
+# 事件循环单次阻塞上限（秒）
+BLOCKING_THRESHOLD = 0.1
+# 心跳间隔（秒）
+HEARTBEAT_INTERVAL = 0.005
+
+
+class LoopLagMonitor:
+    """事件循环延迟监视器：记录心跳协程实际唤醒时间与预期时间的最大差值"""
+
+    def __init__(self, interval: float = HEARTBEAT_INTERVAL):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, loop.time() - expected)
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._run())
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc):
+        # 让心跳协程至少再唤醒一次，记录最后一次阻塞
+        await asyncio.sleep(self.interval * 2)
+        self._task.cancel()
+
+
+async def _seed(session_factory, count: int = 2000):
+    old = datetime.utcnow() - timedelta(days=120)
+    async with session_factory() as session:
+        session.add_all([
+            SessionModel(
+                session_type="image_analysis" if i % 2 else "url_analysis",
+                status="processing" if i % 3 else "completed",
+                request_data={"index": i},
+                created_at=old,
+                updated_at=old,
+            )
+            for i in range(count)
+        ])
+        session.add_all([
+            TestReport(
+                script_id=f"script_{i % 20}",
+                script_name=f"脚本{i}",
+                session_id=f"session_{i}",
+                execution_id=f"exec_{i}",
+                status="passed" if i % 4 else "failed",
+                logs=[f"日志{j}" for j in range(50)],
+                created_at=old,
+            )
+            for i in range(count)
+        ])
+        await session.commit()
+
+
+def test_monitor_detects_blocking_call():
+    """测试监视器能识别阻塞调用"""
+    async def main():
+        async with LoopLagMonitor() as monitor:
+            time.sleep(BLOCKING_THRESHOLD * 2)
+        return monitor.max_lag
+
+    assert asyncio.run(main()) >= BLOCKING_THRESHOLD
+
+
+def test_repositories_do_not_block_event_loop():
+    """测试仓库操作期间事件循环延迟低于阈值"""
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        await _seed(session_factory)
+
+        session_repo = SessionRepository()
+        report_repo = ReportRepository()
+        execution_repo = ExecutionRepository()
+
+        async with LoopLagMonitor() as monitor:
+            async with session_factory() as session:
+                session_stats = await session_repo.get_session_statistics(session)
+                expired = await session_repo.cleanup_expired_sessions(session, expire_hours=24)
+                await session.commit()
+                report_stats = await report_repo.get_report_statistics(session)
+                deleted = await report_repo.cleanup_old_reports(session, days=90, chunk_size=200)
+                await execution_repo.get_execution_statistics(session)
+
+        await engine.dispose()
+        return monitor.max_lag, session_stats, expired, report_stats, deleted
+
+    max_lag, session_stats, expired, report_stats, deleted = asyncio.run(main())
+
+    assert session_stats["total_sessions"] == 2000
+    assert expired == session_stats["active_sessions"]
+    assert report_stats["total_reports"] == 2000
+    assert len(deleted) == 2000
+    assert max_lag < BLOCKING_THRESHOLD, f"事件循环被阻塞 {max_lag:.3f}s"
+
+
+def test_sync_repository_only_outside_event_loop():
+    """测试同步适配器可在脚本中使用，但拒绝在事件循环中调用"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_url = f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'sync.db')}"
+
+        asyncio.run(_create_tables(database_url))
+
+        with SyncRepository(SessionRepository(), database_url=database_url) as repo:
+            repo.create_session(session_type="image_analysis")
+            assert repo.get_session_statistics()["total_sessions"] == 1
+
+            async def call_in_loop():
+                repo.get_session_statistics()
+
+            try:
+                asyncio.run(call_in_loop())
+            except RuntimeError:
+                pass
+            else:
+                raise AssertionError("在事件循环中调用同步仓库应抛出RuntimeError")
+
+
+async def _create_tables(database_url: str):
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    print("🧪 测试仓库事件循环阻塞...")
+    test_monitor_detects_blocking_call()
+    test_repositories_do_not_block_event_loop()
+    test_sync_repository_only_outside_event_loop()
+    print("✅ 仓库事件循环阻塞测试通过")
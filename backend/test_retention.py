@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+保留策略测试
+验证报告目录按报告记录中的脚本ID保留最近N个报告，没有报告记录的文件只按保留天数清理，
+报告记录引用的文件不被目录策略删除
+"""
+import sys
+import os
+import time
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.database.models.base import Base
+from app.database.models.reports import TestReport
+from app.database.repositories.report_repository import REPORT_SOURCE_ARTIFACT
+import app.database.connection as connection_module
+from app.services.retention import RetentionManager, RetentionPolicy
+
+
+class _SqliteDatabase:
+    """与 db_manager 相同接口的内存数据库"""
+
+    def __init__(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        self.session_factory = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def create_tables(self):
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[TestReport.__table__])
+
+    @asynccontextmanager
+    async def get_session(self):
+        async with self.session_factory() as session:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+
+def _write_report(directory: Path, name: str, age_days: float) -> Path:
+    path = directory / name
+    path.write_text(f"<html>{name}</html>", encoding="utf-8")
+    mtime = time.time() - age_days * 86400
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def _report(script_id: str, execution_id: str, report_path=None, source=None) -> TestReport:
+    return TestReport(
+        script_id=script_id, script_name=script_id, session_id=f"session-{execution_id}",
+        execution_id=execution_id, status="passed", report_path=str(report_path) if report_path else None,
+        artifacts=[{"type": REPORT_SOURCE_ARTIFACT, "path": str(source)}] if source else [],
+    )
+
+
+def test_reports_are_kept_per_script_from_report_records():
+    """测试按脚本ID保留最近的报告：MidScene文件名中的时间戳和十六进制后缀不影响分组"""
+    async def main():
+        database = _SqliteDatabase()
+        await database.create_tables()
+        original = connection_module.db_manager
+        connection_module.db_manager = database
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                report_dir = Path(tmp_dir)
+                login = [_write_report(report_dir, f"web-2025-06-0{day}_12-30-45-{suffix}.html", 5 - day)
+                         for day, suffix in ((1, "1a2b3c4d"), (2, "ff03e1"), (3, "9c8d7e6f"), (4, "0a0b0c0d"))]
+                search = _write_report(report_dir, "web-2025-06-01_08-00-00-abcdef12.html", 4)
+                # 报告记录直接引用的文件（未启用内容寻址存储）
+                referenced = _write_report(report_dir, "web-2025-05-30_10-00-00-12345678.html", 6)
+                orphan_new = _write_report(report_dir, "web-2025-06-05_09-00-00-aaaa0000.html", 1)
+                orphan_old = _write_report(report_dir, "web-2025-04-01_09-00-00-bbbb1111.html", 40)
+
+                async with database.get_session() as session:
+                    for index, path in enumerate(login):
+                        session.add(_report("script-login", f"login-{index}", source=path))
+                    session.add(_report("script-login", "login-referenced", report_path=referenced))
+                    session.add(_report("script-search", "search-0", source=search))
+
+                policy = RetentionPolicy(name="midscene_reports", paths=[report_dir], max_age_days=30,
+                                         keep_last=2, group_by_script=True, recursive=False,
+                                         protect_reports=True)
+                manager = RetentionManager([policy])
+                result = await manager.apply_policy(policy, await manager._report_files())
+
+                remaining = {path.name for path in report_dir.iterdir()}
+                assert remaining == {login[3].name, login[2].name, search.name, referenced.name, orphan_new.name}
+                assert result["deleted"] == 3
+        finally:
+            connection_module.db_manager = original
+            await database.engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_report_policies_skip_without_database():
+    """测试数据库不可用时按脚本保留的策略跳过，不会把所有文件当作孤立文件处理"""
+    async def main():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            _write_report(Path(tmp_dir), "web-2025-06-01_12-30-45-1a2b3c4d.html", 40)
+            policy = RetentionPolicy(name="midscene_reports", paths=[Path(tmp_dir)], max_age_days=30,
+                                     keep_last=2, group_by_script=True)
+            result = await RetentionManager([policy]).apply_policy(policy, None)
+            assert result["skipped"] and result["deleted"] == 0
+            assert len(list(Path(tmp_dir).iterdir())) == 1
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    test_reports_are_kept_per_script_from_report_records()
+    test_report_policies_skip_without_database()
+    print("✅ 保留策略测试通过")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件脚本索引测试
+验证按格式/标签/分类/关键词查询、其他进程改动和删除文件后的增量刷新、执行记录按脚本分组，
+以及异步刷新在线程中扫描时不覆盖本进程的增量更新
+"""
+import sys
+import os
+import json
+import asyncio
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.models.test_scripts import (
+    TestScript, ScriptExecutionRecord, ScriptSearchRequest, ScriptFormat, ScriptType
+)
+from app.schemas.ui_automation import TestStatus
+from app.services.script_index import ScriptIndex
+
+
+def _script(script_id: str, name: str, script_format=ScriptFormat.YAML, tags=None, category=None,
+            updated_at: str = "2025-06-01T10:00:00") -> TestScript:
+    return TestScript(
+        id=script_id, session_id="session-1", name=name, description=f"{name}的脚本",
+        script_format=script_format, script_type=ScriptType.IMAGE_ANALYSIS, content="tasks: []",
+        file_path=f"{script_id}.yaml", test_description=f"验证{name}", tags=tags or [], category=category,
+        created_at="2025-06-01T09:00:00", updated_at=updated_at,
+    )
+
+
+def _record(record_id: str, script_id: str, start_time: str) -> ScriptExecutionRecord:
+    return ScriptExecutionRecord(id=record_id, script_id=script_id, execution_id=f"exec-{record_id}",
+                                 status=TestStatus.PASSED, start_time=start_time)
+
+
+def _write(directory: Path, item) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{item.id}.json"
+    path.write_text(json.dumps(item.model_dump(), ensure_ascii=False), encoding="utf-8")
+    # 保证mtime变化（部分文件系统的时间精度较低）
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def _touch_newer(path: Path) -> None:
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+
+
+def test_lookups_and_incremental_refresh():
+    """测试首次加载后的查询，其他进程修改和删除文件后按mtime只重新加载变化的文件"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        metadata, executions = Path(tmp_dir) / "metadata", Path(tmp_dir) / "executions"
+        _write(metadata, _script("s1", "用户登录", tags=["smoke"], category="账户", updated_at="2025-06-01T10:00:00"))
+        _write(metadata, _script("s2", "商品搜索", ScriptFormat.PLAYWRIGHT, tags=["smoke", "search"],
+                                 updated_at="2025-06-02T10:00:00"))
+        _write(executions, _record("r1", "s1", "2025-06-01T11:00:00"))
+        _write(executions, _record("r2", "s1", "2025-06-03T11:00:00"))
+        (metadata / "broken.json").write_text("{", encoding="utf-8")
+
+        index = ScriptIndex(metadata, executions, refresh_interval=3600)
+        assert index.get_script("s1").name == "用户登录"
+        assert index.get_script("broken") is None
+        assert [s.id for s in index.search(ScriptSearchRequest(tags=["smoke"]))] == ["s2", "s1"]
+        assert [s.id for s in index.search(ScriptSearchRequest(script_format=ScriptFormat.PLAYWRIGHT))] == ["s2"]
+        assert [s.id for s in index.search(ScriptSearchRequest(category="账户"))] == ["s1"]
+        assert [s.id for s in index.search(ScriptSearchRequest(query="搜索"))] == ["s2"]
+        # 片段都出现但不连续时不匹配
+        assert index.search(ScriptSearchRequest(query="登搜")) == []
+        assert [r.id for r in index.get_executions("s1")] == ["r2", "r1"]
+
+        # 其他进程改名、删除脚本：节流间隔内不扫描，强制刷新后生效
+        _write(metadata, _script("s1", "管理员登录", tags=["admin"]))
+        (metadata / "s2.json").unlink()
+        (executions / "r1.json").unlink()
+        assert index.get_script("s1").name == "用户登录"
+
+        loaded = []
+        original_load = index._metadata.load
+        index._metadata.load = lambda item_id: loaded.append(item_id) or original_load(item_id)
+        index.refresh(force=True)
+        assert loaded == ["s1"]  # 未变化的文件不重新读取（损坏的文件仍未变化）
+        assert index.get_script("s1").name == "管理员登录"
+        assert index.get_script("s2") is None
+        assert index.search(ScriptSearchRequest(tags=["smoke"])) == []
+        assert [s.id for s in index.search(ScriptSearchRequest(tags=["admin"]))] == ["s1"]
+        assert index.search(ScriptSearchRequest(query="搜索")) == []
+        assert index.get_execution("r1") is None
+        assert [r.id for r in index.get_executions("s1")] == ["r2"]
+
+
+def test_refresh_async_scans_in_thread_and_keeps_local_updates():
+    """测试异步刷新在线程中加载磁盘变更，扫描期间本进程的增量更新不被旧文件覆盖"""
+    async def main():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            metadata, executions = Path(tmp_dir) / "metadata", Path(tmp_dir) / "executions"
+            _write(metadata, _script("s1", "用户登录"))
+            _write(metadata, _script("s2", "商品搜索"))
+
+            index = ScriptIndex(metadata, executions, refresh_interval=3600)
+            await index.refresh_async()
+            assert len(index.all_scripts()) == 2
+
+            _write(metadata, _script("s3", "订单提交"))
+            _touch_newer(metadata / "s2.json")
+
+            original_collect = index._collect_changes
+
+            def collect_while_saving(known):
+                changes = original_collect(known)
+                # 线程扫描完成后、回到事件循环前，本进程保存了新版本的 s2
+                updated = _script("s2", "商品搜索（新版）")
+                _write(metadata, updated)
+                index.upsert_script(updated)
+                return changes
+
+            index._collect_changes = collect_while_saving
+            await index.refresh_async(force=True)
+
+            assert index.get_script("s3").name == "订单提交"
+            assert index.get_script("s2").name == "商品搜索（新版）"
+            assert [s.id for s in index.search(ScriptSearchRequest(query="新版"))] == ["s2"]
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    test_lookups_and_incremental_refresh()
+    test_refresh_async_scans_in_thread_and_keeps_local_updates()
+    print("✅ 文件脚本索引测试通过")
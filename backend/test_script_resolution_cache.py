@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+脚本解析缓存测试
+验证目录监听异常退出后清空缓存并按退避间隔自动重启
+"""
+import sys
+import os
+import asyncio
+import tempfile
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.script_resolution_cache import ScriptResolutionCache
+
+
+def test_watcher_restarts_after_failure():
+    """测试监听任务异常退出后清空缓存并按退避间隔重启，停止监听后不再重启"""
+    async def main():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ScriptResolutionCache(script_dir=tmp_dir, ttl=300)
+            cache.enabled = True
+            cache.put("script-1", {"path": os.path.join(tmp_dir, "login.spec.ts")})
+
+            attempts = []
+
+            async def failing_watch(awatch=None, interval=None):
+                attempts.append(1)
+                if len(attempts) == 1:
+                    raise RuntimeError("监听失败")
+                await asyncio.sleep(3600)
+
+            cache._watch_with_watchfiles = failing_watch
+            cache._watch_with_polling = failing_watch
+            cache.start_watching()
+            await asyncio.sleep(0.1)
+            assert cache.get("script-1") is None
+            assert cache.get_stats()["watching"] is False
+
+            # 首次重启间隔1秒
+            await asyncio.sleep(1.2)
+            assert len(attempts) == 2
+            assert cache.get_stats()["watching"] is True
+
+            await cache.stop_watching()
+            assert cache.get_stats()["watching"] is False
+            await asyncio.sleep(0.1)
+            assert len(attempts) == 2
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    test_watcher_restarts_after_failure()
+    print("✅ 脚本解析缓存测试通过")
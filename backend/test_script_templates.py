@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+脚本模板引擎测试
+验证常见流程识别、元素缺失或意图不唯一时交由大模型、没有被测页面URL时不使用模板、
+按字段类型选择输入值，以及渲染的YAML和Playwright脚本打开被测页面
+"""
+import sys
+import os
+import json
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.messages.web import PageAnalysis, TestAction
+from app.services.script_templates import ScriptTemplateEngine, extract_ui_elements
+
+URL = "https://shop.test.local/account"
+
+
+def _page(page_type: str, elements, steps=None, title: str = "测试页面") -> PageAnalysis:
+    """与图片分析智能体输出相同的结构：UI元素为包含JSON对象的文本"""
+    text = "识别到以下元素：\n" + "\n".join(json.dumps(element, ensure_ascii=False) for element in elements)
+    return PageAnalysis(page_title=title, page_type=page_type, ui_elements=[text],
+                        test_steps=steps or [], analysis_summary="测试")
+
+
+def _element(name: str, element_type: str, description: str = "") -> dict:
+    return {"name": name, "element_type": element_type, "description": description}
+
+
+LOGIN_ELEMENTS = [
+    _element("账号输入框", "input", "顶部的账号输入框"),
+    _element("密码输入框", "password", "账号下方的密码输入框"),
+    _element("登录按钮", "button", "蓝色的登录按钮"),
+]
+
+REGISTER_ELEMENTS = [
+    _element("邮箱", "email", "邮箱输入框"),
+    _element("手机号", "input", "手机号输入框"),
+    _element("年龄", "number", "年龄输入框"),
+    _element("所在城市", "select", "城市下拉框"),
+    _element("备注", "textarea", "备注文本框"),
+    _element("昵称", "input", "昵称输入框"),
+    _element("提交按钮", "button", "底部的提交按钮"),
+]
+
+
+def test_extract_ui_elements_from_agent_text():
+    """测试从智能体输出的文本中提取元素，跳过无效JSON和缺少名称的对象"""
+    page = PageAnalysis(ui_elements=[
+        '元素1: {"name": "搜索框", "type": "Search", "visual_description": "顶部搜索框"} 元素2: {无效}',
+        '{"element_type": "button"}',
+    ], analysis_summary="测试")
+    assert extract_ui_elements(page) == [{"name": "搜索框", "element_type": "search", "description": "顶部搜索框"}]
+
+
+def test_login_flow_uses_request_url_and_analysis_values():
+    """测试登录流程按分析结果中的输入值生成步骤，脚本打开请求中的被测页面"""
+    engine = ScriptTemplateEngine(threshold=1.0)
+    steps = [TestAction(step_number=1, action="input", target="账号输入框", description="输入账号",
+                        input_value="alice")]
+    plan = engine.match(_page("login", LOGIN_ELEMENTS, steps), "测试用户登录功能", URL)
+    assert plan["flow"] == "login" and plan["url"] == URL
+    assert [step["value"] for step in plan["steps"] if step["action"] == "input"] == ["alice", "Test@123456"]
+
+    yaml_script = engine.render_yaml(plan)
+    assert yaml_script["web"]["url"] == URL
+    flow = yaml_script["tasks"][0]["flow"]
+    assert flow[0] == {"aiInput": "alice", "locate": "顶部的账号输入框"}
+    assert flow[2] == {"aiTap": "蓝色的登录按钮"}
+    assert "aiAssert" in flow[-1]
+
+    code = engine.render_playwright(plan)
+    assert f'await page.goto("{URL}");' in code
+    assert 'await aiInput("alice", "顶部的账号输入框");' in code
+    assert "example.com" not in code
+
+
+def test_templates_are_skipped_without_url_or_clear_match():
+    """测试没有URL、意图不唯一或元素缺失时返回None，统计中计入未处理的请求"""
+    engine = ScriptTemplateEngine(threshold=1.0)
+    assert engine.match(_page("login", LOGIN_ELEMENTS), "测试用户登录功能") is None
+    # 登录后搜索属于组合流程
+    assert engine.match(_page("login", LOGIN_ELEMENTS), "登录后搜索商品", URL) is None
+    # 缺少登录按钮
+    assert engine.match(_page("login", LOGIN_ELEMENTS[:2]), "测试用户登录", URL) is None
+    # 降低阈值后缺少的元素按描述定位
+    partial = ScriptTemplateEngine(threshold=0.5).match(_page("login", LOGIN_ELEMENTS[:2]), "测试用户登录", URL)
+    assert {"action": "tap", "target": "提交按钮"} in partial["steps"]
+
+    search = engine.match(_page("search", [_element("搜索框", "search", "顶部搜索框")]),
+                          "搜索“蓝牙耳机”并查看结果", URL)
+    assert search["steps"][0]["value"] == "蓝牙耳机"
+    assert search["steps"][1] == {"action": "keyboard", "target": "顶部搜索框", "value": "Enter"}
+
+    stats = engine.get_stats()
+    assert stats["requests"] == 4 and stats["handled"] == 1
+    assert stats["by_flow"] == {"search": 1}
+
+
+def test_form_inputs_follow_field_types():
+    """测试表单字段按类型填写符合格式的值，下拉框展开后选择选项"""
+    engine = ScriptTemplateEngine(threshold=1.0)
+    plan = engine.match(_page("register", REGISTER_ELEMENTS), "测试注册表单提交", URL)
+    assert plan["flow"] == "form"
+
+    values = {step["target"]: step.get("value") for step in plan["steps"] if step["action"] == "input"}
+    assert values == {
+        "邮箱输入框": "test_user@example.com",
+        "手机号输入框": "13800138000",
+        "年龄输入框": "25",
+        "备注文本框": "这是一段测试内容",
+        "昵称输入框": "测试数据",
+    }
+    taps = [step["target"] for step in plan["steps"] if step["action"] == "tap"]
+    assert taps == ["城市下拉框", "城市下拉框展开后的第一个可选项", "底部的提交按钮"]
+
+    flow = engine.render_yaml(plan)["tasks"][0]["flow"]
+    assert {"aiInput": "13800138000", "locate": "手机号输入框"} in flow
+
+
+def test_pagination_flow():
+    """测试表格翻页流程：等待列表加载、点击下一页并断言第2页数据"""
+    engine = ScriptTemplateEngine(threshold=1.0)
+    elements = [_element("订单表格", "table", "订单数据表格"), _element("下一页", "button", "分页器中的下一页按钮")]
+    plan = engine.match(_page("list", elements), "验证订单列表翻页", URL)
+    assert [step["action"] for step in plan["steps"]] == ["wait", "tap", "wait"]
+    assert plan["steps"][1]["target"] == "分页器中的下一页按钮"
+    assert plan["assertion"] == "订单数据表格显示了第2页的数据"
+    assert "await aiWaitFor(" in engine.render_playwright(plan)
+
+
+if __name__ == "__main__":
+    test_extract_ui_elements_from_agent_text()
+    test_login_flow_uses_request_url_and_analysis_values()
+    test_templates_are_skipped_without_url_or_clear_match()
+    test_form_inputs_follow_field_types()
+    test_pagination_flow()
+    print("✅ 脚本模板引擎测试通过")
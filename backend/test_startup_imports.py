@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动导入回归测试
+验证导入 app.main 时不会加载智能体、autogen-agentchat、openai 等应延迟加载的模块
+"""
+import sys
+import os
+import subprocess
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scripts.profile_imports import DEFERRED_MODULES, check_report, profile_imports
+
+
+def test_app_import_defers_heavy_modules():
+    """测试导入 app.main 时不加载应延迟加载的模块（不检查耗时，避免受CI机器性能影响）"""
+    report = profile_imports("app.main")
+    assert report["total_s"] > 0
+    assert check_report(report, budget=None) == []
+
+
+def test_agent_factory_loads_agents_on_first_use():
+    """测试智能体工厂在首次访问智能体类时才导入智能体模块"""
+    code = (
+        "import sys\n"
+        "from app.agents.factory import agent_factory\n"
+        "assert 'app.agents.web.image_analyzer' not in sys.modules\n"
+        "assert len(agent_factory.list_available_agents()) == 9\n"
+        "assert 'app.agents.web.image_analyzer' not in sys.modules\n"
+        "from app.agents import ImageAnalyzerAgent\n"
+        "assert 'app.agents.web.image_analyzer' in sys.modules\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+
+if __name__ == "__main__":
+    test_app_import_defers_heavy_modules()
+    test_agent_factory_loads_agents_on_first_use()
+    print("✅ 启动导入测试通过")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地向量索引测试
+验证写入覆盖、IVF近似检索相对暴力检索的召回率、删除、从磁盘重新加载和压缩（含中断后的恢复）
+"""
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.knowledge.vector_index import VectorIndex, MANIFEST_FILE
+
+DIMENSION = 32
+
+
+def _vectors(count: int, seed: int = 0) -> np.ndarray:
+    """带聚类结构的单位向量"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, DIMENSION))
+    vectors = centers[rng.integers(20, size=count)] + 0.3 * rng.normal(size=(count, DIMENSION))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _index(directory: Path, **kwargs) -> VectorIndex:
+    return VectorIndex(str(directory), DIMENSION, "test-model", **kwargs)
+
+
+def test_upsert_search_and_remove():
+    """测试同一ID覆盖原向量、按附加数据过滤检索，以及删除后不再返回"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = _index(Path(tmp_dir) / "index", ann_threshold=1000)
+        vectors = _vectors(50)
+        ids = [f"page-{i}" for i in range(50)]
+        index.upsert(ids, vectors, [{"page_type": "form" if i % 2 else "list"} for i in range(50)])
+        assert len(index) == 50
+
+        hits = index.search(vectors[7], top_k=3)
+        assert hits[0][0] == "page-7" and abs(hits[0][1] - 1.0) < 1e-5
+
+        # 覆盖后原向量不再命中自身
+        index.upsert(["page-7"], vectors[8:9], [{"page_type": "form"}])
+        assert len(index) == 50
+        assert {hit[0] for hit in index.search(vectors[8], top_k=2)} == {"page-7", "page-8"}
+
+        hits = index.search(vectors[3], top_k=5, predicate=lambda payload: payload["page_type"] == "list")
+        assert hits and all(hit[2]["page_type"] == "list" for hit in hits)
+
+        assert index.remove(["page-3", "missing"]) == 1
+        assert "page-3" not in [hit[0] for hit in index.search(vectors[3], top_k=10)]
+        assert index.remove_where(lambda payload: payload["page_type"] == "list") == 25
+        assert len(index) == 24
+
+
+def test_ivf_recall_against_brute_force():
+    """测试超过阈值后使用IVF检索，top-10召回率相对暴力检索不低于0.9"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        count = 2000
+        vectors = _vectors(count, seed=1)
+        index = _index(Path(tmp_dir) / "index", ann_threshold=500, nprobe=8)
+        index.upsert([str(i) for i in range(count)], vectors)
+        assert index.get_stats()["mode"] == "ivf"
+
+        queries = _vectors(50, seed=2)
+        recall = 0.0
+        for query in queries:
+            expected = set(np.argsort(-(vectors @ query))[:10].astype(str))
+            found = {hit[0] for hit in index.search(query, top_k=10)}
+            recall += len(expected & found) / 10
+        assert recall / len(queries) >= 0.9
+
+
+def test_reload_and_compact():
+    """测试重新加载后数据一致，压缩后墓碑被清理且检索结果不变"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = Path(tmp_dir) / "index"
+        vectors = _vectors(300, seed=3)
+        index = _index(directory, ann_threshold=100)
+        index.upsert([f"v{i}" for i in range(300)], vectors, [{"n": i} for i in range(300)])
+        index.remove([f"v{i}" for i in range(0, 300, 3)])
+        expected = index.search(vectors[1], top_k=5)
+
+        reloaded = _index(directory, ann_threshold=100)
+        assert len(reloaded) == 200
+        assert reloaded.search(vectors[1], top_k=5) == expected
+
+        reloaded.compact()
+        stats = reloaded.get_stats()
+        assert stats["vectors"] == stats["rows"] == 200
+        assert [hit[0] for hit in reloaded.search(vectors[1], top_k=5)] == [hit[0] for hit in expected]
+        assert sorted(path.name for path in Path(tmp_dir).iterdir()) == ["index"]
+
+        again = _index(directory, ann_threshold=100)
+        assert len(again) == 200 and again.search(vectors[1], top_k=1)[0][2] == {"n": 1}
+
+
+def test_interrupted_compaction_recovers():
+    """测试压缩中断后的恢复：新索引构建中断时保留原索引，原目录已移走时启用新索引"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = Path(tmp_dir) / "index"
+        vectors = _vectors(20, seed=4)
+        index = _index(directory)
+        index.upsert([f"v{i}" for i in range(20)], vectors)
+        del index
+
+        # 新索引构建到一半：原索引保持不变，残留目录被清理
+        partial = Path(tmp_dir) / "index.compact"
+        partial.mkdir()
+        (partial / "vectors.f32").write_bytes(b"\0" * 16)
+        assert len(_index(directory)) == 20
+        assert not partial.exists()
+
+        # 新索引已构建完成、原目录已移走但尚未替换
+        _index(partial).upsert([f"v{i}" for i in range(10)], vectors[:10])
+        os.replace(directory, Path(tmp_dir) / "index.old")
+        recovered = _index(directory)
+        assert len(recovered) == 10
+        assert (directory / MANIFEST_FILE).exists()
+        assert sorted(path.name for path in Path(tmp_dir).iterdir()) == ["index"]
+
+
+if __name__ == "__main__":
+    test_upsert_search_and_remove()
+    test_ivf_recall_against_brute_force()
+    test_reload_and_compact()
+    test_interrupted_compaction_recovers()
+    print("✅ 本地向量索引测试通过")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YAML增量解析测试
+验证流式输入时按task输出解析事件、自动修复缩进和丢弃无效步骤，以及无法修复的结构错误
+"""
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.yaml_stream import IncrementalYAMLParser, YAMLStreamError
+
+SCRIPT = """以下是生成的测试脚本：
+```yaml
+web:
+  url: https://example.com
+  viewportWidth: 1280
+tasks:
+  - name: 搜索商品
+    flow:
+      - aiInput: 手机
+        locate: 搜索框
+      - aiTap: 搜索按钮
+      - aiAssert: 页面显示搜索结果
+  - name: 查看详情
+    flow:
+      - aiTap: 第一个商品
+      - aiWaitFor: 商品详情页加载完成
+```
+脚本说明：tasks:
+  - 这段文字不属于脚本
+"""
+
+
+def _feed_in_chunks(parser, text, size):
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return events + parser.finish()
+
+
+def test_tasks_are_emitted_as_they_complete():
+    """测试任意切分的流式输入都按顺序输出web、task和complete事件，代码块之后的内容被忽略"""
+    for size in (1, 7, len(SCRIPT)):
+        parser = IncrementalYAMLParser()
+        events = _feed_in_chunks(parser, SCRIPT, size)
+        assert [event["type"] for event in events] == ["web", "task", "task", "complete"]
+        assert events[0]["data"]["url"] == "https://example.com"
+        assert [task["name"] for task in parser.tasks] == ["搜索商品", "查看详情"]
+        assert len(parser.tasks[0]["flow"]) == 3
+        assert parser.document()["tasks"][1]["continueOnError"] is False
+
+    # 第一个task在第二个task开始时即可校验完成，不等待整个脚本
+    parser = IncrementalYAMLParser()
+    head = SCRIPT[:SCRIPT.index("  - name: 查看详情")] + "  - name: 查看详情\n"
+    assert [event["type"] for event in parser.feed(head)] == ["web", "task"]
+    assert not parser.finished
+
+
+def test_unknown_steps_dropped_and_indentation_repaired():
+    """测试没有可识别动作的步骤和task被丢弃并给出警告，奇数缩进自动修复"""
+    parser = IncrementalYAMLParser()
+    events = _feed_in_chunks(parser, (
+        "web:\n"
+        "  url: https://example.com\n"
+        "tasks:\n"
+        "  - name: 登录\n"
+        "    flow:\n"
+        "      - aiTap: 登录按钮\n"
+        "      - clickSomewhere: 未知动作\n"
+        "  - name: 空任务\n"
+        "    flow:\n"
+        "      - unknownAction: 1\n"
+        "  - name: 缩进错误\n"
+        "    flow:\n"
+        "      - aiInput: 密码\n"
+        "       locate: 密码框\n"
+    ), 16)
+    assert [task["name"] for task in parser.tasks] == ["登录", "缩进错误"]
+    assert parser.tasks[0]["flow"] == [{"aiTap": "登录按钮"}]
+    assert parser.tasks[1]["flow"] == [{"aiInput": "密码", "locate": "密码框"}]
+    # 两个未知动作的步骤各一条，没有有效步骤的task一条
+    assert sum(1 for event in events if event["type"] == "warning") == 3
+    assert any("缩进已自动修复" in warning for warning in parser.warnings)
+
+
+def test_unrecoverable_structure_raises():
+    """测试修复缩进后仍无法解析的task抛出 YAMLStreamError，已校验的task保留"""
+    parser = IncrementalYAMLParser()
+    parser.feed(
+        "web:\n"
+        "  url: https://example.com\n"
+        "tasks:\n"
+        "  - name: 搜索\n"
+        "    flow:\n"
+        "      - aiTap: 搜索按钮\n"
+    )
+    try:
+        parser.feed(
+            "  - name: 结构错误\n"
+            "    flow: [aiTap: 按钮\n"
+            "  - name: 下一个\n"
+        )
+        assert False, "应当抛出 YAMLStreamError"
+    except YAMLStreamError:
+        pass
+    assert [task["name"] for task in parser.tasks] == ["搜索"]
+
+
+if __name__ == "__main__":
+    test_tasks_are_emitted_as_they_complete()
+    test_unknown_steps_dropped_and_indentation_repaired()
+    test_unrecoverable_structure_raises()
+    print("✅ YAML增量解析测试通过")